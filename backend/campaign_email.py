@@ -0,0 +1,296 @@
+"""
+CAMPAIGN EMAIL - Templates précompilés et envoi batch Resend
+Le HTML d'une campagne est compilé UNE fois (message, CTA, bloc média),
+puis chaque destinataire est rendu par simple concaténation ({prénom}).
+Les envois passent par l'endpoint batch de Resend (100 emails max par appel).
+"""
+
+import html
+import json
+import logging
+import os
+import re
+import urllib.error
+import urllib.request
+from typing import Optional, List, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# === CONFIGURATION ===
+RESEND_API_URL = os.environ.get('RESEND_API_URL', 'https://api.resend.com')
+RESEND_BATCH_LIMIT = 100
+DEFAULT_SENDER = "Afroboost <notifications@afroboosteur.com>"
+FRONTEND_BASE_URL = "https://afroboosteur.com"
+DEFAULT_FIRST_NAME = "ami(e)"
+
+FIRST_NAME_PLACEHOLDERS = ("{prénom}", "{prenom}")
+_NAME_MARK = "\x00PRENOM\x00"
+_SLOT_PATTERN = re.compile(r'%%([A-Z_]+)%%')
+
+# === LAYOUTS ===
+# Layout "simple" : lancement immédiat (/campaigns/{id}/launch)
+LAYOUT_SIMPLE = """<!DOCTYPE html>
+<html lang="fr">
+<head><meta charset="utf-8"><title>Message Afroboost</title></head>
+<body style="margin:0;padding:20px;background:#f5f5f5;font-family:Arial,sans-serif;">
+<div style="max-width:480px;margin:0 auto;background:#111;border-radius:10px;overflow:hidden;">
+<div style="background:#9333EA;padding:16px 20px;text-align:center;">
+<span style="color:#fff;font-size:22px;font-weight:bold;">Afroboost</span>
+</div>
+<div style="padding:20px;color:#fff;font-size:14px;line-height:1.6;">
+<p>Salut %%FIRST_NAME%%,</p>
+%%MEDIA%%
+%%MESSAGE%%
+%%CTA%%
+</div>
+<div style="padding:15px 20px;border-top:1px solid #333;text-align:center;">
+<a href="https://afroboosteur.com" style="color:#9333EA;text-decoration:none;font-size:11px;">afroboosteur.com</a>
+</div>
+</div>
+</body>
+</html>"""
+
+# Layout "v5" : Template Email V5 FINAL - Anti-Promotions Maximal
+# RÈGLES GMAIL ANTI-PROMOTIONS:
+# 1. TEXTE BRUT en premier (3 lignes minimum AVANT tout design)
+# 2. Salutation personnalisée
+# 3. Ratio texte > image
+# 4. Pas de gradient CSS (Gmail les ignore parfois)
+# 5. Taille réduite de 20%
+LAYOUT_V5 = '''<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Message Afroboost</title>
+</head>
+<body style="margin:0;padding:0;background-color:#f5f5f5;font-family:Arial,Helvetica,sans-serif;">
+
+<!-- PREHEADER INVISIBLE -->
+<div style="display:none;font-size:1px;color:#f5f5f5;line-height:1px;max-height:0px;max-width:0px;opacity:0;overflow:hidden;">
+Salut %%FIRST_NAME%%, découvre notre nouvelle vidéo exclusive !
+</div>
+
+<!-- WRAPPER -->
+<table width="100%" cellpadding="0" cellspacing="0" border="0" style="background-color:#f5f5f5;">
+<tr><td align="center" style="padding:20px 10px;">
+
+<!-- ========== TEXTE BRUT ANTI-PROMOTIONS (3 lignes AVANT le design) ========== -->
+<table width="480" cellpadding="0" cellspacing="0" border="0" style="max-width:480px;">
+<tr><td style="color:#333333;font-size:14px;line-height:1.6;font-family:Arial,sans-serif;padding-bottom:15px;">
+Salut %%FIRST_NAME%%,<br><br>
+J'ai une nouvelle vidéo à te partager. Je pense qu'elle va te plaire !<br>
+Clique sur le bouton ci-dessous pour la découvrir.
+</td></tr>
+</table>
+
+<!-- ========== CARD PRINCIPALE (taille réduite 480px) ========== -->
+<table width="480" cellpadding="0" cellspacing="0" border="0" style="max-width:480px;background-color:#111111;border-radius:10px;overflow:hidden;">
+
+<!-- HEADER VIOLET -->
+<tr><td align="center" style="background-color:#9333EA;padding:16px 20px;">
+<a href="https://afroboosteur.com" style="color:#ffffff;font-size:22px;font-weight:bold;text-decoration:none;font-family:Arial,sans-serif;">Afroboost</a>
+</td></tr>
+
+<!-- CONTENU -->
+<tr><td style="padding:20px;">
+
+<!-- IMAGE + BOUTON -->
+%%MEDIA%%
+
+<!-- MESSAGE -->
+<table cellpadding="0" cellspacing="0" border="0" width="100%" style="margin-top:20px;">
+<tr><td style="color:#ffffff;font-size:14px;line-height:1.6;font-family:Arial,sans-serif;">
+%%MESSAGE%%
+</td></tr>
+</table>
+
+%%CTA%%
+
+</td></tr>
+
+<!-- FOOTER -->
+<tr><td align="center" style="padding:15px 20px;border-top:1px solid #333333;">
+<p style="color:#888888;font-size:11px;margin:0;font-family:Arial,sans-serif;">
+<a href="https://afroboosteur.com" style="color:#9333EA;text-decoration:none;">afroboosteur.com</a>
+</p>
+</td></tr>
+
+</table>
+
+</td></tr>
+</table>
+
+</body>
+</html>'''
+
+LAYOUTS = {"simple": LAYOUT_SIMPLE, "v5": LAYOUT_V5}
+
+
+# === HELPERS ===
+
+def first_name_of(full_name: Optional[str]) -> str:
+    """Extrait le prénom d'un nom complet (fallback: ami(e))."""
+    parts = (full_name or "").split()
+    return parts[0] if parts else DEFAULT_FIRST_NAME
+
+
+def extract_media_slug(media_url: Optional[str]) -> Optional[str]:
+    """
+    Extrait le slug d'un lien média interne.
+    Formats supportés: /v/slug, /api/share/slug, afroboosteur.com/v/slug
+    """
+    if not media_url:
+        return None
+    if '/api/share/' in media_url:
+        slug = media_url.split('/api/share/')[-1]
+    elif '/v/' in media_url:
+        slug = media_url.split('/v/')[-1]
+    else:
+        return None
+    return slug.split('?')[0].split('#')[0].strip('/') or None
+
+
+def resolve_media(media_url: Optional[str], media_link: Optional[dict] = None,
+                  frontend_base: str = FRONTEND_BASE_URL) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Calcule (click_url, thumbnail_url) pour le bloc média.
+    media_link = document media_links déjà chargé par l'appelant (ou None).
+    """
+    if not media_url:
+        return None, None
+    slug = extract_media_slug(media_url)
+    if not slug:
+        # URL externe directe (image)
+        return media_url, media_url
+    if not media_link:
+        logger.warning(f"[EMAIL] Media link not found for slug: {slug}")
+        return media_url, None
+    thumbnail_url = media_link.get("thumbnail") or media_link.get("custom_thumbnail")
+    # HASH ROUTING: /#/v/{slug} fonctionne sans configuration serveur
+    return f"{frontend_base}/#/v/{slug}", thumbnail_url
+
+
+def build_media_html(click_url: Optional[str], thumbnail_url: Optional[str]) -> str:
+    """Bloc image cliquable + bouton 'Voir la vidéo' (V5, taille réduite -20%)."""
+    if not click_url or not thumbnail_url:
+        return ""
+    if thumbnail_url.startswith('http://'):
+        thumbnail_url = thumbnail_url.replace('http://', 'https://')
+    return f'''<!-- Image cliquable (taille réduite) -->
+<a href="{click_url}" style="display:block;text-decoration:none;">
+<img src="{thumbnail_url}" width="400" style="display:block;width:100%;max-width:400px;border-radius:8px;margin:0 auto;" alt="Aperçu vidéo">
+</a>
+<!-- Bouton "Voir la vidéo" -->
+<table cellpadding="0" cellspacing="0" border="0" width="100%" style="margin-top:15px;">
+<tr><td align="center">
+<a href="{click_url}" style="display:inline-block;padding:12px 28px;background:#E91E63;color:#ffffff;text-decoration:none;border-radius:8px;font-family:Arial,sans-serif;font-size:14px;font-weight:bold;">
+&#9658; Voir la vidéo
+</a>
+</td></tr>
+</table>'''
+
+
+def build_cta_html(cta_text: Optional[str], cta_link: Optional[str]) -> str:
+    """Bouton CTA de la campagne (vide si pas de lien)."""
+    if not cta_link:
+        return ""
+    link = cta_link.strip()
+    if link and not link.startswith(('http://', 'https://', '#')):
+        link = 'https://' + link
+    label = html.escape(cta_text or "En savoir plus")
+    return f'''<table cellpadding="0" cellspacing="0" border="0" width="100%" style="margin-top:20px;">
+<tr><td align="center">
+<a href="{link}" style="display:inline-block;padding:12px 28px;background:#9333EA;color:#ffffff;text-decoration:none;border-radius:8px;font-family:Arial,sans-serif;font-size:14px;font-weight:bold;">
+{label}
+</a>
+</td></tr>
+</table>'''
+
+
+def _mark_first_name(text: str) -> str:
+    for placeholder in FIRST_NAME_PLACEHOLDERS:
+        text = text.replace(placeholder, _NAME_MARK)
+    return text
+
+
+# === TEMPLATE PRÉCOMPILÉ ===
+
+class CampaignEmailTemplate:
+    """
+    Template email compilé une fois par campagne.
+    Seul le prénom varie par destinataire: render() = join des fragments.
+    """
+
+    def __init__(self, subject: str, message: str, media_html: str = "",
+                 cta_html: str = "", layout: str = "v5", sender: str = DEFAULT_SENDER):
+        self.sender = sender
+        slots = {
+            "FIRST_NAME": _NAME_MARK,
+            "MEDIA": media_html or "",
+            "CTA": cta_html or "",
+            "MESSAGE": _mark_first_name(message or "").replace(chr(10), '<br>'),
+        }
+        compiled = _SLOT_PATTERN.sub(lambda m: slots.get(m.group(1), m.group(0)), LAYOUTS[layout])
+        self._html_parts = compiled.split(_NAME_MARK)
+        self._subject_parts = _mark_first_name(subject or "").split(_NAME_MARK)
+
+    def render(self, to_name: Optional[str] = None) -> Dict[str, str]:
+        """Rend sujet + HTML pour un destinataire."""
+        first_name = first_name_of(to_name)
+        return {
+            "subject": first_name.join(self._subject_parts),
+            "html": html.escape(first_name).join(self._html_parts),
+        }
+
+    def build_email(self, to_email: str, to_name: Optional[str] = None) -> Dict[str, Any]:
+        """Paramètres Resend pour un destinataire."""
+        rendered = self.render(to_name)
+        return {"from": self.sender, "to": [to_email], "subject": rendered["subject"], "html": rendered["html"]}
+
+
+# === ENVOI BATCH RESEND ===
+
+def _post_batch(emails: List[Dict[str, Any]], api_key: str, api_url: str, timeout: float) -> List[Dict[str, Any]]:
+    request = urllib.request.Request(
+        f"{api_url.rstrip('/')}/emails/batch",
+        data=json.dumps(emails).encode("utf-8"),
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "User-Agent": "afroboost-campaigns",
+        },
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.loads(response.read().decode("utf-8") or "{}")
+    return payload.get("data") or []
+
+
+def send_batch(emails: List[Dict[str, Any]], api_key: str, api_url: Optional[str] = None,
+               timeout: float = 30) -> List[Dict[str, Any]]:
+    """
+    Envoie une liste d'emails via POST /emails/batch (chunks de 100).
+    Synchrone: appeler via asyncio.to_thread depuis un handler async.
+
+    Returns:
+        Une entrée par email, dans l'ordre: {to, success, email_id|error}
+    """
+    api_url = api_url or RESEND_API_URL
+    results = []
+    for start in range(0, len(emails), RESEND_BATCH_LIMIT):
+        chunk = emails[start:start + RESEND_BATCH_LIMIT]
+        try:
+            data = _post_batch(chunk, api_key, api_url, timeout)
+            for idx, email in enumerate(chunk):
+                email_id = data[idx].get("id") if idx < len(data) else None
+                results.append({"to": email["to"][0], "success": True, "email_id": email_id})
+            logger.info(f"[EMAIL-BATCH] ✅ {len(chunk)} email(s) envoyés")
+        except urllib.error.HTTPError as e:
+            error = f"HTTP {e.code}: {e.read().decode('utf-8', 'replace')[:200]}"
+            logger.error(f"[EMAIL-BATCH] ❌ Chunk de {len(chunk)} échoué: {error}")
+            results.extend({"to": email["to"][0], "success": False, "error": error} for email in chunk)
+        except Exception as e:
+            logger.error(f"[EMAIL-BATCH] ❌ Chunk de {len(chunk)} échoué: {e}")
+            results.extend({"to": email["to"][0], "success": False, "error": str(e)} for email in chunk)
+    return results
@@ -0,0 +1,186 @@
+"""
+EMOJI REGISTRY - Manifeste des emojis du coach + planche de sprites
+- manifeste en mémoire (liste du stockage), invalidé par les uploads / suppressions,
+  par le mtime du dossier (stockage local) ou par TTL (S3)
+- version = hash du contenu listé (clés, tailles, dates) -> ETag et URLs versionnées
+- planche PNG unique (SVG rastérisés via CairoSVG, PNG/JPEG/GIF/WebP via Pillow)
+  + atlas JSON des positions: le sélecteur s'ouvre en 2 requêtes au lieu de N
+- fichiers "custom_<uuid>" (emojis du coach, /chat/emojis, référencés par
+  custom_emojis.image_url) partagent le stockage mais sont exclus du sélecteur
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EMOJI_EXTENSIONS = ("png", "jpg", "jpeg", "gif", "webp", "svg")
+SPRITE_CELL = 64
+SPRITE_COLUMNS = 8
+MANIFEST_TTL_SECONDS = 60
+SPRITE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+COACH_EMOJI_PREFIX = "custom_"
+
+
+def is_picker_emoji(key: str) -> bool:
+    """Fichier image du sélecteur (extension connue, hors emojis du coach)."""
+    stem, _, extension = key.rpartition(".")
+    return bool(stem) and extension.lower() in EMOJI_EXTENSIONS and not key.startswith(COACH_EMOJI_PREFIX)
+
+
+def rasterize(data: bytes, extension: str, cell: int):
+    """Image RGBA cell x cell (proportions conservées, centrée) depuis un SVG ou une image."""
+    from PIL import Image
+
+    if extension == "svg":
+        import cairosvg
+        data = cairosvg.svg2png(bytestring=data, output_width=cell, output_height=cell)
+    img = Image.open(io.BytesIO(data))
+    img.seek(0)  # GIF animé: première image
+    img = img.convert("RGBA")
+    img.thumbnail((cell, cell), Image.LANCZOS)
+    tile = Image.new("RGBA", (cell, cell), (0, 0, 0, 0))
+    tile.paste(img, ((cell - img.width) // 2, (cell - img.height) // 2))
+    return tile
+
+
+def compose_sprite(sources: List[tuple], count: int, cell: int, columns: int,
+                   render: Callable = rasterize) -> bytes:
+    """[(index, données, extension)] -> PNG de la planche de `count` cases (vides si échec de rendu)."""
+    from PIL import Image
+
+    rows = max(1, math.ceil(count / columns))
+    sheet = Image.new("RGBA", (cell * columns, cell * rows), (0, 0, 0, 0))
+    for index, data, extension in sources:
+        try:
+            tile = render(data, extension, cell)
+        except Exception as e:
+            logger.warning(f"[EMOJIS] Rendu sprite impossible (case {index}): {e}")
+            continue
+        sheet.paste(tile, ((index % columns) * cell, (index // columns) * cell))
+    buffer = io.BytesIO()
+    sheet.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+@dataclass
+class EmojiManifest:
+    version: str
+    emojis: List[dict]
+    atlas: dict
+    built_at: float
+    stamp: Optional[int]
+
+    def as_dict(self, sprite_url: str, atlas_url: str) -> dict:
+        return {
+            "version": self.version,
+            "emojis": self.emojis,
+            "count": len(self.emojis),
+            "sprite": {"url": f"{sprite_url}?v={self.version}", "atlas_url": f"{atlas_url}?v={self.version}",
+                       "cell": self.atlas["cell"], "columns": self.atlas["columns"],
+                       "width": self.atlas["width"], "height": self.atlas["height"]},
+        }
+
+
+class EmojiRegistry:
+    """Manifeste + sprite mémorisés par version; reconstruction unique (verrou)."""
+
+    def __init__(self, storage, cell: int = SPRITE_CELL, columns: int = SPRITE_COLUMNS,
+                 ttl_seconds: float = MANIFEST_TTL_SECONDS, compose: Callable = compose_sprite,
+                 clock: Callable[[], float] = time.monotonic):
+        self.storage = storage
+        self.cell = cell
+        self.columns = columns
+        self.ttl_seconds = ttl_seconds
+        self._compose = compose
+        self._clock = clock
+        self._manifest: Optional[EmojiManifest] = None
+        self._sprites: Dict[str, bytes] = {}
+        self._manifest_lock = asyncio.Lock()
+        self._sprite_lock = asyncio.Lock()
+        self.builds = 0
+        self.sprite_builds = 0
+
+    def invalidate(self):
+        self._manifest = None
+
+    def _fresh(self) -> Optional[EmojiManifest]:
+        manifest = self._manifest
+        if manifest is None:
+            return None
+        stamp = self.storage.change_stamp()
+        if stamp is not None:
+            return manifest if stamp == manifest.stamp else None
+        return manifest if self._clock() - manifest.built_at <= self.ttl_seconds else None
+
+    async def manifest(self) -> EmojiManifest:
+        manifest = self._fresh()
+        if manifest:
+            return manifest
+        async with self._manifest_lock:
+            manifest = self._fresh()
+            if manifest:
+                return manifest
+            stamp = self.storage.change_stamp()  # lu avant le listing: un ajout concurrent invalide
+            objects = sorted((o for o in await self.storage.list() if is_picker_emoji(o.key)), key=lambda o: o.key)
+            digest = hashlib.sha256()
+            emojis, frames = [], {}
+            for index, stored in enumerate(objects):
+                digest.update(f"{stored.key}:{stored.size}:{int(stored.mtime)};".encode())
+                x, y = (index % self.columns) * self.cell, (index // self.columns) * self.cell
+                frames[stored.key] = {"x": x, "y": y, "w": self.cell, "h": self.cell}
+                emojis.append({
+                    "name": stored.key.rpartition(".")[0],
+                    "url": self.storage.url(stored.key),
+                    "filename": stored.key,
+                    "sprite": {"x": x, "y": y},
+                })
+            rows = max(1, math.ceil(len(objects) / self.columns))
+            version = digest.hexdigest()[:16]
+            atlas = {
+                "version": version, "cell": self.cell, "columns": self.columns,
+                "width": self.cell * self.columns, "height": self.cell * rows, "frames": frames,
+            }
+            manifest = EmojiManifest(version, emojis, atlas, self._clock(), stamp)
+            self._manifest = manifest
+            self.builds += 1
+            # Planches des versions précédentes: inutiles
+            self._sprites = {v: b for v, b in self._sprites.items() if v == version}
+            return manifest
+
+    async def sprite(self) -> tuple:
+        """(version, PNG) de la planche du manifeste courant, construite une fois par version."""
+        manifest = await self.manifest()
+        sprite = self._sprites.get(manifest.version)
+        if sprite is not None:
+            return manifest.version, sprite
+        async with self._sprite_lock:
+            sprite = self._sprites.get(manifest.version)
+            if sprite is None:
+                sources = []
+                for index, emoji in enumerate(manifest.emojis):
+                    try:
+                        data = await self.storage.get_bytes(emoji["filename"])
+                    except Exception as e:
+                        logger.warning(f"[EMOJIS] Lecture {emoji['filename']} impossible: {e}")
+                        continue
+                    sources.append((index, data, emoji["filename"].rpartition(".")[2].lower()))
+                sprite = await asyncio.to_thread(
+                    self._compose, sources, len(manifest.emojis), self.cell, self.columns
+                )
+                self._sprites[manifest.version] = sprite
+                self.sprite_builds += 1
+        return manifest.version, sprite
+
+    def metrics(self) -> dict:
+        return {
+            "version": self._manifest.version if self._manifest else None,
+            "builds": self.builds,
+            "sprite_builds": self.sprite_builds,
+        }
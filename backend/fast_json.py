@@ -0,0 +1,74 @@
+"""
+FAST JSON - Rendu JSON rapide des gros payloads (orjson)
+- dumps(): orjson (datetime, UUID natifs), repli sur json si orjson absent
+- project_rows(): équivalent de Model.model_construct(**doc).model_dump()
+  sans validation, pour les documents lus en DB (déjà conformes au modèle)
+- trusted_response(): réponse orjson directe, sans passer par jsonable_encoder
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, List
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - orjson est dans requirements.txt
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if ORJSON_AVAILABLE else 0
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(data: Any) -> bytes:
+    """JSON compact UTF-8 (même forme que JSONResponse / ORJSONResponse)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=_ORJSON_OPTIONS)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+_FIELD_PLANS = {}
+
+
+def _field_plan(model) -> List[tuple]:
+    plan = _FIELD_PLANS.get(model)
+    if plan is None:
+        plan = [
+            (name, info.serialization_alias or info.alias or name, info)
+            for name, info in model.model_fields.items()
+        ]
+        _FIELD_PLANS[model] = plan
+    return plan
+
+
+def project_rows(model, docs: Iterable[dict]) -> List[dict]:
+    """
+    Documents DB -> dicts au format du response_model, sans validation:
+    champs du modèle uniquement (extras ignorés), valeurs par défaut complétées.
+    """
+    plan = _field_plan(model)
+    rows = []
+    for doc in docs:
+        row = {}
+        for name, key, info in plan:
+            if name in doc:
+                row[key] = doc[name]
+            elif not info.is_required():
+                row[key] = info.get_default(call_default_factory=True)
+            else:
+                row[key] = None
+        rows.append(row)
+    return rows
+
+
+def trusted_response(content: Any, status_code: int = 200, headers: dict = None):
+    """Réponse JSON directe (orjson) pour des données déjà sérialisables."""
+    from starlette.responses import Response
+    return Response(content=dumps(content), status_code=status_code, headers=headers,
+                    media_type="application/json")
@@ -0,0 +1,268 @@
+"""
+IDENTITY - Résolution des contacts (email / téléphone / nom) sur clés normalisées
+Entrée chat, chat IA et adhésion aux groupes cherchaient chacun à leur façon
+($regex non ancrés, numéro brut vs "nettoyé"), avec des scans de collection.
+- clés stockées sur le document: email_key (minuscules), phone_e164 / phone_key
+  (phone_index), name_key (casefold, espaces normalisés), chacune indexée
+- find(): une seule requête $or sur ces index, priorité email > téléphone > nom
+- resolve_or_create(): unicité garantie par des "claims" (_id = "scope:email:...",
+  "scope:phone:+41...") dans contact_identities: deux inscriptions simultanées
+  avec le même email/numéro aboutissent au même contact
+- backfill(): clés + claims des documents existants (le plus ancien garde la clé)
+- update(): modification (PUT) d'un contact: nouvelles clés réservées, claims de ses
+  anciennes clés libérés
+- release(): claims d'un contact supprimé libérés; un claim resté orphelin (contact
+  disparu ou qui ne porte plus la clé) est repris par le prochain contact qui la revendique
+"""
+
+import logging
+import unicodedata
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from phone_index import with_phone_index
+
+logger = logging.getLogger(__name__)
+
+CLAIMS_COLLECTION = "contact_identities"
+DUPLICATE_KEY = 11000
+CLAIM_ATTEMPTS = 3
+BACKFILL_BATCH = 500
+
+
+def email_key(email: Optional[str]) -> Optional[str]:
+    email = (email or "").strip().lower()
+    return email if "@" in email else None
+
+
+def name_key(name: Optional[str]) -> Optional[str]:
+    name = " ".join(unicodedata.normalize("NFC", name or "").split()).casefold()
+    return name or None
+
+
+def with_identity_fields(doc: dict, collection: str) -> dict:
+    """Pose email_key / name_key (+ champs téléphone) pour les champs présents dans `doc`."""
+    if "email" in doc:
+        doc["email_key"] = email_key(doc["email"])
+    if "name" in doc:
+        doc["name_key"] = name_key(doc["name"])
+    return with_phone_index(doc, collection)
+
+
+# Clés fortes réservées (champ -> type dans l'_id du claim)
+_CLAIM_KINDS = {"email_key": "email", "phone_e164": "phone"}
+# Champs retirés d'une mise à jour quand la clé forte appartient à un autre contact
+_CLAIM_SOURCES = {"email_key": ("email", "email_key"), "phone_e164": ("whatsapp", "phone_e164", "phone_key")}
+
+
+def _is_duplicate(error: Exception) -> bool:
+    return getattr(error, "code", None) == DUPLICATE_KEY
+
+
+class IdentityIndex:
+    """Contacts d'une collection (chat_participants, users) adressés par clés normalisées."""
+
+    def __init__(self, database, collection: str, scope: Optional[str] = None):
+        self.database = database
+        self.collection = collection
+        self.scope = scope or collection
+        self.created = 0
+        self.resolved = 0
+        self.races = 0
+
+    @property
+    def documents(self):
+        return self.database[self.collection]
+
+    @property
+    def claims(self):
+        return self.database[CLAIMS_COLLECTION]
+
+    def _claim_ids(self, doc: dict) -> Dict[str, str]:
+        """{champ: _id du claim} des clés fortes (email, téléphone) du document."""
+        return {field: f"{self.scope}:{kind}:{doc[field]}" for field, kind in _CLAIM_KINDS.items() if doc.get(field)}
+
+    async def ensure_indexes(self):
+        for field in ("email_key", "phone_e164", "name_key"):
+            await self.documents.create_index(field, partialFilterExpression={field: {"$type": "string"}})
+
+    async def find(self, email: Optional[str] = None, whatsapp: Optional[str] = None,
+                   name: Optional[str] = None) -> Optional[dict]:
+        keys = with_identity_fields({"email": email or "", "whatsapp": whatsapp or "", "name": name or ""},
+                                    self.collection)
+        clauses = [{field: keys[field]} for field in ("email_key", "phone_e164", "name_key") if keys.get(field)]
+        if not clauses:
+            return None
+        candidates = await self.documents.find({"$or": clauses}, {"_id": 0}).to_list(10)
+        for field in ("email_key", "phone_e164", "name_key"):
+            for candidate in candidates:
+                if keys.get(field) and candidate.get(field) == keys[field]:
+                    return candidate
+        return None
+
+    async def _claim_key(self, field: str, key: str, contact_id: str) -> Optional[str]:
+        """
+        Réserve une clé; None si acquise (ou déjà à ce contact), sinon id du propriétaire.
+        Claim d'un contact supprimé ou dont la clé a changé: repris (conditionné à l'ancien
+        propriétaire).
+        """
+        claim_id = self._claim_ids({field: key})[field]
+        for _ in range(CLAIM_ATTEMPTS):
+            now = datetime.now(timezone.utc).isoformat()
+            try:
+                await self.claims.insert_one({
+                    "_id": claim_id, "contact_id": contact_id, "collection": self.collection, "created_at": now,
+                })
+                return None
+            except Exception as e:
+                if not _is_duplicate(e):
+                    raise
+            owner = await self.claims.find_one({"_id": claim_id})
+            if owner is None:
+                continue  # libéré entre-temps: nouvelle tentative
+            owner_id = owner.get("contact_id")
+            if owner_id == contact_id:
+                return None
+            if await self.documents.find_one({"id": owner_id, field: key}, {"_id": 1}):
+                return owner_id
+            taken = await self.claims.update_one(
+                {"_id": claim_id, "contact_id": owner_id}, {"$set": {"contact_id": contact_id, "created_at": now}}
+            )
+            if taken.modified_count:
+                logger.info(f"[IDENTITY] Claim orphelin {claim_id} repris ({owner_id} -> {contact_id})")
+                return None
+        logger.warning(f"[IDENTITY] Claim {claim_id} non acquis après {CLAIM_ATTEMPTS} tentatives")
+        return None
+
+    async def _claim(self, doc: dict) -> Optional[str]:
+        """Réserve les clés fortes de doc; id du propriétaire existant en cas de conflit."""
+        taken = []
+        for field, claim_id in self._claim_ids(doc).items():
+            owner_id = await self._claim_key(field, doc[field], doc["id"])
+            if owner_id:
+                if taken:
+                    await self.claims.delete_many({"_id": {"$in": taken}})
+                return owner_id
+            taken.append(claim_id)
+        return None
+
+    async def _claim_fields(self, contact_id: str, update: dict) -> dict:
+        """Réserve les clés fortes de `update`; celles d'un autre contact en sont retirées."""
+        for field, claim_id in self._claim_ids(update).items():
+            owner_id = await self._claim_key(field, update[field], contact_id)
+            if owner_id:
+                logger.info(f"[IDENTITY] {claim_id} appartient déjà à {owner_id}")
+                for source in _CLAIM_SOURCES[field]:
+                    update.pop(source, None)
+        return update
+
+    async def resolve_or_create(self, new_doc: dict, email: Optional[str] = None,
+                                whatsapp: Optional[str] = None, name: Optional[str] = None
+                                ) -> Tuple[dict, bool]:
+        """
+        (contact, créé?) - contact existant (email > téléphone > nom si fourni)
+        ou new_doc inséré avec ses clés. Perdant d'une course: new_doc retiré,
+        le contact gagnant est retourné.
+        """
+        existing = await self.find(email, whatsapp, name)
+        if existing:
+            self.resolved += 1
+            return existing, False
+        doc = with_identity_fields(dict(new_doc), self.collection)
+        await self.documents.insert_one(doc)
+        doc.pop("_id", None)
+        owner_id = await self._claim(doc)
+        if owner_id:
+            owner = await self.documents.find_one({"id": owner_id}, {"_id": 0})
+            if owner:
+                self.races += 1
+                await self.documents.delete_one({"id": doc["id"]})
+                return owner, False
+            # Propriétaire supprimé entre la réservation et la lecture: le nouveau document reste
+            logger.warning(f"[IDENTITY] Claim orphelin {owner_id} ({self.collection})")
+        self.created += 1
+        return doc, True
+
+    async def release(self, contact_id: str) -> int:
+        """Libère les claims d'un contact supprimé (email / téléphone réutilisables)."""
+        result = await self.claims.delete_many({"contact_id": contact_id, "collection": self.collection})
+        return result.deleted_count
+
+    async def attach(self, contact: dict, email: Optional[str] = None, whatsapp: Optional[str] = None,
+                     extra: Optional[dict] = None) -> dict:
+        """
+        Complète un contact existant (email / WhatsApp manquants) + champs `extra`.
+        Une clé déjà réservée par un autre contact n'est pas recopiée (pas de doublon).
+        """
+        update = dict(extra or {})
+        if email and not contact.get("email"):
+            update["email"] = email
+        if whatsapp and not contact.get("whatsapp"):
+            update["whatsapp"] = whatsapp
+        update = await self._claim_fields(contact["id"], with_identity_fields(update, self.collection))
+        if update:
+            await self.documents.update_one({"id": contact["id"]}, {"$set": update})
+            contact = {**contact, **update}
+        return contact
+
+    async def update(self, contact_id: str, update: dict) -> Optional[dict]:
+        """
+        Modification d'un contact (PUT): ses nouvelles clés sont réservées (retirées si
+        déjà à un autre contact), les claims de ses anciennes clés libérés.
+        Contact mis à jour, None s'il n'existe pas.
+        """
+        update = await self._claim_fields(contact_id, with_identity_fields(dict(update), self.collection))
+        if update:
+            await self.documents.update_one({"id": contact_id}, {"$set": update})
+        contact = await self.documents.find_one({"id": contact_id}, {"_id": 0})
+        if contact is None:
+            await self.release(contact_id)
+            return None
+        await self.claims.delete_many({
+            "contact_id": contact_id, "collection": self.collection,
+            "_id": {"$nin": list(self._claim_ids(contact).values())},
+        })
+        return contact
+
+    async def backfill(self, batch_size: int = BACKFILL_BATCH) -> int:
+        """Clés normalisées + claims des documents qui n'en ont pas (plus ancien d'abord)."""
+        from pymongo import UpdateOne
+
+        ops, claims, total = [], [], 0
+
+        async def write():
+            nonlocal ops, claims
+            if ops:
+                await self.documents.bulk_write(ops, ordered=False)
+            if claims:
+                try:
+                    await self.claims.insert_many(claims, ordered=False)
+                except Exception as e:
+                    # Clés déjà réservées (doublons historiques): le premier propriétaire reste
+                    logger.info(f"[IDENTITY] Backfill {self.collection}: claims en doublon ignorés ({e.__class__.__name__})")
+            ops, claims = [], []
+
+        cursor = self.documents.find(
+            {"name_key": {"$exists": False}}, {"_id": 1, "id": 1, "name": 1, "email": 1, "whatsapp": 1, "phone": 1}
+        ).sort("created_at", 1)
+        async for doc in cursor:
+            fields = with_identity_fields(
+                {"email": doc.get("email") or "", "name": doc.get("name") or "", "whatsapp": doc.get("whatsapp") or "",
+                 "phone": doc.get("phone") or ""}, self.collection
+            )
+            fields = {k: v for k, v in fields.items() if k.endswith(("_key", "_e164"))}
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            if doc.get("id"):
+                now = datetime.now(timezone.utc).isoformat()
+                claims.extend({"_id": claim_id, "contact_id": doc["id"], "collection": self.collection,
+                               "created_at": now} for claim_id in self._claim_ids(fields).values())
+            total += 1
+            if len(ops) >= batch_size:
+                await write()
+        await write()
+        if total:
+            logger.info(f"[IDENTITY] Backfill {self.collection}: {total} documents")
+        return total
+
+    def metrics(self) -> dict:
+        return {"created": self.created, "resolved": self.resolved, "races": self.races}
@@ -0,0 +1,244 @@
+"""
+IMAGE PIPELINE - Photos de profil traitées hors de la boucle asyncio
+- décodage / redimensionnement / encodage dans un pool de processus (Pillow)
+- file d'attente bornée: au-delà de MAX_PENDING uploads en cours -> PipelineBusy
+- plusieurs tailles (48/96/200) en WebP + repli JPEG, srcset pour le frontend
+- fichiers adressés par contenu (hash): un ré-upload identique ne refait rien
+- publication via media_storage (disque local ou bucket S3)
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = (48, 96, 200)
+FORMATS = (("webp", "WEBP", {"quality": 80, "method": 4}), ("jpg", "JPEG", {"quality": 85, "optimize": True}))
+CONTENT_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+# Nom adressé par contenu: jamais réécrit avec un autre contenu
+VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MAX_WORKERS = 2
+MAX_PENDING = 8
+QUEUE_TIMEOUT_SECONDS = 10
+# Pas de fork du serveur (threads APScheduler, push, motor): verrous hérités -> deadlock
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class PipelineBusy(Exception):
+    """Trop d'images en attente de traitement."""
+
+
+class InvalidImage(Exception):
+    """Contenu non décodable comme image."""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:24]
+
+
+def variant_name(digest: str, size: int, ext: str) -> str:
+    return f"{digest}_{size}.{ext}"
+
+
+def variant_names(digest: str, sizes: Sequence[int] = AVATAR_SIZES) -> List[str]:
+    return [variant_name(digest, size, ext) for size in sizes for ext, _, _ in FORMATS]
+
+
+def sentinel_name(digest: str, sizes: Sequence[int] = AVATAR_SIZES) -> str:
+    """Dernière variante écrite / publiée: sa présence implique celle de toutes les autres."""
+    return variant_name(digest, min(sizes), FORMATS[-1][0])
+
+
+def render_variants(data: bytes, digest: str, out_dir: str, sizes: Sequence[int] = AVATAR_SIZES) -> List[str]:
+    """
+    Exécuté dans un processus du pool: décode une fois, produit chaque taille
+    (carré max size x size, proportions conservées) en WebP et JPEG.
+    Écriture atomique (fichier temporaire + rename).
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except Exception as e:
+        raise InvalidImage(str(e))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    written = []
+    # Du plus grand au plus petit: chaque réduction repart de la précédente
+    current = img
+    for size in sorted(sizes, reverse=True):
+        current = current.copy()
+        current.thumbnail((size, size), Image.LANCZOS)
+        for ext, pil_format, options in FORMATS:
+            name = variant_name(digest, size, ext)
+            target = os.path.join(out_dir, name)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            current.save(tmp, pil_format, **options)
+            os.replace(tmp, target)
+            written.append(name)
+    return written
+
+
+@dataclass
+class AvatarSet:
+    digest: str
+    url: str  # JPEG 200px: compatible avec l'ancien photo_url
+    srcset: str  # WebP
+    srcset_jpeg: str
+    variants: Dict[str, Dict[int, str]] = field(default_factory=dict)
+    deduplicated: bool = False
+
+    def as_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "srcset": self.srcset,
+            "srcset_jpeg": self.srcset_jpeg,
+            "variants": {ext: {str(size): url for size, url in urls.items()} for ext, urls in self.variants.items()},
+            "hash": self.digest,
+            "deduplicated": self.deduplicated,
+        }
+
+
+def build_avatar_set(digest: str, url_of: Callable[[str], str], sizes: Sequence[int] = AVATAR_SIZES,
+                     deduplicated: bool = False) -> AvatarSet:
+    variants = {
+        ext: {size: url_of(variant_name(digest, size, ext)) for size in sorted(sizes)}
+        for ext, _, _ in FORMATS
+    }
+
+    def srcset(ext):
+        return ", ".join(f"{url} {size}w" for size, url in variants[ext].items())
+
+    return AvatarSet(
+        digest=digest,
+        url=variants["jpg"][max(sizes)],
+        srcset=srcset("webp"),
+        srcset_jpeg=srcset("jpg"),
+        variants=variants,
+        deduplicated=deduplicated,
+    )
+
+
+class ImagePipeline:
+    """
+    Pool de processus créé au premier upload; au plus max_pending traitements admis.
+    Stockage local: rendu directement dans le dossier servi. Sinon rendu dans un
+    dossier temporaire puis publication (sentinelle en dernier).
+    """
+
+    def __init__(self, storage, sizes: Sequence[int] = AVATAR_SIZES,
+                 max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS,
+                 render: Callable = render_variants, executor_factory: Optional[Callable] = None):
+        self.storage = storage
+        self.sizes = tuple(sizes)
+        self.max_workers = max_workers
+        self.queue_timeout = queue_timeout
+        self._render = render
+        self._executor_factory = executor_factory or self._process_pool
+        self._executor = None
+        self._slots = asyncio.Semaphore(max_pending)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.processed = 0
+        self.deduplicated = 0
+        self.rejected = 0
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context(START_METHOD))
+
+    def _avatar_set(self, digest: str, deduplicated: bool = False) -> AvatarSet:
+        return build_avatar_set(digest, self.storage.url, self.sizes, deduplicated=deduplicated)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._executor_factory()
+        return self._executor
+
+    async def _render_and_publish(self, data: bytes, digest: str):
+        loop = asyncio.get_running_loop()
+        local_dir = self.storage.local_directory
+        work_dir = local_dir or tempfile.mkdtemp(prefix="avatars-")
+        try:
+            names = await loop.run_in_executor(
+                self._get_executor(), self._render, data, digest, work_dir, self.sizes
+            )
+            if local_dir:
+                return
+            sentinel = sentinel_name(digest, self.sizes)
+
+            def publish(name):
+                ext = name.rsplit(".", 1)[-1]
+                return self.storage.put_path(name, os.path.join(work_dir, name), CONTENT_TYPES[ext],
+                                             VARIANT_CACHE_CONTROL)
+
+            await asyncio.gather(*(publish(name) for name in names if name != sentinel))
+            await publish(sentinel)
+        finally:
+            if not local_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def process(self, data: bytes) -> AvatarSet:
+        digest = content_hash(data)
+        sentinel = sentinel_name(digest, self.sizes)
+        if await self.storage.exists(sentinel):
+            # Ré-upload dédupliqué: rafraîchit la date (période de grâce du GC des orphelins)
+            await self.storage.touch(sentinel)
+            self.deduplicated += 1
+            return self._avatar_set(digest, deduplicated=True)
+        # Même contenu déjà en cours de traitement: attendre le même résultat
+        pending = self._inflight.get(digest)
+        if pending is not None:
+            await asyncio.shield(pending)
+            self.deduplicated += 1
+            return self._avatar_set(digest, deduplicated=True)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[digest] = future
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise PipelineBusy("File de traitement d'images pleine")
+            try:
+                await self._render_and_publish(data, digest)
+            finally:
+                self._slots.release()
+            self.processed += 1
+            future.set_result(digest)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # évite "exception never retrieved" sans attente concurrente
+            raise
+        finally:
+            self._inflight.pop(digest, None)
+        return self._avatar_set(digest)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self) -> dict:
+        return {
+            "processed": self.processed,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,101 @@
+"""
+LAZY IMPORTS - Intégrations optionnelles chargées au premier usage
+Le démarrage d'un worker (deploy, redémarrage) ne paie plus l'import de
+stripe / resend / apscheduler tant qu'aucune requête n'en a besoin.
+- LazyModule: proxy importé au premier accès d'attribut (+ configuration)
+- module_available(): présence du paquet sans l'importer (find_spec)
+- importtime_report(): profil `python -X importtime` d'un module (tests / diagnostic)
+"""
+
+import importlib
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+
+def module_available(name: str) -> bool:
+    """Paquet installé ? (sans exécuter son import)"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Proxy de module: import + configure(module) au premier accès d'attribut."""
+
+    def __init__(self, name: str, configure: Optional[Callable] = None):
+        self.__dict__["_name"] = name
+        self.__dict__["_configure"] = configure
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    if self.__dict__["_configure"]:
+                        self.__dict__["_configure"](module)
+                    self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "chargé" if self.loaded else "non chargé"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(stderr: str) -> List[ImportTiming]:
+    """Lignes 'import time: self [us] | cumulative | imported package' -> ImportTiming."""
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us = parts[0].strip(), parts[1].strip()
+        if not (self_us.isdigit() and cumulative_us.isdigit()):
+            continue  # en-tête
+        timings.append(ImportTiming(parts[2].strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+
+def importtime_report(module: str, cwd: Optional[str] = None, env: Optional[dict] = None,
+                      top: int = 15) -> dict:
+    """Importe `module` dans un interpréteur neuf avec -X importtime et résume le profil."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, env={**os.environ, **(env or {})}, capture_output=True, text=True, timeout=120,
+    )
+    timings = parse_importtime(result.stderr)
+    by_module = {t.module: t for t in timings}
+    total = by_module[module].cumulative_us if module in by_module else sum(t.self_us for t in timings)
+    return {
+        "ok": result.returncode == 0,
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode and result.stderr.strip() else None,
+        "total_us": total,
+        "modules": set(by_module),
+        "slowest": sorted(timings, key=lambda t: t.self_us, reverse=True)[:top],
+    }
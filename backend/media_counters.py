@@ -0,0 +1,294 @@
+"""
+MEDIA COUNTERS - Vues / clics des liens média en écriture différée + rollups analytiques
+Un lien de campagne viral = des milliers de $inc sur le même document. Ici:
+- record(): événement agrégé en mémoire (aucune I/O sur le chemin de la requête):
+  slug, source (api, go, share), classe d'user agent, référent, heure de la visite
+- flush() toutes les FLUSH_INTERVAL_SECONDS: un seul bulk_write par collection
+  (un $inc par slug sur media_links, un upsert par rollup)
+- rollups par lien ET par campagne (campaign_id résolu au flush, une requête $in),
+  par heure, par jour et cumul ("all"): les tableaux de bord lisent au plus
+  une poignée de documents, quel que soit le volume de clics
+- flush final à l'arrêt; en cas d'échec partiel (BulkWriteError) seuls les slugs
+  non écrits sont réintégrés, un échec de résultat inconnu abandonne le lot
+  (sous-compter plutôt que compter deux fois)
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = 5
+ROLLUPS_COLLECTION = "link_click_rollups"
+PERIODS = ("hour", "day", "all")
+ALL_BUCKET = "all"
+SCOPE_LINK = "link"
+SCOPE_CAMPAIGN = "campaign"
+BREAKDOWNS = ("sources", "agents", "referrers")
+MAX_QUERY_BUCKETS = {"hour": 24 * 14, "day": 366}
+
+_CRAWLER_RE = re.compile(
+    r"whatsapp|facebookexternalhit|facebot|twitterbot|linkedinbot|slackbot|telegrambot|discordbot|"
+    r"skypeuripreview|googlebot|bingbot|applebot|bot\b|crawler|spider|preview", re.IGNORECASE
+)
+_MOBILE_RE = re.compile(r"mobile|android|iphone|ipad|ipod", re.IGNORECASE)
+
+# Référents suivis (domaine et sous-domaines -> champ du rollup). Le header Referer
+# est fourni par le client: tout autre hôte va dans "other", sinon chaque hôte
+# inventé ajouterait un champ aux documents "all" (limite de 16 Mo par document).
+KNOWN_REFERRERS = {
+    "afroboosteur.com": "afroboosteur_com",
+    "instagram.com": "instagram_com",
+    "facebook.com": "facebook_com",
+    "fb.com": "facebook_com",
+    "messenger.com": "facebook_com",
+    "whatsapp.com": "whatsapp_com",
+    "wa.me": "whatsapp_com",
+    "t.co": "x_com",
+    "twitter.com": "x_com",
+    "x.com": "x_com",
+    "tiktok.com": "tiktok_com",
+    "youtube.com": "youtube_com",
+    "linkedin.com": "linkedin_com",
+    "lnkd.in": "linkedin_com",
+    "t.me": "telegram_org",
+    "telegram.org": "telegram_org",
+    "snapchat.com": "snapchat_com",
+    "google.com": "google",
+    "google.ch": "google",
+    "google.fr": "google",
+    "bing.com": "bing_com",
+}
+OTHER_REFERRER = "other"
+
+
+def classify_user_agent(user_agent: Optional[str]) -> str:
+    """crawler (aperçus WhatsApp, réseaux sociaux, moteurs) / mobile / desktop / unknown."""
+    if not user_agent:
+        return "unknown"
+    if _CRAWLER_RE.search(user_agent):
+        return "crawler"
+    if _MOBILE_RE.search(user_agent):
+        return "mobile"
+    return "desktop"
+
+
+def referrer_host(referrer: Optional[str]) -> str:
+    """Champ du rollup pour le référent: hôte connu (KNOWN_REFERRERS), 'direct' ou 'other'."""
+    try:
+        host = (urlparse(referrer).hostname or "") if referrer else ""
+    except ValueError:
+        return OTHER_REFERRER
+    if not host:
+        return "direct"
+    parts = host.split(".")
+    for start in range(len(parts) - 1):
+        name = KNOWN_REFERRERS.get(".".join(parts[start:]))
+        if name:
+            return name
+    return OTHER_REFERRER
+
+
+def bucket_start(timestamp: float, period: str) -> str:
+    """Début (ISO UTC) de l'heure ou du jour contenant timestamp; 'all' pour le cumul."""
+    if period == "all":
+        return ALL_BUCKET
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    if period == "hour":
+        moment = moment.replace(minute=0, second=0, microsecond=0)
+    else:
+        moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.isoformat()
+
+
+def _update_one(filter_: dict, update: dict, upsert: bool = False):
+    from pymongo import UpdateOne
+    return UpdateOne(filter_, update, upsert=upsert)
+
+
+def _failed_op_indexes(error: Exception) -> Optional[set]:
+    """Index des opérations non appliquées d'un BulkWriteError; None si le résultat est inconnu."""
+    details = getattr(error, "details", None)
+    if not isinstance(details, dict) or "writeErrors" not in details:
+        return None
+    return {write_error["index"] for write_error in details["writeErrors"]}
+
+
+def _breakdown(doc: dict) -> dict:
+    return {"views": doc.get("views", 0), **{name: doc.get(name, {}) for name in BREAKDOWNS}}
+
+
+class ViewCounter:
+    """Agrégateur de vues par slug; flush périodique (start/stop) ou ponctuel (flush)."""
+
+    def __init__(self, database, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 clock: Callable[[], float] = time.time, update_op: Callable = _update_one):
+        self.database = database
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._update_op = update_op
+        self._views: Dict[str, int] = defaultdict(int)
+        # (slug, début d'heure en secondes) -> {"views": n, "sources.share": n, "agents.mobile": n, ...}
+        self._hours: Dict[Tuple[str, int], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.writes = 0
+        self.failures = 0
+
+    @property
+    def rollups(self):
+        return self.database[ROLLUPS_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.rollups.create_index(
+            [("scope", 1), ("key", 1), ("period", 1), ("bucket", 1)], unique=True
+        )
+        await self.database.media_links.create_index("slug")
+
+    def record(self, slug: str, source: str = "api", user_agent: Optional[str] = None,
+               referrer: Optional[str] = None, count: int = 1):
+        slug = slug.lower()
+        hour = int(self._clock()) // 3600 * 3600
+        self._views[slug] += count
+        fields = self._hours[(slug, hour)]
+        fields["views"] += count
+        fields[f"sources.{source}"] += count
+        fields[f"agents.{classify_user_agent(user_agent)}"] += count
+        fields[f"referrers.{referrer_host(referrer)}"] += count
+        self.recorded += count
+
+    def pending(self, slug: str) -> int:
+        """Vues enregistrées mais pas encore écrites (affichage des compteurs à jour)."""
+        return self._views.get(slug.lower(), 0)
+
+    async def _campaigns_of(self, slugs: Iterable[str]) -> Dict[str, str]:
+        cursor = self.database.media_links.find(
+            {"slug": {"$in": list(slugs)}, "campaign_id": {"$nin": [None, ""]}},
+            {"_id": 0, "slug": 1, "campaign_id": 1}
+        )
+        return {doc["slug"]: doc["campaign_id"] async for doc in cursor}
+
+    def _rollup_ops(self, hours: Dict[Tuple[str, int], Dict[str, int]], campaigns: Dict[str, str]) -> list:
+        increments: Dict[Tuple[str, str, str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for (slug, hour), fields in hours.items():
+            scopes = [(SCOPE_LINK, slug)]
+            if slug in campaigns:
+                scopes.append((SCOPE_CAMPAIGN, campaigns[slug]))
+            for scope, key in scopes:
+                for period in PERIODS:
+                    target = increments[(scope, key, period, bucket_start(hour, period))]
+                    for field, count in fields.items():
+                        target[field] += count
+        return [
+            self._update_op({"scope": scope, "key": key, "period": period, "bucket": bucket},
+                            {"$inc": dict(fields)}, upsert=True)
+            for (scope, key, period, bucket), fields in increments.items()
+        ]
+
+    async def flush(self) -> int:
+        """Écrit les compteurs accumulés; retourne le nombre de vues écrites."""
+        async with self._lock:
+            views, self._views = self._views, defaultdict(int)
+            hours, self._hours = self._hours, defaultdict(lambda: defaultdict(int))
+            if not views:
+                return 0
+            slugs = list(views)
+            try:
+                ops = [self._update_op({"slug": slug}, {"$inc": {"views": views[slug]}}) for slug in slugs]
+                await self.database.media_links.bulk_write(ops, ordered=False)
+                self.writes += 1
+            except Exception as e:
+                self.failures += 1
+                failed_indexes = _failed_op_indexes(e)
+                if failed_indexes is None:
+                    # Résultat inconnu (réseau, timeout): une partie a pu être écrite
+                    logger.error(f"[MEDIA-VIEWS] Flush échoué ({sum(views.values())} vues abandonnées): {e}")
+                    return 0
+                # Écriture partielle: seuls les slugs en erreur sont réintégrés pour le prochain flush
+                failed = {slugs[index] for index in failed_indexes}
+                for slug in failed:
+                    self._views[slug] += views.pop(slug)
+                for key in [key for key in hours if key[0] in failed]:
+                    for field, n in hours.pop(key).items():
+                        self._hours[key][field] += n
+                logger.error(f"[MEDIA-VIEWS] Flush partiel ({len(failed)} slugs conservés): {e}")
+                if not views:
+                    return 0
+            total = sum(views.values())
+            try:
+                campaigns = await self._campaigns_of(views)
+                await self.rollups.bulk_write(self._rollup_ops(hours, campaigns), ordered=False)
+                self.writes += 1
+            except Exception as e:
+                # Compteurs principaux déjà écrits: rollups perdus plutôt que comptés deux fois
+                self.failures += 1
+                logger.error(f"[MEDIA-VIEWS] Rollups non écrits ({total} vues): {e}")
+            self.flushed += total
+            self.flushes += 1
+            return total
+
+    async def report(self, scope: str, key: str, period: str = "day", limit: int = 30) -> dict:
+        """
+        Série des `limit` dernières heures / jours + cumul, lue sur les rollups:
+        au plus limit + 1 documents par l'index (scope, key, period, bucket).
+        """
+        if period not in MAX_QUERY_BUCKETS:
+            raise ValueError(f"Période invalide: {period}")
+        limit = max(1, min(limit, MAX_QUERY_BUCKETS[period]))
+        step = timedelta(hours=1) if period == "hour" else timedelta(days=1)
+        since = bucket_start(self._clock() - step.total_seconds() * (limit - 1), period)
+        rows = await self.rollups.find(
+            {"scope": scope, "key": key, "period": period, "bucket": {"$gte": since}},
+            {"_id": 0, "bucket": 1, "views": 1, **{name: 1 for name in BREAKDOWNS}}
+        ).sort("bucket", 1).to_list(limit)
+        totals = await self.rollups.find_one(
+            {"scope": scope, "key": key, "period": "all", "bucket": ALL_BUCKET},
+            {"_id": 0, "views": 1, **{name: 1 for name in BREAKDOWNS}}
+        )
+        return {
+            "scope": scope,
+            "key": key,
+            "period": period,
+            "since": since,
+            "totals": _breakdown(totals or {}),
+            "series": [{"bucket": row["bucket"], **_breakdown(row)} for row in rows],
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"[MEDIA-VIEWS] Boucle de flush: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Arrêt: boucle annulée puis flush final."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            "pending_views": sum(self._views.values()),
+            "pending_slugs": len(self._views),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "failures": self.failures,
+        }
@@ -1,42 +1,39 @@
 """
 MEDIA HANDLER - Module pour la gestion des médias YouTube/Google Drive
 Détecte et transforme les liens médias pour l'affichage dans le chat.
+- un seul motif compilé (YouTube + Drive, groupes nommés): une recherche par URL
+- classification mémorisée (LRU) par URL normalisée: les liens de campagne se
+  répètent dans des milliers de messages
+- API par lots (classify_urls, detect_media_in_messages): media_type des historiques
+  (server.format_messages_for_frontend) et des messages de campagne
 """
 
 import re
 import logging
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterable, List
 
 logger = logging.getLogger(__name__)
 
 # === PATTERNS REGEX ===
-YOUTUBE_PATTERNS = [
-    re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/)([a-zA-Z0-9_-]{11})(?:[?&]|$)'),
-    re.compile(r'youtube\.com/embed/([a-zA-Z0-9_-]{11})'),
-    re.compile(r'youtube\.com/shorts/([a-zA-Z0-9_-]{11})')
-]
+# watch?v= / youtu.be/ / embed/ / shorts/ suivis d'un ID de 11 caractères exactement
+MEDIA_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?v=|embed/|shorts/)|youtu\.be/)(?P<youtube>[a-zA-Z0-9_-]{11})(?![a-zA-Z0-9_-])'
+    r'|drive\.google\.com/(?:file/d/|open\?id=)(?P<drive>[a-zA-Z0-9_-]+)'
+)
+URL_PATTERN = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
 
-GOOGLE_DRIVE_FILE_PATTERN = re.compile(r'drive\.google\.com/file/d/([a-zA-Z0-9_-]+)')
-GOOGLE_DRIVE_OPEN_PATTERN = re.compile(r'drive\.google\.com/open\?id=([a-zA-Z0-9_-]+)')
+IMAGE_EXTENSIONS = frozenset(['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg'])
+VIDEO_EXTENSIONS = frozenset(['mp4', 'webm', 'ogg', 'mov'])
+MEDIA_TYPES = frozenset(['youtube', 'drive', 'image', 'video'])
+CLASSIFY_CACHE_SIZE = 4096
 
 
-def get_media_type(url: str) -> Dict[str, Any]:
-    """
-    Détecte le type de média d'une URL.
-    
-    Returns:
-        dict avec type, video_id/file_id, embed_url, thumbnail_url, direct_url
-    """
-    if not url or not isinstance(url, str):
-        return {"type": "unknown", "error": "URL invalide"}
-    
-    url = url.strip()
-    
-    # === YOUTUBE ===
-    for pattern in YOUTUBE_PATTERNS:
-        match = pattern.search(url)
-        if match:
-            video_id = match.group(1)
+def _classify(url: str) -> Dict[str, Any]:
+    match = MEDIA_PATTERN.search(url)
+    if match:
+        video_id = match.group("youtube")
+        if video_id:
             return {
                 "type": "youtube",
                 "platform": "youtube",
@@ -45,48 +42,58 @@ def get_media_type(url: str) -> Dict[str, Any]:
                 "embed_url": f"https://www.youtube.com/embed/{video_id}?rel=0&modestbranding=1&mute=1&playsinline=1",
                 "thumbnail_url": f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
             }
-    
-    # === GOOGLE DRIVE ===
-    for pattern in [GOOGLE_DRIVE_FILE_PATTERN, GOOGLE_DRIVE_OPEN_PATTERN]:
-        match = pattern.search(url)
-        if match:
-            file_id = match.group(1)
-            return {
-                "type": "drive",
-                "platform": "google_drive",
-                "file_id": file_id,
-                "direct_url": f"https://drive.google.com/uc?export=view&id={file_id}",
-                "thumbnail_url": f"https://drive.google.com/thumbnail?id={file_id}&sz=w400",
-                "embed_url": f"https://drive.google.com/file/d/{file_id}/preview"
-            }
-    
+        file_id = match.group("drive")
+        return {
+            "type": "drive",
+            "platform": "google_drive",
+            "file_id": file_id,
+            "direct_url": f"https://drive.google.com/uc?export=view&id={file_id}",
+            "thumbnail_url": f"https://drive.google.com/thumbnail?id={file_id}&sz=w400",
+            "embed_url": f"https://drive.google.com/file/d/{file_id}/preview"
+        }
+
     # Log si lien Drive mal formaté (contient drive.google mais pas reconnu)
     if 'drive.google.com' in url.lower():
         logger.warning(f"[MEDIA] Lien Drive non reconnu: {url[:100]}")
-    
-    # === IMAGE DIRECTE ===
-    image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg']
-    ext = url.split('.')[-1].lower().split('?')[0] if '.' in url else ''
-    if ext in image_extensions:
-        return {
-            "type": "image",
-            "platform": "direct",
-            "direct_url": url,
-            "thumbnail_url": url
-        }
-    
-    # === VIDÉO DIRECTE ===
-    video_extensions = ['mp4', 'webm', 'ogg', 'mov']
-    if ext in video_extensions:
-        return {
-            "type": "video",
-            "platform": "direct",
-            "direct_url": url
-        }
-    
+
+    # === IMAGE / VIDÉO DIRECTE ===
+    ext = url.rpartition('.')[2].lower().split('?')[0] if '.' in url else ''
+    if ext in IMAGE_EXTENSIONS:
+        return {"type": "image", "platform": "direct", "direct_url": url, "thumbnail_url": url}
+    if ext in VIDEO_EXTENSIONS:
+        return {"type": "video", "platform": "direct", "direct_url": url}
+
     return {"type": "link", "platform": "unknown", "direct_url": url}
 
 
+@lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+def _classify_cached(url: str) -> tuple:
+    # Tuple immuable: chaque appelant reçoit son propre dict (detect_media_in_text le complète)
+    return tuple(_classify(url).items())
+
+
+def get_media_type(url: str) -> Dict[str, Any]:
+    """
+    Détecte le type de média d'une URL.
+
+    Returns:
+        dict avec type, video_id/file_id, embed_url, thumbnail_url, direct_url
+    """
+    if not url or not isinstance(url, str):
+        return {"type": "unknown", "error": "URL invalide"}
+    return dict(_classify_cached(url.strip()))
+
+
+def classify_urls(urls: Iterable[str]) -> List[Dict[str, Any]]:
+    """Classification par lots (médias d'une campagne, liens d'un historique), dans l'ordre."""
+    return [get_media_type(url) for url in urls]
+
+
+def cache_info():
+    """Statistiques du cache LRU (hits, misses, taille)."""
+    return _classify_cached.cache_info()
+
+
 def extract_youtube_id(url: str) -> Optional[str]:
     """Extrait l'ID d'une vidéo YouTube."""
     result = get_media_type(url)
@@ -104,23 +111,32 @@ def detect_media_in_text(text: str) -> Optional[Dict[str, Any]]:
     Scanne un texte pour trouver le premier lien média (YouTube/Drive/Image).
     Retourne les infos du média trouvé ou None.
     """
-    if not text:
+    if not text or 'http' not in text:
         return None
-    
-    # Pattern URL générique
-    url_pattern = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
-    urls = url_pattern.findall(text)
-    
-    for url in urls:
-        media_info = get_media_type(url)
-        if media_info.get("type") in ["youtube", "drive", "image", "video"]:
+
+    for match in URL_PATTERN.finditer(text):
+        url = match.group(0)
+        media_info = dict(_classify_cached(url))
+        if media_info.get("type") in MEDIA_TYPES:
             media_info["original_url"] = url
             return media_info
-    
+
     return None
 
 
+def detect_media_in_messages(messages: Iterable[Any], field: str = "content") -> List[Optional[Dict[str, Any]]]:
+    """
+    Premier média de chaque message (textes ou documents `{field: texte}`), dans l'ordre.
+    Un lien répété dans tout un historique n'est classifié qu'une fois (cache LRU).
+    """
+    results = []
+    for message in messages:
+        text = message.get(field) if isinstance(message, dict) else message
+        results.append(detect_media_in_text(text) if isinstance(text, str) else None)
+    return results
+
+
 def is_media_url(url: str) -> bool:
     """Vérifie si une URL est un média supporté."""
     result = get_media_type(url)
-    return result.get("type") in ["youtube", "drive", "image", "video"]
+    return result.get("type") in MEDIA_TYPES
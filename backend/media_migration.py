@@ -0,0 +1,109 @@
+"""
+MEDIA MIGRATION - Passage du stockage local au bucket S3 (MEDIA_STORAGE=s3)
+Les URLs des médias sont stockées en DB (photo_url / photoUrl / photo_srcset,
+custom_emojis.image_url) et pointent vers les montages locaux (/api/uploads/profiles,
+/api/emojis), qui ne sont plus servis une fois le stockage basculé:
+- copy_files(): fichiers du dossier local absents du bucket copiés (un listing de chaque côté)
+- rewrite_references(): URLs locales remplacées par l'URL publique du bucket, par lots;
+  seules les clés effectivement présentes dans le bucket sont réécrites
+Idempotent: relancé à chaque démarrage tant que le dossier local existe, il ne recopie
+ni ne réécrit rien une fois terminé. Les fichiers locaux sont conservés (retour arrière).
+"""
+
+import logging
+import mimetypes
+import os
+import re
+from typing import Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH = 500
+
+
+def _update_one(filter_: dict, update: dict):
+    from pymongo import UpdateOne
+    return UpdateOne(filter_, update)
+
+
+def rewrite_url_value(value, source, target, available: Set[str]) -> Optional[str]:
+    """
+    URL ou srcset ("url 48w, url 96w") avec les URLs de `source` pointées vers `target`
+    (clés présentes dans `available`); None si rien n'est à réécrire.
+    """
+    if not isinstance(value, str) or value.startswith("data:"):
+        return None
+    changed = False
+    candidates = []
+    for candidate in value.split(","):
+        url, separator, descriptor = candidate.strip().partition(" ")
+        key = source.key_from_url(url) if url else None
+        if key in available:
+            url = target.url(key)
+            changed = True
+        candidates.append(f"{url}{separator}{descriptor}")
+    return ", ".join(candidates) if changed else None
+
+
+async def copy_files(source, target, cache_control: Optional[str] = None) -> Set[str]:
+    """Copie vers `target` les fichiers de `source` (LocalDiskStorage) qu'il n'a pas; clés disponibles."""
+    available = {stored.key for stored in await target.list()}
+    copied = 0
+    for stored in await source.list():
+        if stored.key in available or stored.key.endswith(".tmp"):
+            continue
+        content_type = mimetypes.guess_type(stored.key)[0] or "application/octet-stream"
+        try:
+            await target.put_path(stored.key, os.path.join(source.local_directory, stored.key),
+                                  content_type, cache_control)
+        except Exception as e:
+            # Clé non disponible: ses URLs restent locales, nouvelle tentative au prochain démarrage
+            logger.warning(f"[MEDIA-MIGRATION] Copie de {stored.key} échouée: {e}")
+            continue
+        available.add(stored.key)
+        copied += 1
+    if copied:
+        logger.info(f"[MEDIA-MIGRATION] {copied} fichier(s) copié(s) vers {target.name}")
+    return available
+
+
+async def rewrite_references(collection, fields: Iterable[str], source, target, available: Set[str],
+                             batch_size: int = MIGRATION_BATCH, update_op: Callable = _update_one) -> int:
+    """Réécrit les URLs de `source` des champs `fields`; nombre de documents modifiés."""
+    fields = tuple(fields)
+    pattern = re.escape(source.url_prefix + "/")
+    query = {"$or": [{field: {"$regex": pattern}} for field in fields]}
+    ops, rewritten = [], 0
+    async for doc in collection.find(query, {"_id": 1, **{field: 1 for field in fields}}):
+        update = {}
+        for field in fields:
+            value = rewrite_url_value(doc.get(field), source, target, available)
+            if value is not None:
+                update[field] = value
+        if update:
+            ops.append(update_op({"_id": doc["_id"]}, {"$set": update}))
+        if len(ops) >= batch_size:
+            await collection.bulk_write(ops, ordered=False)
+            rewritten += len(ops)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        rewritten += len(ops)
+    return rewritten
+
+
+async def migrate_local_media(database, source, target, references: Dict[str, Iterable[str]],
+                              cache_control: Optional[str] = None, batch_size: int = MIGRATION_BATCH,
+                              update_op: Callable = _update_one) -> Dict[str, int]:
+    """
+    Copie le dossier local `source` vers `target` puis réécrit les URLs des collections
+    `references` ({collection: champs}); {collection: documents modifiés}.
+    """
+    available = await copy_files(source, target, cache_control)
+    report = {}
+    for name, fields in references.items():
+        report[name] = await rewrite_references(database[name], fields, source, target, available,
+                                                batch_size, update_op)
+        if report[name]:
+            logger.info(f"[MEDIA-MIGRATION] {name}: {report[name]} document(s) pointé(s) vers {target.name}")
+    return report
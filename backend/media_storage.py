@@ -0,0 +1,294 @@
+"""
+MEDIA STORAGE - Stockage des médias uploadés (photos de profil, emojis)
+- LocalDiskStorage: dossier local servi par StaticFiles (développement, nœud unique)
+- S3Storage: bucket S3 compatible (AWS, MinIO, R2...) via boto3; les clients
+  téléchargent directement depuis l'URL publique (CDN / bucket public), sans
+  passer par les workers API
+Sélection par variables d'environnement (storage_from_env):
+  MEDIA_STORAGE=local|s3, S3_BUCKET, S3_PUBLIC_BASE_URL, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION
+Les URLs sont stockées telles quelles en DB (photo_url, image_url): elles doivent
+rester valides indéfiniment, d'où une URL publique obligatoire (pas d'URL présignée,
+qui expire) - url() est un simple formatage, sans appel réseau ni boto3.
+Bascule local -> s3: media_migration copie les dossiers locaux dans le bucket et
+réécrit les URLs en DB; les anciennes URLs locales sont redirigées vers le bucket.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+S3_DELETE_BATCH = 1000
+_MISSING_CODES = {"404", "NoSuchKey", "NotFound"}
+
+
+@dataclass
+class StoredObject:
+    key: str
+    size: int
+    mtime: float
+
+
+def _key_after(path: str, marker: str) -> Optional[str]:
+    """Nom de fichier suivant `marker` dans un chemin d'URL (sans sous-dossier)."""
+    position = path.rfind(marker)
+    if position < 0:
+        return None
+    key = path[position + len(marker):]
+    if not key or "/" in key:
+        return None
+    return key
+
+
+class LocalDiskStorage:
+    """Fichiers dans `directory`, servis sous `url_prefix` (StaticFiles)."""
+
+    name = "local"
+
+    def __init__(self, directory: str, url_prefix: str):
+        self.directory = str(directory)
+        self.url_prefix = url_prefix.rstrip("/")
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def local_directory(self) -> Optional[str]:
+        return self.directory
+
+    def _path(self, key: str) -> str:
+        if not key or "/" in key or key.startswith("."):
+            raise ValueError(f"Clé invalide: {key!r}")
+        return os.path.join(self.directory, key)
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        return _key_after(urlparse(url).path, self.url_prefix + "/")
+
+    async def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    async def get_bytes(self, key: str) -> bytes:
+        path = self._path(key)
+
+        def read():
+            with open(path, "rb") as f:
+                return f.read()
+
+        return await asyncio.to_thread(read)
+
+    def change_stamp(self) -> Optional[int]:
+        """mtime du dossier: change à chaque ajout / suppression de fichier."""
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    async def put_file(self, key: str, fileobj, content_type: str, cache_control: Optional[str] = None) -> str:
+        target = self._path(key)
+
+        def write():
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+            os.replace(tmp, target)
+
+        await asyncio.to_thread(write)
+        return self.url(key)
+
+    async def put_path(self, key: str, path: str, content_type: str, cache_control: Optional[str] = None) -> str:
+        target = self._path(key)
+        if os.path.abspath(path) != os.path.abspath(target):
+            await asyncio.to_thread(shutil.copyfile, path, target)
+        return self.url(key)
+
+    async def touch(self, key: str):
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    async def list(self) -> List[StoredObject]:
+        def scan():
+            objects = []
+            try:
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            objects.append(StoredObject(entry.name, stat.st_size, stat.st_mtime))
+            except FileNotFoundError:
+                pass
+            return objects
+
+        return await asyncio.to_thread(scan)
+
+    async def delete_many(self, keys: Iterable[str]) -> Set[str]:
+        """Supprime les clés; retourne celles en échec."""
+        def remove(batch):
+            failed = set()
+            for key in batch:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError) as e:
+                    failed.add(key)
+                    logger.warning(f"[STORAGE] Suppression impossible {key}: {e}")
+            return failed
+
+        return await asyncio.to_thread(remove, list(keys))
+
+
+class S3Storage:
+    """Objets `{prefix}/{clé}` d'un bucket S3 compatible; appels boto3 hors boucle asyncio."""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str, public_base_url: str, client=None,
+                 endpoint_url: Optional[str] = None, region: Optional[str] = None):
+        if not public_base_url:
+            raise ValueError("S3Storage requiert une URL publique (les URLs sont stockées en DB)")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.public_base_url = public_base_url.rstrip("/")
+        self._endpoint_url = endpoint_url
+        self._region = region
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def local_directory(self) -> Optional[str]:
+        return None
+
+    @property
+    def client(self):
+        # boto3 importé à la première opération (démarrage à froid des workers)
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import boto3
+                    self._client = boto3.client("s3", endpoint_url=self._endpoint_url, region_name=self._region)
+        return self._client
+
+    def _object_key(self, key: str) -> str:
+        if not key or "/" in key:
+            raise ValueError(f"Clé invalide: {key!r}")
+        return f"{self.prefix}/{key}"
+
+    def url(self, key: str) -> str:
+        return f"{self.public_base_url}/{self._object_key(key)}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        return _key_after(urlparse(url).path, f"/{self.prefix}/")
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+            if code in _MISSING_CODES:
+                return False
+            raise
+
+    async def get_bytes(self, key: str) -> bytes:
+        def read():
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+            return response["Body"].read()
+
+        return await asyncio.to_thread(read)
+
+    def change_stamp(self) -> Optional[int]:
+        """Pas d'équivalent bon marché sur S3: les caches s'appuient sur leur TTL."""
+        return None
+
+    def _extra_args(self, content_type: str, cache_control: Optional[str]) -> dict:
+        extra = {"ContentType": content_type}
+        if cache_control:
+            extra["CacheControl"] = cache_control
+        return extra
+
+    async def put_file(self, key: str, fileobj, content_type: str, cache_control: Optional[str] = None) -> str:
+        await asyncio.to_thread(
+            self.client.upload_fileobj, fileobj, self.bucket, self._object_key(key),
+            ExtraArgs=self._extra_args(content_type, cache_control)
+        )
+        return self.url(key)
+
+    async def put_path(self, key: str, path: str, content_type: str, cache_control: Optional[str] = None) -> str:
+        await asyncio.to_thread(
+            self.client.upload_file, path, self.bucket, self._object_key(key),
+            ExtraArgs=self._extra_args(content_type, cache_control)
+        )
+        return self.url(key)
+
+    async def touch(self, key: str):
+        """Copie sur place (métadonnées remplacées): LastModified rafraîchi côté serveur."""
+        object_key = self._object_key(key)
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=object_key)
+            await asyncio.to_thread(
+                self.client.copy_object, Bucket=self.bucket, Key=object_key,
+                CopySource={"Bucket": self.bucket, "Key": object_key},
+                MetadataDirective="REPLACE", ContentType=head.get("ContentType", "application/octet-stream"),
+                CacheControl=head.get("CacheControl", IMMUTABLE_CACHE_CONTROL),
+            )
+        except Exception as e:
+            logger.warning(f"[STORAGE] touch {object_key} échoué: {e}")
+
+    async def list(self) -> List[StoredObject]:
+        def scan():
+            objects = []
+            paginator = self.client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + "/"):
+                for item in page.get("Contents", []):
+                    key = item["Key"][len(self.prefix) + 1:]
+                    if key and "/" not in key:
+                        objects.append(StoredObject(key, item["Size"], item["LastModified"].timestamp()))
+            return objects
+
+        return await asyncio.to_thread(scan)
+
+    async def delete_many(self, keys: Iterable[str]) -> Set[str]:
+        keys = list(keys)
+        failed = set()
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            batch = keys[start:start + S3_DELETE_BATCH]
+            response = await asyncio.to_thread(
+                self.client.delete_objects, Bucket=self.bucket,
+                Delete={"Objects": [{"Key": self._object_key(k)} for k in batch], "Quiet": True}
+            )
+            for error in response.get("Errors", []):
+                failed.add(error["Key"][len(self.prefix) + 1:])
+                logger.warning(f"[STORAGE] Suppression impossible {error['Key']}: {error.get('Message')}")
+        return failed
+
+
+def storage_from_env(area: str, local_directory: str, local_url_prefix: str, env=None):
+    """Driver de stockage pour une zone ("profiles", "emojis") selon MEDIA_STORAGE."""
+    env = os.environ if env is None else env
+    driver = env.get("MEDIA_STORAGE", "local").lower()
+    if driver == "s3":
+        bucket = env.get("S3_BUCKET")
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE=s3 requiert S3_BUCKET")
+        public_base_url = env.get("S3_PUBLIC_BASE_URL")
+        if not public_base_url:
+            raise RuntimeError("MEDIA_STORAGE=s3 requiert S3_PUBLIC_BASE_URL (CDN ou bucket public)")
+        base_prefix = env.get("S3_PREFIX", "media").strip("/")
+        return S3Storage(
+            bucket=bucket,
+            prefix=f"{base_prefix}/{area}" if base_prefix else area,
+            public_base_url=public_base_url,
+            endpoint_url=env.get("S3_ENDPOINT_URL") or None,
+            region=env.get("S3_REGION") or None,
+        )
+    return LocalDiskStorage(local_directory, local_url_prefix)
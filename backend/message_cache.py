@@ -0,0 +1,209 @@
+"""
+MESSAGE CACHE - Derniers messages des sessions actives, en mémoire du process API
+LRU de sessions, chacune avec un tampon borné des messages les plus récents:
+- alimenté à l'écriture (store_chat_message)
+- lecture directe sur miss (read-through), puis servi sans aller-retour DB
+- invalidé par la suppression logique / l'effacement d'historique
+- métriques hits / misses pour suivre le taux de réussite
+"""
+
+import bisect
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_SESSIONS = 512
+CACHE_SESSION_CAPACITY = 200   # Messages conservés par session
+CACHE_TTL_SECONDS = 60         # Relecture périodique (écritures hors process: scheduler)
+
+Loader = Callable[[int], Awaitable[List[dict]]]
+
+
+def _order_key(message: dict):
+    seq = message.get("seq")
+    return (0 if seq is None else 1, seq if seq is not None else 0, message.get("created_at") or "", message.get("id") or "")
+
+
+class _SessionBuffer:
+    """Tampon ordonné (seq puis created_at) des derniers messages d'une session."""
+
+    __slots__ = ("rows", "keys", "complete", "loaded_at")
+
+    def __init__(self, complete: bool, loaded_at: float):
+        self.rows: List[dict] = []
+        self.keys: List[tuple] = []
+        self.complete = complete    # True = le tampon contient TOUTE la session
+        self.loaded_at = loaded_at
+
+    def insert(self, message: dict, capacity: int):
+        key = _order_key(message)
+        pos = bisect.bisect_right(self.keys, key)
+        self.keys.insert(pos, key)
+        self.rows.insert(pos, message)
+        overflow = len(self.rows) - capacity
+        if overflow > 0:
+            del self.rows[:overflow]
+            del self.keys[:overflow]
+            self.complete = False
+
+    def live(self) -> List[dict]:
+        return [m for m in self.rows if not m.get("is_deleted")]
+
+
+class SessionMessageCache:
+    """LRU { session_id: _SessionBuffer } avec métriques."""
+
+    def __init__(self, max_sessions: int = CACHE_MAX_SESSIONS, capacity: int = CACHE_SESSION_CAPACITY,
+                 ttl_seconds: float = CACHE_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._sessions: "OrderedDict[str, _SessionBuffer]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # === ACCÈS ===
+
+    def _buffer(self, session_id: str) -> Optional[_SessionBuffer]:
+        buffer = self._sessions.get(session_id)
+        if buffer is None:
+            return None
+        if self._clock() - buffer.loaded_at > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return buffer
+
+    def _store(self, session_id: str, buffer: _SessionBuffer):
+        self._sessions[session_id] = buffer
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def _recent_rows(self, session_id: str, n: Optional[int] = None) -> Optional[List[dict]]:
+        """
+        Derniers n messages non supprimés (ordre chronologique), ou None si le cache
+        ne peut pas répondre. n=None: toute la session (seulement si tampon complet).
+        """
+        buffer = self._buffer(session_id)
+        if buffer is None:
+            return None
+        live = buffer.live()
+        if n is None:
+            return live if buffer.complete else None
+        if len(live) >= n or buffer.complete:
+            return live[-n:] if n else []
+        return None
+
+    def peek_after_seq(self, session_id: str, after_seq: int) -> Optional[List[dict]]:
+        """Messages (tombstones compris) de seq > after_seq, si le tampon couvre la plage."""
+        buffer = self._buffer(session_id)
+        if buffer is not None and not buffer.complete:
+            oldest = buffer.rows[0].get("seq") if buffer.rows else None
+            if oldest is None or oldest > after_seq + 1:
+                buffer = None
+        self._record(buffer is not None)
+        if buffer is None:
+            return None
+        return [m for m in buffer.rows if m.get("seq") is not None and m["seq"] > after_seq]
+
+    def peek_since(self, session_id: str, since: Optional[str]) -> Optional[List[dict]]:
+        """Messages non supprimés créés après `since`, si le tampon couvre la plage."""
+        buffer = self._buffer(session_id)
+        if buffer is not None and not buffer.complete:
+            oldest = buffer.rows[0].get("created_at") if buffer.rows else None
+            if not since or oldest is None or oldest > since:
+                buffer = None
+        self._record(buffer is not None)
+        if buffer is None:
+            return None
+        rows = [m for m in buffer.live() if not since or (m.get("created_at") or "") > since]
+        return sorted(rows, key=lambda m: (m.get("created_at") or "", m.get("id") or ""))
+
+    async def recent(self, session_id: str, n: Optional[int], loader: Loader) -> Optional[List[dict]]:
+        """
+        Read-through: sert depuis le cache ou charge les `capacity` derniers messages
+        via loader(limit) -> liste chronologique. None si la session dépasse le cache (n=None).
+        """
+        cached = self._recent_rows(session_id, n)
+        self._record(cached is not None)
+        if cached is not None:
+            return cached
+        await self.load(session_id, loader)
+        return self._recent_rows(session_id, n)
+
+    async def load(self, session_id: str, loader: Loader):
+        rows = await loader(self.capacity)
+        buffer = _SessionBuffer(complete=len(rows) < self.capacity, loaded_at=self._clock())
+        for row in rows:
+            buffer.insert(row, self.capacity)
+        # Messages écrits pendant la lecture DB: conservés
+        pending = self._sessions.get(session_id)
+        if pending is not None:
+            loaded_ids = {r.get("id") for r in buffer.rows}
+            for row in pending.rows:
+                if row.get("id") not in loaded_ids:
+                    buffer.insert(row, self.capacity)
+        self._store(session_id, buffer)
+
+    # === ÉCRITURE / INVALIDATION ===
+
+    def append(self, message: dict):
+        """Nouveau message écrit: ajouté au tampon de sa session (créé si besoin)."""
+        session_id = message.get("session_id")
+        if not session_id:
+            return
+        entry = {k: v for k, v in message.items() if k != "_id"}
+        buffer = self._buffer(session_id)
+        if buffer is None:
+            buffer = _SessionBuffer(complete=False, loaded_at=self._clock())
+            self._store(session_id, buffer)
+        buffer.insert(entry, self.capacity)
+
+    def mark_deleted(self, session_id: str, message_id: str, deleted_at: Optional[str] = None):
+        """Suppression logique: le message devient un tombstone dans le tampon."""
+        buffer = self._sessions.get(session_id)
+        if buffer is None:
+            return
+        for i, row in enumerate(buffer.rows):
+            if row.get("id") == message_id:
+                buffer.rows[i] = {**row, "is_deleted": True, "deleted_at": deleted_at}
+                self.invalidations += 1
+                return
+
+    def invalidate(self, session_id: Optional[str] = None):
+        """Oublie une session (ou tout le cache si session_id=None)."""
+        if session_id is None:
+            self.invalidations += len(self._sessions)
+            self._sessions.clear()
+        elif self._sessions.pop(session_id, None) is not None:
+            self.invalidations += 1
+
+    # === MÉTRIQUES ===
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sessions": len(self._sessions),
+            "messages": sum(len(b.rows) for b in self._sessions.values()),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "max_sessions": self.max_sessions,
+            "capacity": self.capacity,
+        }
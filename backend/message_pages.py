@@ -0,0 +1,67 @@
+"""
+MESSAGE PAGES - Pagination keyset ("charger plus ancien") des historiques
+Pages de taille fixe, plus récent d'abord, sans skip:
+- sessions de chat: curseur = seq (index session_id + seq)
+- messages privés: curseur opaque (created_at, id) (index conversation_id + created_at + id)
+Ouvrir une longue conversation coûte une petite page, quelle que soit sa longueur.
+"""
+
+import base64
+from typing import List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 200
+
+
+def clamp_page_size(page_size: Optional[int]) -> int:
+    return max(1, min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+def encode_cursor(created_at: str, message_id: str) -> str:
+    raw = f"{created_at}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Curseur opaque -> (created_at, id). ValueError si invalide."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        created_at, sep, message_id = base64.urlsafe_b64decode(padded.encode()).decode().partition("|")
+    except Exception as e:
+        raise ValueError(f"Curseur invalide: {cursor}") from e
+    if not sep or not created_at:
+        raise ValueError(f"Curseur invalide: {cursor}")
+    return created_at, message_id
+
+
+def keyset_filter(cursor: str, older: bool) -> dict:
+    """Filtre Mongo strictement avant (older) ou après un curseur (created_at, id)."""
+    created_at, message_id = decode_cursor(cursor)
+    op = "$lt" if older else "$gt"
+    return {"$or": [
+        {"created_at": {op: created_at}},
+        {"created_at": created_at, "id": {op: message_id}},
+    ]}
+
+
+def build_page(rows: List[dict], page_size: int, newer: bool, cursor_of) -> dict:
+    """
+    rows: page_size + 1 lignes lues dans le sens du scan (plus récent d'abord pour
+    "before", plus ancien d'abord pour "after"). Retourne la page plus récent d'abord.
+    cursor_of(row) -> curseur de la ligne.
+    """
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if newer:
+        rows = list(reversed(rows))
+    return {
+        "messages": rows,
+        "count": len(rows),
+        # Plus ancien de la page -> charger la suite vers le passé
+        "next_before": cursor_of(rows[-1]) if rows else None,
+        # Plus récent de la page -> récupérer les nouveaux messages
+        "next_after": cursor_of(rows[0]) if rows else None,
+        "direction": "after" if newer else "before",
+        # Encore des messages au-delà de la page, dans le sens demandé
+        "has_more": has_more,
+    }
@@ -0,0 +1,239 @@
+"""
+MESSAGE SEQUENCE - Numéros de séquence monotones par session
+Chaque message reçoit un `seq` attribué atomiquement ($inc sur un document
+compteur par session). Les endpoints de sync paginent sur (session_id, seq)
+au lieu de comparer des created_at ISO: deltas exacts + détection de trous.
+
+Les messages de groupe (broadcast) ont leur propre timeline globale
+(collection broadcast_messages, seq du compteur BROADCAST_TIMELINE): la sync
+fusionne deux scans de plage indexés au lieu d'un $or sur tout l'historique.
+"""
+
+import heapq
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEQUENCES_COLLECTION = "message_sequences"
+BROADCAST_COLLECTION = "broadcast_messages"
+BROADCAST_TIMELINE = "__broadcast__"
+BACKFILL_MARKER = "__backfill__"
+BROADCAST_MIGRATION_MARKER = "__broadcast_migration__"
+GAP_GRACE_SECONDS = 5  # Un trou plus récent peut être une insertion en cours
+DUPLICATE_KEY = 11000
+INDEX_CONFLICT_CODES = (85, 86)  # IndexOptionsConflict / IndexKeySpecsConflict
+BROADCAST_ID_INDEX = "id_1"
+
+
+def _counter_update():
+    return {"$inc": {"seq": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+
+
+async def next_seq(database, session_id: str) -> int:
+    """Prochain seq d'une session (motor). Atomique, sans verrou."""
+    counter = await database[SEQUENCES_COLLECTION].find_one_and_update(
+        {"session_id": session_id}, _counter_update(), upsert=True, return_document=True
+    )
+    return counter["seq"]
+
+
+def next_seq_sync(database, session_id: str) -> int:
+    """Version pymongo synchrone (thread du scheduler)."""
+    counter = database[SEQUENCES_COLLECTION].find_one_and_update(
+        {"session_id": session_id}, _counter_update(), upsert=True, return_document=True
+    )
+    return counter["seq"]
+
+
+def plan_delta(after_seq: int, rows: List[dict], now: Optional[datetime] = None,
+               grace_seconds: int = GAP_GRACE_SECONDS) -> Tuple[int, List[int]]:
+    """
+    Calcule le curseur suivant et les trous d'un delta trié par seq.
+    - Un trou récent (< grace) bloque le curseur: le message peut être en cours d'insertion.
+    - Un trou ancien est considéré définitif (insertion échouée) et sauté.
+
+    Returns:
+        (next_after_seq, gaps)
+    """
+    now = now or datetime.now(timezone.utc)
+    threshold = (now - timedelta(seconds=grace_seconds)).isoformat()
+    cursor = after_seq
+    blocked = False
+    gaps: List[int] = []
+    expected = after_seq + 1
+    for row in rows:
+        seq = row.get("seq")
+        if seq is None or seq < expected:
+            continue
+        if seq > expected:
+            gaps.extend(range(expected, seq))
+            if (row.get("created_at") or "") > threshold:
+                blocked = True
+        if not blocked:
+            cursor = seq
+        expected = seq + 1
+    return cursor, gaps
+
+
+def parse_cursor_map(raw: Optional[str]) -> Dict[str, int]:
+    """'session_a:12,session_b:40' -> {'session_a': 12, 'session_b': 40}"""
+    cursors = {}
+    for part in (raw or "").split(","):
+        session_id, _, seq = part.strip().rpartition(":")
+        if session_id and seq.lstrip("-").isdigit():
+            cursors[session_id] = int(seq)
+    return cursors
+
+
+async def backfill_sequences(database, batch_size: int = 500) -> int:
+    """
+    Attribue un seq aux messages historiques (une seule fois, marqueur en DB).
+    Les anciens messages reçoivent des seq <= 0 (le plus récent = 0) afin de
+    rester avant les nouveaux messages, déjà numérotés à partir de 1.
+    """
+    from pymongo import UpdateOne
+
+    sequences = database[SEQUENCES_COLLECTION]
+    if await sequences.find_one({"session_id": BACKFILL_MARKER}):
+        return 0
+    messages = database.chat_messages
+    session_ids = await messages.distinct("session_id", {"seq": {"$exists": False}})
+    total = 0
+    for session_id in session_ids:
+        if not session_id:
+            continue
+        ids = [m["id"] async for m in messages.find(
+            {"session_id": session_id, "seq": {"$exists": False}}, {"_id": 0, "id": 1}
+        ).sort([("created_at", -1), ("id", -1)])]
+        ops = [UpdateOne({"id": mid, "seq": {"$exists": False}}, {"$set": {"seq": -i}}) for i, mid in enumerate(ids)]
+        for start in range(0, len(ops), batch_size):
+            await messages.bulk_write(ops[start:start + batch_size], ordered=False)
+        total += len(ops)
+    await sequences.update_one(
+        {"session_id": BACKFILL_MARKER},
+        {"$set": {"seq": 0, "messages": total, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    logger.info(f"[SEQ] Backfill: {total} message(s) numérotés sur {len(session_ids)} session(s)")
+    return total
+
+
+def max_seq(rows: Iterable[dict], default: int) -> int:
+    return max((r.get("seq") for r in rows if r.get("seq") is not None), default=default)
+
+
+# === TIMELINE BROADCAST ===
+
+def is_broadcast(message: dict) -> bool:
+    """Message destiné à toutes les sessions (publié sur la timeline globale)."""
+    return bool(message.get("broadcast")) or message.get("type") == "group"
+
+
+def _timeline_key(message: dict) -> Tuple[str, str]:
+    return (message.get("created_at") or "", message.get("id") or "")
+
+
+def merge_timelines(session_rows: List[dict], broadcast_rows: List[dict], limit: Optional[int] = None) -> List[dict]:
+    """
+    Fusionne deux scans déjà triés par (created_at, id) en un seul flux ordonné.
+    Un broadcast émis depuis la session elle-même n'apparaît qu'une fois.
+    """
+    merged, seen = [], set()
+    for row in heapq.merge(session_rows, broadcast_rows, key=_timeline_key):
+        if row.get("id") in seen:
+            continue
+        seen.add(row.get("id"))
+        merged.append(row)
+        if limit is not None and len(merged) >= limit:
+            break
+    return merged
+
+
+async def publish_broadcast(database, message: dict) -> int:
+    """Copie un message de groupe sur la timeline globale (seq propre). Retourne ce seq."""
+    seq = await next_seq(database, BROADCAST_TIMELINE)
+    entry = {k: v for k, v in message.items() if k not in ("_id", "seq")}
+    entry["seq"] = seq
+    entry["session_seq"] = message.get("seq")
+    await database[BROADCAST_COLLECTION].insert_one(entry)
+    return seq
+
+
+async def _drop_duplicate_broadcasts(timeline) -> int:
+    """Copies multiples d'un même message (migrations concurrentes): garde le plus petit seq."""
+    removed = 0
+    cursor = timeline.aggregate([
+        {"$match": {"id": {"$type": "string"}}},
+        {"$group": {"_id": "$id", "seqs": {"$push": "$seq"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    async for group in cursor:
+        result = await timeline.delete_many({"id": group["_id"], "seq": {"$in": sorted(group["seqs"])[1:]}})
+        removed += result.deleted_count
+    return removed
+
+
+async def ensure_broadcast_indexes(database):
+    """
+    Index de la timeline globale. `id` unique: une seule copie par message d'origine
+    (l'ancien index non unique est remplacé, les doublons existants supprimés).
+    """
+    timeline = database[BROADCAST_COLLECTION]
+    await timeline.create_index("seq", unique=True)
+    await timeline.create_index([("created_at", 1), ("id", 1)])
+    for _ in range(len(INDEX_CONFLICT_CODES) + 1):
+        try:
+            await timeline.create_index(
+                "id", unique=True, name=BROADCAST_ID_INDEX, partialFilterExpression={"id": {"$type": "string"}}
+            )
+            return
+        except Exception as e:
+            code = getattr(e, "code", None)
+            if code in INDEX_CONFLICT_CODES:
+                await timeline.drop_index(BROADCAST_ID_INDEX)
+            elif code == DUPLICATE_KEY:
+                removed = await _drop_duplicate_broadcasts(timeline)
+                logger.warning(f"[SEQ] Timeline broadcast: {removed} copie(s) en double supprimée(s)")
+            else:
+                raise
+    await timeline.create_index(
+        "id", unique=True, name=BROADCAST_ID_INDEX, partialFilterExpression={"id": {"$type": "string"}}
+    )
+
+
+async def migrate_broadcasts(database) -> int:
+    """
+    Copie une seule fois les anciens messages broadcast/group de chat_messages
+    vers la timeline globale (dans l'ordre chronologique). Les ids déjà copiés
+    sont lus en une requête; l'index unique sur `id` écarte les copies concurrentes.
+    """
+    sequences = database[SEQUENCES_COLLECTION]
+    if await sequences.find_one({"session_id": BROADCAST_MIGRATION_MARKER}):
+        return 0
+    timeline = database[BROADCAST_COLLECTION]
+    migrated = {doc.get("id") async for doc in timeline.find({}, {"_id": 0, "id": 1})}
+    total = 0
+    cursor = database.chat_messages.find(
+        {"$or": [{"broadcast": True}, {"type": "group"}]}, {"_id": 0}
+    ).sort([("created_at", 1), ("id", 1)])
+    async for message in cursor:
+        if message.get("id") in migrated:
+            continue
+        try:
+            await publish_broadcast(database, message)
+        except Exception as e:
+            # Copié entre-temps par un autre worker (index unique): seq consommé, sans effet
+            if getattr(e, "code", None) != DUPLICATE_KEY:
+                raise
+            continue
+        migrated.add(message.get("id"))
+        total += 1
+    await sequences.update_one(
+        {"session_id": BROADCAST_MIGRATION_MARKER},
+        {"$set": {"seq": 0, "messages": total, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    logger.info(f"[SEQ] Timeline broadcast: {total} message(s) migrés")
+    return total
@@ -0,0 +1,210 @@
+"""
+NOTIFICATION HUB - Compteurs de messages non notifiés poussés en temps réel
+Remplace le polling de /api/notifications/unread toutes les 10 secondes:
+- Compteurs par (cible, session) maintenus en mémoire ET en DB ($inc)
+- Mis à jour par les chemins d'écriture des messages
+- Version incrémentée à chaque changement (long-poll / Socket.IO)
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cibles de notification par type d'expéditeur
+# - coach: messages des utilisateurs
+# - coach_ai: réponses IA (option include_ai du coach)
+# - client: réponses IA/coach destinées aux clients
+TARGETS_BY_SENDER = {
+    "user": ("coach",),
+    "ai": ("coach_ai", "client"),
+    "coach": ("client",),
+}
+SENDERS_BY_TARGET = {
+    "coach": ("user",),
+    "coach_ai": ("ai",),
+    "client": ("ai", "coach"),
+}
+# Lecteur dont le watermark de lecture s'applique à chaque cible
+READER_BY_TARGET = {
+    "coach": "coach",
+    "coach_ai": "coach",
+    "client": "client",
+}
+COACH_ROOM = "notifications_coach"
+BACKFILL_MARKER = "__backfill__"
+
+
+def targets_for(sender_type: Optional[str]) -> tuple:
+    return TARGETS_BY_SENDER.get(sender_type or "", ())
+
+
+class UnreadNotificationHub:
+    """
+    Compteurs non-lus { cible: { session_id: count } }.
+    collection = db.notification_counters (motor) pour la persistance.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    # === LECTURE ===
+
+    def count(self, target: str, session_id: Optional[str] = None, include_ai: bool = False) -> int:
+        targets = [target, "coach_ai"] if (target == "coach" and include_ai) else [target]
+        total = 0
+        for t in targets:
+            per_session = self.counters.get(t, {})
+            total += per_session.get(session_id, 0) if session_id else sum(per_session.values())
+        return total
+
+    def snapshot(self, target: str, session_id: Optional[str] = None) -> dict:
+        return {
+            "target": target,
+            "session_id": session_id,
+            "count": self.count(target, session_id),
+            "count_with_ai": self.count(target, session_id, include_ai=True) if target == "coach" else None,
+            "version": self.version,
+        }
+
+    def sessions_with_unread(self, targets: Iterable[str]) -> List[str]:
+        sessions = set()
+        for target in targets:
+            sessions.update(self.counters.get(target, {}).keys())
+        return sorted(sessions)
+
+    async def wait_for_change(self, since_version: int, timeout: float) -> bool:
+        """Long-poll: attend un changement de version (True) ou le timeout (False)."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.version <= since_version:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return False
+            event = self._changed
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    # === ÉCRITURE ===
+
+    def _bump(self):
+        self.version += 1
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+
+    def _apply(self, target: str, session_id: str, delta: int) -> int:
+        per_session = self.counters.setdefault(target, {})
+        value = max(0, per_session.get(session_id, 0) + delta)
+        if value:
+            per_session[session_id] = value
+        else:
+            per_session.pop(session_id, None)
+        return value
+
+    async def _persist_inc(self, target: str, session_id: str, delta: int):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.update_one(
+                {"target": target, "session_id": session_id},
+                {"$inc": {"count": delta}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"[NOTIF-HUB] Persistance compteur échouée: {e}")
+
+    async def record_message(self, session_id: str, sender_type: str) -> List[str]:
+        """Nouveau message non notifié: +1 sur chaque cible concernée."""
+        targets = list(targets_for(sender_type))
+        if not session_id or not targets:
+            return []
+        for target in targets:
+            self._apply(target, session_id, 1)
+            await self._persist_inc(target, session_id, 1)
+        self._bump()
+        return targets
+
+    async def set_count(self, target: str, session_id: str, value: int):
+        """Aligne un compteur sur un recomptage indexé (après avance du watermark)."""
+        if not session_id:
+            return
+        self._apply(target, session_id, value - self.counters.get(target, {}).get(session_id, 0))
+        if self.collection is not None:
+            try:
+                await self.collection.update_one(
+                    {"target": target, "session_id": session_id},
+                    {"$set": {"count": max(0, value)}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"[NOTIF-HUB] Persistance compteur échouée: {e}")
+        self._bump()
+
+    async def clear(self, targets: Iterable[str], session_id: Optional[str] = None) -> List[str]:
+        """Remet à zéro les compteurs d'une ou plusieurs cibles (toutes sessions ou une)."""
+        cleared = []
+        for target in targets:
+            per_session = self.counters.get(target, {})
+            if session_id:
+                per_session.pop(session_id, None)
+            else:
+                per_session.clear()
+            cleared.append(target)
+            if self.collection is not None:
+                query = {"target": target}
+                if session_id:
+                    query["session_id"] = session_id
+                try:
+                    await self.collection.delete_many(query)
+                except Exception as e:
+                    logger.warning(f"[NOTIF-HUB] Reset compteur échoué: {e}")
+        self._bump()
+        return cleared
+
+    async def forget_session(self, session_id: str):
+        """Session supprimée / historique effacé: retire tous ses compteurs."""
+        await self.clear(list(self.counters.keys()) or ["coach", "coach_ai", "client"], session_id)
+
+    # === CHARGEMENT ===
+
+    async def load(self, messages_collection=None):
+        """
+        Charge les compteurs depuis la DB au démarrage.
+        Si aucun compteur n'existe encore, backfill unique depuis chat_messages.
+        """
+        if self.collection is None:
+            return
+        docs = await self.collection.find({"target": {"$ne": BACKFILL_MARKER}}, {"_id": 0}).to_list(None)
+        backfilled = await self.collection.find_one({"target": BACKFILL_MARKER})
+        if not backfilled and messages_collection is not None:
+            pipeline = [
+                {"$match": {"notified": {"$ne": True}, "is_deleted": {"$ne": True},
+                            "sender_type": {"$in": list(TARGETS_BY_SENDER.keys())}}},
+                {"$group": {"_id": {"session_id": "$session_id", "sender_type": "$sender_type"}, "n": {"$sum": 1}}},
+            ]
+            async for row in messages_collection.aggregate(pipeline):
+                for target in targets_for(row["_id"].get("sender_type")):
+                    session_id = row["_id"].get("session_id")
+                    if session_id:
+                        self._apply(target, session_id, row["n"])
+            for target, per_session in self.counters.items():
+                for session_id, n in per_session.items():
+                    await self._persist_inc(target, session_id, n)
+            await self.collection.update_one(
+                {"target": BACKFILL_MARKER, "session_id": BACKFILL_MARKER},
+                {"$set": {"count": 0}},
+                upsert=True
+            )
+            logger.info(f"[NOTIF-HUB] Backfill compteurs: {sum(len(v) for v in self.counters.values())} entrées")
+            return
+        self.counters = {}
+        for doc in docs:
+            if doc.get("count", 0) > 0 and doc.get("session_id"):
+                self.counters.setdefault(doc["target"], {})[doc["session_id"]] = doc["count"]
+        logger.info(f"[NOTIF-HUB] {len(docs)} compteur(s) chargés")
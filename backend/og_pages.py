@@ -0,0 +1,332 @@
+"""
+OG PAGES - Pages de partage OpenGraph (aperçus WhatsApp / Facebook / LinkedIn)
+- rendu HTML pur (media_links -> str), sans accès DB: mémorisé par slug côté
+  serveur (ResponseCache + ETag), invalidé par la mise à jour / suppression du lien
+- valeurs utilisateur échappées (titre, description, miniature, CTA)
+"""
+
+import html
+from typing import Optional
+
+SITE_URL = "https://afroboosteur.com"
+DEFAULT_TITLE = "Afroboost"
+DEFAULT_DESCRIPTION = "Découvrez cette vidéo exclusive Afroboost"
+HTML_MEDIA_TYPE = "text/html; charset=utf-8"
+OG_PAGE_CACHE_ENTRIES = 1000
+
+
+def escape(value: Optional[str]) -> str:
+    return html.escape(value or "", quote=True)
+
+
+def cache_keys(slug: str) -> tuple:
+    """Clés ResponseCache des trois pages d'un slug (invalidation groupée)."""
+    slug = slug.lower()
+    return (f"og:share:{slug}", f"og:meta:{slug}", f"og:viewer:{slug}")
+
+
+def _title(media: dict) -> str:
+    return escape(media.get("title") or DEFAULT_TITLE)
+
+
+def _description(media: dict) -> str:
+    return escape((media.get("description") or DEFAULT_DESCRIPTION)[:200])
+
+
+def render_og_page(media: dict, slug: str) -> str:
+    """Page minimale de /api/media/{slug}/og (meta tags + redirection immédiate)."""
+    title = _title(media)
+    description = escape((media.get("description", DEFAULT_DESCRIPTION) or "")[:200])
+    thumbnail = escape(media.get("thumbnail", ""))
+    slug = escape(slug)
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    
+    <!-- OpenGraph pour WhatsApp/Facebook/LinkedIn -->
+    <meta property="og:title" content="{title}" />
+    <meta property="og:description" content="{description}" />
+    <meta property="og:image" content="{thumbnail}" />
+    <meta property="og:image:width" content="1280" />
+    <meta property="og:image:height" content="720" />
+    <meta property="og:url" content="{SITE_URL}/v/{slug}" />
+    <meta property="og:type" content="video.other" />
+    <meta property="og:site_name" content="Afroboost" />
+    
+    <!-- Twitter Card -->
+    <meta name="twitter:card" content="summary_large_image" />
+    <meta name="twitter:title" content="{title}" />
+    <meta name="twitter:description" content="{description}" />
+    <meta name="twitter:image" content="{thumbnail}" />
+    
+    <!-- Redirection automatique vers la page React -->
+    <script>
+        window.location.href = "{SITE_URL}/v/{slug}";
+    </script>
+</head>
+<body style="background: #000; color: #fff; font-family: system-ui; display: flex; align-items: center; justify-content: center; height: 100vh; margin: 0;">
+    <div style="text-align: center;">
+        <h1 style="background: linear-gradient(135deg, #d91cd2, #8b5cf6); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">
+            {title}
+        </h1>
+        <p>Redirection en cours...</p>
+        <a href="{SITE_URL}/v/{slug}" style="color: #d91cd2;">Cliquez ici si la redirection ne fonctionne pas</a>
+    </div>
+</body>
+</html>"""
+
+
+def render_share_page(media: dict, slug: str) -> str:
+    """Page principale de partage /api/share/{slug} (OG complet + vidéo + CTA)."""
+    title = _title(media)
+    description = _description(media)
+    thumbnail = escape(media.get("custom_thumbnail") or media.get("thumbnail"))
+    youtube_id = escape(media.get("youtube_id"))
+    cta_text = escape(media.get("cta_text"))
+    slug = escape(slug)
+    share_url = f"{SITE_URL}/api/share/{slug}"
+    viewer_url = f"{SITE_URL}/v/{slug}"
+    return f"""<!DOCTYPE html>
+<html lang="fr" prefix="og: https://ogp.me/ns#">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title} - Afroboost</title>
+    
+    <!-- ===== OPENGRAPH POUR WHATSAPP/FACEBOOK/LINKEDIN ===== -->
+    <meta property="og:type" content="video.other" />
+    <meta property="og:site_name" content="Afroboost" />
+    <meta property="og:title" content="{title}" />
+    <meta property="og:description" content="{description}" />
+    <meta property="og:url" content="{share_url}" />
+    
+    <!-- IMAGE - CRITIQUE POUR WHATSAPP -->
+    <meta property="og:image" content="{thumbnail}" />
+    <meta property="og:image:secure_url" content="{thumbnail}" />
+    <meta property="og:image:type" content="image/jpeg" />
+    <meta property="og:image:width" content="1280" />
+    <meta property="og:image:height" content="720" />
+    <meta property="og:image:alt" content="{title}" />
+    
+    <!-- VIDEO (optionnel mais aide WhatsApp) -->
+    {f'<meta property="og:video" content="https://www.youtube.com/embed/{youtube_id}" />' if youtube_id else ''}
+    {f'<meta property="og:video:secure_url" content="https://www.youtube.com/embed/{youtube_id}" />' if youtube_id else ''}
+    {f'<meta property="og:video:type" content="text/html" />' if youtube_id else ''}
+    {f'<meta property="og:video:width" content="1280" />' if youtube_id else ''}
+    {f'<meta property="og:video:height" content="720" />' if youtube_id else ''}
+    
+    <!-- TWITTER CARD -->
+    <meta name="twitter:card" content="summary_large_image" />
+    <meta name="twitter:site" content="@afroboost" />
+    <meta name="twitter:title" content="{title}" />
+    <meta name="twitter:description" content="{description}" />
+    <meta name="twitter:image" content="{thumbnail}" />
+    
+    <!-- WHATSAPP SPECIFIQUE -->
+    <meta property="al:web:url" content="{viewer_url}" />
+    
+    <style>
+        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+        body {{
+            background: linear-gradient(180deg, #000 0%, #1a0a1f 100%);
+            min-height: 100vh;
+            color: #fff;
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            justify-content: center;
+            padding: 20px;
+        }}
+        .container {{
+            text-align: center;
+            max-width: 500px;
+            width: 100%;
+        }}
+        .logo {{
+            font-size: 28px;
+            font-weight: bold;
+            background: linear-gradient(135deg, #d91cd2, #8b5cf6);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+            background-clip: text;
+            margin-bottom: 30px;
+        }}
+        .thumbnail {{
+            width: 100%;
+            max-width: 480px;
+            border-radius: 16px;
+            box-shadow: 0 0 40px rgba(217, 28, 210, 0.4);
+            margin-bottom: 20px;
+        }}
+        h1 {{
+            font-size: 24px;
+            margin-bottom: 15px;
+            line-height: 1.3;
+        }}
+        p {{
+            color: rgba(255,255,255,0.7);
+            margin-bottom: 25px;
+            line-height: 1.5;
+        }}
+        .cta {{
+            display: inline-block;
+            padding: 16px 32px;
+            background: linear-gradient(135deg, #d91cd2, #8b5cf6);
+            color: white;
+            text-decoration: none;
+            border-radius: 12px;
+            font-weight: bold;
+            font-size: 18px;
+            transition: transform 0.2s, box-shadow 0.2s;
+            box-shadow: 0 4px 20px rgba(217, 28, 210, 0.4);
+        }}
+        .cta:hover {{
+            transform: scale(1.05);
+            box-shadow: 0 6px 30px rgba(217, 28, 210, 0.6);
+        }}
+        .loader {{
+            width: 40px;
+            height: 40px;
+            border: 4px solid rgba(217, 28, 210, 0.3);
+            border-top-color: #d91cd2;
+            border-radius: 50%;
+            animation: spin 1s linear infinite;
+            margin: 0 auto 20px;
+        }}
+        @keyframes spin {{ to {{ transform: rotate(360deg); }} }}
+        .redirect-msg {{
+            font-size: 14px;
+            color: rgba(255,255,255,0.5);
+            margin-top: 30px;
+        }}
+    </style>
+    
+    <!-- REDIRECTION AUTOMATIQUE VERS LE LECTEUR -->
+    <script>
+        // Redirection après un court délai pour permettre aux crawlers de lire les meta tags
+        setTimeout(function() {{
+            window.location.href = "{viewer_url}";
+        }}, 1500);
+    </script>
+</head>
+<body>
+    <div class="container">
+        <div class="logo">🎧 Afroboost</div>
+        
+        {f'<img src="{thumbnail}" alt="{title}" class="thumbnail" />' if thumbnail else ''}
+        
+        <h1>{title}</h1>
+        <p>{description}</p>
+        
+        <a href="{viewer_url}" class="cta">
+            ▶️ {cta_text if cta_text else 'Voir la vidéo'}
+        </a>
+        
+        <p class="redirect-msg">
+            <span class="loader" style="display:inline-block;width:16px;height:16px;vertical-align:middle;margin-right:8px;"></span>
+            Redirection en cours...
+        </p>
+    </div>
+</body>
+</html>"""
+
+
+def render_viewer_page(media: dict, slug: str, frontend_url: str) -> str:
+    """Page /v/{slug}: meta tags puis redirection vers le lecteur React."""
+    title = _title(media)
+    description = escape((media.get("description", DEFAULT_DESCRIPTION) or "")[:200])
+    thumbnail = escape(media.get("thumbnail"))
+    slug = escape(slug)
+    viewer_url = f"{frontend_url}/v/{slug}"
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    
+    <!-- OpenGraph pour WhatsApp/Facebook/LinkedIn -->
+    <meta property="og:title" content="{title}" />
+    <meta property="og:description" content="{description}" />
+    <meta property="og:image" content="{thumbnail}" />
+    <meta property="og:image:width" content="1280" />
+    <meta property="og:image:height" content="720" />
+    <meta property="og:url" content="{SITE_URL}/v/{slug}" />
+    <meta property="og:type" content="video.other" />
+    <meta property="og:site_name" content="Afroboost" />
+    
+    <!-- Twitter Card -->
+    <meta name="twitter:card" content="summary_large_image" />
+    <meta name="twitter:title" content="{title}" />
+    <meta name="twitter:description" content="{description}" />
+    <meta name="twitter:image" content="{thumbnail}" />
+    
+    <style>
+        body {{
+            background: linear-gradient(180deg, #000 0%, #1a0a1f 100%);
+            color: #fff;
+            font-family: system-ui, -apple-system, sans-serif;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            height: 100vh;
+            margin: 0;
+            padding: 20px;
+            box-sizing: border-box;
+        }}
+        .container {{
+            text-align: center;
+            max-width: 400px;
+        }}
+        h1 {{
+            background: linear-gradient(135deg, #d91cd2, #8b5cf6);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+            background-clip: text;
+            margin-bottom: 20px;
+        }}
+        .loader {{
+            width: 40px;
+            height: 40px;
+            border: 4px solid rgba(217, 28, 210, 0.3);
+            border-top-color: #d91cd2;
+            border-radius: 50%;
+            animation: spin 1s linear infinite;
+            margin: 0 auto 20px;
+        }}
+        @keyframes spin {{
+            to {{ transform: rotate(360deg); }}
+        }}
+        a {{
+            color: #d91cd2;
+            text-decoration: none;
+        }}
+        a:hover {{
+            text-decoration: underline;
+        }}
+    </style>
+    
+    <!-- Redirection automatique -->
+    <script>
+        // Rediriger vers le frontend React après un court délai
+        // Ce délai permet aux crawlers de lire les meta tags
+        setTimeout(function() {{
+            window.location.href = "{viewer_url}";
+        }}, 100);
+    </script>
+</head>
+<body>
+    <div class="container">
+        <div class="loader"></div>
+        <h1>{title}</h1>
+        <p>Chargement de la vidéo...</p>
+        <p style="margin-top: 20px; font-size: 14px; opacity: 0.7;">
+            <a href="{viewer_url}">Cliquez ici si vous n'êtes pas redirigé</a>
+        </p>
+    </div>
+</body>
+</html>"""
@@ -0,0 +1,142 @@
+"""
+PHONE INDEX - Numéros de téléphone normalisés et recherche indexée de l'appelant
+Le webhook WhatsApp (Twilio) reçoit "whatsapp:+41791234567"; les documents
+stockent le numéro saisi librement ("079 123 45 67", "0041 79...", "+41-79...").
+- phone_e164: forme E.164 (+41791234567), indicatif par défaut pour les numéros nationaux
+- phone_key: 9 derniers chiffres (indépendant de l'indicatif / du 0 national),
+  clé d'égalité indexée sur reservations, users et chat_participants
+- champs posés à l'écriture (index_fields) + rattrapage au démarrage (backfill)
+- find_caller(): une recherche indexée par collection, dans l'ordre de priorité
+"""
+
+import logging
+import re
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COUNTRY_CODE = "41"
+KEY_DIGITS = 9
+BACKFILL_BATCH = 500
+
+# Champs source du numéro et du nom, par collection (premier non vide)
+PHONE_FIELDS = {
+    "reservations": ("userWhatsapp", "whatsapp", "phone"),
+    "users": ("whatsapp", "phone"),
+    "chat_participants": ("whatsapp", "phone"),
+}
+NAME_FIELDS = {
+    "reservations": ("userName", "name"),
+    "users": ("name",),
+    "chat_participants": ("name",),
+}
+# Ordre de recherche de l'appelant: les réservations portent le nom saisi au paiement
+CALLER_COLLECTIONS = ("reservations", "chat_participants", "users")
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(raw: Optional[str], country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """Numéro libre -> E.164 (+indicatif...), None si trop court pour être un numéro."""
+    if not raw or not isinstance(raw, str):
+        return None
+    raw = raw.strip().replace("whatsapp:", "")
+    digits = _NON_DIGITS.sub("", raw)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif len(digits) <= KEY_DIGITS:
+        digits = country_code + digits  # numéro national saisi sans le 0
+    if len(digits) < KEY_DIGITS or len(digits) > 15:
+        return None
+    return "+" + digits
+
+
+def phone_key(raw: Optional[str]) -> Optional[str]:
+    """9 derniers chiffres (même clé pour +41 79..., 0041 79..., 079...)."""
+    if not raw or not isinstance(raw, str):
+        return None
+    digits = _NON_DIGITS.sub("", raw)
+    return digits[-KEY_DIGITS:] if len(digits) >= KEY_DIGITS else None
+
+
+def index_fields(doc: dict, collection: str) -> Dict[str, Optional[str]]:
+    """
+    {phone_e164, phone_key} à poser avec le document (insert ou $set).
+    Vide si `doc` (ex. un $set partiel) ne touche aucun champ téléphone.
+    """
+    sources = [field for field in PHONE_FIELDS[collection] if field in doc]
+    if not sources:
+        return {}
+    raw = next((doc[field] for field in sources if doc.get(field)), None)
+    return {"phone_e164": normalize_phone(raw), "phone_key": phone_key(raw)}
+
+
+def with_phone_index(doc: dict, collection: str) -> dict:
+    doc.update(index_fields(doc, collection))
+    return doc
+
+
+async def ensure_indexes(database):
+    for collection in PHONE_FIELDS:
+        await database[collection].create_index(
+            "phone_key", partialFilterExpression={"phone_key": {"$type": "string"}}
+        )
+
+
+async def backfill(database, batch_size: int = BACKFILL_BATCH) -> Dict[str, int]:
+    """
+    Pose phone_e164 / phone_key sur les documents qui ne les ont pas encore.
+    Idempotent: les documents traités (même sans numéro) portent le champ,
+    un redémarrage ne revisite que les écritures qui ne l'ont pas posé.
+    """
+    from pymongo import UpdateOne
+
+    counts = {}
+    for collection, fields in PHONE_FIELDS.items():
+        projection = {"_id": 1, **{field: 1 for field in fields}}
+        ops, total = [], 0
+        async for doc in database[collection].find({"phone_key": {"$exists": False}}, projection):
+            fields_set = index_fields({field: doc.get(field) for field in fields}, collection)
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields_set}))
+            if len(ops) >= batch_size:
+                await database[collection].bulk_write(ops, ordered=False)
+                total += len(ops)
+                ops = []
+        if ops:
+            await database[collection].bulk_write(ops, ordered=False)
+            total += len(ops)
+        counts[collection] = total
+    if any(counts.values()):
+        logger.info(f"[PHONE-INDEX] Backfill: {counts}")
+    return counts
+
+
+def _name_of(doc: dict, collection: str) -> Optional[str]:
+    return next((doc[field] for field in NAME_FIELDS[collection] if doc.get(field)), None)
+
+
+async def find_caller(database, raw_phone: str,
+                      collections: Iterable[str] = CALLER_COLLECTIONS) -> Optional[dict]:
+    """
+    Premier document (le plus récent) dont phone_key correspond au numéro appelant:
+    {"collection", "id", "name", "phone_e164"} ou None.
+    """
+    key = phone_key(raw_phone)
+    if not key:
+        return None
+    for collection in collections:
+        fields = NAME_FIELDS[collection]
+        projection = {"_id": 0, "id": 1, "phone_e164": 1, **{field: 1 for field in fields}}
+        cursor = database[collection].find({"phone_key": key}, projection).sort("_id", -1).limit(1)
+        async for doc in cursor:
+            return {
+                "collection": collection,
+                "id": doc.get("id"),
+                "name": _name_of(doc, collection),
+                "phone_e164": doc.get("phone_e164"),
+            }
+    return None
@@ -0,0 +1,98 @@
+"""
+PRIVATE CONVERSATIONS - Conversations privées (MP) adressées par paire de participants
+- pair_key: paire triée "id_a|id_b" (index unique partiel): A->B et B->A aboutissent
+  à la même conversation
+- get_or_create(): upsert atomique sur pair_key; le perdant d'une course (11000) relit
+  la conversation créée par l'autre
+- backfill_keys(): participant_ids + pair_key des conversations historiques; en cas de
+  doublons hérités, la plus ancienne garde la clé (les autres restent listées). Clés
+  existantes lues en une requête projetée, mises à jour par lots (bulk_write)
+"""
+
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+BACKFILL_BATCH = 500
+
+
+def _update_one(filter_: dict, update: dict):
+    from pymongo import UpdateOne
+    return UpdateOne(filter_, update)
+
+
+def _only_duplicates(error: Exception) -> bool:
+    """BulkWriteError dont toutes les erreurs sont des clés en double (autre worker plus rapide)."""
+    details = getattr(error, "details", None)
+    write_errors = details.get("writeErrors") if isinstance(details, dict) else None
+    return bool(write_errors) and all(e.get("code") == DUPLICATE_KEY for e in write_errors)
+
+
+def private_pair_key(participant_a: str, participant_b: str) -> str:
+    """Clé canonique d'une conversation privée, indépendante de l'ordre des participants."""
+    return "|".join(sorted([participant_a, participant_b]))
+
+
+async def ensure_indexes(collection):
+    await collection.create_index(
+        "pair_key", unique=True, partialFilterExpression={"pair_key": {"$type": "string"}}
+    )
+    await collection.create_index([("participant_ids", 1), ("last_message_at", -1)])
+
+
+async def get_or_create(collection, conversation: dict) -> dict:
+    """Conversation de la paire de `conversation` (pair_key renseigné), insérée si absente."""
+    pair_key = conversation["pair_key"]
+    try:
+        return await collection.find_one_and_update(
+            {"pair_key": pair_key},
+            {"$setOnInsert": conversation},
+            upsert=True, return_document=True, projection={"_id": 0}
+        )
+    except Exception as e:
+        # Deux upserts simultanés: le perdant lit la conversation créée par l'autre
+        if getattr(e, "code", None) != DUPLICATE_KEY:
+            raise
+        return await collection.find_one({"pair_key": pair_key}, {"_id": 0})
+
+
+async def backfill_keys(collection, batch_size: int = BACKFILL_BATCH, update_op: Callable = _update_one) -> int:
+    """Conversations sans participant_ids: complète participant_ids + pair_key (plus ancienne d'abord)."""
+    taken = {doc["pair_key"] async for doc in collection.find({"pair_key": {"$type": "string"}},
+                                                               {"_id": 0, "pair_key": 1})}
+    ops, updated = [], 0
+
+    async def write():
+        nonlocal ops, updated
+        if not ops:
+            return
+        try:
+            await collection.bulk_write(ops, ordered=False)
+        except Exception as e:
+            if not _only_duplicates(e):
+                raise
+            # Clé posée entre-temps par un autre worker: conversations reprises au prochain démarrage
+            logger.info(f"[MP] Backfill: {len(e.details['writeErrors'])} clé(s) de paire déjà prise(s)")
+        updated += len(ops)
+        ops = []
+
+    cursor = collection.find(
+        {"participant_ids": {"$exists": False}},
+        {"_id": 0, "id": 1, "participant_1_id": 1, "participant_2_id": 1}
+    ).sort("created_at", 1)
+    async for conv in cursor:
+        p1, p2 = conv.get("participant_1_id") or "", conv.get("participant_2_id") or ""
+        fields = {"participant_ids": sorted([p1, p2])}
+        pair_key = private_pair_key(p1, p2)
+        if pair_key not in taken:
+            fields["pair_key"] = pair_key
+            taken.add(pair_key)
+        ops.append(update_op({"id": conv["id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            await write()
+    await write()
+    if updated:
+        logger.info(f"[MP] {updated} conversation(s) privée(s) indexée(s) par paire")
+    return updated
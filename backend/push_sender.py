@@ -0,0 +1,152 @@
+"""
+PUSH SENDER - Envoi Web Push asynchrone et concurrent
+- L'envoi HTTPS (pywebpush) tourne dans un pool de threads dédié: la boucle
+  asyncio (chat, Socket.IO) n'est plus bloquée pendant l'aller-retour.
+- Le JWT VAPID est signé une fois par origine de push service (audience)
+  puis réutilisé jusqu'à son expiration.
+- Fan-out multi-appareils: tous les endpoints d'un participant, en parallèle.
+- Les endpoints expirés (404/410) sont remontés pour désactivation en bloc.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+VAPID_TOKEN_TTL = 12 * 3600       # Durée de vie d'un JWT VAPID (max 24h)
+VAPID_RENEW_MARGIN = 10 * 60      # Renouveler 10 min avant expiration
+PUSH_MESSAGE_TTL = 86400          # TTL du message côté push service
+PUSH_MAX_CONCURRENCY = 32
+EXPIRED_STATUS_CODES = (404, 410)
+
+
+def audience_of(endpoint: str) -> str:
+    """Origine (scheme://host) d'un endpoint push = audience du JWT VAPID."""
+    parsed = urlparse(endpoint)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _py_vapid_signer(private_key: str) -> Callable[[dict], Dict[str, str]]:
+    """Signer par défaut basé sur py_vapid (dépendance de pywebpush)."""
+    from py_vapid import Vapid
+    if os.path.isfile(private_key):
+        vapid = Vapid.from_file(private_key_file=private_key)
+    else:
+        vapid = Vapid.from_string(private_key=private_key)
+    return vapid.sign
+
+
+def _pywebpush_transport(subscription_info: dict, payload: str, headers: Dict[str, str], ttl: int) -> int:
+    """Transport par défaut: chiffrement + POST via pywebpush. Retourne le status HTTP."""
+    from pywebpush import WebPusher
+    response = WebPusher(subscription_info).send(
+        data=payload, headers=headers, ttl=ttl, content_encoding="aes128gcm", timeout=10
+    )
+    return response.status_code
+
+
+class VapidTokenCache:
+    """
+    Cache des en-têtes VAPID signés, par audience (origine du push service).
+    Un seul JWT par origine (FCM, Mozilla, Apple...) au lieu d'un par envoi.
+    """
+
+    def __init__(self, private_key: str, claims_email: str, signer: Callable = None,
+                 token_ttl: int = VAPID_TOKEN_TTL, clock: Callable[[], float] = time.time):
+        self.claims_sub = f"mailto:{claims_email}"
+        self.token_ttl = token_ttl
+        self._private_key = private_key
+        self._signer = signer
+        self._clock = clock
+        self._tokens: Dict[str, Tuple[Dict[str, str], float]] = {}
+        self._lock = threading.Lock()
+        self.signatures = 0
+
+    def headers_for(self, endpoint: str) -> Dict[str, str]:
+        """En-têtes Authorization VAPID pour un endpoint (copie, réutilisable)."""
+        aud = audience_of(endpoint)
+        with self._lock:
+            now = self._clock()
+            cached = self._tokens.get(aud)
+            if cached and cached[1] - VAPID_RENEW_MARGIN > now:
+                return dict(cached[0])
+            if self._signer is None:
+                self._signer = _py_vapid_signer(self._private_key)
+            exp = int(now) + self.token_ttl
+            headers = self._signer({"sub": self.claims_sub, "aud": aud, "exp": exp})
+            self.signatures += 1
+            self._tokens[aud] = (dict(headers), exp)
+            return dict(headers)
+
+
+@dataclass
+class PushReport:
+    """Résultat d'un fan-out push."""
+    sent: int = 0
+    failed: int = 0
+    expired_endpoints: List[str] = field(default_factory=list)
+
+    @property
+    def delivered(self) -> bool:
+        return self.sent > 0
+
+
+class AsyncPushSender:
+    """
+    Envoi concurrent de notifications push, sans bloquer la boucle asyncio.
+    transport(subscription_info, payload, headers, ttl) -> status HTTP
+    """
+
+    def __init__(self, vapid_cache: VapidTokenCache, transport: Callable = None,
+                 max_concurrency: int = PUSH_MAX_CONCURRENCY, ttl: int = PUSH_MESSAGE_TTL):
+        self.vapid_cache = vapid_cache
+        self.transport = transport or _pywebpush_transport
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="webpush")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._max_concurrency = max_concurrency
+
+    def _send_one_sync(self, subscription_info: dict, payload: str) -> int:
+        headers = self.vapid_cache.headers_for(subscription_info["endpoint"])
+        return self.transport(subscription_info, payload, headers, self.ttl)
+
+    async def _send_one(self, subscription_info: dict, payload: str) -> Tuple[str, Optional[int], Optional[str]]:
+        endpoint = subscription_info.get("endpoint", "")
+        async with self._semaphore:
+            try:
+                loop = asyncio.get_running_loop()
+                status = await loop.run_in_executor(self._executor, self._send_one_sync, subscription_info, payload)
+                return endpoint, status, None
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                return endpoint, status, str(e)
+
+    async def send_many(self, subscriptions: List[dict], payload: str) -> PushReport:
+        """Envoie le même payload à toutes les souscriptions, en parallèle."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        report = PushReport()
+        targets = [s for s in subscriptions if s and s.get("endpoint")]
+        if not targets:
+            return report
+        outcomes = await asyncio.gather(*(self._send_one(s, payload) for s in targets))
+        for endpoint, status, error in outcomes:
+            if status in EXPIRED_STATUS_CODES:
+                report.expired_endpoints.append(endpoint)
+                report.failed += 1
+            elif error is None and status is not None and status < 300:
+                report.sent += 1
+            else:
+                report.failed += 1
+                logger.error(f"[PUSH] Echec {endpoint[:40]}...: {error or f'HTTP {status}'}")
+        return report
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
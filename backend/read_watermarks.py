@@ -0,0 +1,63 @@
+"""
+READ WATERMARKS - Marqueurs de lecture par (lecteur, conversation)
+Remplace le basculement message par message des flags notified / is_read:
+marquer un historique de 5000 messages comme lu = UNE petite écriture.
+Les non-lus se déduisent d'un comptage indexé sur created_at > watermark.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = "*"  # Watermark "tout lu" d'un lecteur (toutes conversations)
+
+
+def private_scope(conversation_id: str) -> str:
+    """Scope d'une conversation privée (MP)."""
+    return f"pm:{conversation_id}"
+
+
+def effective_watermark(watermarks: Dict[str, str], scope: str) -> Optional[str]:
+    """Watermark applicable à un scope = max(watermark global, watermark du scope)."""
+    candidates = [w for w in (watermarks.get(GLOBAL_SCOPE), watermarks.get(scope)) if w]
+    return max(candidates) if candidates else None
+
+
+def is_unread(created_at: Optional[str], watermark: Optional[str]) -> bool:
+    return not watermark or (created_at or "") > watermark
+
+
+class ReadWatermarkStore:
+    """
+    Collection read_watermarks: { reader_id, scope, last_read_at, updated_at }
+    Index unique (reader_id, scope). last_read_at ne recule jamais ($max).
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("reader_id", 1), ("scope", 1)], unique=True)
+
+    async def advance(self, reader_id: str, scope: str, read_at: Optional[str] = None) -> str:
+        """Avance le watermark (jamais en arrière). Une seule écriture upsert."""
+        read_at = read_at or datetime.now(timezone.utc).isoformat()
+        await self.collection.update_one(
+            {"reader_id": reader_id, "scope": scope},
+            {"$max": {"last_read_at": read_at}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+        return read_at
+
+    async def get_many(self, reader_id: str, scopes: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Watermarks d'un lecteur {scope: last_read_at} (inclut toujours le scope global)."""
+        query = {"reader_id": reader_id}
+        if scopes is not None:
+            query["scope"] = {"$in": list(set(scopes) | {GLOBAL_SCOPE})}
+        docs = await self.collection.find(query, {"_id": 0, "scope": 1, "last_read_at": 1}).to_list(None)
+        return {d["scope"]: d.get("last_read_at") for d in docs}
+
+    async def get(self, reader_id: str, scope: str) -> Optional[str]:
+        return effective_watermark(await self.get_many(reader_id, [scope]), scope)
@@ -0,0 +1,161 @@
+"""
+RESPONSE CACHE - Réponses GET mémorisées + ETag / requêtes conditionnelles
+Pour les endpoints catalogue / config relus à chaque chargement de page:
+- corps JSON sérialisé une seule fois et gardé en mémoire (par clé)
+- ETag = hash du contenu, If-None-Match -> 304 sans corps
+- Cache-Control "no-cache": le navigateur garde la réponse et revalide
+- invalidé par les handlers PUT/POST/DELETE correspondants (+ TTL de sécurité)
+- max_entries optionnel (clés nombreuses, ex. une page par slug): éviction LRU
+- verrous par clé retirés dès qu'aucune requête ne les utilise sans entrée mémorisée
+  (slugs inconnus / build() en erreur: pas de croissance sans borne)
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import fast_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_CONTROL = "no-cache"
+RESPONSE_CACHE_TTL = 300  # Filet de sécurité si une écriture contourne l'invalidation
+
+
+def dump_json(data: Any) -> bytes:
+    """Même encodage que JSONResponse (compact, UTF-8), via orjson si disponible."""
+    return fast_json.dumps(data)
+
+
+def compute_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match: liste d'ETags (faibles acceptés) ou '*'."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+    media_type: str
+    cache_control: str
+    built_at: float
+
+
+class ResponseCache:
+    """{ clé: CachedBody } avec reconstruction unique par clé (verrou)."""
+
+    def __init__(self, ttl_seconds: float = RESPONSE_CACHE_TTL, clock: Callable[[], float] = time.monotonic,
+                 max_entries: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: Dict[str, CachedBody] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}  # requêtes en attente / en cours sur le verrou
+        self._generation: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def _fresh(self, key: str) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry and self._clock() - entry.built_at <= self.ttl_seconds:
+            if self.max_entries:
+                self._entries[key] = self._entries.pop(key)  # plus récemment utilisée en fin
+            return entry
+        return None
+
+    def _store(self, key: str, entry: CachedBody):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        if self.max_entries:
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                del self._entries[oldest]
+                self._drop_lock(oldest)
+                self.evictions += 1
+
+    def _drop_lock(self, key: str):
+        if not self._lock_users.get(key):
+            self._locks.pop(key, None)
+
+    async def entry(self, key: str, build: Callable[[], Awaitable[bytes]],
+                    media_type: str = "application/json",
+                    cache_control: str = DEFAULT_CACHE_CONTROL) -> CachedBody:
+        """Corps mémorisé de `key`, construit par build() au premier appel / après invalidation."""
+        entry = self._fresh(key)
+        if entry:
+            self.hits += 1
+            return entry
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                entry = self._fresh(key)
+                if entry:
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+                generation = self._generation.get(key, 0)
+                body = await build()
+                entry = CachedBody(body, compute_etag(body), media_type, cache_control, self._clock())
+                # Invalidé pendant la construction: servir sans mémoriser (donnée peut-être périmée)
+                if self._generation.get(key, 0) == generation:
+                    self._store(key, entry)
+                return entry
+        finally:
+            users = self._lock_users.pop(key) - 1
+            if users:
+                self._lock_users[key] = users
+            elif key not in self._entries:
+                self._drop_lock(key)  # build() en erreur ou non mémorisé: verrou inutile
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+            self._generation[key] = self._generation.get(key, 0) + 1
+
+    async def serve(self, request, key: str, producer: Callable[[], Awaitable[Any]],
+                    serialize: Callable[[Any], bytes] = dump_json,
+                    media_type: str = "application/json",
+                    cache_control: str = DEFAULT_CACHE_CONTROL):
+        """Réponse HTTP (200 avec corps mémorisé, ou 304 si l'ETag du client correspond)."""
+        from starlette.responses import Response
+
+        async def build() -> bytes:
+            return serialize(await producer())
+
+        entry = await self.entry(key, build, media_type, cache_control)
+        headers = {"ETag": entry.etag, "Cache-Control": entry.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "locks": len(self._locks),
+        }
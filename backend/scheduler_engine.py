@@ -12,6 +12,9 @@ import requests
 from datetime import datetime, timezone
 import logging
 
+import campaign_email
+from message_sequence import next_seq_sync
+
 logger = logging.getLogger("scheduler_engine")
 
 PARIS_TZ = pytz.timezone('Europe/Paris')
@@ -99,6 +102,9 @@ def store_scheduled_message(scheduler_db, session_id, message_text, mode="commun
         if campaign_name:
             message["campaign_name"] = campaign_name
         
+        # Numéro de séquence monotone de la session (sync par after_seq)
+        message["seq"] = next_seq_sync(scheduler_db, session_id)
+        
         # INSERTION EN DB - POINT DE VÉRITÉ
         result = scheduler_db.chat_messages.insert_one(message)
         
@@ -296,28 +302,52 @@ def send_group_message(scheduler_db, target_group_id, message_text,
         return False, str(e), None
 
 
-def send_email(to_email, to_name, subject, message, media_url=None):
-    """Envoi email via l'API interne."""
+def send_campaign_emails(scheduler_db, entries, subject, message, media_url=None,
+                         cta_text=None, cta_link=None):
+    """
+    Envoi email DIRECT via le batch Resend (plus de boucle HTTP vers notre API).
+    Le template est compilé une fois, chaque destinataire ne coûte qu'un rendu.
+    entries = résultats campagne ({contactEmail, contactName, ...}) mis à jour en place.
+    
+    Returns:
+        (success_count, fail_count)
+    """
+    api_key = os.environ.get('RESEND_API_KEY', '')
+    if not api_key:
+        for entry in entries:
+            entry["status"] = "failed"
+            entry["error"] = "Resend non configuré"
+        return 0, len(entries)
+    
     try:
-        response = requests.post(
-            "http://localhost:8001/api/campaigns/send-email",
-            json={
-                "to_email": to_email,
-                "to_name": to_name,
-                "subject": subject,
-                "message": message,
-                "media_url": media_url
-            },
-            timeout=30
+        media_link = None
+        slug = campaign_email.extract_media_slug(media_url)
+        if slug:
+            media_link = scheduler_db.media_links.find_one({"slug": slug.lower()}, {"_id": 0})
+        click_url, thumbnail_url = campaign_email.resolve_media(media_url, media_link)
+        template = campaign_email.CampaignEmailTemplate(
+            subject=subject,
+            message=message,
+            media_html=campaign_email.build_media_html(click_url, thumbnail_url),
+            cta_html=campaign_email.build_cta_html(cta_text, cta_link)
         )
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("success"):
-                return True, None
-            return False, result.get("error", "Unknown error")
-        return False, f"HTTP {response.status_code}"
+        emails = [template.build_email(e["contactEmail"], e.get("contactName")) for e in entries]
+        batch_results = campaign_email.send_batch(emails, api_key)
     except Exception as e:
-        return False, str(e)
+        batch_results = [{"success": False, "error": str(e)} for _ in entries]
+    
+    success_count = 0
+    for entry, outcome in zip(entries, batch_results):
+        if outcome.get("success"):
+            entry["status"] = "sent"
+            entry["error"] = None
+            success_count += 1
+        else:
+            entry["status"] = "failed"
+            entry["error"] = outcome.get("error", "Unknown error")
+    
+    print(f"[EMAIL] 📧 Batch Resend: {success_count}/{len(entries)} envoyé(s)")
+    return success_count, len(entries) - success_count
 
 
 def send_whatsapp(to_phone, message, media_url=None):
@@ -511,33 +541,23 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                 else:
                     contacts = list(scheduler_db.users.find({"id": {"$in": selected_contacts}}, {"_id": 0}))
                 
+                pending_emails = []
                 for contact in contacts:
                     contact_email = contact.get("email", "")
                     contact_phone = contact.get("whatsapp", "")
                     contact_name = contact.get("name", "")
                     
                     if channels.get("email") and contact_email:
-                        try:
-                            success, error = send_email(
-                                to_email=contact_email,
-                                to_name=contact_name,
-                                subject=f"📢 {campaign_name}",
-                                message=message,
-                                media_url=media_url if media_url else None
-                            )
-                            results.append({
-                                "contactEmail": contact_email,
-                                "channel": "email",
-                                "status": "sent" if success else "failed",
-                                "error": error if not success else None,
-                                "sentAt": now_utc.isoformat()
-                            })
-                            if success:
-                                success_count += 1
-                            else:
-                                fail_count += 1
-                        except:
-                            fail_count += 1
+                        email_result = {
+                            "contactEmail": contact_email,
+                            "contactName": contact_name,
+                            "channel": "email",
+                            "status": "pending",
+                            "error": None,
+                            "sentAt": now_utc.isoformat()
+                        }
+                        results.append(email_result)
+                        pending_emails.append(email_result)
                     
                     if channels.get("whatsapp") and contact_phone:
                         try:
@@ -560,6 +580,20 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                         except:
                             fail_count += 1
                 
+                # Emails collectés -> un seul template, envoi batch
+                if pending_emails:
+                    sent, failed = send_campaign_emails(
+                        scheduler_db,
+                        pending_emails,
+                        subject=f"📢 {campaign_name}",
+                        message=message,
+                        media_url=media_url if media_url else None,
+                        cta_text=cta_text,
+                        cta_link=cta_link
+                    )
+                    success_count += sent
+                    fail_count += failed
+                
                 # Mise à jour finale
                 new_sent_dates = list(set(sent_dates + dates_to_process))
                 all_dates_done = set(new_sent_dates) >= set(scheduled_dates)
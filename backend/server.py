@@ -1,6 +1,6 @@
 # VERSION 7.0 - PRODUCTION READY - NE PAS MODIFIER login/tri/sync
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -12,32 +12,72 @@ from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import stripe
 import asyncio
 import json
 import socketio
 
-# Web Push imports
-try:
-    from pywebpush import webpush, WebPushException
-    WEBPUSH_AVAILABLE = True
-except ImportError:
-    WEBPUSH_AVAILABLE = False
-    logger = logging.getLogger(__name__)
-    logger.warning("pywebpush not installed - push notifications disabled")
-
-# Resend import
-try:
-    import resend
-    RESEND_AVAILABLE = True
-except ImportError:
-    RESEND_AVAILABLE = False
+from lazy_imports import LazyModule, module_available
+
+# Intégrations optionnelles: présence vérifiée sans import, chargées au premier usage
+# Web Push (pywebpush importé par push_sender dans son pool de threads)
+WEBPUSH_AVAILABLE = module_available("pywebpush")
+if not WEBPUSH_AVAILABLE:
+    logging.getLogger(__name__).warning("pywebpush not installed - push notifications disabled")
+
+# Resend
+RESEND_AVAILABLE = module_available("resend")
+
+from push_sender import AsyncPushSender, VapidTokenCache, PushReport
+from notification_hub import (
+    UnreadNotificationHub, COACH_ROOM as COACH_NOTIFICATION_ROOM, SENDERS_BY_TARGET, READER_BY_TARGET
+)
+from read_watermarks import ReadWatermarkStore, GLOBAL_SCOPE, private_scope, effective_watermark, is_unread
+from message_cache import SessionMessageCache
+from message_pages import clamp_page_size, keyset_filter, build_page, encode_cursor
+from response_cache import ResponseCache, etag_matches
+from media_handler import extract_youtube_id, classify_urls, get_media_type
+from identity import IdentityIndex
+from phone_index import (
+    with_phone_index, find_caller, normalize_phone, ensure_indexes as ensure_phone_indexes,
+    backfill as backfill_phone_index
+)
+from whatsapp_memory import WhatsAppConversations
+from private_conversations import (
+    private_pair_key, get_or_create as get_or_create_private_conversation,
+    ensure_indexes as ensure_private_conversation_indexes, backfill_keys as backfill_private_conversation_keys
+)
+from media_counters import ViewCounter, SCOPE_CAMPAIGN, SCOPE_LINK
+from og_pages import (
+    HTML_MEDIA_TYPE, SITE_URL, OG_PAGE_CACHE_ENTRIES, cache_keys as og_cache_keys,
+    render_og_page, render_share_page, render_viewer_page
+)
+from fast_json import dumps as fast_dumps, project_rows, trusted_response
+from settings_cache import (
+    SettingsCache, AI_CONFIG, COACH_AUTH, FEATURE_FLAGS, WHATSAPP_CONFIG, coach_subscription
+)
+from message_sequence import (
+    next_seq, plan_delta, parse_cursor_map, backfill_sequences, max_seq, GAP_GRACE_SECONDS,
+    is_broadcast, merge_timelines, publish_broadcast, migrate_broadcasts, ensure_broadcast_indexes
+)
+from image_pipeline import ImagePipeline, PipelineBusy, InvalidImage
+from upload_gc import UploadSweeper, record_upload, forget_uploads, PHOTO_FIELDS, REFERENCE_COLLECTIONS
+from media_storage import storage_from_env, LocalDiskStorage, IMMUTABLE_CACHE_CONTROL
+from media_migration import migrate_local_media
+from emoji_registry import COACH_EMOJI_PREFIX, EmojiRegistry, SPRITE_CACHE_CONTROL
+from upload_intake import (
+    UploadSizeLimitMiddleware, read_upload, read_bytes, base64_limit, UploadTooLarge, UnsupportedImage,
+    MAX_PHOTO_BYTES, MAX_EMOJI_BYTES, MULTIPART_OVERHEAD
+)
+from campaign_email import (
+    CampaignEmailTemplate, send_batch as send_email_batch, extract_media_slug, resolve_media,
+    build_media_html, build_cta_html, FRONTEND_BASE_URL as EMAIL_FRONTEND_BASE_URL
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Stripe configuration - utilise la variable d'environnement existante
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+# Stripe configuration - utilise la variable d'environnement existante (clé posée au premier import)
+stripe = LazyModule("stripe", configure=lambda module: setattr(module, "api_key", os.environ.get('STRIPE_SECRET_KEY')))
 
 # VAPID configuration for Web Push
 VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY', '')
@@ -46,8 +86,7 @@ VAPID_CLAIMS_EMAIL = os.environ.get('VAPID_CLAIMS_EMAIL', 'contact@afroboost.ch'
 
 # Resend configuration
 RESEND_API_KEY = os.environ.get('RESEND_API_KEY', '')
-if RESEND_AVAILABLE and RESEND_API_KEY:
-    resend.api_key = RESEND_API_KEY
+resend = LazyModule("resend", configure=lambda module: setattr(module, "api_key", RESEND_API_KEY or None))
 
 # TWILIO CONFIGURATION
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', '')
@@ -68,7 +107,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 # Créer l'application FastAPI (interne)
-fastapi_app = FastAPI(title="Afroboost API")
+fastapi_app = FastAPI(title="Afroboost API", default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # SOCKET.IO CONFIGURATION
@@ -140,6 +179,130 @@ async def emit_new_message(session_id: str, message_data: dict):
         await sio.emit('message_received', message_data, room=session_id)
         logger.info(f"[SOCKET.IO] Message émis dans session {session_id}")
 
+# ==================== NOTIFICATIONS NON LUES (PUSH TEMPS RÉEL) ====================
+# Compteurs maintenus par les chemins d'écriture -> plus de polling toutes les 10s
+notification_hub = UnreadNotificationHub(db.notification_counters)
+# Watermarks de lecture: "tout lu" = une écriture, plus de update_many sur les messages
+read_watermarks = ReadWatermarkStore(db.read_watermarks)
+# Derniers messages des sessions actives (historique IA, entrée chat, sync)
+message_cache = SessionMessageCache()
+# Réponses catalogue / config mémorisées (ETag + 304), invalidées par les écritures
+response_cache = ResponseCache()
+# Pages de partage OpenGraph par slug (bornées: un slug par lien média)
+og_page_cache = ResponseCache(max_entries=OG_PAGE_CACHE_ENTRIES)
+# Contacts (participants chat, utilisateurs) résolus par email / téléphone / nom normalisés
+contact_identities = IdentityIndex(db, "chat_participants", scope="participant")
+user_identities = IdentityIndex(db, "users", scope="user")
+# Vues / clics des liens média: agrégés en mémoire, bulk_write + rollups toutes les 5s
+view_counter = ViewCounter(db)
+# Documents de configuration singleton (ai_config, coach_auth, feature_flags...)
+settings_cache = SettingsCache(db)
+
+def trusted_serializer(model, many: bool = True):
+    """Documents DB -> JSON au format du response_model, sans re-validation Pydantic."""
+    if many:
+        return lambda docs: fast_dumps(project_rows(model, docs))
+    return lambda doc: fast_dumps(project_rows(model, [doc])[0])
+
+@sio.event
+async def subscribe_notifications(sid, data):
+    """
+    Un client s'abonne aux compteurs non lus.
+    data = { "target": "coach" } ou { "target": "client", "session_id": "xxx" }
+    """
+    data = data or {}
+    target = data.get("target", "coach")
+    session_id = data.get("session_id")
+    if target == "coach":
+        await sio.enter_room(sid, COACH_NOTIFICATION_ROOM)
+    elif session_id:
+        await sio.enter_room(sid, session_id)
+    await sio.emit('unread_update', notification_hub.snapshot(target, session_id), room=sid)
+
+async def emit_unread_update(targets, session_id: str = None, message: dict = None):
+    """Pousse l'état non-lu aux abonnés concernés (room coach et/ou room de la session)."""
+    try:
+        if any(t in ("coach", "coach_ai") for t in targets):
+            payload = notification_hub.snapshot("coach")
+            if message:
+                payload["message"] = message
+            await sio.emit('unread_update', payload, room=COACH_NOTIFICATION_ROOM)
+        if "client" in targets and session_id:
+            payload = notification_hub.snapshot("client", session_id)
+            if message:
+                payload["message"] = message
+            await sio.emit('unread_update', payload, room=session_id)
+    except Exception as e:
+        logger.warning(f"[NOTIF-HUB] Emission unread_update échouée: {e}")
+
+async def recount_session_unread(session_id: str, targets=("coach", "coach_ai", "client")):
+    """
+    Recalcule les compteurs d'une session par comptage indexé
+    (session_id, sender_type, created_at > watermark) et les pousse aux abonnés.
+    """
+    readers = {READER_BY_TARGET[t] for t in targets}
+    marks = {reader: await read_watermarks.get_many(reader, [session_id]) for reader in readers}
+    for target in targets:
+        query = {
+            "session_id": session_id,
+            "sender_type": {"$in": list(SENDERS_BY_TARGET[target])},
+            "is_deleted": {"$ne": True},
+            "notified": {"$ne": True}  # Messages déjà notifiés avant les watermarks
+        }
+        watermark = effective_watermark(marks[READER_BY_TARGET[target]], session_id)
+        if watermark:
+            query["created_at"] = {"$gt": watermark}
+        count = await db.chat_messages.count_documents(query)
+        await notification_hub.set_count(target, session_id, count)
+    await emit_unread_update(list(targets), session_id)
+
+async def store_chat_message(message: dict) -> dict:
+    """
+    Insère un message dans chat_messages avec son seq monotone de session
+    (+ timeline broadcast pour les messages de groupe), puis met à jour les
+    compteurs non-lus. Complète `message` (seq) en place.
+    """
+    message["seq"] = await next_seq(db, message["session_id"])
+    await db.chat_messages.insert_one(dict(message))
+    message_cache.append(message)
+    if is_broadcast(message):
+        await publish_broadcast(db, message)
+    await record_unread_message(message)
+    return message
+
+async def _load_recent_messages(session_id: str, limit: int) -> list:
+    """Derniers messages d'une session (supprimés compris), ordre chronologique."""
+    rows = await db.chat_messages.find(
+        {"session_id": session_id}, {"_id": 0}
+    ).sort([("seq", -1), ("created_at", -1)]).to_list(limit)
+    rows.reverse()
+    return rows
+
+async def recent_session_messages(session_id: str, n: int) -> list:
+    """n derniers messages non supprimés (chronologique): cache LRU, sinon DB."""
+    rows = await message_cache.recent(session_id, n, lambda limit: _load_recent_messages(session_id, limit))
+    if rows is None:
+        rows = await db.chat_messages.find(
+            {"session_id": session_id, "is_deleted": {"$ne": True}}, {"_id": 0}
+        ).sort("created_at", -1).to_list(n)
+        rows.reverse()
+    return rows
+
+# Conversations WhatsApp: session persistée par numéro + historique borné pour l'IA
+whatsapp_conversations = WhatsAppConversations(db, store_chat_message, recent_session_messages)
+
+async def record_unread_message(message: dict):
+    """À appeler après chaque insertion dans chat_messages (compteur + push)."""
+    try:
+        session_id = message.get("session_id")
+        targets = await notification_hub.record_message(session_id, message.get("sender_type"))
+        if targets:
+            preview = {k: message.get(k) for k in ("id", "session_id", "sender_name", "sender_type", "created_at")}
+            preview["content"] = (message.get("content") or "")[:200]
+            await emit_unread_update(targets, session_id, preview)
+    except Exception as e:
+        logger.warning(f"[NOTIF-HUB] Enregistrement message échoué: {e}")
+
 # ==================== PRIVATE MESSAGE SOCKET.IO ====================
 @sio.event
 async def join_private_conversation(sid, data):
@@ -296,27 +459,53 @@ async def api_favicon():
     from starlette.responses import Response
     return Response(status_code=204)
 
-# === FICHIERS STATIQUES EMOJIS ===
-# Créer le dossier emojis s'il n'existe pas
+# === STOCKAGE DES MÉDIAS (emojis, photos de profil) ===
+# MEDIA_STORAGE=local (défaut): dossiers servis par StaticFiles
+# MEDIA_STORAGE=s3: bucket S3 compatible, les clients téléchargent sans passer par l'API
 EMOJIS_DIR = ROOT_DIR / "uploads" / "emojis"
-EMOJIS_DIR.mkdir(parents=True, exist_ok=True)
-
-# Monter les fichiers statiques pour les emojis
-try:
-    fastapi_app.mount("/api/emojis", StaticFiles(directory=str(EMOJIS_DIR)), name="emojis")
-    logger.info(f"[EMOJIS] Dossier monté: {EMOJIS_DIR}")
-except Exception as e:
-    logger.warning(f"[EMOJIS] Impossible de monter le dossier: {e}")
-
-# Monter les fichiers statiques pour les photos de profil
-try:
-    import os
-    UPLOADS_DIR = "/app/backend/uploads/profiles"
-    os.makedirs(UPLOADS_DIR, exist_ok=True)
-    fastapi_app.mount("/api/uploads/profiles", StaticFiles(directory=UPLOADS_DIR), name="profile_photos")
-    logger.info(f"[UPLOADS] Dossier photos de profil monté: {UPLOADS_DIR}")
-except Exception as e:
-    logger.warning(f"[UPLOADS] Impossible de monter le dossier: {e}")
+UPLOADS_DIR = "/app/backend/uploads/profiles"
+emoji_storage = storage_from_env("emojis", str(EMOJIS_DIR), "/api/emojis")
+profile_storage = storage_from_env("profiles", UPLOADS_DIR, "/api/uploads/profiles")
+# Manifeste des emojis (versionné) + planche de sprites pour le sélecteur
+emoji_registry = EmojiRegistry(emoji_storage)
+
+# Zones de médias: montage local, et URLs stockées en DB à migrer lors d'une bascule S3
+MEDIA_AREAS = (
+    (emoji_storage, str(EMOJIS_DIR), "/api/emojis", "emojis", {"custom_emojis": ("image_url",)}, None),
+    (profile_storage, UPLOADS_DIR, "/api/uploads/profiles", "profile_photos",
+     {name: PHOTO_FIELDS for name in REFERENCE_COLLECTIONS}, IMMUTABLE_CACHE_CONTROL),
+)
+
+
+def _storage_redirect(storage):
+    async def redirect_media(key: str):
+        """URLs locales (tags [emoji:fichier], photos gardées en cache client): redirection vers le stockage."""
+        try:
+            target = storage.url(key)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Fichier introuvable")
+        from fastapi.responses import RedirectResponse
+        return RedirectResponse(url=target, status_code=302, headers={"Cache-Control": "public, max-age=86400"})
+    return redirect_media
+
+
+# Monter les fichiers statiques (stockage local); sinon redirection des anciennes URLs
+for _storage, _directory, _mount_path, _mount_name, _, _ in MEDIA_AREAS:
+    if _storage.local_directory:
+        try:
+            fastapi_app.mount(_mount_path, StaticFiles(directory=_storage.local_directory), name=_mount_name)
+            logger.info(f"[UPLOADS] Dossier monté: {_storage.local_directory} -> {_mount_path}")
+        except Exception as e:
+            logger.warning(f"[UPLOADS] Impossible de monter le dossier: {e}")
+    else:
+        api_router.add_api_route(f"{_mount_path.removeprefix('/api')}/{{key}}", _storage_redirect(_storage),
+                                 methods=["GET"], include_in_schema=False)
+        logger.info(f"[UPLOADS] {_mount_name}: stockage {_storage.name}, {_mount_path} redirigé")
+
+# Photos de profil: variantes 48/96/200 (WebP + JPEG) produites dans un pool de processus
+avatar_pipeline = ImagePipeline(profile_storage)
+# Fichiers de profil non référencés (users, chat_participants, profile_uploads): supprimés après 24h de grâce
+upload_sweeper = UploadSweeper(db, profile_storage)
 
 # ==================== MODELS ====================
 
@@ -758,6 +947,7 @@ class EnhancedChatMessage(BaseModel):
     notified: bool = False  # Pour les notifications coach/client
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     deleted_at: Optional[str] = None
+    seq: Optional[int] = None  # Séquence monotone par session (attribuée à l'insertion)
 
 class EnhancedChatMessageCreate(BaseModel):
     session_id: str
@@ -795,6 +985,8 @@ class PrivateConversation(BaseModel):
     participant_1_name: str
     participant_2_id: str
     participant_2_name: str
+    pair_key: Optional[str] = None  # Paire triée "id_a|id_b" (index unique)
+    participant_ids: List[str] = []  # Multikey pour lister les conversations d'un participant
     last_message: Optional[str] = None
     last_message_at: Optional[str] = None
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
@@ -809,9 +1001,17 @@ def format_message_for_frontend(m: dict) -> dict:
         "senderId": m.get("sender_id") or m.get("senderId", ""), "sender_type": m.get("sender_type", "ai"),
         "created_at": m.get("created_at"), "media_url": m.get("media_url"), "media_type": m.get("media_type"),
         "cta_type": m.get("cta_type"), "cta_text": m.get("cta_text"), "cta_link": m.get("cta_link"),
-        "broadcast": m.get("broadcast", False), "scheduled": m.get("scheduled", False)
+        "broadcast": m.get("broadcast", False), "scheduled": m.get("scheduled", False), "seq": m.get("seq")
     }
 
+def format_messages_for_frontend(messages: List[dict]) -> List[dict]:
+    """Historique formaté; media_type des médias sans type (anciens messages) classifié par lot."""
+    formatted = [format_message_for_frontend(m) for m in messages]
+    untyped = [row for row in formatted if row["media_url"] and not row["media_type"]]
+    for row, media in zip(untyped, classify_urls(row["media_url"] for row in untyped)):
+        row["media_type"] = media["type"]
+    return formatted
+
 # ==================== ROUTES ====================
 
 @api_router.get("/")
@@ -820,7 +1020,10 @@ async def root():
 
 # --- Courses ---
 @api_router.get("/courses", response_model=List[Course])
-async def get_courses():
+async def get_courses(request: Request):
+    return await response_cache.serve(request, "courses", _load_courses, trusted_serializer(Course))
+
+async def _load_courses():
     # EXCLURE les cours archivés de la liste
     courses_raw = await db.courses.find({"archived": {"$ne": True}}, {"_id": 0}).to_list(100)
     if not courses_raw:
@@ -833,20 +1036,18 @@ async def get_courses():
         courses_raw = default_courses
     
     # === FIX: Ajouter "location" comme alias de "locationName" pour le frontend ===
-    # Créer une copie des cours pour ajouter le champ location
-    courses = []
+    # Documents fraîchement lus: modifiés sur place (la projection produit la copie)
     for course in courses_raw:
-        course_copy = dict(course)
-        if "locationName" in course_copy:
-            course_copy["location"] = course_copy["locationName"]
-        courses.append(course_copy)
+        if "locationName" in course:
+            course["location"] = course["locationName"]
     
-    return courses
+    return courses_raw
 
 @api_router.post("/courses", response_model=Course)
 async def create_course(course: CourseCreate):
     course_obj = Course(**course.model_dump())
     await db.courses.insert_one(course_obj.model_dump())
+    response_cache.invalidate("courses")
     return course_obj
 
 @api_router.put("/courses/{course_id}", response_model=Course)
@@ -861,6 +1062,7 @@ async def update_course(course_id: str, course_update: dict):
     update_data = {k: v for k, v in course_update.items() if v is not None}
     
     await db.courses.update_one({"id": course_id}, {"$set": update_data})
+    response_cache.invalidate("courses")
     updated = await db.courses.find_one({"id": course_id}, {"_id": 0})
     return updated
 
@@ -868,6 +1070,7 @@ async def update_course(course_id: str, course_update: dict):
 async def archive_course(course_id: str):
     """Archive a course instead of deleting it"""
     await db.courses.update_one({"id": course_id}, {"$set": {"archived": True}})
+    response_cache.invalidate("courses")
     updated = await db.courses.find_one({"id": course_id}, {"_id": 0})
     return {"success": True, "course": updated}
 
@@ -886,6 +1089,7 @@ async def delete_course(course_id: str):
     # 1. Supprimer le cours (y compris les archivés)
     result = await db.courses.delete_one({"id": course_id})
     deleted_counts["course"] = result.deleted_count
+    response_cache.invalidate("courses")
     
     # 2. Supprimer TOUTES les réservations liées à ce cours
     result = await db.reservations.delete_many({"courseId": course_id})
@@ -932,6 +1136,7 @@ async def purge_archived_courses():
     
     # Supprimer les cours archivés
     deleted_courses = await db.courses.delete_many({"archived": True})
+    response_cache.invalidate("courses")
     
     # Supprimer les réservations liées
     deleted_reservations = await db.reservations.delete_many({"courseId": {"$in": archived_ids}})
@@ -956,7 +1161,10 @@ async def purge_archived_courses():
 
 # --- Offers ---
 @api_router.get("/offers", response_model=List[Offer])
-async def get_offers():
+async def get_offers(request: Request):
+    return await response_cache.serve(request, "offers", _load_offers, trusted_serializer(Offer))
+
+async def _load_offers():
     offers = await db.offers.find({}, {"_id": 0}).to_list(100)
     if not offers:
         default_offers = [
@@ -972,11 +1180,13 @@ async def get_offers():
 async def create_offer(offer: OfferCreate):
     offer_obj = Offer(**offer.model_dump())
     await db.offers.insert_one(offer_obj.model_dump())
+    response_cache.invalidate("offers")
     return offer_obj
 
 @api_router.put("/offers/{offer_id}", response_model=Offer)
 async def update_offer(offer_id: str, offer: OfferCreate):
     await db.offers.update_one({"id": offer_id}, {"$set": offer.model_dump()})
+    response_cache.invalidate("offers")
     updated = await db.offers.find_one({"id": offer_id}, {"_id": 0})
     return updated
 
@@ -985,6 +1195,7 @@ async def delete_offer(offer_id: str):
     """Supprime une offre et nettoie les références dans les codes promo"""
     # 1. Supprimer l'offre
     await db.offers.delete_one({"id": offer_id})
+    response_cache.invalidate("offers")
     
     # 2. Nettoyer les références dans les codes promo (retirer l'offre des 'courses'/articles autorisés)
     await db.discount_codes.update_many(
@@ -996,7 +1207,10 @@ async def delete_offer(offer_id: str):
 
 # --- Product Categories ---
 @api_router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
+    return await response_cache.serve(request, "categories", _load_categories)
+
+async def _load_categories():
     categories = await db.categories.find({}, {"_id": 0}).to_list(100)
     return categories if categories else [
         {"id": "service", "name": "Services & Cours", "icon": "🎧"},
@@ -1010,6 +1224,8 @@ async def get_categories():
 async def create_category(category: dict):
     category["id"] = category.get("id") or str(uuid.uuid4())[:8]
     await db.categories.insert_one(category)
+    category.pop("_id", None)
+    response_cache.invalidate("categories")
     return category
 
 # --- Shipping / Tracking ---
@@ -1033,18 +1249,17 @@ async def update_tracking(reservation_id: str, tracking_data: dict):
 @api_router.get("/users", response_model=List[User])
 async def get_users():
     users = await db.users.find({}, {"_id": 0}).to_list(1000)
-    for user in users:
-        if isinstance(user.get('createdAt'), str):
-            user['createdAt'] = datetime.fromisoformat(user['createdAt'].replace('Z', '+00:00'))
-    return users
+    # Lecture DB de confiance: projection sur le modèle sans re-validation (createdAt déjà ISO)
+    return trusted_response(project_rows(User, users))
 
 @api_router.post("/users", response_model=User)
 async def create_user(user: UserCreate):
+    """Crée un contact (ou retourne celui qui possède déjà cet email / ce WhatsApp)"""
     user_obj = User(**user.model_dump())
     doc = user_obj.model_dump()
     doc['createdAt'] = doc['createdAt'].isoformat()
-    await db.users.insert_one(doc)
-    return user_obj
+    contact, _ = await user_identities.resolve_or_create(doc, email=doc["email"], whatsapp=doc.get("whatsapp"))
+    return contact
 
 @api_router.get("/users/{user_id}", response_model=User)
 async def get_user(user_id: str):
@@ -1062,9 +1277,10 @@ async def update_user(user_id: str, user: UserCreate):
     if not existing:
         raise HTTPException(status_code=404, detail="User not found")
     
-    update_data = user.model_dump()
-    await db.users.update_one({"id": user_id}, {"$set": update_data})
-    updated = await db.users.find_one({"id": user_id}, {"_id": 0})
+    # Clés d'identité déplacées avec l'email / le WhatsApp (l'ancien email redevient libre)
+    updated = await user_identities.update(user_id, user.model_dump())
+    if not updated:
+        raise HTTPException(status_code=404, detail="User not found")
     if isinstance(updated.get('createdAt'), str):
         updated['createdAt'] = datetime.fromisoformat(updated['createdAt'].replace('Z', '+00:00'))
     return updated
@@ -1079,8 +1295,10 @@ async def delete_user(user_id: str):
     
     user_email = user.get("email")
     
-    # 2. Supprimer l'utilisateur
+    # 2. Supprimer l'utilisateur et libérer ses clés d'identité
     await db.users.delete_one({"id": user_id})
+    await user_identities.release(user_id)
+    await forget_uploads(db, user_id)
     
     # 3. Nettoyer les références dans les codes promo (retirer l'email des assignedEmail)
     if user_email:
@@ -1097,83 +1315,69 @@ async def upload_user_photo(file: UploadFile = File(...), participant_id: str =
     """
     MOTEUR D'UPLOAD RÉEL - Sauvegarde physique + DB
     1. Reçoit l'image via UploadFile
-    2. Redimensionne à 200x200 max
-    3. Sauvegarde dans /app/backend/uploads/profiles/
-    4. Met à jour photo_url dans la collection 'users' ET 'chat_participants'
-    5. Retourne l'URL pour synchronisation
-    """
-    from PIL import Image
-    import io
-    import uuid
-    import os
-    
-    # Validation du type MIME
-    if not file.content_type or not file.content_type.startswith("image/"):
+    2. Lecture bornée (2MB) + vérification du type réel (PNG/JPEG/GIF/WebP)
+    3. Variantes 48/96/200 (WebP + JPEG) calculées dans le pool de processus
+    4. Fichiers nommés par hash du contenu dans /app/backend/uploads/profiles/ (ré-upload identique = aucun travail)
+    5. Met à jour photo_url (+ photo_srcset) dans la collection 'users' ET 'chat_participants'
+    6. Retourne l'URL (JPEG 200px) et le srcset pour synchronisation
+    """
+    # Lecture par blocs (max 2MB, arrêt au premier octet de trop) + type réel d'après les magic bytes
+    try:
+        intake = await read_upload(file, MAX_PHOTO_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedImage:
         raise HTTPException(status_code=400, detail="Type de fichier non supporté. Envoyez une image.")
-    
-    # Lire le contenu du fichier
-    contents = await file.read()
-    
-    # Vérifier la taille (max 2MB)
-    if len(contents) > 2 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Fichier trop volumineux (max 2MB)")
+    try:
+        contents = intake.read_all()
+    finally:
+        intake.close()
     
     try:
-        # Ouvrir et traiter l'image
-        img = Image.open(io.BytesIO(contents))
-        
-        # Convertir en RGB si nécessaire (RGBA, P modes)
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-        
-        # Redimensionner à max 200x200 en conservant les proportions
-        img.thumbnail((200, 200), Image.LANCZOS)
-        
-        # Créer le dossier s'il n'existe pas
-        upload_dir = "/app/backend/uploads/profiles"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Générer un nom de fichier unique
-        filename = f"{participant_id}_{uuid.uuid4().hex[:8]}.jpg"
-        filepath = os.path.join(upload_dir, filename)
-        
-        # Sauvegarder l'image PHYSIQUEMENT sur le serveur
-        img.save(filepath, "JPEG", quality=85)
-        
-        # URL relative pour accès via l'API
-        photo_url = f"/api/uploads/profiles/{filename}"
-        
-        # === MISE À JOUR BASE DE DONNÉES ===
-        # 1. Mettre à jour dans la collection 'users' (par participant_id OU email)
-        update_result_users = await db.users.update_one(
-            {"$or": [{"id": participant_id}, {"participant_id": participant_id}]},
-            {"$set": {"photo_url": photo_url, "photoUrl": photo_url}},
-            upsert=False
-        )
-        
-        # 2. Mettre à jour dans 'chat_participants' si existe
-        update_result_participants = await db.chat_participants.update_one(
-            {"id": participant_id},
-            {"$set": {"photo_url": photo_url, "photoUrl": photo_url}},
-            upsert=False
-        )
-        
-        logger.info(f"[UPLOAD] ✅ Photo uploadée: {filename} | users={update_result_users.modified_count}, participants={update_result_participants.modified_count}")
-        
-        return {
-            "success": True,
-            "url": photo_url,
-            "filename": filename,
-            "participant_id": participant_id,
-            "db_updated": {
-                "users": update_result_users.modified_count,
-                "participants": update_result_participants.modified_count
-            }
-        }
-        
+        avatar = await avatar_pipeline.process(contents)
+    except PipelineBusy:
+        raise HTTPException(status_code=503, detail="Trop d'uploads en cours, réessayez dans quelques secondes")
+    except InvalidImage as e:
+        raise HTTPException(status_code=400, detail=f"Image illisible: {e}")
     except Exception as e:
         logger.error(f"[UPLOAD] ❌ Erreur traitement image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur traitement image: {str(e)}")
+    
+    photo_url = avatar.url
+    photo_fields = {"photo_url": photo_url, "photoUrl": photo_url, "photo_srcset": avatar.srcset}
+    
+    # === MISE À JOUR BASE DE DONNÉES ===
+    # 1. Mettre à jour dans la collection 'users' (par participant_id OU email)
+    update_result_users = await db.users.update_one(
+        {"$or": [{"id": participant_id}, {"participant_id": participant_id}]},
+        {"$set": photo_fields},
+        upsert=False
+    )
+    
+    # 2. Mettre à jour dans 'chat_participants' si existe
+    update_result_participants = await db.chat_participants.update_one(
+        {"id": participant_id},
+        {"$set": photo_fields},
+        upsert=False
+    )
+    
+    # 3. Aucun document (invité, profil local uniquement): référence gardée pour le balayage
+    if not update_result_users.matched_count and not update_result_participants.matched_count:
+        await record_upload(db, participant_id, avatar.digest, photo_fields)
+    
+    filename = photo_url.rsplit("/", 1)[-1]
+    logger.info(f"[UPLOAD] ✅ Photo uploadée: {filename} (dedupe={avatar.deduplicated}) | users={update_result_users.modified_count}, participants={update_result_participants.modified_count}")
+    
+    return {
+        "success": True,
+        **avatar.as_dict(),
+        "filename": filename,
+        "participant_id": participant_id,
+        "db_updated": {
+            "users": update_result_users.modified_count,
+            "participants": update_result_participants.modified_count
+        }
+    }
 
 
 @api_router.get("/users/{participant_id}/profile")
@@ -1196,7 +1400,8 @@ async def get_user_profile(participant_id: str):
             "participant_id": participant_id,
             "name": user.get("name") or user.get("username"),
             "email": user.get("email"),
-            "photo_url": photo_url
+            "photo_url": photo_url,
+            "photo_srcset": user.get("photo_srcset")
         }
     
     # 2. Fallback: chercher dans 'chat_participants'
@@ -1213,7 +1418,8 @@ async def get_user_profile(participant_id: str):
             "participant_id": participant_id,
             "name": participant.get("name") or participant.get("username"),
             "email": participant.get("email"),
-            "photo_url": photo_url
+            "photo_url": photo_url,
+            "photo_srcset": participant.get("photo_srcset")
         }
     
     # 3. Aucun profil trouvé
@@ -1283,7 +1489,7 @@ async def get_reservations(
         if isinstance(res.get('createdAt'), str):
             res['createdAt'] = datetime.fromisoformat(res['createdAt'].replace('Z', '+00:00'))
     
-    return {
+    return trusted_response({
         "data": reservations,
         "pagination": {
             "page": page,
@@ -1291,7 +1497,7 @@ async def get_reservations(
             "total": total_count,
             "pages": (total_count + limit - 1) // limit  # Ceiling division
         }
-    }
+    })
 
 @api_router.post("/reservations", response_model=Reservation)
 async def create_reservation(reservation: ReservationCreate):
@@ -1333,7 +1539,7 @@ async def create_reservation(reservation: ReservationCreate):
     res_obj = Reservation(**reservation.model_dump(), reservationCode=res_code)
     doc = res_obj.model_dump()
     doc['createdAt'] = doc['createdAt'].isoformat()
-    await db.reservations.insert_one(doc)
+    await db.reservations.insert_one(with_phone_index(doc, "reservations"))
     
     # === NOTIFICATION EMAIL AU COACH SI RÉSERVATION ABONNÉ ===
     if reservation.type == 'abonné' and reservation.promoCode:
@@ -1494,7 +1700,7 @@ Notification automatique Afroboost"""
 @api_router.get("/discount-codes", response_model=List[DiscountCode])
 async def get_discount_codes():
     codes = await db.discount_codes.find({}, {"_id": 0}).to_list(1000)
-    return codes
+    return trusted_response(project_rows(DiscountCode, codes))
 
 @api_router.post("/discount-codes", response_model=DiscountCode)
 async def create_discount_code(code: DiscountCodeCreate):
@@ -1664,7 +1870,7 @@ async def sanitize_data():
 @api_router.get("/campaigns")
 async def get_campaigns():
     campaigns = await db.campaigns.find({}, {"_id": 0}).sort("createdAt", -1).to_list(100)
-    return campaigns
+    return trusted_response(campaigns)
 
 @api_router.get("/campaigns/logs")
 async def get_campaigns_error_logs():
@@ -1751,7 +1957,7 @@ async def get_campaign(campaign_id: str):
     campaign = await db.campaigns.find_one({"id": campaign_id}, {"_id": 0})
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    return campaign
+    return trusted_response(campaign)
 
 @api_router.post("/campaigns")
 async def create_campaign(campaign: CampaignCreate):
@@ -1858,6 +2064,8 @@ async def launch_campaign(campaign_id: str):
     channels = campaign.get("channels", {})
     message_content = campaign.get("message", "")
     media_url = campaign.get("mediaUrl", "")
+    # Type du média classifié une fois pour tous les messages de la campagne
+    media_type = get_media_type(media_url)["type"] if media_url else None
     campaign_name = campaign.get("name", "Campagne")
     target_ids = campaign.get("targetIds", [])
     
@@ -1902,17 +2110,19 @@ async def launch_campaign(campaign_id: str):
                 msg_id = str(uuid.uuid4())
                 msg_timestamp = datetime.now(timezone.utc).isoformat()
                 
-                await db.chat_messages.insert_one({
+                campaign_message = {
                     "id": msg_id,
                     "session_id": session_id,
                     "content": message_content,
                     "media_url": media_url or None,
+                    "media_type": media_type,
                     "sender_type": "coach",
                     "sender_name": "Coach Bassi",
                     "sender_id": "coach-campaign",
                     "timestamp": msg_timestamp,
                     "created_at": msg_timestamp
-                })
+                }
+                await store_chat_message(campaign_message)
                 
                 # Mettre à jour la session
                 await db.chat_sessions.update_one(
@@ -1946,6 +2156,7 @@ async def launch_campaign(campaign_id: str):
             if selected_ids:
                 contacts = await db.users.find({"id": {"$in": selected_ids}}, {"_id": 0}).to_list(1000)
     
+    pending_emails = []
     for contact in contacts:
         contact_id = contact.get("id", "")
         contact_name = contact.get("name", "")
@@ -1996,6 +2207,7 @@ async def launch_campaign(campaign_id: str):
             results.append(whatsapp_result)
         
         # ==================== ENVOI EMAIL (INDÉPENDANT) ====================
+        # Collecté ici, envoyé en batch Resend après la boucle (ordre des résultats conservé)
         if channels.get("email") and contact_email:
             email_result = {
                 "contactId": contact_id,
@@ -2006,57 +2218,8 @@ async def launch_campaign(campaign_id: str):
                 "status": "pending",
                 "sentAt": None
             }
-            
-            try:
-                # Envoi via l'endpoint interne (Resend)
-                if RESEND_AVAILABLE and RESEND_API_KEY:
-                    # Préparer le template email
-                    subject = f"📢 {campaign_name}"
-                    first_name = contact_name.split()[0] if contact_name else "ami(e)"
-                    
-                    html_content = f"""<!DOCTYPE html>
-<html lang="fr">
-<head><meta charset="utf-8"><title>Message Afroboost</title></head>
-<body style="margin:0;padding:20px;background:#f5f5f5;font-family:Arial,sans-serif;">
-<div style="max-width:480px;margin:0 auto;background:#111;border-radius:10px;overflow:hidden;">
-<div style="background:#9333EA;padding:16px 20px;text-align:center;">
-<span style="color:#fff;font-size:22px;font-weight:bold;">Afroboost</span>
-</div>
-<div style="padding:20px;color:#fff;font-size:14px;line-height:1.6;">
-<p>Salut {first_name},</p>
-{message_content.replace(chr(10), '<br>')}
-</div>
-<div style="padding:15px 20px;border-top:1px solid #333;text-align:center;">
-<a href="https://afroboosteur.com" style="color:#9333EA;text-decoration:none;font-size:11px;">afroboosteur.com</a>
-</div>
-</div>
-</body>
-</html>"""
-                    
-                    params = {
-                        "from": "Afroboost <notifications@afroboosteur.com>",
-                        "to": [contact_email],
-                        "subject": subject,
-                        "html": html_content
-                    }
-                    
-                    email_response = await asyncio.to_thread(resend.Emails.send, params)
-                    email_result["status"] = "sent"
-                    email_result["sentAt"] = datetime.now(timezone.utc).isoformat()
-                    email_result["email_id"] = email_response.get("id")
-                    success_count += 1
-                    logger.info(f"[CAMPAIGN-LAUNCH] ✅ Email envoyé à {contact_name} ({contact_email})")
-                else:
-                    email_result["status"] = "simulated"
-                    email_result["sentAt"] = datetime.now(timezone.utc).isoformat()
-                    logger.info(f"[CAMPAIGN-LAUNCH] 🧪 Email simulé pour {contact_name} ({contact_email})")
-            except Exception as e:
-                email_result["status"] = "failed"
-                email_result["error"] = str(e)
-                fail_count += 1
-                logger.error(f"[CAMPAIGN-LAUNCH] ❌ Email échoué pour {contact_name}: {str(e)}")
-            
             results.append(email_result)
+            pending_emails.append(email_result)
         
         # ==================== INSTAGRAM (NON SUPPORTÉ - MANUEL) ====================
         if channels.get("instagram"):
@@ -2071,6 +2234,20 @@ async def launch_campaign(campaign_id: str):
                 "note": "Envoi manuel requis"
             })
     
+    # ==================== ENVOI EMAIL BATCH (Resend) ====================
+    if pending_emails:
+        sent, failed = await send_campaign_email_batch(
+            pending_emails,
+            subject=f"📢 {campaign_name}",
+            message=message_content,
+            media_url=media_url,
+            cta_text=campaign.get("ctaText"),
+            cta_link=campaign.get("ctaLink"),
+            layout="simple"
+        )
+        success_count += sent
+        fail_count += failed
+    
     # Déterminer le statut final
     all_sent = all(r.get("status") in ["sent", "simulated", "manual"] for r in results)
     final_status = "completed" if all_sent else "sending"
@@ -2118,7 +2295,10 @@ async def mark_campaign_sent(campaign_id: str, data: dict):
 
 # --- Payment Links ---
 @api_router.get("/payment-links", response_model=PaymentLinks)
-async def get_payment_links():
+async def get_payment_links(request: Request):
+    return await response_cache.serve(request, "payment-links", _load_payment_links, trusted_serializer(PaymentLinks, many=False))
+
+async def _load_payment_links():
     links = await db.payment_links.find_one({"id": "payment_links"}, {"_id": 0})
     if not links:
         default_links = PaymentLinks().model_dump()
@@ -2133,6 +2313,7 @@ async def update_payment_links(links: PaymentLinksUpdate):
         {"$set": links.model_dump()}, 
         upsert=True
     )
+    response_cache.invalidate("payment-links")
     return await db.payment_links.find_one({"id": "payment_links"}, {"_id": 0})
 
 # --- Stripe Checkout avec TWINT ---
@@ -2352,7 +2533,10 @@ async def stripe_webhook(request: Request):
 
 # --- Concept ---
 @api_router.get("/concept", response_model=Concept)
-async def get_concept():
+async def get_concept(request: Request):
+    return await response_cache.serve(request, "concept", _load_concept, trusted_serializer(Concept, many=False))
+
+async def _load_concept():
     concept = await db.concept.find_one({"id": "concept"}, {"_id": 0})
     if not concept:
         default_concept = Concept().model_dump()
@@ -2365,6 +2549,7 @@ async def update_concept(concept: ConceptUpdate):
     try:
         updates = {k: v for k, v in concept.model_dump().items() if v is not None}
         result = await db.concept.update_one({"id": "concept"}, {"$set": updates}, upsert=True)
+        response_cache.invalidate("concept", "manifest")
         updated = await db.concept.find_one({"id": "concept"}, {"_id": 0})
         return updated
     except Exception as e:
@@ -2373,7 +2558,10 @@ async def update_concept(concept: ConceptUpdate):
 
 # --- Config ---
 @api_router.get("/config", response_model=AppConfig)
-async def get_config():
+async def get_config(request: Request):
+    return await response_cache.serve(request, "config", _load_config, trusted_serializer(AppConfig, many=False))
+
+async def _load_config():
     config = await db.config.find_one({"id": "app_config"}, {"_id": 0})
     if not config:
         default_config = AppConfig().model_dump()
@@ -2384,6 +2572,7 @@ async def get_config():
 @api_router.put("/config")
 async def update_config(config_update: dict):
     await db.config.update_one({"id": "app_config"}, {"$set": config_update}, upsert=True)
+    response_cache.invalidate("config")
     return await db.config.find_one({"id": "app_config"}, {"_id": 0})
 
 # ==================== GOOGLE OAUTH AUTHENTICATION ====================
@@ -2614,12 +2803,15 @@ async def coach_login(login: CoachLogin):
 # Business: Seul le Super Admin peut activer/désactiver les services globaux
 
 @api_router.get("/feature-flags")
-async def get_feature_flags():
+async def get_feature_flags(request: Request):
     """
     Récupère la configuration des feature flags
     Par défaut, tous les services additionnels sont désactivés
     """
-    flags = await db.feature_flags.find_one({"id": "feature_flags"}, {"_id": 0})
+    return await response_cache.serve(request, "feature-flags", _load_feature_flags)
+
+async def _load_feature_flags():
+    flags = await settings_cache.get(FEATURE_FLAGS)
     if not flags:
         # Créer la config par défaut (tout désactivé)
         default_flags = {
@@ -2631,6 +2823,7 @@ async def get_feature_flags():
             "updatedBy": None
         }
         await db.feature_flags.insert_one(default_flags.copy())  # .copy() pour éviter mutation
+        settings_cache.put(FEATURE_FLAGS, default_flags)
         # Retourner sans _id
         return {k: v for k, v in default_flags.items() if k != "_id"}
     return flags
@@ -2650,7 +2843,10 @@ async def update_feature_flags(update: FeatureFlagsUpdate):
         {"$set": update_data}, 
         upsert=True
     )
-    return await db.feature_flags.find_one({"id": "feature_flags"}, {"_id": 0})
+    response_cache.invalidate("feature-flags")
+    flags = await db.feature_flags.find_one({"id": "feature_flags"}, {"_id": 0})
+    settings_cache.put(FEATURE_FLAGS, flags)
+    return flags
 
 # ==================== COACH SUBSCRIPTION API ====================
 # Business: Gestion des abonnements et droits des coachs
@@ -2662,17 +2858,14 @@ async def get_coach_subscription():
     Utilise l'email de coach_auth pour trouver l'abonnement correspondant
     """
     # Récupérer l'email du coach actuel
-    coach_auth = await db.coach_auth.find_one({"id": "coach_auth"}, {"_id": 0})
+    coach_auth = await settings_cache.get(COACH_AUTH)
     if not coach_auth:
         return {"error": "Coach auth not found"}
     
     coach_email = coach_auth.get("email", "coach@afroboost.com")
     
     # Chercher l'abonnement correspondant
-    subscription = await db.coach_subscriptions.find_one(
-        {"coachEmail": coach_email}, 
-        {"_id": 0}
-    )
+    subscription = await settings_cache.get(coach_subscription(coach_email))
     
     if not subscription:
         # Créer un abonnement par défaut (free, sans services additionnels)
@@ -2690,6 +2883,7 @@ async def get_coach_subscription():
             "updatedAt": None
         }
         await db.coach_subscriptions.insert_one(default_sub.copy())  # .copy() pour éviter mutation
+        settings_cache.put(coach_subscription(coach_email), default_sub)
         # Retourner sans _id
         return {k: v for k, v in default_sub.items() if k != "_id"}
     
@@ -2701,7 +2895,7 @@ async def update_coach_subscription(update: CoachSubscriptionUpdate):
     Met à jour l'abonnement du coach
     TODO: Ajouter vérification Super Admin pour modifications sensibles
     """
-    coach_auth = await db.coach_auth.find_one({"id": "coach_auth"}, {"_id": 0})
+    coach_auth = await settings_cache.get(COACH_AUTH)
     if not coach_auth:
         raise HTTPException(status_code=404, detail="Coach auth not found")
     
@@ -2716,7 +2910,9 @@ async def update_coach_subscription(update: CoachSubscriptionUpdate):
         upsert=True
     )
     
-    return await db.coach_subscriptions.find_one({"coachEmail": coach_email}, {"_id": 0})
+    subscription = await db.coach_subscriptions.find_one({"coachEmail": coach_email}, {"_id": 0})
+    settings_cache.put(coach_subscription(coach_email), subscription)
+    return subscription
 
 # ==================== SERVICE ACCESS VERIFICATION ====================
 # Business: Fonction centrale pour vérifier l'accès aux services
@@ -2754,14 +2950,14 @@ async def verify_service_access(service_name: str):
     flag_field, sub_field = service_map[service_name]
     
     # 1. Vérifier le feature flag global
-    flags = await db.feature_flags.find_one({"id": "feature_flags"}, {"_id": 0})
+    flags = await settings_cache.get(FEATURE_FLAGS)
     feature_enabled = flags.get(flag_field, False) if flags else False
     
     # 2. Vérifier l'abonnement du coach
-    coach_auth = await db.coach_auth.find_one({"id": "coach_auth"}, {"_id": 0})
+    coach_auth = await settings_cache.get(COACH_AUTH)
     coach_email = coach_auth.get("email", "coach@afroboost.com") if coach_auth else "coach@afroboost.com"
     
-    subscription = await db.coach_subscriptions.find_one({"coachEmail": coach_email}, {"_id": 0})
+    subscription = await settings_cache.get(coach_subscription(coach_email))
     coach_has_service = subscription.get(sub_field, False) if subscription else False
     
     # Déterminer l'accès et la raison
@@ -2828,7 +3024,7 @@ class WhatsAppConfigUpdate(BaseModel):
 
 @api_router.get("/whatsapp-config")
 async def get_whatsapp_config():
-    config = await db.whatsapp_config.find_one({"id": "whatsapp_config"}, {"_id": 0})
+    config = await settings_cache.get(WHATSAPP_CONFIG)
     if not config:
         return {"id": "whatsapp_config", "accountSid": "", "authToken": "", "fromNumber": "", "apiMode": "twilio"}
     return config
@@ -2838,7 +3034,9 @@ async def update_whatsapp_config(config: WhatsAppConfigUpdate):
     updates = {k: v for k, v in config.model_dump().items() if v is not None}
     updates["id"] = "whatsapp_config"
     await db.whatsapp_config.update_one({"id": "whatsapp_config"}, {"$set": updates}, upsert=True)
-    return await db.whatsapp_config.find_one({"id": "whatsapp_config"}, {"_id": 0})
+    config = await db.whatsapp_config.find_one({"id": "whatsapp_config"}, {"_id": 0})
+    settings_cache.put(WHATSAPP_CONFIG, config)
+    return config
 
 # ==================== DATA MIGRATION (localStorage -> MongoDB) ====================
 
@@ -2897,7 +3095,7 @@ async def migrate_localstorage_to_mongodb(data: MigrationData):
             if res.get("reservationCode"):
                 existing = await db.reservations.find_one({"reservationCode": res["reservationCode"]})
                 if not existing:
-                    await db.reservations.insert_one(res)
+                    await db.reservations.insert_one(with_phone_index(res, "reservations"))
                     migrated["reservations"] += 1
     
     # Migration Coach Auth
@@ -2911,6 +3109,8 @@ async def migrate_localstorage_to_mongodb(data: MigrationData):
             )
             migrated["coachAuth"] = True
     
+    for collection in ("whatsapp_config", "ai_config", "coach_auth"):
+        settings_cache.invalidate(collection)
     logger.info(f"Migration completed: {migrated}")
     return {"success": True, "migrated": migrated}
 
@@ -2979,10 +3179,12 @@ class WhatsAppWebhook(BaseModel):
 # --- AI Config Routes ---
 @api_router.get("/ai-config")
 async def get_ai_config():
-    config = await db.ai_config.find_one({"id": "ai_config"}, {"_id": 0})
+    config = await settings_cache.get(AI_CONFIG)
     if not config:
         default_config = AIConfig().model_dump()
         await db.ai_config.insert_one(default_config)
+        default_config.pop("_id", None)
+        settings_cache.put(AI_CONFIG, default_config)
         return default_config
     return config
 
@@ -2990,7 +3192,9 @@ async def get_ai_config():
 async def update_ai_config(config: AIConfigUpdate):
     updates = {k: v for k, v in config.model_dump().items() if v is not None}
     await db.ai_config.update_one({"id": "ai_config"}, {"$set": updates}, upsert=True)
-    return await db.ai_config.find_one({"id": "ai_config"}, {"_id": 0})
+    config = await db.ai_config.find_one({"id": "ai_config"}, {"_id": 0})
+    settings_cache.put(AI_CONFIG, config)
+    return config
 
 # --- AI Logs Routes ---
 @api_router.get("/ai-logs")
@@ -3013,28 +3217,28 @@ async def handle_whatsapp_webhook(webhook: WhatsAppWebhook):
     import time
     start_time = time.time()
     
-    # Récupérer la config IA
-    ai_config = await db.ai_config.find_one({"id": "ai_config"}, {"_id": 0})
-    if not ai_config or not ai_config.get("enabled"):
-        logger.info(f"AI disabled, ignoring message from {webhook.From}")
-        return {"status": "ai_disabled"}
-    
     # Extraire le numéro de téléphone
     from_phone = webhook.From.replace("whatsapp:", "")
     incoming_message = webhook.Body
     
     logger.info(f"Incoming WhatsApp from {from_phone}: {incoming_message}")
     
-    # Chercher le client dans les réservations
-    client_name = None
+    # Identifier le client: recherche indexée sur les 9 derniers chiffres (phone_key)
     normalized_phone = from_phone.replace("+", "").replace(" ", "")
-    reservations = await db.reservations.find({}, {"_id": 0}).to_list(1000)
+    caller = await find_caller(db, from_phone)
+    client_name = caller["name"] if caller else None
     
-    for res in reservations:
-        res_phone = (res.get("whatsapp") or res.get("phone") or "").replace("+", "").replace(" ", "").replace("-", "")
-        if res_phone and normalized_phone.endswith(res_phone[-9:]):
-            client_name = res.get("userName") or res.get("name")
-            break
+    # Persister le message dans la session WhatsApp du numéro (CRM + mémoire de l'IA)
+    session, inbound = await whatsapp_conversations.record_inbound(
+        normalize_phone(from_phone) or from_phone, incoming_message, client_name,
+        caller["id"] if caller and caller["collection"] == "chat_participants" else None
+    )
+    
+    # Récupérer la config IA
+    ai_config = await settings_cache.get(AI_CONFIG)
+    if not ai_config or not ai_config.get("enabled"):
+        logger.info(f"AI disabled, message from {webhook.From} stored without reply")
+        return {"status": "ai_disabled"}
     
     # Construire le contexte
     context = ""
@@ -3047,7 +3251,7 @@ async def handle_whatsapp_webhook(webhook: WhatsAppWebhook):
     
     full_system_prompt = ai_config.get("systemPrompt", "") + context
     
-    # Appeler l'IA
+    # Appeler l'IA (historique récent de la session injecté par whatsapp_conversations)
     try:
         from emergentintegrations.llm.chat import LlmChat, UserMessage
         
@@ -3056,17 +3260,22 @@ async def handle_whatsapp_webhook(webhook: WhatsAppWebhook):
             logger.error("EMERGENT_LLM_KEY not configured")
             return {"status": "error", "message": "AI key not configured"}
         
-        # Créer une session unique par numéro de téléphone
-        session_id = f"whatsapp_{normalized_phone}"
-        
-        chat = LlmChat(
-            api_key=emergent_key,
-            session_id=session_id,
-            system_message=full_system_prompt
-        ).with_model(ai_config.get("provider", "openai"), ai_config.get("model", "gpt-4o-mini"))
-        
-        user_message = UserMessage(text=incoming_message)
-        ai_response = await chat.send_message(user_message)
+        async def llm(system_prompt: str, text: str, llm_session_id: str) -> str:
+            chat = LlmChat(
+                api_key=emergent_key,
+                session_id=llm_session_id,
+                system_message=system_prompt
+            ).with_model(ai_config.get("provider", "openai"), ai_config.get("model", "gpt-4o-mini"))
+            return await chat.send_message(UserMessage(text=text))
+        
+        # Session LLM par numéro de téléphone
+        result = await whatsapp_conversations.reply(
+            session, inbound, full_system_prompt, llm, f"whatsapp_{normalized_phone}"
+        )
+        if result is None:
+            logger.info(f"[WHATSAPP] Session {session['id']} en mode coach, pas de réponse IA")
+            return {"status": "human_mode", "session_id": session["id"]}
+        ai_response = result["response"]
         
         response_time = time.time() - start_time
         
@@ -3080,7 +3289,7 @@ async def handle_whatsapp_webhook(webhook: WhatsAppWebhook):
         ).model_dump()
         await db.ai_logs.insert_one(log_entry)
         
-        logger.info(f"AI responded to {from_phone} in {response_time:.2f}s")
+        logger.info(f"AI responded to {from_phone} in {response_time:.2f}s ({result['history_turns']} tours d'historique)")
         
         # Retourner la réponse (Twilio attend un TwiML ou un JSON)
         # Pour une réponse automatique, Twilio utilise TwiML
@@ -3088,7 +3297,8 @@ async def handle_whatsapp_webhook(webhook: WhatsAppWebhook):
             "status": "success",
             "response": ai_response,
             "clientName": client_name,
-            "responseTime": response_time
+            "responseTime": response_time,
+            "session_id": session["id"]
         }
         
     except Exception as e:
@@ -3117,7 +3327,7 @@ async def _get_twilio_config():
         return TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_NUMBER
     
     # PRIORITÉ 2: Configuration en base de données (fallback)
-    whatsapp_config = await db.whatsapp_config.find_one({"id": "whatsapp_config"}, {"_id": 0})
+    whatsapp_config = await settings_cache.get(WHATSAPP_CONFIG)
     if whatsapp_config:
         account_sid = whatsapp_config.get("accountSid")
         auth_token = whatsapp_config.get("authToken")
@@ -3212,7 +3422,7 @@ async def send_whatsapp_direct(to_phone: str, message: str, media_url: str = Non
                         "http_status": response.status_code,
                         "created_at": datetime.now(timezone.utc).isoformat()
                     }
-                    mongo_client_sync[os.environ.get('DB_NAME', 'test_database')].campaign_errors.insert_one(error_doc)
+                    await db.campaign_errors.insert_one(error_doc)
                 except Exception as log_err:
                     logger.error(f"[WHATSAPP] Erreur log: {log_err}")
                 
@@ -3248,7 +3458,7 @@ async def send_whatsapp_direct(to_phone: str, message: str, media_url: str = Non
                 "from_phone": clean_from,
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
-            mongo_client_sync[os.environ.get('DB_NAME', 'test_database')].campaign_errors.insert_one(error_doc)
+            await db.campaign_errors.insert_one(error_doc)
         except Exception as log_err:
             logger.error(f"[WHATSAPP-DIAG] Impossible d'enregistrer l'exception: {log_err}")
         
@@ -3281,7 +3491,7 @@ async def test_ai_response(data: dict):
         raise HTTPException(status_code=400, detail="Message requis")
     
     # Récupérer la config IA
-    ai_config = await db.ai_config.find_one({"id": "ai_config"}, {"_id": 0})
+    ai_config = await settings_cache.get(AI_CONFIG)
     if not ai_config:
         ai_config = AIConfig().model_dump()
     
@@ -3395,46 +3605,29 @@ async def chat_with_ai(data: ChatMessage):
     # Enregistrer le prospect dans chat_participants si email ou whatsapp fourni
     if email or whatsapp:
         try:
-            # Vérifier si le contact existe déjà (par email OU whatsapp)
-            existing_contact = None
-            if email:
-                existing_contact = await db.chat_participants.find_one({"email": email}, {"_id": 0})
-            if not existing_contact and whatsapp:
-                # Normaliser le numéro WhatsApp
-                clean_whatsapp = whatsapp.replace(" ", "").replace("-", "")
-                existing_contact = await db.chat_participants.find_one({
-                    "$or": [
-                        {"whatsapp": whatsapp},
-                        {"whatsapp": clean_whatsapp}
-                    ]
-                }, {"_id": 0})
-            
-            if not existing_contact:
-                # Créer le nouveau contact
-                new_participant = {
-                    "id": str(uuid.uuid4()),
-                    "name": first_name or "Visiteur Chat IA",
-                    "email": email or "",
-                    "whatsapp": whatsapp or "",
-                    "source": f"Lien Chat IA ({source})",
-                    "link_token": None,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "last_seen_at": datetime.now(timezone.utc).isoformat()
-                }
-                await db.chat_participants.insert_one(new_participant)
+            # Contact existant (email OU whatsapp, clés normalisées) ou création atomique
+            now = datetime.now(timezone.utc).isoformat()
+            contact, created = await contact_identities.resolve_or_create({
+                "id": str(uuid.uuid4()),
+                "name": first_name or "Visiteur Chat IA",
+                "email": email or "",
+                "whatsapp": whatsapp or "",
+                "source": f"Lien Chat IA ({source})",
+                "link_token": None,
+                "created_at": now,
+                "last_seen_at": now
+            }, email, whatsapp)
+            if created:
                 logger.info(f"[CRM-AUTO] Nouveau contact créé: {first_name or 'Visiteur'} ({email or whatsapp}) - Source: {source}")
             else:
                 # Mettre à jour last_seen_at
-                await db.chat_participants.update_one(
-                    {"id": existing_contact.get("id")},
-                    {"$set": {"last_seen_at": datetime.now(timezone.utc).isoformat()}}
-                )
-                logger.info(f"[CRM-AUTO] Contact existant mis à jour: {existing_contact.get('name')}")
+                await contact_identities.attach(contact, extra={"last_seen_at": now})
+                logger.info(f"[CRM-AUTO] Contact existant mis à jour: {contact.get('name')}")
         except Exception as crm_error:
             logger.warning(f"[CRM-AUTO] Erreur enregistrement CRM (non bloquant): {crm_error}")
     
     # === 2. RÉCUPÉRER LA CONFIG IA ===
-    ai_config = await db.ai_config.find_one({"id": "ai_config"}, {"_id": 0})
+    ai_config = await settings_cache.get(AI_CONFIG)
     if not ai_config:
         ai_config = AIConfig().model_dump()
     
@@ -3863,10 +4056,11 @@ async def get_chat_participant(participant_id: str):
 
 @api_router.post("/chat/participants")
 async def create_chat_participant(participant: ChatParticipantCreate):
-    """Crée un nouveau participant"""
+    """Crée un nouveau participant (ou retourne celui qui possède déjà cet email / ce WhatsApp)"""
     participant_obj = ChatParticipant(**participant.model_dump())
-    await db.chat_participants.insert_one(participant_obj.model_dump())
-    return participant_obj.model_dump()
+    doc = participant_obj.model_dump()
+    contact, _ = await contact_identities.resolve_or_create(doc, email=doc.get("email"), whatsapp=doc.get("whatsapp"))
+    return contact
 
 @api_router.get("/chat/participants/find")
 async def find_participant(
@@ -3899,12 +4093,8 @@ async def find_participant(
 async def update_chat_participant(participant_id: str, update_data: dict):
     """Met à jour un participant"""
     update_data["last_seen_at"] = datetime.now(timezone.utc).isoformat()
-    await db.chat_participants.update_one(
-        {"id": participant_id},
-        {"$set": update_data}
-    )
-    updated = await db.chat_participants.find_one({"id": participant_id}, {"_id": 0})
-    return updated
+    # Clés d'identité déplacées avec l'email / le WhatsApp (l'ancien email redevient libre)
+    return await contact_identities.update(participant_id, update_data)
 
 @api_router.delete("/chat/participants/{participant_id}")
 async def delete_chat_participant(participant_id: str):
@@ -3920,6 +4110,7 @@ async def delete_chat_participant(participant_id: str):
     
     # 1. Supprimer tous les messages envoyes par ce participant
     messages_result = await db.chat_messages.delete_many({"sender_id": participant_id})
+    message_cache.invalidate()
     logger.info(f"[DELETE] Messages supprimes: {messages_result.deleted_count}")
     
     # 2. Retirer le participant de toutes les sessions
@@ -3936,9 +4127,11 @@ async def delete_chat_participant(participant_id: str):
     })
     logger.info(f"[DELETE] Sessions orphelines supprimees: {orphan_sessions.deleted_count}")
     
-    # 4. Supprimer le participant
+    # 4. Supprimer le participant et libérer ses clés d'identité (email / WhatsApp)
     result = await db.chat_participants.delete_one({"id": participant_id})
-    logger.info(f"[DELETE] Participant supprime: {result.deleted_count}")
+    released = await contact_identities.release(participant_id)
+    await forget_uploads(db, participant_id)
+    logger.info(f"[DELETE] Participant supprime: {result.deleted_count} ({released} cles liberees)")
     
     logger.info(f"[DELETE] Participant {participant_name} et donnees associees supprimes")
     return {
@@ -4157,20 +4350,15 @@ async def join_group_automatically(request: GroupJoinRequest):
         # Récupérer ou créer l'utilisateur
         participant_id = user_id
         if not participant_id:
-            # Chercher l'utilisateur par email
-            existing_user = await db.users.find_one({"email": email}, {"_id": 0})
-            if existing_user:
-                participant_id = existing_user.get("id")
-            else:
-                # Créer un nouvel utilisateur
-                participant_id = str(uuid.uuid4())
-                new_user = {
-                    "id": participant_id,
-                    "name": name,
-                    "email": email,
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                await db.users.insert_one(new_user)
+            # Utilisateur par email (clé normalisée) ou création atomique
+            user, created = await user_identities.resolve_or_create({
+                "id": str(uuid.uuid4()),
+                "name": name,
+                "email": email,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }, email=email)
+            participant_id = user.get("id")
+            if created:
                 logger.info(f"[GROUP-JOIN] ✅ Nouvel utilisateur créé: {name} ({email})")
         
         # Ajouter l'utilisateur au groupe s'il n'y est pas déjà
@@ -4209,7 +4397,7 @@ async def get_chat_sessions(include_deleted: bool = False):
     """Récupère toutes les sessions de chat (exclut les supprimées par défaut)"""
     query = {} if include_deleted else {"is_deleted": {"$ne": True}}
     sessions = await db.chat_sessions.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return sessions
+    return trusted_response(sessions)
 
 # ==================== CRM AVANCÉ - HISTORIQUE CONVERSATIONS ====================
 @api_router.get("/conversations")
@@ -4347,13 +4535,13 @@ async def get_conversations_advanced(
     
     logger.info(f"[CRM] Conversations: page={page}, limit={limit}, query='{query}', total={total}")
     
-    return {
+    return trusted_response({
         "conversations": enriched_conversations,
         "total": total,
         "page": page,
         "pages": pages,
         "has_more": page < pages
-    }
+    })
 
 @api_router.get("/chat/sessions/{session_id}")
 async def get_chat_session(session_id: str):
@@ -4461,39 +4649,166 @@ async def toggle_session_ai(session_id: str):
 
 # --- Chat Messages ---
 @api_router.get("/chat/sessions/{session_id}/messages")
-async def get_session_messages(session_id: str, include_deleted: bool = False):
-    """Recupere tous les messages d'une session avec format unifie."""
+async def get_session_messages(session_id: str, include_deleted: bool = False, before: Optional[str] = None,
+                               after: Optional[str] = None, page_size: Optional[int] = None):
+    """
+    Recupere tous les messages d'une session avec format unifie.
+    before / after / page_size: page de taille fixe, plus récent d'abord (curseur = seq).
+    """
+    if before is not None or after is not None or page_size is not None:
+        return await _session_messages_page(session_id, include_deleted, before, after, clamp_page_size(page_size))
+    if not include_deleted:
+        cached = await message_cache.recent(session_id, None, lambda limit: _load_recent_messages(session_id, limit))
+        if cached is not None:
+            return format_messages_for_frontend(cached)
     query = {"session_id": session_id}
     if not include_deleted: query["is_deleted"] = {"$ne": True}
     raw = await db.chat_messages.find(query, {"_id": 0}).sort("created_at", 1).to_list(500)
-    return [format_message_for_frontend(m) for m in raw]
+    return format_messages_for_frontend(raw)
+
+async def _session_messages_page(session_id: str, include_deleted: bool, before: Optional[str],
+                                 after: Optional[str], size: int) -> dict:
+    """Page keyset sur (session_id, seq): un scan de plage indexé de size + 1 lignes."""
+    try:
+        before_seq = int(before) if before is not None else None
+        after_seq = int(after) if after is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide (seq attendu)")
+    if before_seq is None and after_seq is None and not include_deleted:
+        # Première page: les derniers messages, servis par le cache si possible
+        rows = await recent_session_messages(session_id, size + 1)
+        rows.reverse()
+    else:
+        query = {"session_id": session_id}
+        if not include_deleted:
+            query["is_deleted"] = {"$ne": True}
+        if after_seq is not None:
+            query["seq"] = {"$gt": after_seq}
+            order = 1
+        else:
+            if before_seq is not None:
+                query["seq"] = {"$lt": before_seq}
+            order = -1
+        rows = await db.chat_messages.find(query, {"_id": 0}).sort("seq", order).to_list(size + 1)
+    page = build_page(rows, size, newer=after_seq is not None, cursor_of=lambda m: str(m.get("seq")))
+    page["messages"] = format_messages_for_frontend(page["messages"])
+    page["session_id"] = session_id
+    return page
 
 
 # ==================== ENDPOINT SYNC "RAMASSER" ====================
+def _normalize_since(since: Optional[str]) -> Optional[str]:
+    """Timestamp client -> ISO UTC comparable aux created_at stockés."""
+    if not since:
+        return None
+    try:
+        if 'Z' in since: since = since.replace('Z', '+00:00')
+        parsed = datetime.fromisoformat(since)
+        if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc).isoformat()
+    except Exception:
+        return since
+
 @api_router.get("/messages/sync")
-async def sync_messages(session_id: str, since: Optional[str] = None, limit: int = 100):
-    """RAMASSER: Messages de la session OU messages de groupe (broadcast). Tri deterministe."""
-    base_query = {"is_deleted": {"$ne": True}, "$or": [{"session_id": session_id}, {"broadcast": True}, {"type": "group"}]}
+async def sync_messages(session_id: str, since: Optional[str] = None, limit: int = 100,
+                        after_seq: Optional[int] = None, after_broadcast_seq: Optional[int] = None):
+    """
+    RAMASSER: Messages de la session + messages de groupe (timeline broadcast). Tri deterministe.
+    Deux scans de plage indexés fusionnés côté serveur: le coût dépend des nouveaux
+    messages, pas de tout l'historique broadcast.
+    after_seq / after_broadcast_seq: deltas exacts par numéro de séquence,
+    avec tombstones des messages supprimés et détection des trous.
+    """
+    since = _normalize_since(since)
+    if after_seq is not None:
+        return await _sync_session_by_seq(session_id, after_seq, after_broadcast_seq, since, limit)
+    session_query = {"session_id": session_id, "is_deleted": {"$ne": True}}
+    broadcast_query = {"is_deleted": {"$ne": True}}
     if since:
-        try:
-            if 'Z' in since: since = since.replace('Z', '+00:00')
-            parsed = datetime.fromisoformat(since)
-            if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=timezone.utc)
-            base_query["created_at"] = {"$gt": parsed.astimezone(timezone.utc).isoformat()}
-        except Exception:
-            base_query["created_at"] = {"$gt": since}
+        session_query["created_at"] = {"$gt": since}
+        broadcast_query["created_at"] = {"$gt": since}
     # Tri deterministe: created_at puis id pour garantir un ordre stable
-    raw = await db.chat_messages.find(base_query, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).to_list(limit)
-    messages = [format_message_for_frontend(m) for m in raw]
+    order = [("created_at", 1), ("id", 1)]
+    session_rows = message_cache.peek_since(session_id, since)
+    if session_rows is None:
+        session_rows = await db.chat_messages.find(session_query, {"_id": 0}).sort(order).to_list(limit)
+    session_rows = session_rows[:limit]
+    broadcast_rows = await db.broadcast_messages.find(broadcast_query, {"_id": 0}).sort(order).to_list(limit)
+    raw = merge_timelines(session_rows, [_as_timeline_row(m) for m in broadcast_rows], limit)
+    messages = [_format_timeline_message(m) for m in raw]
     sync_ts = datetime.now(timezone.utc).isoformat()
-    return {"success": True, "session_id": session_id, "count": len(messages), "messages": messages, "synced_at": sync_ts, "server_time_utc": sync_ts}
+    # Curseurs de séquence initiaux (uniquement si la réponse n'est pas tronquée)
+    complete = len(raw) < limit
+    next_after_seq = max_seq([m for m in raw if "broadcast_seq" not in m], None) if complete else None
+    next_after_broadcast_seq = max((m["broadcast_seq"] for m in raw if "broadcast_seq" in m), default=None) if complete else None
+    return {"success": True, "session_id": session_id, "count": len(messages), "messages": messages, "synced_at": sync_ts, "server_time_utc": sync_ts,
+            "next_after_seq": next_after_seq, "next_after_broadcast_seq": next_after_broadcast_seq}
+
+def _as_timeline_row(m: dict) -> dict:
+    """Entrée de broadcast_messages -> ligne de timeline (seq de session + seq broadcast)."""
+    row = dict(m)
+    row["broadcast_seq"] = row.pop("seq", None)
+    row["seq"] = row.pop("session_seq", None)
+    return row
+
+def _format_timeline_message(m: dict) -> dict:
+    formatted = format_message_for_frontend(m)
+    if "broadcast_seq" in m:
+        formatted["broadcast"] = True
+        formatted["broadcast_seq"] = m["broadcast_seq"]
+    return formatted
+
+async def _sync_session_by_seq(session_id: str, after_seq: int, after_broadcast_seq: Optional[int],
+                               since: Optional[str], limit: int) -> dict:
+    """Delta par seq: scans de plage indexés (session + broadcast), supprimés renvoyés en tombstones."""
+    sync_ts = datetime.now(timezone.utc).isoformat()
+    rows = message_cache.peek_after_seq(session_id, after_seq)
+    if rows is None:
+        rows = await db.chat_messages.find(
+            {"session_id": session_id, "seq": {"$gt": after_seq}}, {"_id": 0}
+        ).sort("seq", 1).to_list(limit + 1)
+    rows = rows[:limit + 1]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_after_seq, gaps = plan_delta(after_seq, rows)
+    # Timeline broadcast: par seq si le client a un curseur, sinon par date
+    if after_broadcast_seq is not None:
+        broadcasts = await db.broadcast_messages.find(
+            {"seq": {"$gt": after_broadcast_seq}}, {"_id": 0}
+        ).sort("seq", 1).to_list(limit + 1)
+    else:
+        broadcast_query = {"is_deleted": {"$ne": True}}
+        if since:
+            broadcast_query["created_at"] = {"$gt": since}
+        broadcasts = await db.broadcast_messages.find(broadcast_query, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).to_list(limit + 1)
+    has_more = has_more or len(broadcasts) > limit
+    broadcasts = broadcasts[:limit]
+    next_after_broadcast_seq, broadcast_gaps = after_broadcast_seq, []
+    if after_broadcast_seq is not None or broadcasts:
+        by_seq = sorted(broadcasts, key=lambda b: b["seq"])
+        base = after_broadcast_seq if after_broadcast_seq is not None else by_seq[0]["seq"] - 1
+        next_after_broadcast_seq, broadcast_gaps = plan_delta(base, by_seq)
+    timeline = merge_timelines(rows, [_as_timeline_row(b) for b in broadcasts])
+    messages = [_format_timeline_message(m) for m in timeline if not m.get("is_deleted")]
+    deleted_ids = [m["id"] for m in timeline if m.get("is_deleted")]
+    if gaps:
+        logger.info(f"[SYNC-SEQ] Session {session_id[:8]}...: trous {gaps[:10]} (curseur {next_after_seq})")
+    return {
+        "success": True, "session_id": session_id, "count": len(messages), "messages": messages,
+        "deleted_ids": deleted_ids, "after_seq": after_seq, "next_after_seq": next_after_seq,
+        "last_seq": max_seq(rows, after_seq), "gaps": gaps, "has_more": has_more,
+        "after_broadcast_seq": after_broadcast_seq, "next_after_broadcast_seq": next_after_broadcast_seq,
+        "broadcast_gaps": broadcast_gaps,
+        "synced_at": sync_ts, "server_time_utc": sync_ts
+    }
 
 
 @api_router.get("/messages/sync/all")
-async def sync_all_messages(participant_id: str, since: Optional[str] = None, limit: int = 200):
+async def sync_all_messages(participant_id: str, since: Optional[str] = None, limit: int = 200, cursors: Optional[str] = None):
     """
     RAMASSER TOUT: Récupère tous les messages du participant (toutes sessions).
     Pour synchronisation complète au réveil du mobile.
+    cursors: "session_id:seq,..." -> delta par seq pour ces sessions (les autres par date).
     """
     # Trouver toutes les sessions du participant
     sessions = await db.chat_sessions.find(
@@ -4506,19 +4821,37 @@ async def sync_all_messages(participant_id: str, since: Optional[str] = None, li
     
     session_ids = [s["id"] for s in sessions]
     
+    seq_cursors = {sid: c for sid, c in parse_cursor_map(cursors).items() if sid in session_ids}
+    other_ids = [sid for sid in session_ids if sid not in seq_cursors]
+    
     query = {
-        "session_id": {"$in": session_ids},
+        "session_id": {"$in": other_ids},
         "is_deleted": {"$ne": True}
     }
     
     if since:
         query["created_at"] = {"$gt": since}
     
+    if seq_cursors:
+        # Une plage (session_id, seq > curseur) par session: chaque branche du $or est indexée
+        branches = [{"session_id": sid, "seq": {"$gt": c}} for sid, c in seq_cursors.items()]
+        if other_ids:
+            branches.append(query)
+        query = {"$or": branches}
+    
     messages = await db.chat_messages.find(
         query,
         {"_id": 0}
     ).sort("created_at", -1).to_list(limit)
     
+    # Curseurs suivants (les supprimés sont renvoyés pour que le client les retire)
+    # Réponse tronquée: les plus anciens manquent, tout trou bloque le curseur
+    grace = 10 ** 9 if len(messages) >= limit else GAP_GRACE_SECONDS
+    next_cursors = {}
+    for sid, cursor in seq_cursors.items():
+        rows = sorted((m for m in messages if m.get("session_id") == sid), key=lambda m: m.get("seq") or 0)
+        next_cursors[sid], _ = plan_delta(cursor, rows, grace_seconds=grace)
+    
     logger.info(f"[SYNC-ALL] 📱 Ramassé {len(messages)} message(s) pour {participant_id[:8]}...")
     
     return {
@@ -4527,6 +4860,7 @@ async def sync_all_messages(participant_id: str, since: Optional[str] = None, li
         "sessions_count": len(session_ids),
         "messages_count": len(messages),
         "messages": messages,
+        "cursors": next_cursors,
         "synced_at": datetime.now(timezone.utc).isoformat()
     }
 
@@ -4546,19 +4880,29 @@ async def create_chat_message(message: EnhancedChatMessageCreate):
         **message.model_dump(),
         mode=session.get("mode", "ai")
     )
-    await db.chat_messages.insert_one(message_obj.model_dump())
-    return message_obj.model_dump()
+    return await store_chat_message(message_obj.model_dump())
 
 @api_router.put("/chat/messages/{message_id}/delete")
 async def soft_delete_message(message_id: str):
     """Suppression logique d'un message"""
-    await db.chat_messages.update_one(
-        {"id": message_id},
+    deleted_at = datetime.now(timezone.utc).isoformat()
+    message = await db.chat_messages.find_one_and_update(
+        {"id": message_id, "is_deleted": {"$ne": True}},
         {"$set": {
             "is_deleted": True,
-            "deleted_at": datetime.now(timezone.utc).isoformat()
-        }}
+            "deleted_at": deleted_at
+        }},
+        projection={"_id": 0, "session_id": 1, "notified": 1, "broadcast": 1, "type": 1}
     )
+    if message:
+        message_cache.mark_deleted(message.get("session_id"), message_id, deleted_at)
+    if message and is_broadcast(message):
+        await db.broadcast_messages.update_one(
+            {"id": message_id},
+            {"$set": {"is_deleted": True, "deleted_at": deleted_at}}
+        )
+    if message and not message.get("notified"):
+        await recount_session_unread(message.get("session_id"))
     return {"success": True, "message": "Message marqué comme supprimé"}
 
 # ==================== ROUTES ADMIN SÉCURISÉES ====================
@@ -4593,8 +4937,15 @@ async def admin_delete_history(request: Request):
             "deleted_by": caller_email
         }}
     )
+    await db.broadcast_messages.update_many(
+        {"session_id": session_id, "is_deleted": {"$ne": True}},
+        {"$set": {"is_deleted": True, "deleted_at": datetime.now(timezone.utc).isoformat()}}
+    )
     
     logger.info(f"[ADMIN] Historique supprimé pour session {session_id} par {caller_email}. {result.modified_count} messages.")
+    message_cache.invalidate(session_id)
+    await notification_hub.forget_session(session_id)
+    await emit_unread_update(["coach", "client"], session_id)
     
     return {
         "success": True, 
@@ -4812,41 +5163,33 @@ async def create_or_get_private_conversation(request: Request):
     if not all([participant_1_id, participant_2_id]):
         raise HTTPException(status_code=400, detail="IDs des participants requis")
     
-    # Vérifier si une conversation existe déjà (dans les deux sens)
-    existing = await db.private_conversations.find_one({
-        "$or": [
-            {"participant_1_id": participant_1_id, "participant_2_id": participant_2_id},
-            {"participant_1_id": participant_2_id, "participant_2_id": participant_1_id}
-        ]
-    }, {"_id": 0})
-    
-    if existing:
-        logger.info(f"[MP] Conversation existante trouvée: {existing.get('id')}")
-        return existing
-    
-    # Créer une nouvelle conversation
+    # Get-or-create atomique sur la clé de paire (index unique, les deux sens)
+    pair_key = private_pair_key(participant_1_id, participant_2_id)
     conversation = PrivateConversation(
         participant_1_id=participant_1_id,
         participant_1_name=participant_1_name or "Membre",
         participant_2_id=participant_2_id,
-        participant_2_name=participant_2_name or "Membre"
+        participant_2_name=participant_2_name or "Membre",
+        pair_key=pair_key,
+        participant_ids=sorted([participant_1_id, participant_2_id])
     )
-    await db.private_conversations.insert_one(conversation.model_dump())
-    logger.info(f"[MP] Nouvelle conversation créée: {conversation.id}")
-    return conversation.model_dump()
+    result = await get_or_create_private_conversation(db.private_conversations, conversation.model_dump())
+    
+    if result.get("id") != conversation.id:
+        logger.info(f"[MP] Conversation existante trouvée: {result.get('id')}")
+    else:
+        logger.info(f"[MP] Nouvelle conversation créée: {conversation.id}")
+    return result
 
 @api_router.get("/private/conversations/{participant_id}")
 async def get_private_conversations(participant_id: str):
     """
     Récupère toutes les conversations privées d'un participant.
     """
-    conversations = await db.private_conversations.find({
-        "$or": [
-            {"participant_1_id": participant_id},
-            {"participant_2_id": participant_id}
-        ]
-    }, {"_id": 0}).sort("last_message_at", -1).to_list(50)
-    return conversations
+    conversations = await db.private_conversations.find(
+        {"participant_ids": participant_id}, {"_id": 0}
+    ).sort("last_message_at", -1).to_list(50)
+    return trusted_response(conversations)
 
 @api_router.post("/private/messages")
 async def send_private_message(request: Request):
@@ -4899,10 +5242,28 @@ async def send_private_message(request: Request):
     return message.model_dump()
 
 @api_router.get("/private/messages/{conversation_id}")
-async def get_private_messages(conversation_id: str, limit: int = 100):
+async def get_private_messages(conversation_id: str, limit: int = 100, before: Optional[str] = None,
+                               after: Optional[str] = None, page_size: Optional[int] = None):
     """
     Récupère les messages d'une conversation privée.
+    before / after / page_size: page de taille fixe, plus récent d'abord (curseur created_at + id).
     """
+    if before is not None or after is not None or page_size is not None:
+        size = clamp_page_size(page_size)
+        query = {"conversation_id": conversation_id, "is_deleted": {"$ne": True}}
+        try:
+            if after or before:
+                query = {"$and": [query, keyset_filter(after or before, older=not after)]}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        order = 1 if after else -1
+        rows = await db.private_messages.find(query, {"_id": 0}).sort(
+            [("created_at", order), ("id", order)]
+        ).to_list(size + 1)
+        page = build_page(rows, size, newer=bool(after),
+                          cursor_of=lambda m: encode_cursor(m.get("created_at") or "", m.get("id") or ""))
+        page["conversation_id"] = conversation_id
+        return page
     messages = await db.private_messages.find(
         {"conversation_id": conversation_id, "is_deleted": {"$ne": True}},
         {"_id": 0}
@@ -4913,23 +5274,41 @@ async def get_private_messages(conversation_id: str, limit: int = 100):
 async def mark_private_messages_read(conversation_id: str, reader_id: str):
     """
     Marque tous les messages d'une conversation comme lus par un participant.
+    Une seule écriture: avance du watermark (lecteur, conversation).
     """
-    result = await db.private_messages.update_many(
-        {"conversation_id": conversation_id, "recipient_id": reader_id, "is_read": False},
-        {"$set": {"is_read": True}}
-    )
-    return {"success": True, "marked_read": result.modified_count}
+    scope = private_scope(conversation_id)
+    previous = await read_watermarks.get(reader_id, scope)
+    query = {"conversation_id": conversation_id, "recipient_id": reader_id, "is_read": False, "is_deleted": {"$ne": True}}
+    if previous:
+        query["created_at"] = {"$gt": previous}
+    marked = await db.private_messages.count_documents(query)
+    await read_watermarks.advance(reader_id, scope)
+    return {"success": True, "marked_read": marked}
 
 @api_router.get("/private/unread/{participant_id}")
 async def get_unread_private_count(participant_id: str):
     """
     Compte les messages privés non lus pour un participant.
+    Non lu = reçu après le watermark de la conversation (is_read hérité pour l'historique).
     """
-    count = await db.private_messages.count_documents({
+    marks = await read_watermarks.get_many(participant_id)
+    read_until = {
+        scope[len("pm:"):]: effective_watermark(marks, scope)
+        for scope in marks if scope.startswith("pm:")
+    }
+    query = {
         "recipient_id": participant_id,
         "is_read": False,
         "is_deleted": {"$ne": True}
-    })
+    }
+    if marks.get(GLOBAL_SCOPE):
+        query["created_at"] = {"$gt": marks[GLOBAL_SCOPE]}
+    if read_until:
+        query["$or"] = [{"conversation_id": {"$nin": list(read_until)}}] + [
+            {"conversation_id": conv_id, "created_at": {"$gt": watermark}}
+            for conv_id, watermark in read_until.items()
+        ]
+    count = await db.private_messages.count_documents(query)
     return {"unread_count": count}
 
 # ==================== UPLOAD PHOTO DE PROFIL (LEGACY REDIRECT) ====================
@@ -4940,110 +5319,200 @@ async def upload_profile_photo_legacy(file: UploadFile = File(...), participant_
     """Endpoint legacy - redirige vers /users/upload-photo"""
     return await upload_user_photo(file=file, participant_id=participant_id)
 
+@api_router.post("/uploads/gc")
+async def sweep_orphan_uploads(dry_run: bool = True):
+    """
+    Balayage des photos de profil orphelines (aussi exécuté toutes les 6h).
+    dry_run=true (défaut): rapport sans suppression.
+    """
+    return await upload_sweeper.sweep(dry_run=dry_run)
+
+@api_router.get("/uploads/gc")
+async def get_upload_gc_report():
+    """Rapport du dernier balayage effectif."""
+    return {"last_report": upload_sweeper.last_report}
+
 # ==================== NOTIFICATIONS (SONORES ET VISUELLES) ====================
 
 @api_router.get("/notifications/unread")
 async def get_unread_notifications(
     target: str = "coach",  # "coach" ou "client"
     session_id: Optional[str] = None,
-    include_ai: bool = False  # Inclure les réponses IA dans les notifications coach
+    include_ai: bool = False,  # Inclure les réponses IA dans les notifications coach
+    since_version: Optional[int] = None,  # Long-poll: version connue du client
+    wait: int = 0  # Long-poll: secondes max d'attente d'un changement (fallback sans Socket.IO)
 ):
     """
     Récupère les messages non notifiés pour le coach ou un client.
-    Optimisé pour le polling toutes les 10 secondes.
+    Le compteur vient du hub en mémoire (poussé via Socket.IO 'unread_update');
+    cet endpoint sert au chargement initial et de fallback long-poll.
     
     Paramètres:
     - target: "coach" pour les messages user, "client" pour les réponses AI/coach
     - session_id: Optionnel, filtrer par session
     - include_ai: Si true et target=coach, inclut aussi les réponses IA (pour suivi)
+    - since_version + wait: attend (max 30s) qu'un changement survienne
     
     Retourne:
     - count: Nombre de messages non notifiés
     - messages: Liste des messages (max 10, triés par date décroissante)
     - target: Target demandé
+    - version: Version du hub (à renvoyer en since_version)
     """
-    query = {
-        "is_deleted": {"$ne": True},
-        "notified": {"$ne": True}
-    }
+    if since_version is not None and wait > 0:
+        await notification_hub.wait_for_change(since_version, min(wait, 30))
     
-    if target == "coach":
-        if include_ai:
-            # Messages utilisateurs + réponses IA (pour suivi)
-            query["sender_type"] = {"$in": ["user", "ai"]}
-        else:
-            # Seulement messages des utilisateurs
-            query["sender_type"] = "user"
-    else:
-        # Messages de l'IA ou du coach destinés aux clients
-        query["sender_type"] = {"$in": ["ai", "coach"]}
+    count = notification_hub.count(target, session_id, include_ai=include_ai)
+    messages = []
     
-    if session_id:
-        query["session_id"] = session_id
-    
-    # Compter le nombre total (limité pour performance)
-    count = await db.chat_messages.count_documents(query)
-    
-    # Récupérer les messages non notifiés les plus récents (max 10 pour performance)
-    messages = await db.chat_messages.find(
-        query, 
-        {"_id": 0, "id": 1, "session_id": 1, "sender_name": 1, "sender_type": 1, "content": 1, "created_at": 1}
-    ).sort("created_at", -1).limit(10).to_list(10)
+    # Requête DB uniquement s'il y a effectivement des messages non lus,
+    # restreinte aux sessions ayant un compteur > 0, filtrée par watermark
+    if count:
+        targets = ["coach", "coach_ai"] if (target == "coach" and include_ai) else [target]
+        senders = sorted({st for t in targets for st in SENDERS_BY_TARGET[t]})
+        session_ids = [session_id] if session_id else notification_hub.sessions_with_unread(targets)
+        query = {
+            "session_id": {"$in": session_ids},
+            "sender_type": {"$in": senders},
+            "is_deleted": {"$ne": True},
+            "notified": {"$ne": True}
+        }
+        marks = await read_watermarks.get_many(READER_BY_TARGET[target], session_ids)
+        candidates = await db.chat_messages.find(
+            query, 
+            {"_id": 0, "id": 1, "session_id": 1, "sender_name": 1, "sender_type": 1, "content": 1, "created_at": 1}
+        ).sort("created_at", -1).limit(50).to_list(50)
+        # Messages non lus les plus récents (max 10 pour performance)
+        messages = [
+            m for m in candidates
+            if is_unread(m.get("created_at"), effective_watermark(marks, m.get("session_id")))
+        ][:10]
     
     return {
         "count": count,
         "messages": messages,
-        "target": target
+        "target": target,
+        "version": notification_hub.version
     }
 
 # === EMOJIS PERSONNALISÉS DU COACH ===
 @api_router.get("/custom-emojis/list")
-async def list_custom_emojis():
+async def list_custom_emojis(request: Request):
     """
-    Liste tous les emojis personnalisés disponibles dans /uploads/emojis/
+    Manifeste des emojis personnalisés (stockage des emojis), mémorisé et versionné.
+    Chaque emoji porte sa position dans la planche `sprite.url` (une seule image).
+    ETag = version: If-None-Match -> 304.
     """
-    emojis = []
     try:
-        emoji_files = list(EMOJIS_DIR.glob("*.*"))
-        for f in emoji_files:
-            if f.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg']:
-                emojis.append({
-                    "name": f.stem,
-                    "url": f"/api/emojis/{f.name}",
-                    "filename": f.name
-                })
-        logger.info(f"[EMOJIS] {len(emojis)} emojis trouvés")
+        manifest = await emoji_registry.manifest()
     except Exception as e:
         logger.error(f"[EMOJIS] Erreur listing: {e}")
+        return {"emojis": [], "count": 0}
+    
+    etag = f'"{manifest.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return trusted_response(
+        manifest.as_dict("/api/custom-emojis/sprite.png", "/api/custom-emojis/atlas.json"), headers=headers
+    )
+
+def _versioned_cache_headers(requested_version: Optional[str], version: str) -> dict:
+    """URL versionnée à jour: cache immuable; sinon (ancienne version / sans v): revalidation."""
+    cache_control = SPRITE_CACHE_CONTROL if requested_version == version else "no-cache"
+    return {"ETag": f'"{version}"', "Cache-Control": cache_control}
+
+@api_router.get("/custom-emojis/sprite.png")
+async def get_emoji_sprite(request: Request, v: Optional[str] = None):
+    """Planche PNG de tous les emojis (cases de `cell` px, positions dans l'atlas / le manifeste)."""
+    version, sprite = await emoji_registry.sprite()
+    headers = _versioned_cache_headers(v, version)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=sprite, media_type="image/png", headers=headers)
+
+@api_router.get("/custom-emojis/atlas.json")
+async def get_emoji_atlas(request: Request, v: Optional[str] = None):
+    """Atlas JSON de la planche: { filename: {x, y, w, h} }."""
+    manifest = await emoji_registry.manifest()
+    headers = _versioned_cache_headers(v, manifest.version)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return trusted_response(manifest.atlas, headers=headers)
+
+async def _emoji_intake(request: Request, base64_field: str):
+    """
+    (champs, IntakeFile | None) d'un upload d'emoji: multipart binaire (champ 'file')
+    ou JSON legacy avec l'image en base64 dans `base64_field`. Taille max MAX_EMOJI_BYTES.
+    """
+    import base64
     
-    return {"emojis": emojis, "count": len(emojis)}
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form(max_files=1, max_fields=10)
+            try:
+                upload = form.get("file")
+                if upload is None or isinstance(upload, str):
+                    raise HTTPException(status_code=400, detail="Champ 'file' requis")
+                fields = {k: v for k, v in form.items() if isinstance(v, str)}
+                return fields, await read_upload(upload, MAX_EMOJI_BYTES)
+            finally:
+                await form.close()
+        
+        body = await request.json()
+        image_data = body.get(base64_field) or ""
+        if not image_data:
+            return body, None
+        encoded = image_data.split(",")[-1]
+        if len(encoded) > base64_limit(MAX_EMOJI_BYTES):
+            raise UploadTooLarge(MAX_EMOJI_BYTES)
+        try:
+            decoded = base64.b64decode(encoded)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Base64 invalide")
+        return body, await read_bytes(decoded, MAX_EMOJI_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedImage:
+        raise HTTPException(status_code=400, detail="Format non supporté. Utilisez PNG, JPG, GIF ou WebP.")
+
+
+async def _store_emoji_file(intake, stem: str, coach: bool = False):
+    """
+    Publie l'upload (déjà borné et typé) dans le stockage des emojis; retourne (nom, URL).
+    Le préfixe "custom_" est réservé aux emojis du coach (exclus du sélecteur).
+    """
+    import re
+    
+    safe_stem = re.sub(r"[^a-z0-9_-]", "", stem.replace(" ", "_").lower()) or "emoji"
+    if not coach and safe_stem.startswith(COACH_EMOJI_PREFIX):
+        safe_stem = f"emoji_{safe_stem}"
+    filename = f"{safe_stem}.{intake.extension}"
+    try:
+        intake.file.seek(0)
+        url = await emoji_storage.put_file(filename, intake.file, intake.content_type)
+    finally:
+        intake.close()
+    return filename, url
+
 
 @api_router.post("/custom-emojis/upload")
-async def upload_custom_emoji(request: Request):
+async def upload_custom_emoji_file(request: Request):
     """
     Upload un emoji personnalisé (pour le coach).
-    Accepte une image en base64 avec un nom.
+    Multipart: champ 'file' (binaire) + 'name'. Legacy: JSON {name, image (base64)}.
+    L'extension est déduite du contenu, pas de la requête.
     """
-    import base64
+    fields, intake = await _emoji_intake(request, "image")
+    name = fields.get("name", "emoji")
     
-    body = await request.json()
-    name = body.get("name", "emoji")
-    image_data = body.get("image")  # base64 encoded
-    file_extension = body.get("extension", "png")
-    
-    if not image_data:
+    if intake is None:
         raise HTTPException(status_code=400, detail="Image data required")
     
     try:
-        # Décoder le base64
-        image_bytes = base64.b64decode(image_data.split(",")[-1] if "," in image_data else image_data)
-        
-        # Sauvegarder le fichier
-        filename = f"{name.replace(' ', '_').lower()}.{file_extension}"
-        filepath = EMOJIS_DIR / filename
-        
-        with open(filepath, "wb") as f:
-            f.write(image_bytes)
+        filename, url = await _store_emoji_file(intake, name)
+        emoji_registry.invalidate()
         
         logger.info(f"[EMOJIS] Emoji uploadé: {filename}")
         
@@ -5051,7 +5520,7 @@ async def upload_custom_emoji(request: Request):
             "success": True,
             "emoji": {
                 "name": name,
-                "url": f"/api/emojis/{filename}",
+                "url": url,
                 "filename": filename
             }
         }
@@ -5062,12 +5531,14 @@ async def upload_custom_emoji(request: Request):
 @api_router.put("/notifications/mark-read")
 async def mark_notifications_read(request: Request):
     """
-    Marque des messages comme notifiés.
+    Marque des messages comme lus via des watermarks (lecteur, session).
+    Une écriture par session concernée, quel que soit le nombre de messages.
     
     Body:
-    - message_ids: Liste des IDs de messages à marquer comme notifiés
+    - message_ids: IDs des messages lus (le watermark avance jusqu'au plus récent par session)
     - all_for_target: "coach" ou "client" pour marquer tous les messages non lus
     - session_id: Optionnel, pour limiter à une session
+    - reader: Optionnel avec message_ids, "coach" (défaut) ou "client"
     """
     body = await request.json()
     message_ids = body.get("message_ids", [])
@@ -5077,33 +5548,32 @@ async def mark_notifications_read(request: Request):
     update_count = 0
     
     if message_ids:
-        # Marquer des messages spécifiques
-        result = await db.chat_messages.update_many(
+        reader = body.get("reader", "coach")
+        read_messages = await db.chat_messages.find(
             {"id": {"$in": message_ids}},
-            {"$set": {"notified": True}}
-        )
-        update_count = result.modified_count
+            {"_id": 0, "session_id": 1, "created_at": 1}
+        ).to_list(len(message_ids))
+        # Plus récent message lu par session -> une avance de watermark par session
+        latest_by_session = {}
+        for m in read_messages:
+            sid, created_at = m.get("session_id"), m.get("created_at") or ""
+            if sid and created_at > latest_by_session.get(sid, ""):
+                latest_by_session[sid] = created_at
+        targets = [t for t, r in READER_BY_TARGET.items() if r == reader]
+        for sid, created_at in latest_by_session.items():
+            before = sum(notification_hub.count(t, sid) for t in targets)
+            await read_watermarks.advance(reader, sid, created_at)
+            await recount_session_unread(sid, targets)
+            update_count += max(0, before - sum(notification_hub.count(t, sid) for t in targets))
     
     elif all_for_target:
-        # Marquer tous les messages pour un target
-        query = {
-            "is_deleted": {"$ne": True},
-            "notified": {"$ne": True}
-        }
-        
-        if all_for_target == "coach":
-            query["sender_type"] = "user"
-        else:
-            query["sender_type"] = {"$in": ["ai", "coach"]}
-        
-        if session_id:
-            query["session_id"] = session_id
-        
-        result = await db.chat_messages.update_many(
-            query,
-            {"$set": {"notified": True}}
-        )
-        update_count = result.modified_count
+        # Tout marquer comme lu pour un lecteur: UNE écriture (watermark session ou global)
+        reader = "coach" if all_for_target == "coach" else "client"
+        targets = [t for t, r in READER_BY_TARGET.items() if r == reader]
+        update_count = sum(notification_hub.count(t, session_id) for t in targets)
+        await read_watermarks.advance(reader, session_id or GLOBAL_SCOPE)
+        await notification_hub.clear(targets, session_id)
+        await emit_unread_update(targets, session_id)
     
     logger.info(f"[NOTIFICATIONS] Marqué {update_count} messages comme lus (target: {all_for_target})")
     
@@ -5223,57 +5693,25 @@ async def smart_chat_entry(request: Request):
     if not name:
         raise HTTPException(status_code=400, detail="Le nom est requis")
     
-    # Rechercher un participant existant
-    existing_participant = None
-    search_query = {"$or": []}
-    
-    if email:
-        search_query["$or"].append({"email": {"$regex": f"^{email}$", "$options": "i"}})
-    if whatsapp:
-        clean_whatsapp = whatsapp.replace(" ", "").replace("-", "").replace("+", "")
-        if clean_whatsapp:
-            search_query["$or"].append({"whatsapp": {"$regex": clean_whatsapp}})
-    
-    # Recherche aussi par nom exact
-    search_query["$or"].append({"name": {"$regex": f"^{name}$", "$options": "i"}})
-    
-    if search_query["$or"]:
-        existing_participant = await db.chat_participants.find_one(search_query, {"_id": 0})
-    
     # Déterminer la source
     source = f"link_{link_token}" if link_token else "chat_afroboost"
     
-    if existing_participant:
-        # Participant reconnu - mettre à jour last_seen
-        participant_id = existing_participant["id"]
-        update_fields = {"last_seen_at": datetime.now(timezone.utc).isoformat()}
-        
-        # Mettre à jour les infos si nouvelles
-        if email and not existing_participant.get("email"):
-            update_fields["email"] = email
-        if whatsapp and not existing_participant.get("whatsapp"):
-            update_fields["whatsapp"] = whatsapp
-        
-        await db.chat_participants.update_one(
-            {"id": participant_id},
-            {"$set": update_fields}
-        )
-        
-        participant = await db.chat_participants.find_one({"id": participant_id}, {"_id": 0})
-        is_returning = True
-    else:
-        # Nouveau participant
-        participant_obj = ChatParticipant(
-            name=name,
-            email=email,
-            whatsapp=whatsapp,
-            source=source,
-            link_token=link_token
+    # Participant existant (email > WhatsApp > nom, clés normalisées indexées) ou création
+    new_participant = ChatParticipant(
+        name=name,
+        email=email,
+        whatsapp=whatsapp,
+        source=source,
+        link_token=link_token
+    ).model_dump()
+    participant, created = await contact_identities.resolve_or_create(new_participant, email, whatsapp, name)
+    participant_id = participant["id"]
+    is_returning = not created
+    if is_returning:
+        # Participant reconnu - mettre à jour last_seen + infos si nouvelles
+        participant = await contact_identities.attach(
+            participant, email, whatsapp, extra={"last_seen_at": datetime.now(timezone.utc).isoformat()}
         )
-        await db.chat_participants.insert_one(participant_obj.model_dump())
-        participant = participant_obj.model_dump()
-        participant_id = participant["id"]
-        is_returning = False
     
     # Trouver ou créer la session
     session = None
@@ -5322,10 +5760,7 @@ async def smart_chat_entry(request: Request):
     # Récupérer l'historique des messages si participant existant
     chat_history = []
     if is_returning:
-        chat_history = await db.chat_messages.find(
-            {"session_id": session["id"], "is_deleted": {"$ne": True}},
-            {"_id": 0}
-        ).sort("created_at", 1).to_list(50)
+        chat_history = await recent_session_messages(session["id"], 50)
     
     return {
         "participant": participant,
@@ -5381,11 +5816,12 @@ async def get_ai_response_with_session(request: Request):
         content=message_text,
         mode=session.get("mode", "ai")
     )
-    await db.chat_messages.insert_one(user_message.model_dump())
+    user_message.seq = (await store_chat_message(user_message.model_dump()))["seq"]
     
     # === SOCKET.IO: Émettre le message utilisateur en temps réel ===
     await emit_new_message(session_id, {
         "id": user_message.id,
+        "seq": user_message.seq,
         "type": "user",
         "text": message_text,
         "sender": participant_name,
@@ -5414,7 +5850,7 @@ async def get_ai_response_with_session(request: Request):
         }
     
     # Récupérer la config IA
-    ai_config = await db.ai_config.find_one({"id": "ai_config"}, {"_id": 0})
+    ai_config = await settings_cache.get(AI_CONFIG)
     if not ai_config or not ai_config.get("enabled"):
         return {
             "response": "L'assistant IA est actuellement désactivé.",
@@ -5638,15 +6074,12 @@ async def get_ai_response_with_session(request: Request):
         
         # === HISTORIQUE DE CONVERSATION ===
         try:
-            recent_messages = await db.chat_messages.find(
-                {"session_id": session_id, "is_deleted": {"$ne": True}},
-                {"_id": 0}
-            ).sort("created_at", -1).limit(10).to_list(10)
+            recent_messages = await recent_session_messages(session_id, 10)
             
             if recent_messages and len(recent_messages) > 1:
                 history = "\n".join([
                     f"{'Client' if m.get('sender_type') == 'user' else 'Assistant'}: {m.get('content', '')}"
-                    for m in reversed(recent_messages[1:])  # Exclure le message actuel
+                    for m in recent_messages[:-1]  # Exclure le message actuel
                 ])
                 context += f"\n\n📜 HISTORIQUE RÉCENT:\n{history}"
         except Exception as e:
@@ -5832,11 +6265,12 @@ Si la question ne concerne pas un produit ou un cours Afroboost, réponds:
             content=ai_response_text,
             mode="ai"
         )
-        await db.chat_messages.insert_one(ai_message.model_dump())
+        ai_message.seq = (await store_chat_message(ai_message.model_dump()))["seq"]
         
         # === SOCKET.IO: Émettre la réponse IA en temps réel ===
         await emit_new_message(session_id, {
             "id": ai_message.id,
+            "seq": ai_message.seq,
             "type": "ai",
             "text": ai_response_text,
             "sender": "Coach Bassi",
@@ -5900,11 +6334,12 @@ async def send_coach_response(request: Request):
         content=message_text,
         mode=session.get("mode", "human")
     )
-    await db.chat_messages.insert_one(coach_message.model_dump())
+    coach_message.seq = (await store_chat_message(coach_message.model_dump()))["seq"]
     
     # === SOCKET.IO: Émettre le message coach en temps réel ===
     await emit_new_message(session_id, {
         "id": coach_message.id,
+        "seq": coach_message.seq,
         "type": "coach",
         "text": message_text,
         "sender": "Coach Bassi",
@@ -5979,7 +6414,7 @@ async def start_private_chat(request: Request):
         content=f"💬 Discussion privée créée entre {initiator.get('name', '')} et {target.get('name', '')}.",
         mode="human"
     )
-    await db.chat_messages.insert_one(welcome_message.model_dump())
+    welcome_message.seq = (await store_chat_message(welcome_message.model_dump()))["seq"]
     
     return {
         "session": private_session.model_dump(),
@@ -5988,46 +6423,51 @@ async def start_private_chat(request: Request):
     }
 
 # --- Custom Emojis/Stickers ---
+async def _load_chat_emojis():
+    return await db.custom_emojis.find({"active": True}, {"_id": 0}).sort("created_at", -1).to_list(100)
+
 @api_router.get("/chat/emojis")
-async def get_custom_emojis():
-    """Récupère tous les emojis personnalisés uploadés par le coach"""
-    emojis = await db.custom_emojis.find({"active": True}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return emojis
+async def get_custom_emojis(request: Request):
+    """Récupère tous les emojis personnalisés uploadés par le coach (mémorisé + ETag)"""
+    return await response_cache.serve(request, "chat-emojis", _load_chat_emojis)
 
 @api_router.post("/chat/emojis")
 async def upload_custom_emoji(request: Request):
     """
-    Upload un emoji personnalisé (image base64).
+    Upload un emoji personnalisé.
     
-    Body attendu:
+    Multipart (recommandé): champs 'file' (binaire), 'name', 'category' (optionnel)
+    Legacy JSON:
     {
         "name": "happy",
         "image_data": "data:image/png;base64,...",
         "category": "emotions"  # optionnel
     }
+    Le fichier est publié dans le stockage des emojis (image_url); plus de base64 stocké en DB.
     """
-    body = await request.json()
-    name = body.get("name", "").strip()
-    image_data = body.get("image_data", "")
-    category = body.get("category", "custom")
+    fields, intake = await _emoji_intake(request, "image_data")
+    name = (fields.get("name") or "").strip()
+    category = fields.get("category") or "custom"
     
-    if not name or not image_data:
-        raise HTTPException(status_code=400, detail="name et image_data sont requis")
+    if not name or intake is None:
+        if intake is not None:
+            intake.close()
+        raise HTTPException(status_code=400, detail="name et fichier image (file ou image_data) sont requis")
     
-    # Valider le format base64
-    if not image_data.startswith("data:image/"):
-        raise HTTPException(status_code=400, detail="Format d'image invalide. Utilisez base64 (data:image/...)")
+    emoji_id = str(uuid.uuid4())
+    _, image_url = await _store_emoji_file(intake, f"{COACH_EMOJI_PREFIX}{emoji_id}", coach=True)
     
     emoji_obj = {
-        "id": str(uuid.uuid4()),
+        "id": emoji_id,
         "name": name,
-        "image_data": image_data,
+        "image_url": image_url,
         "category": category,
         "active": True,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.custom_emojis.insert_one(emoji_obj)
+    response_cache.invalidate("chat-emojis")
     
     # Retourner sans _id (MongoDB l'ajoute automatiquement)
     emoji_obj.pop("_id", None)
@@ -6035,10 +6475,14 @@ async def upload_custom_emoji(request: Request):
 
 @api_router.delete("/chat/emojis/{emoji_id}")
 async def delete_custom_emoji(emoji_id: str):
-    """Supprime un emoji personnalisé"""
-    result = await db.custom_emojis.delete_one({"id": emoji_id})
-    if result.deleted_count == 0:
+    """Supprime un emoji personnalisé (document + fichier publié)"""
+    emoji = await db.custom_emojis.find_one_and_delete({"id": emoji_id}, {"_id": 0, "image_url": 1})
+    if emoji is None:
         raise HTTPException(status_code=404, detail="Emoji non trouvé")
+    response_cache.invalidate("chat-emojis")
+    key = emoji_storage.key_from_url(emoji["image_url"]) if emoji.get("image_url") else None
+    if key:
+        await emoji_storage.delete_many([key])
     return {"success": True, "message": "Emoji supprimé"}
 
 # --- Get Session Participants (for community chat) ---
@@ -6093,40 +6537,57 @@ async def unsubscribe_push(participant_id: str):
     await db.push_subscriptions.update_one({"participant_id": participant_id}, {"$set": {"active": False}})
     return {"success": True}
 
+# Sender push partagé: pool de threads dédié + JWT VAPID réutilisé par origine
+push_sender = AsyncPushSender(VapidTokenCache(VAPID_PRIVATE_KEY, VAPID_CLAIMS_EMAIL))
+
+def _session_socket_active(session_id: str) -> bool:
+    """True si au moins un client Socket.IO est dans la room de la session."""
+    try:
+        return bool(sio.manager.rooms.get('/', {}).get(session_id))
+    except Exception:
+        return False
+
+def _build_push_payload(title: str, body: str, data: dict = None) -> str:
+    return json.dumps({"title": title, "body": body, "icon": "/logo192.png", "badge": "/logo192.png", "data": data or {}, "timestamp": datetime.now(timezone.utc).isoformat()})
+
+async def _deliver_push(query: dict, payload: str) -> PushReport:
+    """Fan-out vers toutes les souscriptions actives du filtre + désactivation en bloc des 404/410."""
+    subs = await db.push_subscriptions.find({**query, "active": True}, {"_id": 0, "subscription": 1}).to_list(None)
+    report = await push_sender.send_many([s.get("subscription") for s in subs], payload)
+    if report.expired_endpoints:
+        await db.push_subscriptions.update_many(
+            {"subscription.endpoint": {"$in": report.expired_endpoints}},
+            {"$set": {"active": False, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        logger.debug(f"[PUSH] {len(report.expired_endpoints)} souscription(s) desactivee(s) (410/404)")
+    return report
+
 async def send_push_notification(participant_id: str, title: str, body: str, data: dict = None, session_id: str = None):
-    """Envoie une notification push a un participant (sauf si socket actif)."""
+    """Envoie une notification push a tous les appareils d'un participant (sauf si socket actif)."""
     if not WEBPUSH_AVAILABLE or not VAPID_PRIVATE_KEY:
         return False
     # Verifier si socket actif (chat ouvert) - evite vibration inutile
-    if session_id:
-        try:
-            room_sids = list(sio.manager.rooms.get('/', {}).get(session_id, set()))
-            if room_sids:
-                logger.debug(f"[PUSH] Skip - socket actif")
-                return False
-        except Exception:
-            pass
-    # Recuperer la souscription
-    sub = await db.push_subscriptions.find_one({"participant_id": participant_id, "active": True}, {"_id": 0})
-    if not sub or not sub.get("subscription"):
+    if session_id and _session_socket_active(session_id):
+        logger.debug(f"[PUSH] Skip - socket actif")
         return False
-    subscription_info = sub["subscription"]
-    payload = json.dumps({"title": title, "body": body, "icon": "/logo192.png", "badge": "/logo192.png", "data": data or {}, "timestamp": datetime.now(timezone.utc).isoformat()})
     try:
-        webpush(subscription_info=subscription_info, data=payload, vapid_private_key=VAPID_PRIVATE_KEY, vapid_claims={"sub": f"mailto:{VAPID_CLAIMS_EMAIL}"})
-        logger.debug(f"[PUSH] Sent OK")
-        return True
-    except WebPushException as e:
-        if e.response and e.response.status_code in [404, 410]:
-            await db.push_subscriptions.update_one({"participant_id": participant_id}, {"$set": {"active": False}})
-            logger.debug(f"[PUSH] Subscription desactivee (410/404)")
-        else:
-            logger.error(f"[PUSH] Echec critique: {str(e)}")
-        return False
+        report = await _deliver_push({"participant_id": participant_id}, _build_push_payload(title, body, data))
+        logger.debug(f"[PUSH] {report.sent} envoi(s) OK, {report.failed} echec(s)")
+        return report.delivered
     except Exception as e:
         logger.error(f"[PUSH] Erreur: {str(e)}")
         return False
 
+async def send_push_to_participants(participant_ids: List[str], title: str, body: str, data: dict = None) -> PushReport:
+    """Notification groupe: une seule requete DB, envois concurrents sur tous les appareils."""
+    if not WEBPUSH_AVAILABLE or not VAPID_PRIVATE_KEY or not participant_ids:
+        return PushReport()
+    try:
+        return await _deliver_push({"participant_id": {"$in": list(participant_ids)}}, _build_push_payload(title, body, data))
+    except Exception as e:
+        logger.error(f"[PUSH] Erreur groupe: {str(e)}")
+        return PushReport(failed=len(participant_ids))
+
 async def send_backup_email(participant_id: str, message_preview: str):
     """Envoie un email de backup si la notification push echoue."""
     participant = await db.chat_participants.find_one({"id": participant_id}, {"_id": 0})
@@ -6188,7 +6649,7 @@ async def notify_coach_new_message(participant_name: str, message_preview: str,
     Crucial pour ne pas rater de ventes.
     """
     # Récupérer l'email du coach depuis coach_auth
-    coach_auth = await db.coach_auth.find_one({}, {"_id": 0})
+    coach_auth = await settings_cache.get(COACH_AUTH)
     if not coach_auth or not coach_auth.get("email"):
         logger.warning("Coach email not configured - cannot send notification")
         return False
@@ -6247,6 +6708,72 @@ async def notify_coach_new_message(participant_name: str, message_preview: str,
 # =============================================
 # ENDPOINT CAMPAGNES EMAIL VIA RESEND
 # =============================================
+async def build_campaign_email_template(subject: str, message: str, media_url: str = None,
+                                        cta_text: str = None, cta_link: str = None,
+                                        layout: str = "v5") -> CampaignEmailTemplate:
+    """
+    Compile le template email d'une campagne (une seule fois par envoi).
+    Le lien média interne (/v/slug, /api/share/slug) est résolu en DB ici.
+    """
+    media_html = ""
+    if media_url:
+        # PRIORITÉ: FRONTEND_URL explicite, sinon afroboosteur.com (production)
+        frontend_base = os.environ.get('FRONTEND_URL', '')
+        if not frontend_base or 'afroboosteur.com' in frontend_base:
+            frontend_base = EMAIL_FRONTEND_BASE_URL
+        media_link = None
+        slug = extract_media_slug(media_url)
+        if slug:
+            media_link = await db.media_links.find_one({"slug": slug.lower()}, {"_id": 0})
+        click_url, thumbnail_url = resolve_media(media_url, media_link, frontend_base)
+        media_html = build_media_html(click_url, thumbnail_url)
+        logger.info(f"[EMAIL] Media: click_url={click_url}, thumbnail={thumbnail_url}")
+    
+    return CampaignEmailTemplate(
+        subject=subject,
+        message=message,
+        media_html=media_html,
+        cta_html=build_cta_html(cta_text, cta_link),
+        layout=layout
+    )
+
+async def send_campaign_email_batch(entries: List[dict], subject: str, message: str, media_url: str = None,
+                                    cta_text: str = None, cta_link: str = None, layout: str = "v5"):
+    """
+    Envoie un email de campagne à plusieurs destinataires via le batch Resend.
+    entries = résultats campagne ({contactEmail, contactName, ...}) mis à jour en place.
+    Returns: (success_count, fail_count)
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    if not RESEND_API_KEY:
+        for entry in entries:
+            entry["status"] = "simulated"
+            entry["sentAt"] = now
+        logger.info(f"[EMAIL-BATCH] 🧪 {len(entries)} email(s) simulés (Resend non configuré)")
+        return 0, 0
+    
+    template = await build_campaign_email_template(subject, message, media_url, cta_text, cta_link, layout)
+    emails = [template.build_email(e["contactEmail"], e.get("contactName")) for e in entries]
+    
+    try:
+        batch_results = await asyncio.to_thread(send_email_batch, emails, RESEND_API_KEY)
+    except Exception as e:
+        batch_results = [{"success": False, "error": str(e)} for _ in emails]
+    
+    sent = 0
+    for entry, outcome in zip(entries, batch_results):
+        if outcome.get("success"):
+            entry["status"] = "sent"
+            entry["sentAt"] = now
+            entry["email_id"] = outcome.get("email_id")
+            sent += 1
+        else:
+            entry["status"] = "failed"
+            entry["error"] = outcome.get("error", "Unknown error")
+    
+    logger.info(f"[EMAIL-BATCH] 🏁 {sent}/{len(entries)} email(s) envoyés")
+    return sent, len(entries) - sent
+
 @api_router.post("/campaigns/send-email")
 async def send_campaign_email(request: Request):
     """
@@ -6258,191 +6785,62 @@ async def send_campaign_email(request: Request):
         "to_email": "destinataire@example.com",
         "to_name": "Nom Destinataire",
         "subject": "Sujet de l'email",
-        "message": "Contenu HTML ou texte",
-        "media_url": "URL du visuel ou lien interne /v/slug (optionnel)"
+        "message": "Contenu HTML ou texte ({prénom} personnalisé)",
+        "media_url": "URL du visuel ou lien interne /v/slug (optionnel)",
+        "cta_text": "Texte du bouton (optionnel)",
+        "cta_link": "Lien du bouton (optionnel)",
+        "recipients": [{"to_email": "...", "to_name": "..."}]  (optionnel, envoi batch)
     }
     """
     body = await request.json()
     to_email = body.get("to_email")
-    to_name = body.get("to_name", "")
     subject = body.get("subject", "Message d'Afroboost")
     message = body.get("message", "")
     media_url = body.get("media_url", None)
+    recipients = body.get("recipients") or []
+    if to_email:
+        recipients = [{"to_email": to_email, "to_name": body.get("to_name", "")}] + recipients
     
-    # LOG DEBUG CRITIQUE
-    logger.info(f"=== CAMPAGNE EMAIL ===")
-    logger.info(f"To: {to_email}")
-    logger.info(f"Subject: {subject}")
-    logger.info(f"Media URL reçu: {media_url}")
-    logger.info(f"======================")
+    logger.info(f"[EMAIL] Campagne '{subject}' -> {len(recipients)} destinataire(s), media={media_url}")
     
-    if not to_email:
+    if not recipients:
         raise HTTPException(status_code=400, detail="to_email requis")
     if not message:
         raise HTTPException(status_code=400, detail="message requis")
     
     # Vérifier que Resend est configuré
-    if not RESEND_AVAILABLE or not RESEND_API_KEY:
+    if not RESEND_API_KEY:
         logger.warning("Resend non configuré pour les campagnes")
         return {"success": False, "error": "Resend non configuré"}
     
-    # === TRAITEMENT DU MEDIA URL ===
-    media_html = ""
-    if media_url:
-        thumbnail_url = None
-        click_url = media_url
-        
-        # Déterminer l'URL de base du frontend (production ou preview)
-        # PRIORITÉ: 1. FRONTEND_URL explicite, 2. Même domaine que REACT_APP_BACKEND_URL
-        frontend_base = os.environ.get('FRONTEND_URL', '')
-        
-        # Si pas de FRONTEND_URL ou si c'est afroboosteur.com, vérifier si on est en preview
-        if not frontend_base or 'afroboosteur.com' in frontend_base:
-            # Utiliser le même domaine que le backend (pour l'environnement preview)
-            # Le backend est appelé via REACT_APP_BACKEND_URL qui contient le domaine preview
-            from fastapi import Request
-            # Par défaut, utiliser afroboosteur.com pour la production
-            frontend_base = 'https://afroboosteur.com'
-        
-        logger.info(f"Frontend base URL: {frontend_base}")
-        
-        # Vérifier si c'est un lien média interne
-        # Formats supportés: /v/slug, /api/share/slug, afroboosteur.com/v/slug
-        slug = None
-        if '/api/share/' in media_url:
-            slug = media_url.split('/api/share/')[-1].split('?')[0].split('#')[0].strip('/')
-        elif '/v/' in media_url:
-            slug = media_url.split('/v/')[-1].split('?')[0].split('#')[0].strip('/')
-        
-        if slug:
-            # Récupérer la thumbnail depuis la base de données
-            media_link = await db.media_links.find_one({"slug": slug.lower()}, {"_id": 0})
-            if media_link:
-                thumbnail_url = media_link.get("thumbnail") or media_link.get("custom_thumbnail")
-                # HASH ROUTING: Utiliser /#/v/{slug} pour garantir le fonctionnement
-                # sans configuration serveur (100% côté client)
-                click_url = f"{frontend_base}/#/v/{slug}"
-                logger.info(f"Media link found for slug {slug}: click_url={click_url}, thumbnail={thumbnail_url}")
-            else:
-                logger.warning(f"Media link not found for slug: {slug}")
-        else:
-            # URL externe directe (image)
-            thumbnail_url = media_url
-        
-        # Générer le HTML de l'image cliquable - V5 FINAL (taille réduite -20%)
-        if thumbnail_url:
-            if thumbnail_url.startswith('http://'):
-                thumbnail_url = thumbnail_url.replace('http://', 'https://')
-            
-            # Template V5 : Card RÉDUITE (-20%) avec image + bouton
-            # Image: 400px au lieu de 536px
-            media_html = f'''<!-- Image cliquable (taille réduite) -->
-<a href="{click_url}" style="display:block;text-decoration:none;">
-<img src="{thumbnail_url}" width="400" style="display:block;width:100%;max-width:400px;border-radius:8px;margin:0 auto;" alt="Aperçu vidéo">
-</a>
-<!-- Bouton "Voir la vidéo" -->
-<table cellpadding="0" cellspacing="0" border="0" width="100%" style="margin-top:15px;">
-<tr><td align="center">
-<a href="{click_url}" style="display:inline-block;padding:12px 28px;background:#E91E63;color:#ffffff;text-decoration:none;border-radius:8px;font-family:Arial,sans-serif;font-size:14px;font-weight:bold;">
-&#9658; Voir la vidéo
-</a>
-</td></tr>
-</table>'''
-    
-    # =====================================================
-    # Template Email V5 FINAL - Anti-Promotions Maximal
-    # =====================================================
-    # RÈGLES GMAIL ANTI-PROMOTIONS:
-    # 1. TEXTE BRUT en premier (3 lignes minimum AVANT tout design)
-    # 2. Salutation personnalisée
-    # 3. Ratio texte > image
-    # 4. Pas de gradient CSS (Gmail les ignore parfois)
-    # 5. Taille réduite de 20%
-    
-    # Extraire le prénom pour personnalisation
-    to_name = body.get("to_name", "")
-    first_name = to_name.split()[0] if to_name else "ami(e)"
-    preheader_text = f"Salut {first_name}, découvre notre nouvelle vidéo exclusive !"
-    
-    html_content = f'''<!DOCTYPE html>
-<html lang="fr">
-<head>
-<meta charset="utf-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>Message Afroboost</title>
-</head>
-<body style="margin:0;padding:0;background-color:#f5f5f5;font-family:Arial,Helvetica,sans-serif;">
-
-<!-- PREHEADER INVISIBLE -->
-<div style="display:none;font-size:1px;color:#f5f5f5;line-height:1px;max-height:0px;max-width:0px;opacity:0;overflow:hidden;">
-{preheader_text}
-</div>
-
-<!-- WRAPPER -->
-<table width="100%" cellpadding="0" cellspacing="0" border="0" style="background-color:#f5f5f5;">
-<tr><td align="center" style="padding:20px 10px;">
-
-<!-- ========== TEXTE BRUT ANTI-PROMOTIONS (3 lignes AVANT le design) ========== -->
-<table width="480" cellpadding="0" cellspacing="0" border="0" style="max-width:480px;">
-<tr><td style="color:#333333;font-size:14px;line-height:1.6;font-family:Arial,sans-serif;padding-bottom:15px;">
-Salut {first_name},<br><br>
-J'ai une nouvelle vidéo à te partager. Je pense qu'elle va te plaire !<br>
-Clique sur le bouton ci-dessous pour la découvrir.
-</td></tr>
-</table>
-
-<!-- ========== CARD PRINCIPALE (taille réduite 480px) ========== -->
-<table width="480" cellpadding="0" cellspacing="0" border="0" style="max-width:480px;background-color:#111111;border-radius:10px;overflow:hidden;">
-
-<!-- HEADER VIOLET -->
-<tr><td align="center" style="background-color:#9333EA;padding:16px 20px;">
-<a href="https://afroboosteur.com" style="color:#ffffff;font-size:22px;font-weight:bold;text-decoration:none;font-family:Arial,sans-serif;">Afroboost</a>
-</td></tr>
-
-<!-- CONTENU -->
-<tr><td style="padding:20px;">
-
-<!-- IMAGE + BOUTON -->
-{media_html}
-
-<!-- MESSAGE -->
-<table cellpadding="0" cellspacing="0" border="0" width="100%" style="margin-top:20px;">
-<tr><td style="color:#ffffff;font-size:14px;line-height:1.6;font-family:Arial,sans-serif;">
-{message.replace(chr(10), '<br>')}
-</td></tr>
-</table>
-
-</td></tr>
-
-<!-- FOOTER -->
-<tr><td align="center" style="padding:15px 20px;border-top:1px solid #333333;">
-<p style="color:#888888;font-size:11px;margin:0;font-family:Arial,sans-serif;">
-<a href="https://afroboosteur.com" style="color:#9333EA;text-decoration:none;">afroboosteur.com</a>
-</p>
-</td></tr>
-
-</table>
-
-</td></tr>
-</table>
-
-</body>
-</html>'''
+    entries = [
+        {"contactEmail": r.get("to_email"), "contactName": r.get("to_name", "")}
+        for r in recipients if r.get("to_email")
+    ]
+    sent, failed = await send_campaign_email_batch(
+        entries,
+        subject=subject,
+        message=message,
+        media_url=media_url,
+        cta_text=body.get("cta_text"),
+        cta_link=body.get("cta_link")
+    )
     
-    try:
-        params = {
-            "from": "Afroboost <notifications@afroboosteur.com>",
-            "to": [to_email],
-            "subject": subject,
-            "html": html_content
-        }
-        
-        email_result = await asyncio.to_thread(resend.Emails.send, params)
-        logger.info(f"Campaign email sent to {to_email}: {email_result}")
-        return {"success": True, "email_id": email_result.get("id"), "to": to_email}
-    except Exception as e:
-        logger.error(f"Campaign email failed: {str(e)}")
-        return {"success": False, "error": str(e)}
+    if len(entries) == 1:
+        entry = entries[0]
+        if entry["status"] == "sent":
+            return {"success": True, "email_id": entry.get("email_id"), "to": entry["contactEmail"]}
+        return {"success": False, "error": entry.get("error")}
+    
+    return {
+        "success": failed == 0,
+        "sent": sent,
+        "failed": failed,
+        "results": [
+            {"to": e["contactEmail"], "status": e["status"], "email_id": e.get("email_id"), "error": e.get("error")}
+            for e in entries
+        ]
+    }
 
 @api_router.post("/push/send")
 async def send_push_to_participant(request: Request):
@@ -6456,13 +6854,20 @@ async def send_push_to_participant(request: Request):
         "body": "Vous avez une réponse...",
         "send_email_backup": true
     }
+    Ou pour un groupe: { "participant_ids": ["xxx", "yyy"], "title": ..., "body": ... }
     """
     body = await request.json()
     participant_id = body.get("participant_id")
+    participant_ids = body.get("participant_ids") or []
     title = body.get("title", "Afroboost")
     message_body = body.get("body", "Vous avez un nouveau message")
     send_email_backup = body.get("send_email_backup", True)
     
+    # Envoi groupe (pas de backup email)
+    if participant_ids and not participant_id:
+        report = await send_push_to_participants(participant_ids, title, message_body)
+        return {"push_sent": report.sent, "push_failed": report.failed, "expired": len(report.expired_endpoints)}
+    
     if not participant_id:
         raise HTTPException(status_code=400, detail="participant_id requis")
     
@@ -6496,19 +6901,6 @@ class MediaLinkCreate(BaseModel):
     cta_link: Optional[str] = Field(None, description="Lien du bouton CTA")
     campaign_id: Optional[str] = Field(None, description="ID campagne associée")
 
-def extract_youtube_id(url: str) -> Optional[str]:
-    """Extrait l'ID YouTube d'une URL"""
-    import re
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([a-zA-Z0-9_-]{11})',
-        r'youtube\.com\/shorts\/([a-zA-Z0-9_-]{11})'
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    return None
-
 @api_router.post("/media/create")
 async def create_media_link(data: MediaLinkCreate):
     """
@@ -6557,7 +6949,7 @@ async def create_media_link(data: MediaLinkCreate):
     }
 
 @api_router.get("/media/{slug}")
-async def get_media_link(slug: str):
+async def get_media_link(slug: str, request: Request):
     """
     Récupère les infos d'un lien média par son slug.
     Incrémente le compteur de vues.
@@ -6566,11 +6958,9 @@ async def get_media_link(slug: str):
     if not media:
         raise HTTPException(status_code=404, detail="Média non trouvé")
     
-    # Incrémenter les vues
-    await db.media_links.update_one(
-        {"slug": slug.lower()},
-        {"$inc": {"views": 1}}
-    )
+    # Incrémenter les vues (écriture différée, groupée par slug)
+    _record_link_click(slug, "api", request)
+    media["views"] = media.get("views", 0) + view_counter.pending(slug)
     
     return media
 
@@ -6589,60 +6979,33 @@ async def get_media_thumbnail(slug: str):
         "title": media.get("title", "")
     }
 
+# ==================== PAGES OPENGRAPH MÉMORISÉES ====================
+# Un envoi groupé WhatsApp = des centaines d'aperçus simultanés du même slug:
+# HTML rendu une fois par slug (misses concurrents fusionnés), puis servi depuis la mémoire
+
+async def _serve_og_page(request: Request, slug: str, kind: str, render):
+    slug = slug.lower()
+
+    async def load_page() -> str:
+        media = await db.media_links.find_one({"slug": slug}, {"_id": 0})
+        if not media:
+            raise HTTPException(status_code=404, detail="Média non trouvé")
+        return render(media)
+
+    return await og_page_cache.serve(
+        request, f"og:{kind}:{slug}", load_page, serialize=str.encode, media_type=HTML_MEDIA_TYPE
+    )
+
 @api_router.get("/media/{slug}/og")
-async def get_media_opengraph(slug: str):
+async def get_media_opengraph(slug: str, request: Request):
     """
     Retourne une page HTML avec les meta tags OpenGraph pour les previews WhatsApp/réseaux sociaux.
+    Page mémorisée par slug (ETag + 304), invalidée par PUT / DELETE /media/{slug}.
     """
-    media = await db.media_links.find_one({"slug": slug.lower()}, {"_id": 0})
-    if not media:
-        raise HTTPException(status_code=404, detail="Média non trouvé")
-    
-    # Générer la page HTML avec meta tags
-    html = f"""<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{media.get('title', 'Afroboost')}</title>
-    
-    <!-- OpenGraph pour WhatsApp/Facebook/LinkedIn -->
-    <meta property="og:title" content="{media.get('title', 'Afroboost')}" />
-    <meta property="og:description" content="{media.get('description', 'Découvrez cette vidéo exclusive Afroboost')[:200]}" />
-    <meta property="og:image" content="{media.get('thumbnail', '')}" />
-    <meta property="og:image:width" content="1280" />
-    <meta property="og:image:height" content="720" />
-    <meta property="og:url" content="https://afroboosteur.com/v/{slug}" />
-    <meta property="og:type" content="video.other" />
-    <meta property="og:site_name" content="Afroboost" />
-    
-    <!-- Twitter Card -->
-    <meta name="twitter:card" content="summary_large_image" />
-    <meta name="twitter:title" content="{media.get('title', 'Afroboost')}" />
-    <meta name="twitter:description" content="{media.get('description', 'Découvrez cette vidéo exclusive Afroboost')[:200]}" />
-    <meta name="twitter:image" content="{media.get('thumbnail', '')}" />
-    
-    <!-- Redirection automatique vers la page React -->
-    <script>
-        window.location.href = "https://afroboosteur.com/v/{slug}";
-    </script>
-</head>
-<body style="background: #000; color: #fff; font-family: system-ui; display: flex; align-items: center; justify-content: center; height: 100vh; margin: 0;">
-    <div style="text-align: center;">
-        <h1 style="background: linear-gradient(135deg, #d91cd2, #8b5cf6); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">
-            {media.get('title', 'Afroboost')}
-        </h1>
-        <p>Redirection en cours...</p>
-        <a href="https://afroboosteur.com/v/{slug}" style="color: #d91cd2;">Cliquez ici si la redirection ne fonctionne pas</a>
-    </div>
-</body>
-</html>"""
-    
-    from fastapi.responses import HTMLResponse
-    return HTMLResponse(content=html, status_code=200)
+    return await _serve_og_page(request, slug, "meta", lambda media: render_og_page(media, media["slug"]))
 
 @api_router.get("/go/{slug}")
-async def redirect_to_media(slug: str):
+async def redirect_to_media(slug: str, request: Request):
     """
     Endpoint de redirection HTTP 302 vers la page média.
     Utilisé dans les emails pour garantir une redirection fiable
@@ -6653,11 +7016,8 @@ async def redirect_to_media(slug: str):
     if not media:
         raise HTTPException(status_code=404, detail="Média non trouvé")
     
-    # Incrémenter les vues
-    await db.media_links.update_one(
-        {"slug": slug.lower()},
-        {"$inc": {"views": 1}}
-    )
+    # Incrémenter les vues (écriture différée, groupée par slug)
+    _record_link_click(slug, "go", request)
     
     # Déterminer l'URL de destination
     frontend_base = os.environ.get('FRONTEND_URL', 'https://afroboosteur.com')
@@ -6668,10 +7028,35 @@ async def redirect_to_media(slug: str):
     from fastapi.responses import RedirectResponse
     return RedirectResponse(url=redirect_url, status_code=302)
 
+def _record_link_click(slug: str, source: str, request: Request):
+    view_counter.record(
+        slug, source, request.headers.get("user-agent"), request.headers.get("referer")
+    )
+
+# ==================== ANALYTICS LIENS / CAMPAGNES (ROLLUPS) ====================
+
+@api_router.get("/analytics/campaigns/{campaign_id}")
+async def get_campaign_click_analytics(campaign_id: str, period: str = "day", limit: int = 30):
+    """Clics d'une campagne (tous ses liens média) par heure / jour + cumul, depuis les rollups."""
+    try:
+        return await view_counter.report(SCOPE_CAMPAIGN, campaign_id, period, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/analytics/links/{slug}")
+async def get_link_click_analytics(slug: str, period: str = "day", limit: int = 30):
+    """Clics d'un lien média par heure / jour + cumul (sources, appareils, référents)."""
+    try:
+        return await view_counter.report(SCOPE_LINK, slug.lower(), period, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @api_router.get("/media")
 async def list_media_links():
     """Liste tous les liens média créés"""
     media_links = await db.media_links.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    for media in media_links:
+        media["views"] = media.get("views", 0) + view_counter.pending(media.get("slug", ""))
     return media_links
 
 @api_router.delete("/media/{slug}")
@@ -6680,6 +7065,7 @@ async def delete_media_link(slug: str):
     result = await db.media_links.delete_one({"slug": slug.lower()})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Média non trouvé")
+    og_page_cache.invalidate(*og_cache_keys(slug))
     return {"success": True, "deleted": slug}
 
 @api_router.put("/media/{slug}")
@@ -6725,6 +7111,7 @@ async def update_media_link(slug: str, request: Request):
         {"slug": slug.lower()},
         {"$set": update_fields}
     )
+    og_page_cache.invalidate(*og_cache_keys(slug))
     
     # Retourner le média mis à jour
     updated = await db.media_links.find_one({"slug": slug.lower()}, {"_id": 0})
@@ -6746,173 +7133,10 @@ async def share_media_with_opengraph(slug: str, request: Request):
     2. Le backend retourne les balises og:image, og:title, etc.
     3. L'utilisateur qui clique est redirigé vers /v/{slug} (frontend React)
     """
-    media = await db.media_links.find_one({"slug": slug.lower()}, {"_id": 0})
-    if not media:
-        raise HTTPException(status_code=404, detail="Média non trouvé")
-    
-    # Incrémenter les vues
-    await db.media_links.update_one({"slug": slug.lower()}, {"$inc": {"views": 1}})
-    
-    # Échapper les caractères spéciaux pour éviter XSS
-    title = (media.get('title', 'Afroboost') or 'Afroboost').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
-    description = (media.get('description', 'Découvrez cette vidéo exclusive Afroboost') or 'Découvrez cette vidéo exclusive Afroboost')[:200].replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
-    thumbnail = media.get('custom_thumbnail') or media.get('thumbnail') or ''
-    youtube_id = media.get('youtube_id', '')
-    cta_text = media.get('cta_text', '')
-    cta_link = media.get('cta_link', '')
-    
-    # URL de partage et URL du viewer
-    share_url = f"https://afroboosteur.com/api/share/{slug}"
-    viewer_url = f"https://afroboosteur.com/v/{slug}"
-    
-    # Générer la page HTML avec meta tags OpenGraph COMPLETS
-    html = f"""<!DOCTYPE html>
-<html lang="fr" prefix="og: https://ogp.me/ns#">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title} - Afroboost</title>
-    
-    <!-- ===== OPENGRAPH POUR WHATSAPP/FACEBOOK/LINKEDIN ===== -->
-    <meta property="og:type" content="video.other" />
-    <meta property="og:site_name" content="Afroboost" />
-    <meta property="og:title" content="{title}" />
-    <meta property="og:description" content="{description}" />
-    <meta property="og:url" content="{share_url}" />
-    
-    <!-- IMAGE - CRITIQUE POUR WHATSAPP -->
-    <meta property="og:image" content="{thumbnail}" />
-    <meta property="og:image:secure_url" content="{thumbnail}" />
-    <meta property="og:image:type" content="image/jpeg" />
-    <meta property="og:image:width" content="1280" />
-    <meta property="og:image:height" content="720" />
-    <meta property="og:image:alt" content="{title}" />
-    
-    <!-- VIDEO (optionnel mais aide WhatsApp) -->
-    {f'<meta property="og:video" content="https://www.youtube.com/embed/{youtube_id}" />' if youtube_id else ''}
-    {f'<meta property="og:video:secure_url" content="https://www.youtube.com/embed/{youtube_id}" />' if youtube_id else ''}
-    {f'<meta property="og:video:type" content="text/html" />' if youtube_id else ''}
-    {f'<meta property="og:video:width" content="1280" />' if youtube_id else ''}
-    {f'<meta property="og:video:height" content="720" />' if youtube_id else ''}
-    
-    <!-- TWITTER CARD -->
-    <meta name="twitter:card" content="summary_large_image" />
-    <meta name="twitter:site" content="@afroboost" />
-    <meta name="twitter:title" content="{title}" />
-    <meta name="twitter:description" content="{description}" />
-    <meta name="twitter:image" content="{thumbnail}" />
-    
-    <!-- WHATSAPP SPECIFIQUE -->
-    <meta property="al:web:url" content="{viewer_url}" />
-    
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            background: linear-gradient(180deg, #000 0%, #1a0a1f 100%);
-            min-height: 100vh;
-            color: #fff;
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            padding: 20px;
-        }}
-        .container {{
-            text-align: center;
-            max-width: 500px;
-            width: 100%;
-        }}
-        .logo {{
-            font-size: 28px;
-            font-weight: bold;
-            background: linear-gradient(135deg, #d91cd2, #8b5cf6);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            margin-bottom: 30px;
-        }}
-        .thumbnail {{
-            width: 100%;
-            max-width: 480px;
-            border-radius: 16px;
-            box-shadow: 0 0 40px rgba(217, 28, 210, 0.4);
-            margin-bottom: 20px;
-        }}
-        h1 {{
-            font-size: 24px;
-            margin-bottom: 15px;
-            line-height: 1.3;
-        }}
-        p {{
-            color: rgba(255,255,255,0.7);
-            margin-bottom: 25px;
-            line-height: 1.5;
-        }}
-        .cta {{
-            display: inline-block;
-            padding: 16px 32px;
-            background: linear-gradient(135deg, #d91cd2, #8b5cf6);
-            color: white;
-            text-decoration: none;
-            border-radius: 12px;
-            font-weight: bold;
-            font-size: 18px;
-            transition: transform 0.2s, box-shadow 0.2s;
-            box-shadow: 0 4px 20px rgba(217, 28, 210, 0.4);
-        }}
-        .cta:hover {{
-            transform: scale(1.05);
-            box-shadow: 0 6px 30px rgba(217, 28, 210, 0.6);
-        }}
-        .loader {{
-            width: 40px;
-            height: 40px;
-            border: 4px solid rgba(217, 28, 210, 0.3);
-            border-top-color: #d91cd2;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 20px;
-        }}
-        @keyframes spin {{ to {{ transform: rotate(360deg); }} }}
-        .redirect-msg {{
-            font-size: 14px;
-            color: rgba(255,255,255,0.5);
-            margin-top: 30px;
-        }}
-    </style>
-    
-    <!-- REDIRECTION AUTOMATIQUE VERS LE LECTEUR -->
-    <script>
-        // Redirection après un court délai pour permettre aux crawlers de lire les meta tags
-        setTimeout(function() {{
-            window.location.href = "{viewer_url}";
-        }}, 1500);
-    </script>
-</head>
-<body>
-    <div class="container">
-        <div class="logo">🎧 Afroboost</div>
-        
-        {f'<img src="{thumbnail}" alt="{title}" class="thumbnail" />' if thumbnail else ''}
-        
-        <h1>{title}</h1>
-        <p>{description}</p>
-        
-        <a href="{viewer_url}" class="cta">
-            ▶️ {cta_text if cta_text else 'Voir la vidéo'}
-        </a>
-        
-        <p class="redirect-msg">
-            <span class="loader" style="display:inline-block;width:16px;height:16px;vertical-align:middle;margin-right:8px;"></span>
-            Redirection en cours...
-        </p>
-    </div>
-</body>
-</html>"""
-    
-    from fastapi.responses import HTMLResponse
-    return HTMLResponse(content=html, status_code=200)
+    response = await _serve_og_page(request, slug, "share", lambda media: render_share_page(media, media["slug"]))
+    # Compteur de vues: à chaque visite (y compris 304), écriture différée
+    _record_link_click(slug, "share", request)
+    return response
 
 # ==================== ROUTE RACINE /v/{slug} POUR OPENGRAPH ====================
 # Cette route est essentielle pour que WhatsApp puisse afficher les aperçus riches
@@ -6924,111 +7148,10 @@ async def serve_media_opengraph_page(slug: str, request: Request):
     WhatsApp/Facebook crawle cette URL et récupère les balises og:.
     La page redirige ensuite vers le frontend React pour l'affichage.
     """
-    media = await db.media_links.find_one({"slug": slug.lower()}, {"_id": 0})
-    if not media:
-        raise HTTPException(status_code=404, detail="Média non trouvé")
-    
-    # Échapper les caractères spéciaux pour éviter XSS
-    title = (media.get('title', 'Afroboost') or 'Afroboost').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
-    description = (media.get('description', 'Découvrez cette vidéo exclusive Afroboost') or '')[:200].replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
-    thumbnail = media.get('thumbnail', '') or ''
-    
-    # Déterminer l'URL du frontend (production ou preview)
-    frontend_url = os.environ.get('FRONTEND_URL', 'https://afroboosteur.com')
-    viewer_url = f"{frontend_url}/v/{slug}"
-    
-    # Générer la page HTML avec meta tags
-    html = f"""<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    
-    <!-- OpenGraph pour WhatsApp/Facebook/LinkedIn -->
-    <meta property="og:title" content="{title}" />
-    <meta property="og:description" content="{description}" />
-    <meta property="og:image" content="{thumbnail}" />
-    <meta property="og:image:width" content="1280" />
-    <meta property="og:image:height" content="720" />
-    <meta property="og:url" content="https://afroboosteur.com/v/{slug}" />
-    <meta property="og:type" content="video.other" />
-    <meta property="og:site_name" content="Afroboost" />
-    
-    <!-- Twitter Card -->
-    <meta name="twitter:card" content="summary_large_image" />
-    <meta name="twitter:title" content="{title}" />
-    <meta name="twitter:description" content="{description}" />
-    <meta name="twitter:image" content="{thumbnail}" />
-    
-    <style>
-        body {{
-            background: linear-gradient(180deg, #000 0%, #1a0a1f 100%);
-            color: #fff;
-            font-family: system-ui, -apple-system, sans-serif;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            height: 100vh;
-            margin: 0;
-            padding: 20px;
-            box-sizing: border-box;
-        }}
-        .container {{
-            text-align: center;
-            max-width: 400px;
-        }}
-        h1 {{
-            background: linear-gradient(135deg, #d91cd2, #8b5cf6);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            margin-bottom: 20px;
-        }}
-        .loader {{
-            width: 40px;
-            height: 40px;
-            border: 4px solid rgba(217, 28, 210, 0.3);
-            border-top-color: #d91cd2;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 20px;
-        }}
-        @keyframes spin {{
-            to {{ transform: rotate(360deg); }}
-        }}
-        a {{
-            color: #d91cd2;
-            text-decoration: none;
-        }}
-        a:hover {{
-            text-decoration: underline;
-        }}
-    </style>
-    
-    <!-- Redirection automatique -->
-    <script>
-        // Rediriger vers le frontend React après un court délai
-        // Ce délai permet aux crawlers de lire les meta tags
-        setTimeout(function() {{
-            window.location.href = "{viewer_url}";
-        }}, 100);
-    </script>
-</head>
-<body>
-    <div class="container">
-        <div class="loader"></div>
-        <h1>{title}</h1>
-        <p>Chargement de la vidéo...</p>
-        <p style="margin-top: 20px; font-size: 14px; opacity: 0.7;">
-            <a href="{viewer_url}">Cliquez ici si vous n'êtes pas redirigé</a>
-        </p>
-    </div>
-</body>
-</html>"""
-    
-    from fastapi.responses import HTMLResponse
-    return HTMLResponse(content=html, status_code=200)
+    frontend_url = os.environ.get('FRONTEND_URL', SITE_URL)
+    return await _serve_og_page(
+        request, slug, "viewer", lambda media: render_viewer_page(media, media["slug"], frontend_url)
+    )
 
 # === SCHEDULER HEALTH ENDPOINTS (définis avant include_router) ===
 @api_router.get("/scheduler/status")
@@ -7036,11 +7159,12 @@ async def get_scheduler_status():
     """Endpoint pour vérifier que le scheduler est en vie avec APScheduler."""
     from datetime import datetime, timezone
     
-    # Obtenir le statut d'APScheduler
-    scheduler_state = "running" if apscheduler.running else "stopped"
+    # Obtenir le statut d'APScheduler (créé au démarrage du serveur)
+    scheduler_running = bool(apscheduler and apscheduler.running)
+    scheduler_state = "running" if scheduler_running else "stopped"
     
     # Obtenir les infos du job
-    job = apscheduler.get_job('campaign_scheduler_job')
+    job = apscheduler.get_job('campaign_scheduler_job') if apscheduler else None
     job_info = None
     if job:
         job_info = {
@@ -7051,7 +7175,7 @@ async def get_scheduler_status():
         }
     
     return {
-        "scheduler_running": apscheduler.running,
+        "scheduler_running": scheduler_running,
         "scheduler_state": scheduler_state,
         "interval_seconds": SCHEDULER_INTERVAL,
         "persistence": "MongoDB (survit aux redémarrages)",
@@ -7078,6 +7202,16 @@ async def get_scheduler_health():
             "last_run": None
         }
 
+@api_router.get("/chat/cache/metrics")
+async def get_message_cache_metrics():
+    """Taux de réussite des caches mémoire (messages récents, réponses, configuration)."""
+    return {**message_cache.metrics(), "responses": response_cache.metrics(),
+            "og_pages": og_page_cache.metrics(),
+            "media_views": view_counter.metrics(),
+            "identities": {"participants": contact_identities.metrics(), "users": user_identities.metrics()},
+            "settings": settings_cache.metrics(),
+            "avatars": avatar_pipeline.metrics(), "emojis": emoji_registry.metrics()}
+
 # Fonction de test de persistance (définie au niveau module pour sérialisation)
 # ==================== SCHEDULER GROUP MESSAGE EMISSION ====================
 @api_router.post("/scheduler/emit-group-message")
@@ -7106,6 +7240,16 @@ async def scheduler_emit_group_message(request: Request):
         for field in ["media_url", "media_type", "cta_type", "cta_text", "cta_link"]:
             if message_data.get(field):
                 safe_message[field] = message_data[field]
+        # Message écrit en DB par le thread scheduler (hors cache)
+        message_cache.invalidate(session_id)
+        await record_unread_message({
+            "id": safe_message["id"],
+            "session_id": session_id,
+            "sender_type": safe_message["sender_type"],
+            "sender_name": safe_message["sender"],
+            "content": safe_message["text"],
+            "created_at": safe_message["created_at"]
+        })
         try:
             if broadcast:
                 await sio.emit('message_received', safe_message)
@@ -7125,6 +7269,17 @@ async def scheduler_emit_group_message(request: Request):
 # Include router
 fastapi_app.include_router(api_router)
 
+# Corps des uploads bornés avant parsing (Content-Length ou flux chunked)
+fastapi_app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        ("POST", "/api/users/upload-photo"): MAX_PHOTO_BYTES + MULTIPART_OVERHEAD,
+        ("POST", "/api/upload/profile-photo"): MAX_PHOTO_BYTES + MULTIPART_OVERHEAD,
+        ("POST", "/api/chat/emojis"): base64_limit(MAX_EMOJI_BYTES),
+        ("POST", "/api/custom-emojis/upload"): base64_limit(MAX_EMOJI_BYTES),
+    },
+)
+
 fastapi_app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -7135,8 +7290,13 @@ fastapi_app.add_middleware(
 
 # Dynamic manifest.json endpoint for PWA
 @fastapi_app.get("/api/manifest.json")
-async def get_dynamic_manifest():
+async def get_dynamic_manifest(request: Request):
     """Serve dynamic manifest.json with logo and name from coach settings"""
+    return await response_cache.serve(
+        request, "manifest", _build_manifest, media_type="application/manifest+json"
+    )
+
+async def _build_manifest() -> dict:
     concept = await db.concept.find_one({})
     
     # Use coach-configured favicon (priority) or logo as fallback
@@ -7210,58 +7370,75 @@ async def get_dynamic_manifest():
             }
         ]
     
-    from fastapi.responses import JSONResponse
-    return JSONResponse(content=manifest, media_type="application/manifest+json")
+    return manifest
 
 # ==================== SCHEDULER INTÉGRÉ (APSCHEDULER AVEC PERSISTANCE) ====================
 
-import threading
-import time as time_module
-
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.jobstores.mongodb import MongoDBJobStore
-from apscheduler.executors.pool import ThreadPoolExecutor
-from apscheduler.triggers.interval import IntervalTrigger
-from pymongo import MongoClient
-
 SCHEDULER_RUNNING = False
 SCHEDULER_LAST_HEARTBEAT = None
 SCHEDULER_INTERVAL = 30
 
-mongo_client_sync = MongoClient(os.environ.get('MONGO_URL'))
-jobstores = {
-    'default': MongoDBJobStore(
-        database=os.environ.get('DB_NAME', 'afroboost'),
-        collection='scheduled_jobs',
-        client=mongo_client_sync
-    )
-}
+# Client Mongo synchrone + APScheduler: créés au démarrage (startup), pas à l'import
+mongo_client_sync = None
+apscheduler = None
 
-executors = {'default': ThreadPoolExecutor(10)}
-job_defaults = {'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 60}
+SCHEDULER_HEARTBEAT_REF = [None]
 
-apscheduler = BackgroundScheduler(
-    jobstores=jobstores,
-    executors=executors,
-    job_defaults=job_defaults,
-    timezone="UTC"
-)
 
-from scheduler_engine import scheduler_job as scheduler_job_engine, PARIS_TZ, parse_campaign_date
+def create_background_scheduler():
+    """Client pymongo (thread scheduler) + BackgroundScheduler avec jobstore MongoDB."""
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.jobstores.mongodb import MongoDBJobStore
+    from apscheduler.executors.pool import ThreadPoolExecutor
+    from pymongo import MongoClient
+
+    sync_client = MongoClient(os.environ.get('MONGO_URL'))
+    jobstores = {
+        'default': MongoDBJobStore(
+            database=os.environ.get('DB_NAME', 'afroboost'),
+            collection='scheduled_jobs',
+            client=sync_client
+        )
+    }
+    executors = {'default': ThreadPoolExecutor(10)}
+    job_defaults = {'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 60}
+    scheduler = BackgroundScheduler(
+        jobstores=jobstores,
+        executors=executors,
+        job_defaults=job_defaults,
+        timezone="UTC"
+    )
+    return sync_client, scheduler
 
-SCHEDULER_HEARTBEAT_REF = [None]
 
 def scheduler_job():
     """Wrapper pour le job du scheduler - appelle scheduler_engine."""
     global SCHEDULER_LAST_HEARTBEAT
+    from scheduler_engine import scheduler_job as scheduler_job_engine
     scheduler_job_engine(mongo_client_sync, SCHEDULER_HEARTBEAT_REF)
     SCHEDULER_LAST_HEARTBEAT = SCHEDULER_HEARTBEAT_REF[0]
 
+# Rattrapages lancés au démarrage: références gardées (pas de collecte par le GC)
+# et échecs journalisés sous le préfixe du module
+_startup_tasks: set = set()
+
+def spawn_startup_task(coro, tag: str) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _startup_tasks.add(task)
+
+    def _done(finished: asyncio.Task):
+        _startup_tasks.discard(finished)
+        if not finished.cancelled() and finished.exception() is not None:
+            logger.error(f"[{tag}] Tâche de fond échouée: {finished.exception()!r}")
+
+    task.add_done_callback(_done)
+    return task
+
 
 @fastapi_app.on_event("startup")
 async def startup_scheduler():
     """Lance APScheduler avec persistance MongoDB au démarrage du serveur."""
-    global SCHEDULER_RUNNING
+    global SCHEDULER_RUNNING, mongo_client_sync, apscheduler
     
     logger.info("[SYSTEM] 🚀 Démarrage du serveur Afroboost...")
     
@@ -7296,6 +7473,77 @@ async def startup_scheduler():
     except Exception as e:
         logger.error(f"[ZOMBIE] Erreur: {e}")
     
+    # Compteurs non-lus (mémoire + DB, backfill unique au premier démarrage)
+    try:
+        await read_watermarks.ensure_indexes()
+        await db.chat_messages.create_index([("session_id", 1), ("sender_type", 1), ("created_at", 1)])
+        await db.private_messages.create_index([("recipient_id", 1), ("conversation_id", 1), ("created_at", 1)])
+        await db.private_messages.create_index([("conversation_id", 1), ("created_at", 1), ("id", 1)])
+        await db.notification_counters.create_index([("target", 1), ("session_id", 1)], unique=True)
+        await notification_hub.load(db.chat_messages)
+    except Exception as e:
+        logger.error(f"[NOTIF-HUB] Chargement compteurs échoué: {e}")
+    
+    # Séquences de messages: index (session_id, seq) + numérotation unique de l'historique
+    try:
+        await db.message_sequences.create_index("session_id", unique=True)
+        await db.chat_messages.create_index(
+            [("session_id", 1), ("seq", 1)], unique=True,
+            partialFilterExpression={"seq": {"$exists": True}}
+        )
+        spawn_startup_task(backfill_sequences(db), "SEQ")
+        # Timeline broadcast globale: scans de plage sur seq ou created_at
+        await db.chat_messages.create_index([("session_id", 1), ("created_at", 1), ("id", 1)])
+        await ensure_broadcast_indexes(db)
+        spawn_startup_task(migrate_broadcasts(db), "SEQ")
+    except Exception as e:
+        logger.error(f"[SEQ] Initialisation séquences échouée: {e}")
+    
+    # Conversations privées: clé de paire unique + liste multikey des participants
+    try:
+        await ensure_private_conversation_indexes(db.private_conversations)
+        await backfill_private_conversation_keys(db.private_conversations)
+    except Exception as e:
+        logger.error(f"[MP] Index conversations privées échoué: {e}")
+    
+    # Téléphones normalisés (E.164 + 9 derniers chiffres): webhook WhatsApp indexé
+    try:
+        await ensure_phone_indexes(db)
+        spawn_startup_task(backfill_phone_index(db), "PHONE-INDEX")
+    except Exception as e:
+        logger.error(f"[PHONE-INDEX] Initialisation échouée: {e}")
+    
+    try:
+        await whatsapp_conversations.ensure_indexes()
+    except Exception as e:
+        logger.error(f"[WHATSAPP] Index sessions WhatsApp échoué: {e}")
+    
+    # Identités des contacts: index des clés normalisées + claims des contacts existants
+    for identities in (contact_identities, user_identities):
+        try:
+            await identities.ensure_indexes()
+            spawn_startup_task(identities.backfill(), "IDENTITY")
+        except Exception as e:
+            logger.error(f"[IDENTITY] Initialisation {identities.collection} échouée: {e}")
+    
+    # Bascule MEDIA_STORAGE=s3: dossiers locaux copiés dans le bucket, URLs en DB réécrites
+    for storage, directory, url_prefix, _, references, cache_control in MEDIA_AREAS:
+        if not storage.local_directory and os.path.isdir(directory):
+            spawn_startup_task(
+                migrate_local_media(db, LocalDiskStorage(directory, url_prefix), storage, references, cache_control),
+                "MEDIA-MIGRATION"
+            )
+    
+    # Balayage périodique des photos de profil orphelines
+    upload_sweeper.start()
+    
+    # Vues des liens média (écriture différée + rollups horaires / journaliers)
+    try:
+        await view_counter.ensure_indexes()
+    except Exception as e:
+        logger.error(f"[MEDIA-VIEWS] Index rollups échoué: {e}")
+    view_counter.start()
+    
     # Index unique pour push_subscriptions (evite doublons)
     try:
         await db.push_subscriptions.create_index("endpoint", unique=True, sparse=True)
@@ -7304,6 +7552,9 @@ async def startup_scheduler():
         pass  # Index existe deja
     
     # Ajouter le job APScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+    if apscheduler is None:
+        mongo_client_sync, apscheduler = create_background_scheduler()
     try:
         existing_job = apscheduler.get_job('campaign_scheduler_job')
         if existing_job:
@@ -7333,11 +7584,18 @@ async def startup_scheduler():
 async def shutdown_db_client():
     global SCHEDULER_RUNNING
     SCHEDULER_RUNNING = False
-    if apscheduler.running:
+    if apscheduler and apscheduler.running:
         apscheduler.shutdown(wait=False)
         logger.info("[SCHEDULER] Arrêté (jobs persistés)")
+    push_sender.shutdown()
+    avatar_pipeline.shutdown()
+    upload_sweeper.stop()
+    for task in list(_startup_tasks):
+        task.cancel()
+    await view_counter.stop()
     client.close()
-    mongo_client_sync.close()
+    if mongo_client_sync:
+        mongo_client_sync.close()
     logger.info("[SYSTEM] Arrete")
 
 
@@ -0,0 +1,96 @@
+"""
+SETTINGS CACHE - Documents de configuration singleton en mémoire
+ai_config, coach_auth, feature_flags, coach_subscriptions, whatsapp_config
+sont relus par presque chaque requête (tour de chat, webhook, notification).
+- lecture directe (read-through) puis servie depuis la mémoire
+- write-through: les endpoints PUT remplacent l'entrée par le document écrit
+- TTL de secours pour les modifications hors API (shell Mongo, scheduler)
+"""
+
+import asyncio
+import copy
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_TTL_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class SettingSpec:
+    """Un document de configuration: collection + filtre (clé de cache dérivée)."""
+    collection: str
+    query: Tuple[Tuple[str, str], ...] = field(default=())
+
+    @property
+    def key(self) -> str:
+        return self.collection + "".join(f":{k}={v}" for k, v in self.query)
+
+    def filter(self) -> dict:
+        return dict(self.query)
+
+
+AI_CONFIG = SettingSpec("ai_config", (("id", "ai_config"),))
+COACH_AUTH = SettingSpec("coach_auth", (("id", "coach_auth"),))
+FEATURE_FLAGS = SettingSpec("feature_flags", (("id", "feature_flags"),))
+WHATSAPP_CONFIG = SettingSpec("whatsapp_config", (("id", "whatsapp_config"),))
+
+
+def coach_subscription(coach_email: str) -> SettingSpec:
+    return SettingSpec("coach_subscriptions", (("coachEmail", coach_email),))
+
+
+class SettingsCache:
+    """{ spec.key: (document | None, chargé_à) } - les absences sont aussi mémorisées."""
+
+    def __init__(self, database, ttl_seconds: float = SETTINGS_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.database = database
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: Dict[str, Tuple[SettingSpec, Optional[dict], float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, spec: SettingSpec):
+        entry = self._entries.get(spec.key)
+        if entry and self._clock() - entry[2] <= self.ttl_seconds:
+            return entry
+        return None
+
+    async def get(self, spec: SettingSpec) -> Optional[dict]:
+        """Document (copie modifiable par l'appelant) ou None s'il n'existe pas."""
+        entry = self._fresh(spec)
+        if entry is None:
+            lock = self._locks.setdefault(spec.key, asyncio.Lock())
+            async with lock:
+                entry = self._fresh(spec)
+                if entry is None:
+                    self.misses += 1
+                    doc = await self.database[spec.collection].find_one(spec.filter(), {"_id": 0})
+                    entry = (spec, doc, self._clock())
+                    self._entries[spec.key] = entry
+                else:
+                    self.hits += 1
+        else:
+            self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, spec: SettingSpec, doc: Optional[dict]):
+        """Write-through: document tel qu'écrit en DB."""
+        if doc is not None:
+            doc = {k: v for k, v in doc.items() if k != "_id"}
+        self._entries[spec.key] = (spec, copy.deepcopy(doc), self._clock())
+
+    def invalidate(self, collection: Optional[str] = None):
+        """Oublie les documents d'une collection (ou tout le cache)."""
+        for key, (spec, _, _) in list(self._entries.items()):
+            if collection is None or spec.collection == collection:
+                del self._entries[key]
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark: détection des médias dans un historique de chat
+Compare l'ancienne détection (jusqu'à 5 recherches regex par URL, sans cache)
+à la classification en une passe + LRU de media_handler, sur un corpus de
+messages types du chat Afroboost (liens de campagne répétés, YouTube, Drive,
+flyers, textes sans lien).
+
+Usage: python tests/bench_media_handler.py [nombre_de_messages] [tours]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import media_handler  # noqa: E402
+
+MESSAGES = [
+    "Bonjour ! Je voudrais réserver pour le cours de samedi",
+    "Merci coach 🔥🔥",
+    "Voici la vidéo du dernier cours : https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "Nouvelle choré dispo 👉 https://youtu.be/3JZ_D3ELwOQ?si=Xy12ab",
+    "Le short de la semaine https://youtube.com/shorts/aqz-KE-bpKQ",
+    "Playlist échauffement https://www.youtube.com/embed/M7lc1UVf-VE",
+    "Le programme du mois : https://drive.google.com/file/d/1BxiMVs0XRA5nFMdKvBdBZjgmUUqptlbs/view?usp=sharing",
+    "Photos de la soirée https://drive.google.com/open?id=0B7sD2pFhZ3XkYzBnT2VxQ",
+    "Flyer 👇 https://afroboosteur.com/api/uploads/profiles/flyer-ete.jpg",
+    "Réservez ici https://afroboosteur.com/api/share/promo-ete",
+    "Le lien du cours en ligne : https://meet.google.com/abc-defg-hij",
+    "C'est à quelle heure demain ?",
+    "Replay https://afroboosteur.com/v/replay-samedi et le planning https://afroboosteur.com/planning",
+    "Clip https://cdn.afroboosteur.com/media/teaser.mp4",
+    "Paiement fait via TWINT ✅",
+    "Ok super, à samedi !",
+]
+
+
+def build_corpus(size: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [{"content": rng.choice(MESSAGES)} for _ in range(size)]
+
+
+# === Ancienne implémentation (référence) ===
+_LEGACY_YOUTUBE = [
+    re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/)([a-zA-Z0-9_-]{11})(?:[?&]|$)'),
+    re.compile(r'youtube\.com/embed/([a-zA-Z0-9_-]{11})'),
+    re.compile(r'youtube\.com/shorts/([a-zA-Z0-9_-]{11})'),
+]
+_LEGACY_DRIVE = [
+    re.compile(r'drive\.google\.com/file/d/([a-zA-Z0-9_-]+)'),
+    re.compile(r'drive\.google\.com/open\?id=([a-zA-Z0-9_-]+)'),
+]
+
+
+def legacy_media_type(url: str) -> str:
+    url = url.strip()
+    for pattern in _LEGACY_YOUTUBE:
+        if pattern.search(url):
+            return "youtube"
+    for pattern in _LEGACY_DRIVE:
+        if pattern.search(url):
+            return "drive"
+    ext = url.split('.')[-1].lower().split('?')[0] if '.' in url else ''
+    if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg']:
+        return "image"
+    if ext in ['mp4', 'webm', 'ogg', 'mov']:
+        return "video"
+    return "link"
+
+
+def legacy_detect(text: str):
+    if not text:
+        return None
+    for url in re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+').findall(text):
+        kind = legacy_media_type(url)
+        if kind in ["youtube", "drive", "image", "video"]:
+            return kind
+    return None
+
+
+def run(size: int = 20000, rounds: int = 5) -> dict:
+    corpus = build_corpus(size)
+    texts = [m["content"] for m in corpus]
+
+    def best_of(fn):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    legacy = best_of(lambda: [legacy_detect(t) for t in texts])
+    media_handler._classify_cached.cache_clear()
+    unified = best_of(lambda: media_handler.detect_media_in_messages(corpus))
+    return {
+        "messages": size,
+        "legacy_ms": round(legacy * 1000, 2),
+        "unified_ms": round(unified * 1000, 2),
+        "speedup": round(legacy / unified, 2) if unified else None,
+        "cache": media_handler.cache_info()._asdict(),
+    }
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(run(size, rounds))
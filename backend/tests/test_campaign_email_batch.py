@@ -0,0 +1,136 @@
+"""
+Test Suite: Campaign Email - templates précompilés + batch Resend
+Tests against a local HTTP stub of the Resend batch endpoint (no network).
+
+Features to test:
+1. Template compiled once, {prénom} / greeting rendered per recipient
+2. Media block + CTA injected once per campaign
+3. Sends chunked by 100 recipients on POST /emails/batch
+4. A failing chunk marks only its own recipients as failed
+"""
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from campaign_email import (
+    CampaignEmailTemplate, send_batch, extract_media_slug, resolve_media,
+    build_media_html, build_cta_html, RESEND_BATCH_LIMIT
+)
+
+
+class _ResendStub(BaseHTTPRequestHandler):
+    calls = []
+    fail_call_numbers = set()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        _ResendStub.calls.append({
+            "path": self.path,
+            "auth": self.headers.get("Authorization"),
+            "emails": body,
+        })
+        if len(_ResendStub.calls) in _ResendStub.fail_call_numbers:
+            self.send_response(422)
+            self.end_headers()
+            self.wfile.write(b'{"message":"invalid"}')
+            return
+        data = {"data": [{"id": f"email-{len(_ResendStub.calls)}-{i}"} for i in range(len(body))]}
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def resend_stub():
+    _ResendStub.calls = []
+    _ResendStub.fail_call_numbers = set()
+    server = HTTPServer(("127.0.0.1", 0), _ResendStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", _ResendStub
+    server.shutdown()
+
+
+class TestCampaignTemplate:
+    """Template compilation and per-recipient rendering"""
+
+    def test_first_name_rendered_per_recipient(self):
+        template = CampaignEmailTemplate(subject="📢 Promo {prénom}", message="Hello {prénom}\nA bientôt")
+        alice = template.render("Alice Martin")
+        bob = template.render("Bob")
+        assert alice["subject"] == "📢 Promo Alice"
+        assert "Salut Alice," in alice["html"]
+        assert "Hello Alice<br>A bientôt" in alice["html"]
+        assert "Salut Bob," in bob["html"]
+        assert "{prénom}" not in bob["html"]
+
+    def test_missing_name_falls_back(self):
+        template = CampaignEmailTemplate(subject="S", message="Hi {prenom}", layout="simple")
+        rendered = template.render("")
+        assert "Salut ami(e)," in rendered["html"]
+        assert "Hi ami(e)" in rendered["html"]
+
+    def test_name_is_html_escaped(self):
+        template = CampaignEmailTemplate(subject="S", message="M")
+        assert "<script>" not in template.render("<script>")["html"]
+
+    def test_media_and_cta_blocks(self):
+        media_html = build_media_html("https://afroboosteur.com/#/v/promo", "http://img.test/thumb.jpg")
+        cta_html = build_cta_html("Réserver", "afroboosteur.com/book")
+        html = CampaignEmailTemplate(subject="S", message="M", media_html=media_html, cta_html=cta_html).render("Zoé")["html"]
+        assert 'src="https://img.test/thumb.jpg"' in html
+        assert 'href="https://afroboosteur.com/book"' in html
+        assert "Réserver" in html
+        assert "%%" not in html
+
+    def test_media_slug_resolution(self):
+        assert extract_media_slug("https://afroboosteur.com/v/promo-danse?x=1") == "promo-danse"
+        assert extract_media_slug("https://api.test/api/share/promo/") == "promo"
+        assert extract_media_slug("https://img.test/a.jpg") is None
+        click, thumb = resolve_media("/v/promo", {"thumbnail": "https://t/1.jpg"})
+        assert click == "https://afroboosteur.com/#/v/promo"
+        assert thumb == "https://t/1.jpg"
+        assert resolve_media("https://img.test/a.jpg") == ("https://img.test/a.jpg", "https://img.test/a.jpg")
+
+
+class TestResendBatch:
+    """Batch sending against the local Resend stub"""
+
+    def _emails(self, count):
+        template = CampaignEmailTemplate(subject="S", message="Salut {prénom}")
+        return [template.build_email(f"user{i}@test.ch", f"User{i}") for i in range(count)]
+
+    def test_chunks_of_100(self, resend_stub):
+        url, stub = resend_stub
+        results = send_batch(self._emails(250), "re_test", api_url=url)
+        assert [len(c["emails"]) for c in stub.calls] == [RESEND_BATCH_LIMIT, RESEND_BATCH_LIMIT, 50]
+        assert all(c["path"] == "/emails/batch" for c in stub.calls)
+        assert all(c["auth"] == "Bearer re_test" for c in stub.calls)
+        assert len(results) == 250
+        assert all(r["success"] for r in results)
+        assert results[0] == {"to": "user0@test.ch", "success": True, "email_id": "email-1-0"}
+        assert results[249]["email_id"] == "email-3-49"
+        assert "Salut User42" in stub.calls[0]["emails"][42]["html"]
+
+    def test_failed_chunk_isolated(self, resend_stub):
+        url, stub = resend_stub
+        stub.fail_call_numbers = {2}
+        results = send_batch(self._emails(150), "re_test", api_url=url)
+        assert all(r["success"] for r in results[:100])
+        assert not any(r["success"] for r in results[100:])
+        assert results[120]["error"].startswith("HTTP 422")
+
+    def test_unreachable_endpoint(self):
+        results = send_batch(self._emails(3), "re_test", api_url="http://127.0.0.1:1", timeout=2)
+        assert len(results) == 3
+        assert not any(r["success"] for r in results)
@@ -0,0 +1,109 @@
+"""
+Test Suite: Emoji Registry - manifeste versionné + planche de sprites
+
+Features to test:
+1. Manifest built once, rebuilt after invalidation or directory change
+2. Version hash changes with the content, sprite positions follow the grid
+3. Coach chat emojis (custom_<uuid>) stay out of the picker manifest and sprite
+4. Sprite composed once per version
+5. Real sprite composition with Pillow (when installed)
+"""
+
+import asyncio
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from emoji_registry import EmojiRegistry, compose_sprite
+from media_storage import LocalDiskStorage
+
+
+class _Compose:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, sources, count, cell, columns):
+        self.calls.append([index for index, _, _ in sources])
+        return b"PNG" + bytes(len(sources))
+
+
+def _registry(tmp_path, names, **kwargs):
+    for name in names:
+        (tmp_path / name).write_bytes(b"<svg/>" if name.endswith(".svg") else b"\x89PNG")
+    compose = _Compose()
+    registry = EmojiRegistry(LocalDiskStorage(str(tmp_path), "/api/emojis"), columns=2, compose=compose, **kwargs)
+    return registry, compose
+
+
+class TestManifest:
+    def test_memoized_then_rebuilt_on_change(self, tmp_path):
+        registry, _ = _registry(tmp_path, ["fire.svg", "heart.svg", "notes.txt"])
+
+        async def scenario():
+            first = await registry.manifest()
+            second = await registry.manifest()
+            (tmp_path / "star.png").write_bytes(b"\x89PNG")  # hors API: mtime du dossier
+            third = await registry.manifest()
+            return first, second, third
+
+        first, second, third = asyncio.run(scenario())
+        assert first is second
+        assert [e["filename"] for e in first.emojis] == ["fire.svg", "heart.svg"]
+        assert third.version != first.version and third.emojis[2]["sprite"] == {"x": 0, "y": 64}
+        assert third.atlas["height"] == 128 and registry.builds == 2
+
+    def test_invalidate(self, tmp_path):
+        registry, _ = _registry(tmp_path, ["fire.svg"])
+
+        async def scenario():
+            await registry.manifest()
+            registry.invalidate()
+            await registry.manifest()
+
+        asyncio.run(scenario())
+        assert registry.builds == 2
+
+    def test_as_dict_has_versioned_sprite_urls(self, tmp_path):
+        registry, _ = _registry(tmp_path, ["fire.svg"])
+        manifest = asyncio.run(registry.manifest())
+        payload = manifest.as_dict("/api/custom-emojis/sprite.png", "/api/custom-emojis/atlas.json")
+        assert payload["sprite"]["url"] == f"/api/custom-emojis/sprite.png?v={manifest.version}"
+        assert payload["emojis"][0]["url"] == "/api/emojis/fire.svg" and payload["count"] == 1
+
+    def test_coach_chat_emojis_excluded(self, tmp_path):
+        registry, compose = _registry(tmp_path, ["fire.svg", "custom_3f2a9c1e-0b7d-4a55-9e61-2c8f4d7a1b00.png"])
+
+        async def scenario():
+            manifest = await registry.manifest()
+            await registry.sprite()
+            return manifest
+
+        manifest = asyncio.run(scenario())
+        assert [e["filename"] for e in manifest.emojis] == ["fire.svg"]
+        assert compose.calls == [[0]]
+
+
+class TestSprite:
+    def test_composed_once_per_version(self, tmp_path):
+        registry, compose = _registry(tmp_path, ["a.svg", "b.png", "c.gif"])
+
+        async def scenario():
+            results = await asyncio.gather(*(registry.sprite() for _ in range(5)))
+            return {version for version, _ in results}
+
+        versions = asyncio.run(scenario())
+        assert len(versions) == 1
+        assert compose.calls == [[0, 1, 2]]
+
+    def test_real_composition(self):
+        Image = pytest.importorskip("PIL.Image")
+        buffer = io.BytesIO()
+        Image.new("RGBA", (10, 20), (255, 0, 0, 255)).save(buffer, "PNG")
+        png = compose_sprite([(0, buffer.getvalue(), "png"), (3, b"corrupted", "png")], count=4, cell=16, columns=2)
+        with Image.open(io.BytesIO(png)) as sheet:
+            assert sheet.size == (32, 32)
+            assert sheet.getpixel((8, 8))[3] == 255  # case 0 remplie, centrée
+            assert sheet.getpixel((24, 24))[3] == 0  # case 3 en échec: vide
@@ -0,0 +1,83 @@
+"""
+Test Suite: Fast JSON - rendu orjson des gros payloads de listes
+
+Features to test:
+1. dumps() matches the JSONResponse encoding (compact UTF-8)
+2. project_rows() keeps model fields only and fills defaults
+3. Micro-benchmark: orjson vs stdlib json on a conversations-like payload
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fast_json
+from fast_json import dumps, project_rows
+
+
+def _payload(n=2000):
+    return {
+        "conversations": [
+            {
+                "id": f"conv-{i}",
+                "participantName": f"Élève {i}",
+                "participantEmail": f"eleve{i}@example.com",
+                "last_message": "Réservation confirmée pour samedi 🎉",
+                "last_message_at": "2026-03-01T12:00:00+00:00",
+                "unread_count": i % 7,
+                "tags": ["crm", "vip"] if i % 3 == 0 else [],
+                "is_active": bool(i % 2),
+            }
+            for i in range(n)
+        ],
+        "total": n, "page": 1, "pages": 1, "has_more": False,
+    }
+
+
+def _stdlib(data):
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _best_of(fn, data, runs=5):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class TestDumps:
+    def test_same_bytes_as_stdlib(self):
+        data = _payload(50)
+        assert json.loads(dumps(data)) == json.loads(_stdlib(data))
+        assert dumps({"nom": "Café"}) == '{"nom":"Café"}'.encode("utf-8")
+
+    @pytest.mark.skipif(not fast_json.ORJSON_AVAILABLE, reason="orjson non installé")
+    def test_benchmark_orjson_faster_than_stdlib(self):
+        data = _payload()
+        stdlib_time = _best_of(_stdlib, data)
+        orjson_time = _best_of(dumps, data)
+        print(f"\n[bench] json={stdlib_time * 1000:.2f}ms orjson={orjson_time * 1000:.2f}ms")
+        assert orjson_time < stdlib_time
+
+
+class TestProjectRows:
+    def test_projection_matches_model_dump(self):
+        pydantic = pytest.importorskip("pydantic")
+
+        class Code(pydantic.BaseModel):
+            id: str
+            code: str
+            active: bool = True
+            courses: list = pydantic.Field(default_factory=list)
+
+        docs = [{"id": "1", "code": "PROMO", "legacy_field": "x"}, {"id": "2", "code": "VIP", "active": False}]
+        assert project_rows(Code, docs) == [Code.model_validate(d).model_dump() for d in docs]
+        rows = project_rows(Code, docs)
+        rows[0]["courses"].append("c")
+        assert project_rows(Code, docs)[0]["courses"] == []
@@ -0,0 +1,260 @@
+"""
+Test Suite: Identity - résolution des contacts sur clés normalisées
+
+Features to test:
+1. Normalized keys (lowercased email, casefolded name, E.164 phone)
+2. Lookup: one $or query, priority email > phone > name
+3. resolve_or_create: existing contact reused, new one inserted with its keys
+4. Concurrent sign-ups with the same email end on a single contact
+5. attach() does not copy a key already owned by another contact
+6. Deleted contacts: release() frees their keys, orphan claims are taken over
+7. Edited contacts: update() moves the claims, the old email is free for a new sign-up
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from identity import IdentityIndex, email_key, name_key, with_identity_fields
+
+
+class _DuplicateKeyError(Exception):
+    code = 11000
+
+
+def _matches(doc, query):
+    if "$or" in query:
+        return any(_matches(doc, clause) for clause in query["$or"])
+    for field, condition in query.items():
+        if isinstance(condition, dict) and "$in" in condition:
+            if doc.get(field) not in condition["$in"]:
+                return False
+        elif isinstance(condition, dict) and "$nin" in condition:
+            if doc.get(field) in condition["$nin"]:
+                return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class _Collection:
+    def __init__(self):
+        self.docs = []
+        self.finds = 0
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        if "_id" in doc and any(d.get("_id") == doc["_id"] for d in self.docs):
+            raise _DuplicateKeyError(doc["_id"])
+        doc.setdefault("_id", object())
+        self.docs.append(dict(doc))
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return _Cursor([{k: v for k, v in d.items() if k != "_id"} for d in self.docs if _matches(d, query)])
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        return next((dict(d) for d in self.docs if _matches(d, query)), None)
+
+    async def update_one(self, query, update):
+        for d in self.docs:
+            if _matches(d, query):
+                d.update(update["$set"])
+                return _Result(modified_count=1)
+        return _Result(modified_count=0)
+
+    async def delete_one(self, query):
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+
+    async def delete_many(self, query):
+        kept = [d for d in self.docs if not _matches(d, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return _Result(deleted_count=deleted)
+
+
+class _Result:
+    def __init__(self, modified_count=0, deleted_count=0):
+        self.modified_count = modified_count
+        self.deleted_count = deleted_count
+
+
+class _Database(dict):
+    def __getitem__(self, name):
+        return self.setdefault(name, _Collection())
+
+
+def _participant(pid, name, email="", whatsapp=""):
+    return {"id": pid, "name": name, "email": email, "whatsapp": whatsapp}
+
+
+class TestKeys:
+    def test_keys(self):
+        assert email_key("  Awa.Diop@Mail.COM ") == "awa.diop@mail.com"
+        assert email_key("pas-un-email") is None
+        assert name_key("  AWA   Diop ") == "awa diop"
+        assert name_key("Straße") == name_key("STRASSE")
+        doc = with_identity_fields(_participant("p", "Awa", "A@B.ch", "079 123 45 67"), "chat_participants")
+        assert (doc["email_key"], doc["phone_e164"], doc["name_key"]) == ("a@b.ch", "+41791234567", "awa")
+
+
+class TestResolve:
+    def test_existing_contact_priority(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            await identities.resolve_or_create(_participant("by-name", "Awa"))
+            await identities.resolve_or_create(_participant("by-phone", "Fatou", whatsapp="+41791234567"),
+                                               whatsapp="+41791234567")
+            database["chat_participants"].finds = 0
+            found = await identities.find(email=None, whatsapp="0791234567", name="awa")
+            return found, database["chat_participants"].finds
+
+        found, finds = asyncio.run(scenario())
+        assert found["id"] == "by-phone"
+        assert finds == 1
+
+    def test_create_then_reuse(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            first, created = await identities.resolve_or_create(
+                _participant("p1", "Awa", "awa@mail.com"), "awa@mail.com")
+            again, created_again = await identities.resolve_or_create(
+                _participant("p2", "Awa", "AWA@mail.com"), " AWA@mail.com ")
+            return first, created, again, created_again, database
+
+        first, created, again, created_again, database = asyncio.run(scenario())
+        assert created and not created_again
+        assert again["id"] == "p1"
+        assert first["email_key"] == "awa@mail.com"
+        assert [c["_id"] for c in database["contact_identities"].docs] == ["chat_participants:email:awa@mail.com"]
+
+    def test_concurrent_signups_single_contact(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "users", scope="user")
+            results = await asyncio.gather(*(
+                identities.resolve_or_create({"id": f"u{i}", "name": "Awa", "email": "awa@mail.com"},
+                                             email="awa@mail.com")
+                for i in range(5)
+            ))
+            return results, database, identities
+
+        results, database, identities = asyncio.run(scenario())
+        assert len({contact["id"] for contact, _ in results}) == 1
+        assert sum(created for _, created in results) == 1
+        assert len(database["users"].docs) == 1
+        assert identities.metrics()["races"] + identities.metrics()["resolved"] == 4
+
+    def test_attach_skips_keys_owned_elsewhere(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            await identities.resolve_or_create(_participant("owner", "Awa", "awa@mail.com"), "awa@mail.com")
+            other, _ = await identities.resolve_or_create(_participant("other", "Bintou"), name="Bintou")
+            other = await identities.attach(other, email="awa@mail.com", whatsapp="+41780000000",
+                                            extra={"last_seen_at": "now"})
+            return other, database
+
+        other, database = asyncio.run(scenario())
+        assert other["email"] == ""
+        assert other["whatsapp"] == "+41780000000"
+        assert other["last_seen_at"] == "now"
+        stored = next(d for d in database["chat_participants"].docs if d["id"] == "other")
+        assert stored.get("email_key") is None and stored["phone_e164"] == "+41780000000"
+
+
+class TestDeletedContacts:
+    def test_release_frees_keys(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            await identities.resolve_or_create(_participant("gone", "Awa", "awa@mail.com", "+41791234567"),
+                                               "awa@mail.com", "+41791234567")
+            await database["chat_participants"].delete_one({"id": "gone"})
+            released = await identities.release("gone")
+            other, _ = await identities.resolve_or_create(_participant("other", "Bintou"), name="Bintou")
+            other = await identities.attach(other, email="awa@mail.com", whatsapp="+41791234567")
+            return released, other, database
+
+        released, other, database = asyncio.run(scenario())
+        assert released == 2
+        assert (other["email"], other["whatsapp"]) == ("awa@mail.com", "+41791234567")
+        assert {c["contact_id"] for c in database["contact_identities"].docs} == {"other"}
+
+    def test_orphan_claim_taken_over(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            await identities.resolve_or_create(_participant("gone", "Awa", "awa@mail.com"), "awa@mail.com")
+            await database["chat_participants"].delete_one({"id": "gone"})  # claim non libéré
+            new, created = await identities.resolve_or_create(
+                _participant("new", "Awa", "awa@mail.com"), "awa@mail.com")
+            # La clé protège de nouveau contre les doublons
+            dup = await identities._claim_key("email_key", "awa@mail.com", "intrus")
+            return new, created, dup, database
+
+        new, created, dup, database = asyncio.run(scenario())
+        assert created and new["id"] == "new"
+        assert [c["contact_id"] for c in database["contact_identities"].docs] == ["new"]
+        assert dup == "new"
+
+
+class TestEditedContacts:
+    def test_edit_then_signup_with_old_email(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            await identities.resolve_or_create(_participant("a", "Awa", "old@mail.com", "+41791234567"),
+                                               "old@mail.com", "+41791234567")
+            edited = await identities.update("a", {"email": "new@mail.com"})
+            bintou, created = await identities.resolve_or_create(
+                _participant("b", "Bintou", "old@mail.com"), "old@mail.com")
+            return edited, bintou, created, database
+
+        edited, bintou, created, database = asyncio.run(scenario())
+        assert edited["email_key"] == "new@mail.com" and edited["phone_e164"] == "+41791234567"
+        assert created and bintou["id"] == "b"
+        assert {c["_id"]: c["contact_id"] for c in database["contact_identities"].docs} == {
+            "chat_participants:email:new@mail.com": "a",
+            "chat_participants:phone:+41791234567": "a",
+            "chat_participants:email:old@mail.com": "b",
+        }
+
+    def test_stale_claim_of_edited_contact_taken_over(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            await identities.resolve_or_create(_participant("a", "Awa", "old@mail.com"), "old@mail.com")
+            # Email modifié hors update(): le claim reste sur "a" qui ne porte plus la clé
+            await database["chat_participants"].update_one(
+                {"id": "a"}, {"$set": with_identity_fields({"email": "new@mail.com"}, "chat_participants")})
+            return await identities.resolve_or_create(_participant("b", "Bintou", "old@mail.com"), "old@mail.com")
+
+        bintou, created = asyncio.run(scenario())
+        assert created and bintou["id"] == "b"
+
+    def test_update_keeps_key_owned_elsewhere(self):
+        async def scenario():
+            database = _Database()
+            identities = IdentityIndex(database, "chat_participants")
+            await identities.resolve_or_create(_participant("a", "Awa", "awa@mail.com"), "awa@mail.com")
+            await identities.resolve_or_create(_participant("b", "Bintou", "bintou@mail.com"), "bintou@mail.com")
+            edited = await identities.update("b", {"email": "awa@mail.com", "name": "Bintou D."})
+            missing = await identities.update("ghost", {"email": "ghost@mail.com"})
+            return edited, missing, database
+
+        edited, missing, database = asyncio.run(scenario())
+        assert (edited["email"], edited["name"]) == ("bintou@mail.com", "Bintou D.")
+        assert missing is None
+        assert {c["contact_id"] for c in database["contact_identities"].docs} == {"a", "b"}
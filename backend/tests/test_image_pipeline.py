@@ -0,0 +1,145 @@
+"""
+Test Suite: Image Pipeline - photos de profil multi-tailles hors boucle asyncio
+
+Features to test:
+1. Content-addressed variant names and srcset
+2. Identical re-upload deduplicated (no render), concurrent identical uploads rendered once
+3. Bounded queue rejects when saturated
+4. Default process pool does not fork the server (forkserver / spawn)
+5. Real Pillow render (WebP + JPEG, 48/96/200) when Pillow is installed
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from image_pipeline import (
+    START_METHOD, ImagePipeline, PipelineBusy, build_avatar_set, content_hash, variant_names, render_variants, AVATAR_SIZES
+)
+from media_storage import LocalDiskStorage
+
+
+class _FakeRender:
+    """Écrit des fichiers vides (thread du pool de test) au lieu de Pillow."""
+
+    def __init__(self, gate=None):
+        self.calls = 0
+        self.gate = gate
+
+    def __call__(self, data, digest, out_dir, sizes):
+        self.calls += 1
+        if self.gate:
+            self.gate.wait(5)
+        names = variant_names(digest, sizes)
+        for name in names:
+            open(os.path.join(out_dir, name), "wb").close()
+        return names
+
+
+def _touch_variants(data, digest, out_dir, sizes):
+    """Rendu factice exécutable dans un processus enfant (importable, sans Pillow)."""
+    names = variant_names(digest, sizes)
+    for name in names:
+        open(os.path.join(out_dir, name), "wb").close()
+    return names
+
+
+def _pipeline(tmp_path, render, **kwargs):
+    return ImagePipeline(LocalDiskStorage(str(tmp_path), "/api/uploads/profiles/"), render=render,
+                         executor_factory=lambda: ThreadPoolExecutor(max_workers=2), **kwargs)
+
+
+class TestAvatarSet:
+    def test_srcset_and_fallback_url(self):
+        avatar = build_avatar_set("abc", lambda name: f"/api/uploads/profiles/{name}")
+        assert avatar.url == "/api/uploads/profiles/abc_200.jpg"
+        assert avatar.srcset.split(", ")[0] == "/api/uploads/profiles/abc_48.webp 48w"
+        assert avatar.srcset_jpeg.endswith("abc_200.jpg 200w")
+        assert len(variant_names("abc")) == 2 * len(AVATAR_SIZES)
+
+
+class TestPipeline:
+    def test_reupload_is_deduplicated(self, tmp_path):
+        render = _FakeRender()
+
+        async def scenario():
+            pipeline = _pipeline(tmp_path, render)
+            first = await pipeline.process(b"image-bytes")
+            second = await pipeline.process(b"image-bytes")
+            pipeline.shutdown()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert render.calls == 1
+        assert first.digest == second.digest == content_hash(b"image-bytes")
+        assert not first.deduplicated and second.deduplicated
+
+    def test_concurrent_identical_uploads_render_once(self, tmp_path):
+        gate = threading.Event()
+        render = _FakeRender(gate)
+
+        async def scenario():
+            pipeline = _pipeline(tmp_path, render)
+            tasks = [asyncio.create_task(pipeline.process(b"same")) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            gate.set()
+            results = await asyncio.gather(*tasks)
+            pipeline.shutdown()
+            return results
+
+        results = asyncio.run(scenario())
+        assert render.calls == 1
+        assert {r.url for r in results} == {results[0].url}
+
+    def test_bounded_queue(self, tmp_path):
+        gate = threading.Event()
+        render = _FakeRender(gate)
+
+        async def scenario():
+            pipeline = _pipeline(tmp_path, render, max_pending=1, queue_timeout=0.05)
+            busy = asyncio.create_task(pipeline.process(b"first"))
+            await asyncio.sleep(0.01)
+            with pytest.raises(PipelineBusy):
+                await pipeline.process(b"second")
+            gate.set()
+            await busy
+            metrics = pipeline.metrics()
+            pipeline.shutdown()
+            return metrics
+
+        metrics = asyncio.run(scenario())
+        assert metrics["rejected"] == 1 and metrics["processed"] == 1
+
+
+class TestProcessPool:
+    def test_default_pool_does_not_fork(self, tmp_path):
+        async def scenario():
+            pipeline = ImagePipeline(LocalDiskStorage(str(tmp_path), "/api/uploads/profiles/"),
+                                     render=_touch_variants, max_workers=1)
+            avatar = await pipeline.process(b"image-bytes")
+            start_method = pipeline._get_executor()._mp_context.get_start_method()
+            pipeline.shutdown()
+            return avatar, start_method
+
+        avatar, start_method = asyncio.run(scenario())
+        assert start_method == START_METHOD != "fork"
+        assert (tmp_path / f"{avatar.digest}_200.jpg").exists()
+
+
+class TestPillowRender:
+    def test_variants_sizes_and_formats(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        buffer = io.BytesIO()
+        Image.new("RGBA", (640, 480), (200, 30, 90, 255)).save(buffer, "PNG")
+        names = render_variants(buffer.getvalue(), "d1", str(tmp_path))
+        assert sorted(names) == sorted(variant_names("d1"))
+        with Image.open(tmp_path / "d1_200.webp") as img:
+            assert img.format == "WEBP" and max(img.size) == 200
+        with Image.open(tmp_path / "d1_48.jpg") as img:
+            assert img.format == "JPEG" and max(img.size) == 48
@@ -0,0 +1,73 @@
+"""
+Test Suite: Import Time - démarrage à froid du worker
+
+Features to test:
+1. `-X importtime` output parsing
+2. LazyModule imports (and configures) on first attribute access only
+3. Cold import of server.py does not pull optional integrations (stripe, resend, apscheduler)
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+from lazy_imports import LazyModule, module_available, parse_importtime, importtime_report
+
+DEFERRED_MODULES = {"stripe", "resend", "apscheduler", "scheduler_engine"}
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      3400 |       9800 | stripe
+import time:        15 |      10050 | server
+"""
+
+
+class TestParseImporttime:
+    def test_parse(self):
+        timings = parse_importtime(SAMPLE)
+        assert [t.module for t in timings] == ["_io", "stripe", "server"]
+        assert timings[1].self_us == 3400 and timings[2].cumulative_us == 10050
+
+
+class TestLazyModule:
+    def test_import_on_first_access(self, tmp_path, monkeypatch):
+        (tmp_path / "afro_fake_sdk.py").write_text("LOADS = [1]\napi_key = None\n")
+        monkeypatch.syspath_prepend(str(tmp_path))
+        configured = []
+
+        def configure(module):
+            configured.append(module.__name__)
+            module.api_key = "sk"
+
+        sdk = LazyModule("afro_fake_sdk", configure=configure)
+        assert "afro_fake_sdk" not in sys.modules and not sdk.loaded
+        assert module_available("afro_fake_sdk")
+        assert sdk.api_key == "sk"
+        assert sdk.LOADS == [1] and len(configured) == 1
+        sdk.api_key = "other"
+        assert sys.modules["afro_fake_sdk"].api_key == "other"
+
+    def test_unknown_module(self):
+        assert not module_available("afro_module_inexistant")
+
+
+class TestColdImport:
+    def test_report_for_helper_module(self):
+        report = importtime_report("lazy_imports", cwd=BACKEND_DIR)
+        assert report["ok"]
+        assert report["total_us"] > 0
+        assert not DEFERRED_MODULES & report["modules"]
+
+    def test_server_import_defers_integrations(self):
+        pytest.importorskip("fastapi")
+        pytest.importorskip("motor")
+        report = importtime_report("server", cwd=BACKEND_DIR,
+                                   env={"MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "afroboost_test"})
+        assert report["ok"], report["error"]
+        print(f"\n[importtime] server: {report['total_us'] / 1000:.1f}ms")
+        for timing in report["slowest"]:
+            print(f"  {timing.self_us / 1000:8.1f}ms  {timing.module}")
+        assert not DEFERRED_MODULES & {m.split(".")[0] for m in report["modules"]}
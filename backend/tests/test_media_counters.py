@@ -0,0 +1,253 @@
+"""
+Test Suite: Media Counters - vues des liens média en écriture différée
+
+Features to test:
+1. Hour / day / cumulative buckets (UTC), user agent classes, referrer allowlist
+2. Many hits on one slug -> one $inc per slug, one bulk_write per collection
+3. Link and campaign rollups per hour / day / total, bucketed at hit time
+4. Partial bulk write re-queues only the failed slugs; unknown outcome drops the batch
+5. stop() flushes what is pending
+6. Dashboard report reads only the rollups of the requested window
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from media_counters import (
+    ViewCounter, bucket_start, classify_user_agent, referrer_host, ROLLUPS_COLLECTION
+)
+
+T0 = datetime(2026, 3, 14, 9, 59, 30, tzinfo=timezone.utc).timestamp()
+
+
+def _op(filter_, update, upsert=False):
+    return (filter_, update, upsert)
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$nin" in condition and value in condition["$nin"]:
+                return False
+            if "$gte" in condition and not value >= condition["$gte"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _BulkWriteError(Exception):
+    """pymongo.errors.BulkWriteError: details["writeErrors"] = opérations non appliquées."""
+
+    def __init__(self, indexes):
+        super().__init__("batch op errors occurred")
+        self.details = {"writeErrors": [{"index": i, "code": 50} for i in indexes]}
+
+
+class _Collection:
+    def __init__(self, docs=None, fail=()):
+        self.docs = docs or []
+        self.batches = []
+        self.fail = list(fail)
+        self.reads = 0
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            error = self.fail.pop(0)
+            if isinstance(error, _BulkWriteError):
+                failed = {w["index"] for w in error.details["writeErrors"]}
+                self.batches.append([op for i, op in enumerate(ops) if i not in failed])
+            raise error
+        self.batches.append(list(ops))
+
+    def find(self, query, projection=None):
+        self.reads += 1
+        return _Cursor([dict(d) for d in self.docs if _matches(d, query)])
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        return next((dict(d) for d in self.docs if _matches(d, query)), None)
+
+
+class _Database:
+    def __init__(self, fail=(), links=()):
+        self.media_links = _Collection(list(links), fail)
+        self.rollups = _Collection()
+
+    def __getitem__(self, name):
+        assert name == ROLLUPS_COLLECTION
+        return self.rollups
+
+
+def _counter(database, now):
+    return ViewCounter(database, clock=lambda: now[0], update_op=_op)
+
+
+class TestBuckets:
+    def test_bucket_start(self):
+        assert bucket_start(T0, "hour") == "2026-03-14T09:00:00+00:00"
+        assert bucket_start(T0, "day") == "2026-03-14T00:00:00+00:00"
+        assert bucket_start(T0, "all") == "all"
+
+    def test_user_agent_classes(self):
+        assert classify_user_agent("WhatsApp/2.23.20.0 A") == "crawler"
+        assert classify_user_agent("facebookexternalhit/1.1") == "crawler"
+        assert classify_user_agent("Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148") == "mobile"
+        assert classify_user_agent("Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0") == "desktop"
+        assert classify_user_agent(None) == "unknown"
+
+    def test_referrer_host_is_a_bounded_field_name(self):
+        assert referrer_host("https://www.instagram.com/p/xyz") == "instagram_com"
+        assert referrer_host("http://l.facebook.com/l.php?u=x") == "facebook_com"
+        assert referrer_host("https://t.co/abc") == "x_com"
+        assert referrer_host("") == "direct"
+        assert referrer_host("not a url") == "direct"
+        # Header fourni par le client: hôtes inconnus regroupés (documents "all" bornés)
+        assert referrer_host("https://spam-4821.example.net/") == "other"
+        assert referrer_host("https://instagram.com.evil.io/") == "other"
+        assert referrer_host("http://[::1") == "other"
+
+
+class TestViewCounter:
+    def test_hits_batched_per_slug(self):
+        now = [T0]
+        database = _Database()
+        counter = _counter(database, now)
+        for _ in range(500):
+            counter.record("Promo-Ete", "share")
+        counter.record("autre")
+        assert counter.pending("promo-ete") == 500
+
+        assert asyncio.run(counter.flush()) == 501
+        assert len(database.media_links.batches) == 1
+        assert sorted(database.media_links.batches[0], key=lambda op: op[0]["slug"]) == [
+            ({"slug": "autre"}, {"$inc": {"views": 1}}, False),
+            ({"slug": "promo-ete"}, {"$inc": {"views": 500}}, False),
+        ]
+        assert counter.pending("promo-ete") == 0
+        assert asyncio.run(counter.flush()) == 0
+        assert counter.metrics()["writes"] == 2
+
+    def test_rollups_bucketed_at_hit_time(self):
+        now = [T0]
+        database = _Database(links=[{"slug": "promo", "campaign_id": "camp-1"}, {"slug": "solo", "campaign_id": None}])
+        counter = _counter(database, now)
+        counter.record("promo", "share", "WhatsApp/2.23", None)
+        counter.record("promo", "go", "Mozilla/5.0 (Linux; Android 14) Mobile", "https://www.instagram.com/")
+        now[0] = T0 + 60  # heure suivante, même jour
+        counter.record("promo", "share", "WhatsApp/2.23")
+        counter.record("solo")
+        asyncio.run(counter.flush())
+
+        rollups = {(f["scope"], f["key"], f["period"], f["bucket"]): u["$inc"]
+                   for f, u, upsert in database.rollups.batches[0]}
+        assert all(upsert for _, _, upsert in database.rollups.batches[0])
+        assert len(database.rollups.batches) == 1
+        assert rollups[("link", "promo", "hour", "2026-03-14T09:00:00+00:00")] == {
+            "views": 2, "sources.share": 1, "sources.go": 1, "agents.crawler": 1, "agents.mobile": 1,
+            "referrers.direct": 1, "referrers.instagram_com": 1,
+        }
+        assert rollups[("link", "promo", "hour", "2026-03-14T10:00:00+00:00")]["views"] == 1
+        assert rollups[("link", "promo", "day", "2026-03-14T00:00:00+00:00")]["sources.share"] == 2
+        assert rollups[("campaign", "camp-1", "day", "2026-03-14T00:00:00+00:00")]["views"] == 3
+        assert rollups[("campaign", "camp-1", "all", "all")]["agents.crawler"] == 2
+        assert rollups[("link", "solo", "all", "all")]["views"] == 1
+        assert not any(scope == "campaign" and key is None for scope, key, _, _ in rollups)
+
+    def test_report_reads_window_and_totals(self):
+        now = [T0]
+        database = _Database()
+        database.rollups.docs = [
+            {"scope": "campaign", "key": "camp-1", "period": "day", "bucket": "2026-03-01T00:00:00+00:00", "views": 9},
+            {"scope": "campaign", "key": "camp-1", "period": "day", "bucket": "2026-03-13T00:00:00+00:00",
+             "views": 4, "sources": {"go": 4}},
+            {"scope": "campaign", "key": "camp-1", "period": "day", "bucket": "2026-03-14T00:00:00+00:00", "views": 6},
+            {"scope": "campaign", "key": "camp-1", "period": "all", "bucket": "all", "views": 19},
+            {"scope": "link", "key": "camp-1", "period": "day", "bucket": "2026-03-14T00:00:00+00:00", "views": 1},
+        ]
+        counter = _counter(database, now)
+        report = asyncio.run(counter.report("campaign", "camp-1", "day", 7))
+
+        assert report["since"] == "2026-03-08T00:00:00+00:00"
+        assert [row["bucket"][:10] for row in report["series"]] == ["2026-03-13", "2026-03-14"]
+        assert report["series"][0] == {"bucket": "2026-03-13T00:00:00+00:00", "views": 4, "sources": {"go": 4},
+                                       "agents": {}, "referrers": {}}
+        assert report["totals"]["views"] == 19
+        assert database.rollups.reads == 2
+
+    def test_report_rejects_unknown_period(self):
+        counter = _counter(_Database(), [T0])
+        with pytest.raises(ValueError):
+            asyncio.run(counter.report("link", "promo", "week"))
+
+    def test_partial_flush_requeues_only_failed_slugs(self):
+        now = [T0]
+        database = _Database(fail=[_BulkWriteError([1])])
+        counter = _counter(database, now)
+        counter.record("promo")
+        counter.record("autre", "go")
+        assert asyncio.run(counter.flush()) == 1  # "promo" écrit, "autre" en erreur
+        assert [f["key"] for f, _, _ in database.rollups.batches[0]] == ["promo"] * 3
+        counter.record("promo")
+        assert asyncio.run(counter.flush()) == 2
+        assert sorted(database.media_links.batches[1], key=lambda op: op[0]["slug"]) == [
+            ({"slug": "autre"}, {"$inc": {"views": 1}}, False),
+            ({"slug": "promo"}, {"$inc": {"views": 1}}, False),
+        ]
+        autre = [u["$inc"] for f, u, _ in database.rollups.batches[1] if f["key"] == "autre" and f["period"] == "all"]
+        assert autre == [{"views": 1, "sources.go": 1, "agents.unknown": 1, "referrers.direct": 1}]
+        assert counter.metrics()["failures"] == 1
+
+    def test_unknown_failure_drops_batch(self):
+        now = [T0]
+        database = _Database(fail=[RuntimeError("primary stepped down")])
+        counter = _counter(database, now)
+        counter.record("promo")
+        assert asyncio.run(counter.flush()) == 0
+        counter.record("promo")
+        assert asyncio.run(counter.flush()) == 1
+        assert database.media_links.batches[0] == [({"slug": "promo"}, {"$inc": {"views": 1}}, False)]
+        assert counter.metrics()["failures"] == 1
+
+    def test_stop_flushes(self):
+        async def scenario():
+            database = _Database()
+            counter = ViewCounter(database, flush_interval=3600, update_op=_op)
+            counter.start()
+            counter.record("promo")
+            await counter.stop()
+            return database, counter
+
+        database, counter = asyncio.run(scenario())
+        assert database.media_links.batches == [[({"slug": "promo"}, {"$inc": {"views": 1}}, False)]]
+        assert counter.metrics()["pending_views"] == 0
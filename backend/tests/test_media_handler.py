@@ -0,0 +1,84 @@
+"""
+Test Suite: Media Handler - classification des liens médias en une passe
+
+Features to test:
+1. YouTube (watch, youtu.be, embed, shorts) and Drive (file, open) in one pattern
+2. IDs must be exactly 11 characters, followed by a separator or end of URL
+3. Direct images / videos by extension, everything else is a plain link
+4. LRU cache: repeated URLs classified once, callers get independent dicts
+5. Batch APIs over URLs and chat messages
+6. Same results as the previous multi-regex detection on the benchmark corpus
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import media_handler
+from media_handler import (
+    get_media_type, classify_urls, detect_media_in_text, detect_media_in_messages, extract_youtube_id
+)
+
+
+class TestClassification:
+    def test_youtube_variants(self):
+        for url in ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42", "https://youtu.be/dQw4w9WgXcQ?si=abc",
+                    "https://youtu.be/dQw4w9WgXcQ#t=1", "https://www.youtube.com/embed/dQw4w9WgXcQ",
+                    "https://youtube.com/shorts/dQw4w9WgXcQ/", "  https://m.youtube.com/watch?v=dQw4w9WgXcQ  "):
+            assert extract_youtube_id(url) == "dQw4w9WgXcQ", url
+
+    def test_youtube_id_length_is_exact(self):
+        assert extract_youtube_id("https://youtu.be/dQw4w9WgXcQX") is None
+        assert extract_youtube_id("https://youtu.be/short") is None
+
+    def test_drive(self):
+        result = get_media_type("https://drive.google.com/open?id=1BxiMVs0XRA5nFMdKvBdBZjgmUUqptlbs")
+        assert (result["type"], result["file_id"]) == ("drive", "1BxiMVs0XRA5nFMdKvBdBZjgmUUqptlbs")
+
+    def test_direct_files_and_links(self):
+        assert get_media_type("https://cdn.example.com/a.b/photo.JPG?w=400")["type"] == "image"
+        assert get_media_type("https://cdn.example.com/clip.mp4")["type"] == "video"
+        assert get_media_type("https://afroboosteur.com/v/promo")["type"] == "link"
+        assert get_media_type(None)["type"] == "unknown"
+
+
+class TestCache:
+    def test_results_are_independent_copies(self):
+        first = get_media_type("https://youtu.be/dQw4w9WgXcQ")
+        first["original_url"] = "mutated"
+        assert "original_url" not in get_media_type("https://youtu.be/dQw4w9WgXcQ")
+
+    def test_repeated_urls_hit_the_cache(self):
+        media_handler._classify_cached.cache_clear()
+        classify_urls(["https://youtu.be/dQw4w9WgXcQ"] * 50 + ["https://example.com/x.png"])
+        info = media_handler.cache_info()
+        assert (info.misses, info.hits) == (2, 49)
+
+
+class TestBatch:
+    def test_detect_in_text_returns_first_media(self):
+        text = "Infos: https://afroboosteur.com/planning puis https://youtu.be/dQw4w9WgXcQ merci"
+        result = detect_media_in_text(text)
+        assert result["video_id"] == "dQw4w9WgXcQ"
+        assert result["original_url"] == "https://youtu.be/dQw4w9WgXcQ"
+        assert detect_media_in_text("Pas de lien ici") is None
+
+    def test_detect_in_messages(self):
+        messages = [
+            {"content": "Regarde https://drive.google.com/file/d/abc123/view"},
+            {"content": "Salut !"},
+            "https://example.com/flyer.webp",
+            {"content": None},
+        ]
+        results = detect_media_in_messages(messages)
+        assert [r["type"] if r else None for r in results] == ["drive", None, "image", None]
+
+
+class TestBenchmarkCorpus:
+    def test_same_detection_as_legacy_on_chat_corpus(self):
+        from bench_media_handler import MESSAGES, legacy_detect
+
+        for text in MESSAGES:
+            result = detect_media_in_text(text)
+            assert (result["type"] if result else None) == legacy_detect(text), text
@@ -0,0 +1,106 @@
+"""
+Test Suite: Media Migration - bascule du stockage local vers le bucket S3
+
+Features to test:
+1. URL and srcset rewriting (only keys present in the target, data: URLs untouched)
+2. Local files missing from the target are copied, failed copies keep their local URLs
+3. DB references rewritten in batches, second run is a no-op
+"""
+
+import asyncio
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from media_migration import migrate_local_media, rewrite_url_value
+from media_storage import LocalDiskStorage
+
+CDN = "https://cdn.example.com/media/profiles"
+
+
+def _op(filter_, update):
+    return filter_, update
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._iter = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.bulk_writes = 0
+
+    def find(self, query, projection=None):
+        def matches(doc):
+            return any(isinstance(doc.get(field), str) and re.search(condition["$regex"], doc[field])
+                       for clause in query["$or"] for field, condition in clause.items())
+        return _Cursor([dict(d) for d in self.docs if matches(d)])
+
+    async def bulk_write(self, ops, ordered=True):
+        self.bulk_writes += 1
+        for filter_, update in ops:
+            next(d for d in self.docs if d["_id"] == filter_["_id"]).update(update["$set"])
+
+
+class _FlakyTarget(LocalDiskStorage):
+    async def put_path(self, key, path, content_type, cache_control=None):
+        if key.startswith("broken"):
+            raise OSError("bucket indisponible")
+        return await super().put_path(key, path, content_type, cache_control)
+
+
+def _storages(tmp_path, names, target_class=LocalDiskStorage):
+    source = LocalDiskStorage(str(tmp_path / "local"), "/api/uploads/profiles")
+    for name in names:
+        (tmp_path / "local" / name).write_bytes(b"\xff\xd8")
+    return source, target_class(str(tmp_path / "bucket"), CDN)
+
+
+def test_rewrite_url_and_srcset(tmp_path):
+    source, target = _storages(tmp_path, [])
+    available = {"a_48.webp", "a_96.webp", "p1.jpg"}
+    srcset = "/api/uploads/profiles/a_48.webp 48w, /api/uploads/profiles/a_96.webp 96w"
+    assert rewrite_url_value(srcset, source, target, available) == f"{CDN}/a_48.webp 48w, {CDN}/a_96.webp 96w"
+    assert rewrite_url_value("https://afroboost.com/api/uploads/profiles/p1.jpg", source, target,
+                             available) == f"{CDN}/p1.jpg"
+    assert rewrite_url_value("/api/uploads/profiles/absent.jpg", source, target, available) is None
+    assert rewrite_url_value("data:image/jpeg;base64,/9j/4AAQ,xyz", source, target, available) is None
+    assert rewrite_url_value(None, source, target, available) is None
+
+
+def test_migration_copies_and_rewrites_once(tmp_path):
+    source, target = _storages(tmp_path, ["p1.jpg", "p2.jpg", "broken.jpg"], _FlakyTarget)
+    users = _Collection([
+        {"_id": 1, "photo_url": "/api/uploads/profiles/p1.jpg", "photoUrl": "/api/uploads/profiles/p1.jpg"},
+        {"_id": 2, "photo_url": "/api/uploads/profiles/broken.jpg"},
+        {"_id": 3, "photo_url": "https://lh3.googleusercontent.com/photo.jpg"},
+    ])
+    participants = _Collection([{"_id": i, "photo_url": "/api/uploads/profiles/p2.jpg"} for i in range(5)])
+    database = {"users": users, "chat_participants": participants}
+    references = {"users": ("photo_url", "photoUrl"), "chat_participants": ("photo_url",)}
+
+    async def scenario():
+        first = await migrate_local_media(database, source, target, references, batch_size=2, update_op=_op)
+        second = await migrate_local_media(database, source, target, references, batch_size=2, update_op=_op)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert sorted(os.listdir(tmp_path / "bucket")) == ["p1.jpg", "p2.jpg"]
+    assert first == {"users": 1, "chat_participants": 5}
+    assert participants.bulk_writes == 3  # lots de 2
+    assert users.docs[0] == {"_id": 1, "photo_url": f"{CDN}/p1.jpg", "photoUrl": f"{CDN}/p1.jpg"}
+    assert users.docs[1]["photo_url"] == "/api/uploads/profiles/broken.jpg"  # copie en échec: URL locale gardée
+    assert users.docs[2]["photo_url"] == "https://lh3.googleusercontent.com/photo.jpg"
+    assert second == {"users": 0, "chat_participants": 0}
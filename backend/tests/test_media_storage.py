@@ -0,0 +1,196 @@
+"""
+Test Suite: Media Storage - disque local et S3 compatible
+
+Features to test:
+1. Local driver: put / exists / list / delete, URL <-> key round trip, key validation
+2. S3 driver against an in-memory S3 stand-in: prefixed keys, stable public URLs,
+   batched deletes, LastModified refresh on touch
+3. Avatar pipeline publishing variants to S3 (sentinel last, temp dir cleaned up)
+4. Driver selection from environment variables
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from media_storage import LocalDiskStorage, S3Storage, storage_from_env
+from image_pipeline import ImagePipeline, variant_names, sentinel_name
+
+
+class _ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """Sous-ensemble de l'API boto3 S3 en mémoire (stand-in local)."""
+
+    def __init__(self):
+        self.objects = {}
+        self.put_order = []
+        self.delete_calls = 0
+        self._lock = threading.Lock()
+        self._clock = 1_000_000
+
+    def _store(self, key, body, extra):
+        with self._lock:
+            self._clock += 1
+            self.objects[key] = {"Body": body, "LastModified": datetime.fromtimestamp(self._clock, timezone.utc), **extra}
+            self.put_order.append(key)
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        self._store(key, fileobj.read(), ExtraArgs or {})
+
+    def upload_file(self, path, bucket, key, ExtraArgs=None):
+        with open(path, "rb") as f:
+            self._store(key, f.read(), ExtraArgs or {})
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise _ClientError("404")
+        return {k: v for k, v in self.objects[Key].items() if k != "Body"}
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective, **extra):
+        self._store(Key, self.objects[CopySource["Key"]]["Body"], extra)
+
+    def delete_objects(self, Bucket, Delete):
+        self.delete_calls += 1
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+        return {}
+
+    def get_paginator(self, name):
+        client = self
+
+        class _Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(k for k in client.objects if k.startswith(Prefix))
+                for start in range(0, len(keys), 2):  # pages de 2 objets
+                    yield {"Contents": [
+                        {"Key": k, "Size": len(client.objects[k]["Body"]), "LastModified": client.objects[k]["LastModified"]}
+                        for k in keys[start:start + 2]
+                    ]}
+
+        return _Paginator()
+
+
+class TestLocalDiskStorage:
+    def test_put_list_delete(self, tmp_path):
+        storage = LocalDiskStorage(str(tmp_path), "/api/emojis/")
+
+        async def scenario():
+            url = await storage.put_file("happy.png", io.BytesIO(b"png-bytes"), "image/png")
+            listed = await storage.list()
+            exists = await storage.exists("happy.png")
+            failed = await storage.delete_many(["happy.png", "missing.png"])
+            return url, listed, exists, failed, await storage.exists("happy.png")
+
+        url, listed, exists, failed, exists_after = asyncio.run(scenario())
+        assert url == "/api/emojis/happy.png"
+        assert [(o.key, o.size) for o in listed] == [("happy.png", 9)]
+        assert exists and not exists_after and failed == set()
+        assert storage.key_from_url("https://afroboost.ch/api/emojis/happy.png?v=1") == "happy.png"
+        assert storage.key_from_url("/api/other/happy.png") is None
+
+    def test_rejects_path_traversal(self, tmp_path):
+        storage = LocalDiskStorage(str(tmp_path), "/api/emojis")
+        with pytest.raises(ValueError):
+            asyncio.run(storage.put_file("../server.py", io.BytesIO(b"x"), "text/plain"))
+
+
+class TestS3Storage:
+    def test_public_urls_and_listing(self):
+        client = FakeS3Client()
+        storage = S3Storage("bucket", "media/profiles", client=client, public_base_url="https://cdn.afroboost.ch/")
+
+        async def scenario():
+            for i in range(3):
+                await storage.put_file(f"f{i}.jpg", io.BytesIO(b"x" * (i + 1)), "image/jpeg", "public, max-age=60")
+            return await storage.list()
+
+        listed = asyncio.run(scenario())
+        assert storage.url("f0.jpg") == "https://cdn.afroboost.ch/media/profiles/f0.jpg"
+        assert storage.key_from_url("https://cdn.afroboost.ch/media/profiles/f0.jpg") == "f0.jpg"
+        assert [(o.key, o.size) for o in listed] == [("f0.jpg", 1), ("f1.jpg", 2), ("f2.jpg", 3)]
+        assert client.objects["media/profiles/f1.jpg"]["ContentType"] == "image/jpeg"
+
+    def test_requires_public_base_url(self):
+        # URL présignée = expirée au bout de quelques jours alors qu'elle est stockée en DB
+        with pytest.raises(ValueError):
+            S3Storage("bucket", "media/emojis", public_base_url=None, client=FakeS3Client())
+
+    def test_exists_touch_and_batched_delete(self, monkeypatch):
+        import media_storage
+        monkeypatch.setattr(media_storage, "S3_DELETE_BATCH", 2)
+        client = FakeS3Client()
+        storage = S3Storage("bucket", "p", client=client, public_base_url="https://cdn.example.com")
+
+        async def scenario():
+            for name in ("a.jpg", "b.jpg", "c.jpg"):
+                await storage.put_file(name, io.BytesIO(b"x"), "image/jpeg")
+            before = client.objects["p/a.jpg"]["LastModified"]
+            await storage.touch("a.jpg")
+            touched = client.objects["p/a.jpg"]["LastModified"] > before
+            await storage.delete_many(["a.jpg", "b.jpg", "c.jpg"])
+            return touched, await storage.exists("a.jpg")
+
+        touched, exists = asyncio.run(scenario())
+        assert touched and not exists
+        assert client.delete_calls == 2
+
+
+class TestPipelineOnS3:
+    def test_variants_published_sentinel_last(self):
+        client = FakeS3Client()
+        storage = S3Storage("bucket", "media/profiles", client=client, public_base_url="https://cdn.example.com")
+        work_dirs = []
+
+        def render(data, digest, out_dir, sizes):
+            work_dirs.append(out_dir)
+            names = variant_names(digest, sizes)
+            for name in names:
+                with open(os.path.join(out_dir, name), "wb") as f:
+                    f.write(b"img")
+            return names
+
+        async def scenario():
+            pipeline = ImagePipeline(storage, render=render, executor_factory=lambda: ThreadPoolExecutor(1))
+            first = await pipeline.process(b"photo")
+            second = await pipeline.process(b"photo")
+            pipeline.shutdown()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first.url.startswith("https://cdn.example.com/media/profiles/") and second.deduplicated
+        uploads = [k for k in client.put_order if k.startswith("media/profiles/")]
+        assert uploads[len(variant_names(first.digest)) - 1] == f"media/profiles/{sentinel_name(first.digest)}"
+        assert not os.path.exists(work_dirs[0])
+
+
+class TestStorageFromEnv:
+    def test_local_default(self, tmp_path):
+        storage = storage_from_env("emojis", str(tmp_path), "/api/emojis", env={})
+        assert storage.name == "local" and storage.local_directory == str(tmp_path)
+
+    def test_s3(self, tmp_path):
+        storage = storage_from_env("profiles", str(tmp_path), "/api/uploads/profiles", env={
+            "MEDIA_STORAGE": "s3", "S3_BUCKET": "afroboost", "S3_PUBLIC_BASE_URL": "https://cdn.example.com"
+        })
+        assert storage.name == "s3" and storage.local_directory is None
+        assert storage.url("x.jpg") == "https://cdn.example.com/media/profiles/x.jpg"
+
+    def test_s3_requires_bucket(self, tmp_path):
+        with pytest.raises(RuntimeError):
+            storage_from_env("profiles", str(tmp_path), "/x", env={"MEDIA_STORAGE": "s3"})
+
+    def test_s3_requires_public_base_url(self, tmp_path):
+        with pytest.raises(RuntimeError):
+            storage_from_env("profiles", str(tmp_path), "/x", env={"MEDIA_STORAGE": "s3", "S3_BUCKET": "afroboost"})
@@ -0,0 +1,103 @@
+"""
+Test Suite: Message Cache - LRU de sessions + tampon des derniers messages
+
+Features to test:
+1. Read-through on miss, then served from memory (hit-rate metrics)
+2. Populated on write, bounded per session, LRU eviction across sessions
+3. Soft delete -> tombstone, history deletion -> invalidation
+4. Range reads for sync (after_seq / since) only when the buffer covers them
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from message_cache import SessionMessageCache
+
+
+def _msg(session_id, seq, **extra):
+    return {"id": f"{session_id}-{seq}", "session_id": session_id, "seq": seq,
+            "created_at": f"2026-03-01T12:00:{seq:02d}+00:00", "content": f"m{seq}", **extra}
+
+
+class _Loader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    async def __call__(self, limit):
+        self.calls += 1
+        return self.rows[-limit:]
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestReadThrough:
+    def test_miss_then_hits(self):
+        cache = SessionMessageCache(capacity=20)
+        loader = _Loader([_msg("s", i) for i in range(1, 31)])
+        first = _run(cache.recent("s", 10, loader))
+        second = _run(cache.recent("s", 10, loader))
+        assert [m["seq"] for m in first] == list(range(21, 31))
+        assert second == first
+        assert loader.calls == 1
+        metrics = cache.metrics()
+        assert (metrics["hits"], metrics["misses"], metrics["hit_rate"]) == (1, 1, 0.5)
+
+    def test_whole_session_only_when_complete(self):
+        cache = SessionMessageCache(capacity=20)
+        assert len(_run(cache.recent("small", None, _Loader([_msg("small", i) for i in range(1, 6)])))) == 5
+        assert _run(cache.recent("big", None, _Loader([_msg("big", i) for i in range(1, 40)]))) is None
+
+
+class TestWritesAndInvalidation:
+    def test_append_bounded_and_ordered(self):
+        cache = SessionMessageCache(capacity=3)
+        _run(cache.recent("s", 1, _Loader([])))
+        for seq in (1, 3, 2, 4):
+            cache.append(_msg("s", seq))
+        assert [m["seq"] for m in _run(cache.recent("s", 3, _Loader([])))] == [2, 3, 4]
+
+    def test_lru_eviction(self):
+        cache = SessionMessageCache(max_sessions=2)
+        for sid in ("a", "b", "c"):
+            cache.append(_msg(sid, 1))
+        assert cache.metrics()["sessions"] == 2
+        assert cache.metrics()["evictions"] == 1
+        assert cache.peek_after_seq("a", 0) is None
+
+    def test_soft_delete_and_history_deletion(self):
+        cache = SessionMessageCache()
+        _run(cache.recent("s", 5, _Loader([_msg("s", i) for i in range(1, 4)])))
+        cache.mark_deleted("s", "s-2", "2026-03-01T13:00:00+00:00")
+        assert [m["seq"] for m in _run(cache.recent("s", 5, _Loader([])))] == [1, 3]
+        tombstone = [m for m in cache.peek_after_seq("s", 0) if m["seq"] == 2][0]
+        assert tombstone["is_deleted"] is True
+        cache.invalidate("s")
+        assert cache.peek_after_seq("s", 0) is None
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = SessionMessageCache(ttl_seconds=10, clock=lambda: now[0])
+        cache.append(_msg("s", 1))
+        now[0] = 11
+        assert cache.peek_after_seq("s", 0) is None
+
+
+class TestRangeReads:
+    def test_after_seq_coverage(self):
+        cache = SessionMessageCache()
+        cache.append(_msg("s", 5))
+        cache.append(_msg("s", 6))
+        assert [m["seq"] for m in cache.peek_after_seq("s", 4)] == [5, 6]
+        assert cache.peek_after_seq("s", 2) is None  # 3..4 absents du tampon
+
+    def test_since_coverage(self):
+        cache = SessionMessageCache()
+        cache.append(_msg("s", 5))
+        cache.append(_msg("s", 7))
+        assert [m["seq"] for m in cache.peek_since("s", "2026-03-01T12:00:06+00:00")] == [7]
+        assert cache.peek_since("s", "2026-03-01T12:00:01+00:00") is None
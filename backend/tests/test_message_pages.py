@@ -0,0 +1,74 @@
+"""
+Test Suite: Message Pages - pagination keyset des historiques
+
+Features to test:
+1. Opaque (created_at, id) cursor round-trip and validation
+2. Keyset filter strictly before / after a cursor, ties broken by id
+3. Pages newest-first with cursors for "load older" and "load newer"
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from message_pages import (
+    encode_cursor, decode_cursor, keyset_filter, build_page, clamp_page_size, MAX_PAGE_SIZE
+)
+
+
+def _matches(row, query):
+    """Évaluation minimale du filtre keyset généré ($or / $lt / $gt / égalité)."""
+    def check(cond, value):
+        if isinstance(cond, dict):
+            return all((value < v) if op == "$lt" else (value > v) for op, v in cond.items())
+        return value == cond
+    return any(all(check(c, row[k]) for k, c in branch.items()) for branch in query["$or"])
+
+
+ROWS = [{"id": f"m{i}", "created_at": f"2026-03-01T12:00:0{i // 2}+00:00", "seq": i} for i in range(8)]
+
+
+class TestCursor:
+    def test_round_trip(self):
+        cursor = encode_cursor("2026-03-01T12:00:00+00:00", "abc|def")
+        assert decode_cursor(cursor) == ("2026-03-01T12:00:00+00:00", "abc|def")
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_clamp(self):
+        assert clamp_page_size(None) > 0
+        assert clamp_page_size(10_000) == MAX_PAGE_SIZE
+
+
+class TestKeysetFilter:
+    def test_before_and_after_with_ties(self):
+        pivot = ROWS[4]  # même created_at que ROWS[5]
+        cursor = encode_cursor(pivot["created_at"], pivot["id"])
+        older = [r["id"] for r in ROWS if _matches(r, keyset_filter(cursor, older=True))]
+        newer = [r["id"] for r in ROWS if _matches(r, keyset_filter(cursor, older=False))]
+        assert older == ["m0", "m1", "m2", "m3"]
+        assert newer == ["m5", "m6", "m7"]
+
+
+class TestBuildPage:
+    def test_first_page_newest_first(self):
+        scan = list(reversed(ROWS))[:4]  # page_size 3 + 1
+        page = build_page(scan, 3, newer=False, cursor_of=lambda m: str(m["seq"]))
+        assert [m["id"] for m in page["messages"]] == ["m7", "m6", "m5"]
+        assert page["has_more"] is True
+        assert (page["next_before"], page["next_after"]) == ("5", "7")
+
+    def test_newer_page_is_reversed(self):
+        scan = ROWS[2:4]  # scan ascendant après seq 1, page_size 3
+        page = build_page(scan, 3, newer=True, cursor_of=lambda m: str(m["seq"]))
+        assert [m["id"] for m in page["messages"]] == ["m3", "m2"]
+        assert page["has_more"] is False
+        assert page["direction"] == "after"
+
+    def test_empty_page(self):
+        page = build_page([], 3, newer=False, cursor_of=lambda m: m["id"])
+        assert page["messages"] == [] and page["next_before"] is None
@@ -0,0 +1,229 @@
+"""
+Test Suite: Message Sequence - curseurs after_seq + détection de trous
+
+Features to test:
+1. Contiguous delta advances the cursor to the last seq
+2. Old gaps are reported and skipped, recent gaps block the cursor
+3. Cursor map parsing for /messages/sync/all
+4. Session + broadcast timelines merged in order, without duplicates
+5. Broadcast migration: migrated ids read once, concurrent copies rejected by the unique id index
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from message_sequence import (
+    plan_delta, parse_cursor_map, max_seq, merge_timelines, is_broadcast, migrate_broadcasts,
+    ensure_broadcast_indexes
+)
+
+NOW = datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def _row(seq, seconds_ago=60):
+    return {"seq": seq, "created_at": (NOW - timedelta(seconds=seconds_ago)).isoformat()}
+
+
+class TestPlanDelta:
+    """Cursor advance and gap detection"""
+
+    def test_contiguous(self):
+        assert plan_delta(3, [_row(4), _row(5), _row(6)], now=NOW) == (6, [])
+
+    def test_empty_delta_keeps_cursor(self):
+        assert plan_delta(7, [], now=NOW) == (7, [])
+
+    def test_old_gap_is_skipped(self):
+        cursor, gaps = plan_delta(0, [_row(1), _row(4, seconds_ago=120)], now=NOW)
+        assert gaps == [2, 3]
+        assert cursor == 4
+
+    def test_recent_gap_blocks_cursor(self):
+        cursor, gaps = plan_delta(0, [_row(1), _row(3, seconds_ago=1), _row(4, seconds_ago=1)], now=NOW)
+        assert gaps == [2]
+        assert cursor == 1
+
+    def test_legacy_negative_sequences(self):
+        assert plan_delta(-3, [_row(-2), _row(-1), _row(0), _row(1)], now=NOW) == (1, [])
+
+    def test_max_seq(self):
+        assert max_seq([_row(2), {"seq": None}, _row(9)], 0) == 9
+        assert max_seq([], 5) == 5
+
+
+class TestCursorMap:
+    def test_parse(self):
+        assert parse_cursor_map("a:12, b:-3,bad,c:x") == {"a": 12, "b": -3}
+        assert parse_cursor_map(None) == {}
+
+
+class TestBroadcastTimeline:
+    """Merge of the two indexed range scans"""
+
+    def _msg(self, mid, minute):
+        return {"id": mid, "created_at": f"2026-03-01T12:{minute:02d}:00+00:00"}
+
+    def test_merge_in_order(self):
+        session = [self._msg("s1", 1), self._msg("s2", 4)]
+        broadcast = [self._msg("b1", 2), self._msg("b2", 3), self._msg("b3", 5)]
+        assert [m["id"] for m in merge_timelines(session, broadcast)] == ["s1", "b1", "b2", "s2", "b3"]
+
+    def test_merge_dedupes_and_limits(self):
+        session = [self._msg("s1", 1), self._msg("x", 2)]
+        broadcast = [self._msg("x", 2), self._msg("b1", 3)]
+        assert [m["id"] for m in merge_timelines(session, broadcast)] == ["s1", "x", "b1"]
+        assert [m["id"] for m in merge_timelines(session, broadcast, limit=2)] == ["s1", "x"]
+
+    def test_is_broadcast(self):
+        assert is_broadcast({"broadcast": True})
+        assert is_broadcast({"type": "group"})
+        assert not is_broadcast({"session_id": "s"})
+
+
+class _DbError(Exception):
+    def __init__(self, code):
+        super().__init__(f"code {code}")
+        self.code = code
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        self.docs.sort(key=lambda d: tuple(d.get(k) for k, _ in keys))
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Result:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class _Timeline:
+    """broadcast_messages: index id unique (une fois créé), copies insérées par d'autres workers."""
+
+    def __init__(self, docs=(), index_options=None):
+        self.docs = list(docs)
+        self.finds = 0
+        self.indexes = {"id_1": index_options} if index_options else {}
+        self.on_insert = None
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return _Cursor([dict(d) for d in self.docs])
+
+    async def insert_one(self, doc):
+        if self.on_insert:
+            self.on_insert(doc)
+        if self.indexes.get("id_1", {}).get("unique") and any(d["id"] == doc["id"] for d in self.docs):
+            raise _DbError(11000)
+        self.docs.append(dict(doc))
+
+    async def create_index(self, keys, unique=False, name=None, **options):
+        if name is None:
+            return
+        existing = self.indexes.get(name)
+        if existing and existing.get("unique") != unique:
+            raise _DbError(86)
+        ids = [d["id"] for d in self.docs]
+        if unique and len(ids) != len(set(ids)):
+            raise _DbError(11000)
+        self.indexes[name] = {"unique": unique, **options}
+
+    async def drop_index(self, name):
+        del self.indexes[name]
+
+    def aggregate(self, pipeline):
+        groups = {}
+        for d in self.docs:
+            groups.setdefault(d["id"], []).append(d["seq"])
+        return _Cursor([{"_id": i, "seqs": seqs, "count": len(seqs)} for i, seqs in groups.items() if len(seqs) > 1])
+
+    async def delete_many(self, query):
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if not (d["id"] == query["id"] and d["seq"] in query["seq"]["$in"])]
+        return _Result(before - len(self.docs))
+
+
+class _Sequences:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query):
+        return self.docs.get(query["session_id"])
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=False):
+        doc = self.docs.setdefault(query["session_id"], {"session_id": query["session_id"], "seq": 0})
+        doc["seq"] += update["$inc"]["seq"]
+        return dict(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(query["session_id"], {}).update(update["$set"])
+
+
+class _ChatMessages:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return _Cursor([dict(d) for d in self.docs])
+
+
+class _SeqDatabase:
+    def __init__(self, timeline, messages):
+        self.collections = {"broadcast_messages": timeline, "message_sequences": _Sequences()}
+        self.chat_messages = _ChatMessages(messages)
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+def _broadcast(mid, minute):
+    return {"id": mid, "broadcast": True, "session_id": "s", "seq": minute,
+            "created_at": f"2026-03-01T12:{minute:02d}:00+00:00"}
+
+
+class TestBroadcastMigration:
+    def test_migrated_ids_read_once(self):
+        timeline = _Timeline([{"id": "b1", "seq": 1}], index_options={"unique": True})
+        database = _SeqDatabase(timeline, [_broadcast("b2", 2), _broadcast("b1", 1), _broadcast("b3", 3)])
+
+        assert asyncio.run(migrate_broadcasts(database)) == 2
+        assert [d["id"] for d in timeline.docs] == ["b1", "b2", "b3"]
+        assert timeline.finds == 1
+        assert timeline.docs[1]["session_seq"] == 2
+        assert asyncio.run(migrate_broadcasts(database)) == 0  # marqueur posé
+
+    def test_concurrent_copy_skipped(self):
+        timeline = _Timeline(index_options={"unique": True})
+
+        def other_worker(doc):
+            # Un autre worker copie b2 juste avant nous
+            if doc["id"] == "b2" and not any(d["id"] == "b2" for d in timeline.docs):
+                timeline.docs.append({"id": "b2", "seq": 99})
+
+        timeline.on_insert = other_worker
+        database = _SeqDatabase(timeline, [_broadcast("b1", 1), _broadcast("b2", 2)])
+        assert asyncio.run(migrate_broadcasts(database)) == 1
+        assert sorted(d["id"] for d in timeline.docs) == ["b1", "b2"]
+
+    def test_unique_index_replaces_legacy_index_and_duplicates(self):
+        timeline = _Timeline([{"id": "b1", "seq": 4}, {"id": "b1", "seq": 2}, {"id": "b2", "seq": 3}],
+                             index_options={"unique": False})
+        asyncio.run(ensure_broadcast_indexes(_SeqDatabase(timeline, [])))
+        assert timeline.indexes["id_1"]["unique"]
+        assert sorted((d["id"], d["seq"]) for d in timeline.docs) == [("b1", 2), ("b2", 3)]
@@ -0,0 +1,85 @@
+"""
+Test Suite: Unread notification hub (server-push instead of 10s polling)
+In-memory behaviour only (no DB, no Socket.IO).
+
+Features to test:
+1. Message writes bump per-target counters and the hub version
+2. mark-read (watermark recount / all_for_target) resets or clears counters
+3. Long-poll wait returns as soon as a write happens
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from notification_hub import UnreadNotificationHub
+
+
+class TestUnreadCounters:
+    """Counters maintained by the message write paths"""
+
+    def test_record_by_sender_type(self):
+        async def scenario():
+            hub = UnreadNotificationHub()
+            await hub.record_message("s1", "user")
+            await hub.record_message("s1", "user")
+            await hub.record_message("s2", "user")
+            await hub.record_message("s1", "ai")
+            await hub.record_message("s2", "coach")
+            await hub.record_message("s2", "system")
+            return hub
+
+        hub = asyncio.run(scenario())
+        assert hub.count("coach") == 3
+        assert hub.count("coach", include_ai=True) == 4
+        assert hub.count("coach", "s1") == 2
+        assert hub.count("client", "s1") == 1
+        assert hub.count("client", "s2") == 1
+        assert hub.version == 5
+
+    def test_recount_and_clear(self):
+        async def scenario():
+            hub = UnreadNotificationHub()
+            for _ in range(3):
+                await hub.record_message("s1", "user")
+            await hub.record_message("s1", "ai")
+            await hub.set_count("coach", "s1", 2)
+            after_recount = hub.count("coach")
+            await hub.clear(["client", "coach_ai"], "s1")
+            return hub, after_recount
+
+        hub, after_recount = asyncio.run(scenario())
+        assert after_recount == 2
+        assert hub.count("client", "s1") == 0
+        assert hub.count("coach", include_ai=True) == 2
+
+    def test_counters_never_negative(self):
+        async def scenario():
+            hub = UnreadNotificationHub()
+            await hub.set_count("coach", "s1", -3)
+            return hub
+
+        assert asyncio.run(scenario()).count("coach") == 0
+
+
+class TestLongPoll:
+    """Long-poll fallback wakes up on write"""
+
+    def test_wait_wakes_on_message(self):
+        async def scenario():
+            hub = UnreadNotificationHub()
+            version = hub.version
+            waiter = asyncio.create_task(hub.wait_for_change(version, timeout=5))
+            await asyncio.sleep(0.05)
+            await hub.record_message("s1", "user")
+            return await asyncio.wait_for(waiter, 1)
+
+        assert asyncio.run(scenario()) is True
+
+    def test_wait_times_out(self):
+        async def scenario():
+            hub = UnreadNotificationHub()
+            return await hub.wait_for_change(hub.version, timeout=0.05)
+
+        assert asyncio.run(scenario()) is False
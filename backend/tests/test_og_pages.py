@@ -0,0 +1,84 @@
+"""
+Test Suite: OG Pages - pages de partage OpenGraph rendues et mémorisées par slug
+
+Features to test:
+1. User values escaped in every page (title, description, thumbnail)
+2. Share page: custom thumbnail preferred, YouTube video tags only when relevant
+3. Viewer page redirects to the configured frontend
+4. Cache keys cover the three pages of a slug (case-insensitive)
+5. Concurrent crawler hits on one slug render once, invalidation re-renders
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from og_pages import cache_keys, render_og_page, render_share_page, render_viewer_page
+from response_cache import ResponseCache
+
+MEDIA = {
+    "slug": "promo-ete",
+    "title": 'Session "Afro" <live>',
+    "description": "Cardio & danse",
+    "thumbnail": "https://img.youtube.com/vi/abc123/maxresdefault.jpg",
+    "youtube_id": "abc123",
+    "cta_text": "Réserver",
+}
+
+
+class TestRendering:
+    def test_values_are_escaped(self):
+        for page in (render_og_page(MEDIA, "promo-ete"), render_share_page(MEDIA, "promo-ete"),
+                     render_viewer_page(MEDIA, "promo-ete", "https://example.com")):
+            assert "<live>" not in page
+            assert "Session &quot;Afro&quot; &lt;live&gt;" in page
+            assert "Cardio &amp; danse" in page
+
+    def test_share_page(self):
+        page = render_share_page({**MEDIA, "custom_thumbnail": "https://cdn.example.com/t.jpg"}, "promo-ete")
+        assert '<meta property="og:image" content="https://cdn.example.com/t.jpg" />' in page
+        assert "https://www.youtube.com/embed/abc123" in page
+        assert "https://afroboosteur.com/api/share/promo-ete" in page
+        assert "Réserver" in page
+
+        plain = render_share_page({"slug": "x", "title": None, "description": ""}, "x")
+        assert "og:video" not in plain
+        assert "<title>Afroboost - Afroboost</title>" in plain
+        assert "Découvrez cette vidéo exclusive Afroboost" in plain
+        assert "Voir la vidéo" in plain
+
+    def test_viewer_page_uses_frontend_url(self):
+        page = render_viewer_page(MEDIA, "promo-ete", "https://preview.example.com")
+        assert 'window.location.href = "https://preview.example.com/v/promo-ete"' in page
+
+    def test_cache_keys(self):
+        assert cache_keys("Promo-Ete") == ("og:share:promo-ete", "og:meta:promo-ete", "og:viewer:promo-ete")
+
+
+class TestCachedPages:
+    def test_crawler_burst_renders_once(self):
+        renders = []
+
+        async def load_page():
+            renders.append(1)
+            await asyncio.sleep(0)
+            return render_share_page(MEDIA, "promo-ete")
+
+        async def _encoded(loader):
+            return (await loader()).encode()
+
+        async def burst():
+            cache = ResponseCache(max_entries=10)
+            key = cache_keys("promo-ete")[0]
+            build = lambda: _encoded(load_page)
+            entries = await asyncio.gather(*(cache.entry(key, build, "text/html; charset=utf-8") for _ in range(200)))
+            cache.invalidate(*cache_keys("promo-ete"))
+            again = await cache.entry(key, build)
+            return entries, again
+
+        entries, again = asyncio.run(burst())
+        assert len(renders) == 2
+        assert len({e.etag for e in entries}) == 1
+        assert entries[0].body.startswith(b"<!DOCTYPE html>")
+        assert again is not entries[0]
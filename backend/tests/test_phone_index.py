@@ -0,0 +1,103 @@
+"""
+Test Suite: Phone Index - numéros normalisés et identification de l'appelant WhatsApp
+
+Features to test:
+1. E.164 normalization (+, 00, national 0, missing 0) and rejection of short numbers
+2. Same 9-digit key for every way of writing one number
+3. Index fields on inserts and partial $set updates
+4. Caller lookup: one equality query per collection, reservations first
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from phone_index import normalize_phone, phone_key, index_fields, with_phone_index, find_caller
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return _Cursor([d for d in self.docs if all(d.get(k) == v for k, v in query.items())])
+
+
+class _Database(dict):
+    def __getitem__(self, name):
+        return self.setdefault(name, _Collection([]))
+
+
+class TestNormalization:
+    def test_e164(self):
+        assert normalize_phone("+41 79 123 45 67") == "+41791234567"
+        assert normalize_phone("0041791234567") == "+41791234567"
+        assert normalize_phone("079 123 45 67") == "+41791234567"
+        assert normalize_phone("79-123-45-67") == "+41791234567"
+        assert normalize_phone("whatsapp:+33612345678") == "+33612345678"
+        assert normalize_phone("0612345678", country_code="33") == "+33612345678"
+        assert normalize_phone("12345") is None
+        assert normalize_phone(None) is None
+
+    def test_key_is_shared_by_all_spellings(self):
+        spellings = ["+41 79 123 45 67", "0041791234567", "079/123.45.67", "whatsapp:+41791234567"]
+        assert {phone_key(p) for p in spellings} == {"791234567"}
+        assert phone_key("1234") is None
+
+
+class TestIndexFields:
+    def test_insert_uses_first_non_empty_source(self):
+        doc = with_phone_index({"userName": "Awa", "userWhatsapp": "", "phone": "079 123 45 67"}, "reservations")
+        assert (doc["phone_e164"], doc["phone_key"]) == ("+41791234567", "791234567")
+
+    def test_partial_update(self):
+        assert index_fields({"last_seen_at": "2026-01-01"}, "chat_participants") == {}
+        assert index_fields({"whatsapp": ""}, "chat_participants") == {"phone_e164": None, "phone_key": None}
+
+
+class TestFindCaller:
+    def test_reservations_first_then_participants(self):
+        database = _Database()
+        database["reservations"] = _Collection([
+            {"_id": 1, "id": "r1", "userName": "Ancien nom", "phone_key": "791234567"},
+            {"_id": 2, "id": "r2", "userName": "Awa", "phone_key": "791234567", "phone_e164": "+41791234567"},
+        ])
+        database["chat_participants"] = _Collection([{"_id": 1, "id": "p1", "name": "Bintou", "phone_key": "612345678"}])
+
+        caller = asyncio.run(find_caller(database, "+41791234567"))
+        assert caller == {"collection": "reservations", "id": "r2", "name": "Awa", "phone_e164": "+41791234567"}
+        assert database["reservations"].queries == [{"phone_key": "791234567"}]
+
+        caller = asyncio.run(find_caller(database, "whatsapp:+33612345678"))
+        assert (caller["collection"], caller["name"]) == ("chat_participants", "Bintou")
+
+    def test_unknown_caller(self):
+        database = _Database()
+        assert asyncio.run(find_caller(database, "+41780000000")) is None
+        assert asyncio.run(find_caller(database, "")) is None
@@ -0,0 +1,181 @@
+"""
+Test Suite: Private Conversations - conversations privées adressées par paire
+
+Features to test:
+1. Pair key is independent of the participants order
+2. Get-or-create returns the existing conversation for A->B then B->A
+3. Two concurrent get-or-create calls end on a single conversation (DuplicateKey 11000 retry)
+4. Backfill: participant_ids on legacy conversations, the oldest duplicate owns the pair key,
+   existing keys read once, updates written in batches
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from private_conversations import backfill_keys, get_or_create, private_pair_key
+
+
+class _DuplicateKeyError(Exception):
+    code = 11000
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        if isinstance(condition, dict) and "$exists" in condition:
+            if (field in doc) != condition["$exists"]:
+                return False
+        elif isinstance(condition, dict) and "$type" in condition:
+            if not isinstance(doc.get(field), str):
+                return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Conversations:
+    """private_conversations avec l'index unique partiel sur pair_key."""
+
+    def __init__(self, docs=None):
+        self.docs = docs or []
+        self.upsert_gate = None  # asyncio.Event: upserts suspendus entre lecture et insertion
+        self.finds = 0
+        self.bulk_writes = 0
+
+    def _check_unique(self, key, owner=None):
+        if isinstance(key, str) and any(d is not owner and d.get("pair_key") == key for d in self.docs):
+            raise _DuplicateKeyError(f"E11000 duplicate key pair_key: {key}")
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=False, projection=None):
+        existing = next((d for d in self.docs if _matches(d, query)), None)
+        if existing is None and self.upsert_gate is not None:
+            await self.upsert_gate.wait()  # les deux requêtes ont vu "absent"
+        if existing is None:
+            doc = {**query, **update["$setOnInsert"]}
+            self._check_unique(doc.get("pair_key"))
+            self.docs.append(doc)
+            return dict(doc)
+        return dict(existing)
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs if _matches(d, query)), None)
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return _Cursor([dict(d) for d in self.docs if _matches(d, query)])
+
+    async def bulk_write(self, ops, ordered=True):
+        self.bulk_writes += 1
+        for query, update in ops:
+            doc = next(d for d in self.docs if _matches(d, query))
+            fields = update["$set"]
+            if "pair_key" in fields:
+                self._check_unique(fields["pair_key"], owner=doc)
+            doc.update(fields)
+
+
+def _op(filter_, update):
+    return filter_, update
+
+
+def _conversation(conv_id, a, b):
+    return {"id": conv_id, "participant_1_id": a, "participant_2_id": b,
+            "pair_key": private_pair_key(a, b), "participant_ids": sorted([a, b])}
+
+
+def test_pair_key_is_order_independent():
+    assert private_pair_key("alice", "bob") == private_pair_key("bob", "alice") == "alice|bob"
+    assert private_pair_key("alice", "bob") != private_pair_key("alice", "carol")
+
+
+def test_get_or_create_reuses_reverse_pair():
+    async def scenario():
+        collection = _Conversations()
+        first = await get_or_create(collection, _conversation("c1", "alice", "bob"))
+        second = await get_or_create(collection, _conversation("c2", "bob", "alice"))
+        return collection, first, second
+
+    collection, first, second = asyncio.run(scenario())
+    assert first["id"] == second["id"] == "c1"
+    assert len(collection.docs) == 1
+
+
+def test_concurrent_get_or_create_single_conversation():
+    async def scenario():
+        collection = _Conversations()
+        collection.upsert_gate = asyncio.Event()
+        calls = asyncio.gather(
+            get_or_create(collection, _conversation("c1", "alice", "bob")),
+            get_or_create(collection, _conversation("c2", "bob", "alice")),
+        )
+        await asyncio.sleep(0)
+        collection.upsert_gate.set()
+        return collection, await calls
+
+    collection, results = asyncio.run(scenario())
+    assert [r["id"] for r in results] == ["c1", "c1"]  # le perdant relit après l'erreur 11000
+    assert len(collection.docs) == 1
+
+
+def test_other_errors_are_raised():
+    class _Broken(_Conversations):
+        async def find_one_and_update(self, *args, **kwargs):
+            raise RuntimeError("primary stepped down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(get_or_create(_Broken(), _conversation("c1", "alice", "bob")))
+
+
+def test_backfill_oldest_duplicate_owns_pair_key():
+    collection = _Conversations([
+        {"id": "late", "participant_1_id": "bob", "participant_2_id": "alice", "created_at": "2025-02-01"},
+        {"id": "early", "participant_1_id": "alice", "participant_2_id": "bob", "created_at": "2025-01-01"},
+        {"id": "other", "participant_1_id": "carol", "participant_2_id": "alice", "created_at": "2025-01-15"},
+        {**_conversation("done", "dan", "erin"), "created_at": "2025-03-01"},
+    ])
+
+    assert asyncio.run(backfill_keys(collection, batch_size=2, update_op=_op)) == 3
+    assert collection.finds == 2 and collection.bulk_writes == 2  # clés existantes + conversations
+    by_id = {d["id"]: d for d in collection.docs}
+    assert by_id["early"]["pair_key"] == "alice|bob"
+    assert "pair_key" not in by_id["late"]
+    assert by_id["late"]["participant_ids"] == ["alice", "bob"]  # toujours listée pour les deux
+    assert by_id["other"]["pair_key"] == "alice|carol"
+    assert asyncio.run(backfill_keys(collection, update_op=_op)) == 0
+
+
+def test_backfill_tolerates_keys_taken_by_another_worker():
+    class _BulkWriteError(Exception):
+        code = 65
+        details = {"writeErrors": [{"index": 0, "code": 11000}]}
+
+    class _Raced(_Conversations):
+        async def bulk_write(self, ops, ordered=True):
+            raise _BulkWriteError()
+
+    collection = _Raced([
+        {"id": "c1", "participant_1_id": "alice", "participant_2_id": "bob", "created_at": "2025-01-01"},
+    ])
+    assert asyncio.run(backfill_keys(collection, update_op=_op)) == 1
@@ -0,0 +1,143 @@
+"""
+Test Suite: Async Web Push sender
+Tests against a local push-service stub (no network, no real encryption).
+
+Features to test:
+1. VAPID JWT signed once per audience origin, then reused
+2. Multi-device fan-out runs concurrently without blocking the event loop
+3. 404/410 endpoints reported for bulk deactivation
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from push_sender import AsyncPushSender, VapidTokenCache, audience_of
+
+
+class _PushServiceStub(BaseHTTPRequestHandler):
+    received = []
+    delay = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        _PushServiceStub.received.append((self.path, self.headers.get("Authorization")))
+        time.sleep(_PushServiceStub.delay)
+        status = {"/push/gone": 410, "/push/missing": 404, "/push/error": 500}.get(self.path, 201)
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def push_service():
+    _PushServiceStub.received = []
+    _PushServiceStub.delay = 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PushServiceStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", _PushServiceStub
+    server.shutdown()
+
+
+def _http_transport(subscription_info, payload, headers, ttl):
+    request = urllib.request.Request(
+        subscription_info["endpoint"], data=payload.encode(), method="POST",
+        headers={**headers, "TTL": str(ttl)}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class _CountingSigner:
+    def __init__(self):
+        self.claims = []
+
+    def __call__(self, claims):
+        self.claims.append(claims)
+        return {"Authorization": f"vapid t=token-{len(self.claims)},k=pub"}
+
+
+class TestVapidTokenCache:
+    """JWT reuse per audience origin"""
+
+    def test_one_signature_per_origin(self):
+        signer = _CountingSigner()
+        cache = VapidTokenCache("key", "contact@afroboost.ch", signer=signer)
+        for i in range(50):
+            cache.headers_for(f"https://fcm.googleapis.com/fcm/send/device-{i}")
+        cache.headers_for("https://updates.push.services.mozilla.com/wpush/v2/abc")
+        assert cache.signatures == 2
+        assert {c["aud"] for c in signer.claims} == {"https://fcm.googleapis.com", "https://updates.push.services.mozilla.com"}
+        assert signer.claims[0]["sub"] == "mailto:contact@afroboost.ch"
+
+    def test_token_renewed_before_expiry(self):
+        now = [1000.0]
+        cache = VapidTokenCache("key", "c@a.ch", signer=_CountingSigner(), token_ttl=3600, clock=lambda: now[0])
+        cache.headers_for("https://fcm.googleapis.com/a")
+        now[0] += 3000  # dans la marge de renouvellement
+        cache.headers_for("https://fcm.googleapis.com/b")
+        assert cache.signatures == 2
+
+    def test_audience_of(self):
+        assert audience_of("https://web.push.apple.com/QGx?x=1") == "https://web.push.apple.com"
+
+
+class TestAsyncPushSender:
+    """Fan-out against the local push service stub"""
+
+    def test_fan_out_and_expired_endpoints(self, push_service):
+        base, stub = push_service
+        sender = AsyncPushSender(VapidTokenCache("key", "c@a.ch", signer=_CountingSigner()), transport=_http_transport)
+        subs = [{"endpoint": f"{base}/push/device-{i}", "keys": {}} for i in range(5)]
+        subs += [{"endpoint": f"{base}/push/gone"}, {"endpoint": f"{base}/push/missing"}, {"endpoint": f"{base}/push/error"}, {}]
+        report = asyncio.run(sender.send_many(subs, '{"title":"t"}'))
+        sender.shutdown()
+        assert report.sent == 5
+        assert report.failed == 3
+        assert sorted(report.expired_endpoints) == [f"{base}/push/gone", f"{base}/push/missing"]
+        assert len(stub.received) == 8
+        assert all(auth == "vapid t=token-1,k=pub" for _, auth in stub.received)
+        assert sender.vapid_cache.signatures == 1
+
+    def test_event_loop_not_blocked(self, push_service):
+        base, stub = push_service
+        stub.delay = 0.2
+        sender = AsyncPushSender(VapidTokenCache("key", "c@a.ch", signer=_CountingSigner()),
+                                 transport=_http_transport, max_concurrency=50)
+        subs = [{"endpoint": f"{base}/push/member-{i}"} for i in range(50)]
+
+        async def scenario():
+            ticks = 0
+
+            async def heartbeat():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            beat = asyncio.create_task(heartbeat())
+            started = time.monotonic()
+            report = await sender.send_many(subs, "{}")
+            elapsed = time.monotonic() - started
+            beat.cancel()
+            return report, elapsed, ticks
+
+        report, elapsed, ticks = asyncio.run(scenario())
+        sender.shutdown()
+        assert report.sent == 50
+        # 50 x 200ms en séquentiel = 10s ; en concurrent << 10s
+        assert elapsed < 3
+        assert ticks > 5
@@ -0,0 +1,33 @@
+"""
+Test Suite: Read watermarks (lecteur, conversation)
+Pure helpers only - the Mongo store is exercised against a live backend.
+
+Features to test:
+1. Effective watermark = max(global, scope)
+2. Unread = created_at strictly after the watermark
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from read_watermarks import GLOBAL_SCOPE, effective_watermark, is_unread, private_scope
+
+
+class TestWatermarkHelpers:
+
+    def test_effective_watermark(self):
+        marks = {GLOBAL_SCOPE: "2026-02-01T10:00:00+00:00", "s1": "2026-02-03T10:00:00+00:00"}
+        assert effective_watermark(marks, "s1") == "2026-02-03T10:00:00+00:00"
+        assert effective_watermark(marks, "s2") == "2026-02-01T10:00:00+00:00"
+        assert effective_watermark({}, "s1") is None
+
+    def test_is_unread(self):
+        watermark = "2026-02-03T10:00:00+00:00"
+        assert is_unread("2026-02-03T10:00:01+00:00", watermark)
+        assert not is_unread(watermark, watermark)
+        assert not is_unread("2026-01-01T00:00:00+00:00", watermark)
+        assert is_unread("2026-01-01T00:00:00+00:00", None)
+
+    def test_private_scope(self):
+        assert private_scope("abc") == "pm:abc"
@@ -0,0 +1,129 @@
+"""
+Test Suite: Response Cache - corps mémorisés + ETag / If-None-Match
+
+Features to test:
+1. Content-hash ETag, stable for identical bodies
+2. If-None-Match matching (list, weak validators, '*')
+3. Body built once per key, rebuilt after invalidation or TTL
+4. Concurrent misses coalesced into one build
+5. LRU eviction, per-key locks bounded (failed builds leave no lock behind)
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from response_cache import ResponseCache, compute_etag, etag_matches, dump_json
+
+
+class _Builder:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return dump_json(self.payload)
+
+
+class TestEtag:
+    def test_content_hash(self):
+        assert compute_etag(b'{"a":1}') == compute_etag(b'{"a":1}')
+        assert compute_etag(b'{"a":1}') != compute_etag(b'{"a":2}')
+
+    def test_if_none_match(self):
+        etag = compute_etag(b"x")
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"other"', etag)
+
+    def test_dump_json_is_compact_utf8(self):
+        assert dump_json({"nom": "Café"}) == '{"nom":"Café"}'.encode("utf-8")
+
+
+class TestResponseCache:
+    def test_memoized_until_invalidated(self):
+        async def scenario():
+            cache = ResponseCache()
+            builder = _Builder([{"id": 1}])
+            first = await cache.entry("courses", builder)
+            second = await cache.entry("courses", builder)
+            builder.payload = [{"id": 2}]
+            cache.invalidate("courses")
+            third = await cache.entry("courses", builder)
+            return builder.calls, first, second, third, cache.metrics()
+
+        calls, first, second, third, metrics = asyncio.run(scenario())
+        assert calls == 2
+        assert first is second
+        assert third.etag != first.etag
+        assert (metrics["hits"], metrics["misses"]) == (1, 2)
+
+    def test_ttl(self):
+        now = [0.0]
+
+        async def scenario():
+            cache = ResponseCache(ttl_seconds=10, clock=lambda: now[0])
+            builder = _Builder({"a": 1})
+            await cache.entry("config", builder)
+            now[0] = 11
+            await cache.entry("config", builder)
+            return builder.calls
+
+        assert asyncio.run(scenario()) == 2
+
+    def test_concurrent_misses_build_once(self):
+        async def scenario():
+            cache = ResponseCache()
+            builder = _Builder({"flags": True})
+            entries = await asyncio.gather(*(cache.entry("feature-flags", builder) for _ in range(10)))
+            return builder.calls, {e.etag for e in entries}
+
+        calls, etags = asyncio.run(scenario())
+        assert calls == 1
+        assert len(etags) == 1
+
+    def test_max_entries_evicts_least_recently_used(self):
+        async def scenario():
+            cache = ResponseCache(max_entries=2)
+            builder = _Builder("<html></html>")
+            await cache.entry("og:share:a", builder)
+            await cache.entry("og:share:b", builder)
+            await cache.entry("og:share:a", builder)  # a redevient la plus récente
+            await cache.entry("og:share:c", builder)  # évince b
+            await cache.entry("og:share:a", builder)
+            await cache.entry("og:share:b", builder)
+            return builder.calls, cache.metrics()
+
+        calls, metrics = asyncio.run(scenario())
+        assert calls == 4
+        assert metrics["entries"] == 2
+        assert metrics["evictions"] == 2
+
+    def test_failed_builds_leave_no_locks(self):
+        async def missing():
+            await asyncio.sleep(0)
+            raise LookupError("slug inconnu")
+
+        async def scenario():
+            cache = ResponseCache(max_entries=10)
+            for i in range(5000):
+                try:
+                    await cache.entry(f"og:share:bogus-{i}", missing)
+                except LookupError:
+                    pass
+            # Requêtes concurrentes sur la même clé: le verrou survit jusqu'à la dernière
+            results = await asyncio.gather(*(cache.entry("og:share:x", missing) for _ in range(3)),
+                                           return_exceptions=True)
+            builder = _Builder("<html></html>")
+            await cache.entry("og:share:ok", builder)
+            return results, cache.metrics()
+
+        results, metrics = asyncio.run(scenario())
+        assert all(isinstance(r, LookupError) for r in results)
+        assert metrics["entries"] == 1
+        assert metrics["locks"] == 1
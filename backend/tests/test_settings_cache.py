@@ -0,0 +1,89 @@
+"""
+Test Suite: Settings Cache - documents de configuration singleton
+
+Features to test:
+1. Read-through once, then served from memory (absent documents too)
+2. Write-through from PUT handlers, invalidation per collection
+3. TTL fallback for out-of-band edits, callers get independent copies
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from settings_cache import SettingsCache, AI_CONFIG, COACH_AUTH, coach_subscription
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        for doc in self.docs:
+            if all(doc.get(k) == v for k, v in query.items()):
+                return dict(doc)
+        return None
+
+
+class _Database(dict):
+    def __missing__(self, name):
+        self[name] = _Collection([])
+        return self[name]
+
+
+def _db():
+    database = _Database()
+    database["ai_config"] = _Collection([{"id": "ai_config", "enabled": True, "tags": ["a"]}])
+    database["coach_subscriptions"] = _Collection([{"coachEmail": "c@test.ch", "hasAudioService": True}])
+    return database
+
+
+class TestSettingsCache:
+    def test_read_through_once(self):
+        database = _db()
+        cache = SettingsCache(database)
+
+        async def scenario():
+            for _ in range(5):
+                assert (await cache.get(AI_CONFIG))["enabled"] is True
+            assert await cache.get(COACH_AUTH) is None
+            assert await cache.get(COACH_AUTH) is None
+            assert (await cache.get(coach_subscription("c@test.ch")))["hasAudioService"] is True
+
+        asyncio.run(scenario())
+        assert database["ai_config"].reads == 1
+        assert database["coach_auth"].reads == 1
+        assert cache.metrics()["hits"] == 5
+
+    def test_write_through_and_invalidate(self):
+        database = _db()
+        cache = SettingsCache(database)
+
+        async def scenario():
+            await cache.get(AI_CONFIG)
+            cache.put(AI_CONFIG, {"_id": "x", "id": "ai_config", "enabled": False})
+            assert await cache.get(AI_CONFIG) == {"id": "ai_config", "enabled": False}
+            cache.invalidate("ai_config")
+            return await cache.get(AI_CONFIG)
+
+        assert asyncio.run(scenario())["enabled"] is True
+        assert database["ai_config"].reads == 2
+
+    def test_ttl_and_copies(self):
+        now = [0.0]
+        database = _db()
+        cache = SettingsCache(database, ttl_seconds=30, clock=lambda: now[0])
+
+        async def scenario():
+            first = await cache.get(AI_CONFIG)
+            first["tags"].append("mutated")
+            second = await cache.get(AI_CONFIG)
+            now[0] = 31
+            await cache.get(AI_CONFIG)
+            return second
+
+        assert asyncio.run(scenario())["tags"] == ["a"]
+        assert database["ai_config"].reads == 2
@@ -0,0 +1,167 @@
+"""
+Test Suite: Upload GC - photos de profil orphelines
+
+Features to test:
+1. Referenced names from photo_url / photoUrl / srcset (all variants of a hash kept)
+2. Orphans older than the grace period deleted in batches, reclaimed bytes reported
+3. Recent unreferenced files (upload in progress, with sibling variants) and dry runs keep files
+4. Guest / local-only photos kept through profile_uploads, one reference per owner
+5. Guest references expire after GUEST_TTL_SECONDS, their photos are reclaimed
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from upload_gc import GUEST_TTL_SECONDS, UploadSweeper, forget_uploads, record_upload, referenced_files
+from image_pipeline import variant_names
+from media_storage import LocalDiskStorage
+
+PREFIX = "/api/uploads/profiles"
+DIGEST = "0123456789abcdef01234567"
+RECENT_DIGEST = "fedcba9876543210fedcba98"
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.scans = 0
+
+    def find(self, query, projection):
+        self.scans += 1
+        return _Cursor([{k: v for k, v in d.items() if k in projection} for d in self.docs])
+
+    async def update_one(self, query, update, upsert=False):
+        doc = next((d for d in self.docs if d["_id"] == query["_id"]), None)
+        if doc is None:
+            doc = dict(query)
+            self.docs.append(doc)
+        doc.update(update["$set"])
+
+    async def delete_many(self, query):
+        def matches(doc):
+            if isinstance(query["_id"], dict):  # références d'invités expirées
+                return doc["_id"].startswith("guest:") and doc["updated_at"] < query["updated_at"]["$lt"]
+            return doc["_id"] == query["_id"]
+
+        kept = [d for d in self.docs if not matches(d)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return _Result(deleted)
+
+
+class _Result:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+def _write(directory, name, size, age_seconds):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    past = time.time() - age_seconds
+    os.utime(path, (past, past))
+
+
+class TestReferencedFiles:
+    def test_urls_and_srcset(self):
+        names = referenced_files([
+            f"{PREFIX}/p1_abcd1234.jpg",
+            f"https://afroboost.ch{PREFIX}/p2_x.jpg?v=2",
+            f"{PREFIX}/{DIGEST}_48.webp 48w, {PREFIX}/{DIGEST}_96.webp 96w",
+            None,
+            "https://cdn.example.com/other.jpg",
+        ], LocalDiskStorage(".", PREFIX).key_from_url)
+        assert {"p1_abcd1234.jpg", "p2_x.jpg"} <= names
+        assert set(variant_names(DIGEST)) <= names
+        assert "other.jpg" not in names
+
+
+class TestSweep:
+    def _setup(self, tmp_path):
+        _write(tmp_path, "live_1.jpg", 10, 3 * 86400)
+        _write(tmp_path, f"{DIGEST}_200.jpg", 10, 3 * 86400)
+        _write(tmp_path, f"{DIGEST}_48.webp", 10, 3 * 86400)
+        _write(tmp_path, "old_1.jpg", 100, 3 * 86400)
+        _write(tmp_path, "old_2.jpg", 150, 3 * 86400)
+        _write(tmp_path, "uploading.jpg", 70, 60)
+        # Ré-upload dédupliqué: seule la sentinelle a été rafraîchie
+        _write(tmp_path, f"{RECENT_DIGEST}_48.jpg", 5, 60)
+        _write(tmp_path, f"{RECENT_DIGEST}_200.webp", 5, 3 * 86400)
+        users = _Collection([{"id": "u1", "photo_url": f"{PREFIX}/live_1.jpg"}, {"id": "u2"}])
+        participants = _Collection([{"id": "p1", "photoUrl": f"{PREFIX}/{DIGEST}_200.jpg"}])
+        return {"users": users, "chat_participants": participants, "profile_uploads": _Collection([])}
+
+    def test_deletes_old_orphans_in_batches(self, tmp_path):
+        db = self._setup(tmp_path)
+        sweeper = UploadSweeper(db, LocalDiskStorage(str(tmp_path), PREFIX), batch_size=1)
+        report = asyncio.run(sweeper.sweep())
+        assert sorted(os.listdir(tmp_path)) == sorted([
+            "live_1.jpg", f"{DIGEST}_200.jpg", f"{DIGEST}_48.webp", "uploading.jpg",
+            f"{RECENT_DIGEST}_48.jpg", f"{RECENT_DIGEST}_200.webp",
+        ])
+        assert (report["deleted"], report["reclaimed_bytes"], report["kept_recent"]) == (2, 250, 3)
+        assert db["users"].scans == 1 and db["chat_participants"].scans == 1
+
+    def test_dry_run_keeps_files(self, tmp_path):
+        db = self._setup(tmp_path)
+        report = asyncio.run(UploadSweeper(db, LocalDiskStorage(str(tmp_path), PREFIX)).sweep(dry_run=True))
+        assert report["orphans"] == 2 and report["reclaimed_bytes"] == 250 and report["deleted"] == 0
+        assert len(os.listdir(tmp_path)) == 8
+
+
+class TestUnownedUploads:
+    def test_guest_and_local_profiles_kept(self, tmp_path):
+        for name in ("guest_a.jpg", "guest_b.jpg", "local_old.jpg", "local_new.jpg", "deleted.jpg"):
+            _write(tmp_path, name, 10, 3 * 86400)
+        db = {"users": _Collection([]), "chat_participants": _Collection([]), "profile_uploads": _Collection([])}
+
+        async def scenario():
+            # Deux invités: une référence par photo (pas d'id stable)
+            await record_upload(db, "guest", "a" * 24, {"photo_url": f"{PREFIX}/guest_a.jpg"})
+            await record_upload(db, None, "b" * 24, {"photo_url": f"{PREFIX}/guest_b.jpg"})
+            # Profil local: le nouvel upload remplace la référence de l'ancien
+            await record_upload(db, "p-local", "c" * 24, {"photo_url": f"{PREFIX}/local_old.jpg"})
+            await record_upload(db, "p-local", "d" * 24, {"photo_url": f"{PREFIX}/local_new.jpg"})
+            await record_upload(db, "p-gone", "e" * 24, {"photo_url": f"{PREFIX}/deleted.jpg"})
+            await forget_uploads(db, "p-gone")
+            return await UploadSweeper(db, LocalDiskStorage(str(tmp_path), PREFIX)).sweep()
+
+        report = asyncio.run(scenario())
+        assert sorted(os.listdir(tmp_path)) == ["guest_a.jpg", "guest_b.jpg", "local_new.jpg"]
+        assert report["deleted"] == 2
+
+    def test_guest_references_expire(self, tmp_path):
+        for name in ("guest_old.jpg", "guest_new.jpg", "local_old.jpg"):
+            _write(tmp_path, name, 10, 3 * 86400)
+        db = {"users": _Collection([]), "chat_participants": _Collection([]), "profile_uploads": _Collection([])}
+        later = time.time() + GUEST_TTL_SECONDS - 3600
+
+        async def scenario():
+            await record_upload(db, "guest", "a" * 24, {"photo_url": f"{PREFIX}/guest_old.jpg"})
+            await record_upload(db, "p-local", "c" * 24, {"photo_url": f"{PREFIX}/local_old.jpg"})
+            db["profile_uploads"].docs[0]["updated_at"] = "2020-01-01T00:00:00+00:00"
+            await record_upload(db, "guest", "b" * 24, {"photo_url": f"{PREFIX}/guest_new.jpg"})
+            sweeper = UploadSweeper(db, LocalDiskStorage(str(tmp_path), PREFIX), clock=lambda: later)
+            dry = await sweeper.sweep(dry_run=True)
+            return dry, await sweeper.sweep()
+
+        dry, report = asyncio.run(scenario())
+        assert dry["orphans"] == 1 and dry["guests_expired"] == 0
+        assert report["guests_expired"] == 1 and report["deleted"] == 1
+        assert sorted(os.listdir(tmp_path)) == ["guest_new.jpg", "local_old.jpg"]
+        assert [d["_id"] for d in db["profile_uploads"].docs] == ["p-local", "guest:" + "b" * 24]
@@ -0,0 +1,130 @@
+"""
+Test Suite: Upload Intake - lecture bornée des uploads photo / emoji
+
+Features to test:
+1. Image type sniffed from magic bytes (PNG, JPEG, GIF, WebP), others rejected
+2. Chunked copy to a spooled file, aborted as soon as the limit is exceeded
+3. ASGI middleware: 413 on declared Content-Length and on oversized streamed bodies
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from upload_intake import (
+    UploadSizeLimitMiddleware, UploadTooLarge, UnsupportedImage, read_upload, read_bytes, sniff_image_type
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+WEBP = b"RIFF\x10\x00\x00\x00WEBPVP8 " + b"\x00" * 64
+
+
+class _ChunkedUpload:
+    """UploadFile minimal: compte les octets effectivement lus."""
+
+    def __init__(self, data):
+        self.data = data
+        self.read_bytes = 0
+
+    async def read(self, size=-1):
+        chunk = self.data[self.read_bytes:self.read_bytes + size]
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+class TestSniff:
+    def test_known_formats(self):
+        assert sniff_image_type(PNG) == "png"
+        assert sniff_image_type(b"\xff\xd8\xff\xe0" + b"\x00" * 12) == "jpg"
+        assert sniff_image_type(b"GIF89a" + b"\x00" * 10) == "gif"
+        assert sniff_image_type(WEBP) == "webp"
+
+    def test_rejects_other_content(self):
+        assert sniff_image_type(b"<svg xmlns='http://www.w3.org/2000/svg'>") is None
+        assert sniff_image_type(b"XXXX\x00\x00\x00\x00WEBP") is None
+
+
+class TestReadUpload:
+    def test_reads_within_limit(self):
+        intake = asyncio.run(read_upload(_ChunkedUpload(PNG), max_bytes=1024, chunk_size=16))
+        assert (intake.kind, intake.size, intake.content_type) == ("png", len(PNG), "image/png")
+        assert intake.read_all() == PNG
+        intake.close()
+
+    def test_stops_at_first_chunk_over_limit(self):
+        upload = _ChunkedUpload(PNG + b"\x00" * 10_000)
+        with pytest.raises(UploadTooLarge):
+            asyncio.run(read_upload(upload, max_bytes=100, chunk_size=64))
+        assert upload.read_bytes <= 128
+
+    def test_rejects_non_image_early(self):
+        upload = _ChunkedUpload(b"#!/bin/sh\necho pwned\n" * 1000)
+        with pytest.raises(UnsupportedImage):
+            asyncio.run(read_upload(upload, max_bytes=10**6, chunk_size=32))
+        assert upload.read_bytes == 32
+
+    def test_read_bytes(self):
+        intake = asyncio.run(read_bytes(WEBP, max_bytes=1024))
+        assert intake.extension == "webp"
+        intake.close()
+
+
+async def _call(middleware, headers, chunks):
+    sent = []
+    queue = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+
+    async def receive():
+        return queue.pop(0) if queue else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/chat/emojis", "headers": headers}
+    await middleware(scope, receive, send)
+    return sent
+
+
+class _BodyApp:
+    """App ASGI qui lit tout le corps puis répond 400 si la connexion a été coupée (comme FastAPI)."""
+
+    def __init__(self):
+        self.body = b""
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                await send({"type": "http.response.start", "status": 400, "headers": []})
+                await send({"type": "http.response.body", "body": b"{}"})
+                return
+            self.body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+class TestMiddleware:
+    def test_declared_length_rejected_without_reading(self):
+        app = _BodyApp()
+        middleware = UploadSizeLimitMiddleware(app, {("POST", "/api/chat/emojis"): 100})
+        sent = asyncio.run(_call(middleware, [(b"content-length", b"5000")], [b"x" * 5000]))
+        assert sent[0]["status"] == 413 and app.body == b""
+        assert "trop volumineux" in json.loads(sent[1]["body"])["detail"]
+
+    def test_streamed_body_cut_at_limit(self):
+        app = _BodyApp()
+        middleware = UploadSizeLimitMiddleware(app, {("POST", "/api/chat/emojis"): 100})
+        sent = asyncio.run(_call(middleware, [], [b"x" * 60, b"x" * 60, b"x" * 60]))
+        assert [m["status"] for m in sent if m["type"] == "http.response.start"] == [413]
+        assert len(app.body) == 60
+
+    def test_within_limit_passes_through(self):
+        app = _BodyApp()
+        middleware = UploadSizeLimitMiddleware(app, {("POST", "/api/chat/emojis"): 100})
+        sent = asyncio.run(_call(middleware, [(b"content-length", b"50")], [b"x" * 50]))
+        assert sent[0]["status"] == 200
@@ -0,0 +1,141 @@
+"""
+Test Suite: WhatsApp memory - conversations persistées et historique de l'IA
+
+Features to test:
+1. History window: most recent turns, chronological, bounded by turns and token budget
+2. One session per phone number (upsert), reused across messages
+3. Inbound and AI messages are persisted in the session
+4. The LLM receives the previous turns in its system prompt
+5. Coach takeover (is_ai_active False): no AI reply
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from whatsapp_memory import WhatsAppConversations, conversation_window, estimate_tokens, format_history
+
+
+class _FakeSessions:
+    def __init__(self):
+        self.docs = []
+        self.upserts = 0
+
+    async def find_one_and_update(self, query, update, upsert=False, projection=None, return_document=False):
+        self.upserts += 1
+        doc = next((d for d in self.docs if d["whatsapp_phone"] == query["whatsapp_phone"]), None)
+        if doc is None:
+            doc = {**query, **update["$setOnInsert"]}
+            self.docs.append(doc)
+        doc.update(update["$set"])
+        for field, value in update.get("$addToSet", {}).items():
+            values = doc.setdefault(field, [])
+            if value not in values:
+                values.append(value)
+        return dict(doc)
+
+
+class _FakeDb:
+    def __init__(self):
+        self.chat_sessions = _FakeSessions()
+
+
+class _Store:
+    """store_chat_message / recent_session_messages du serveur, en mémoire."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def store(self, message):
+        self.messages.append(message)
+        return message
+
+    async def recent(self, session_id, n):
+        rows = [m for m in self.messages if m["session_id"] == session_id and not m.get("is_deleted")]
+        return rows[-n:]
+
+
+def _conversations(**kwargs):
+    store = _Store()
+    return WhatsAppConversations(_FakeDb(), store.store, store.recent, **kwargs), store
+
+
+def _msg(content, sender_type="user"):
+    return {"content": content, "sender_type": sender_type}
+
+
+def test_window_keeps_latest_turns_in_order():
+    messages = [_msg(f"message {i}", "user" if i % 2 == 0 else "ai") for i in range(10)]
+    turns = conversation_window(messages, max_turns=3)
+    assert turns == ["Assistant: message 7", "Client: message 8", "Assistant: message 9"]
+
+
+def test_window_respects_token_budget_and_skips_deleted():
+    messages = [_msg("a" * 400), {**_msg("supprimé"), "is_deleted": True}, _msg("b" * 40), _msg("c" * 40)]
+    budget = 2 * (estimate_tokens("Client: " + "b" * 40) + 4)
+    turns = conversation_window(messages, max_turns=10, token_budget=budget)
+    assert turns == ["Client: " + "b" * 40, "Client: " + "c" * 40]
+    assert format_history([]) == ""
+    assert format_history(turns).startswith("\n\n📜 HISTORIQUE RÉCENT:\nClient: ")
+
+
+def test_one_session_per_phone():
+    async def scenario():
+        conversations, store = _conversations()
+        first, _ = await conversations.record_inbound("+41791234567", "Bonjour", "Awa")
+        second, _ = await conversations.record_inbound("+41791234567", "Tu es là ?", "Awa", "participant-1")
+        other, _ = await conversations.record_inbound("+41797654321", "Salut")
+        return conversations, store, first, second, other
+
+    conversations, store, first, second, other = asyncio.run(scenario())
+    assert first["id"] == second["id"] != other["id"]
+    assert len(conversations.database.chat_sessions.docs) == 2
+    assert second["participant_ids"] == ["participant-1"]
+    assert [m["session_id"] for m in store.messages] == [first["id"], first["id"], other["id"]]
+    assert store.messages[0]["sender_id"] == "whatsapp:+41791234567"
+    assert all(m["channel"] == "whatsapp" for m in store.messages)
+
+
+def test_reply_includes_history_and_is_persisted():
+    prompts = []
+
+    async def llm(system_prompt, text, llm_session_id):
+        prompts.append((system_prompt, text, llm_session_id))
+        return f"Réponse à: {text}"
+
+    async def scenario():
+        conversations, store = _conversations()
+        session, inbound = await conversations.record_inbound("+41791234567", "Le cours est à quelle heure ?")
+        first = await conversations.reply(session, inbound, "Tu es le coach.", llm, "whatsapp_41791234567")
+        session, inbound = await conversations.record_inbound("+41791234567", "Et samedi ?")
+        second = await conversations.reply(session, inbound, "Tu es le coach.", llm, "whatsapp_41791234567")
+        return store, first, second
+
+    store, first, second = asyncio.run(scenario())
+    assert first["history_turns"] == 0
+    assert prompts[0][0] == "Tu es le coach."
+    assert second["history_turns"] == 2
+    system_prompt, text, llm_session_id = prompts[1]
+    assert text == "Et samedi ?"
+    assert llm_session_id == "whatsapp_41791234567"
+    assert "Client: Le cours est à quelle heure ?" in system_prompt
+    assert "Assistant: Réponse à: Le cours est à quelle heure ?" in system_prompt
+    assert "Et samedi ?" not in system_prompt  # message courant envoyé une seule fois
+    assert [m["sender_type"] for m in store.messages] == ["user", "ai", "user", "ai"]
+    assert second["message"]["content"] == "Réponse à: Et samedi ?"
+
+
+def test_no_reply_when_coach_took_over():
+    async def llm(system_prompt, text, llm_session_id):
+        raise AssertionError("LLM ne doit pas être appelé")
+
+    async def scenario():
+        conversations, store = _conversations()
+        session, inbound = await conversations.record_inbound("+41791234567", "Allô ?")
+        session["is_ai_active"] = False
+        return store, await conversations.reply(session, inbound, "prompt", llm, "whatsapp_1")
+
+    store, result = asyncio.run(scenario())
+    assert result is None
+    assert [m["sender_type"] for m in store.messages] == ["user"]
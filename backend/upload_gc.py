@@ -0,0 +1,199 @@
+"""
+UPLOAD GC - Nettoyage des photos de profil orphelines (uploads/profiles)
+Chaque upload écrit de nouveaux fichiers sans supprimer les précédents, et les
+participants supprimés laissent les leurs. Le balayage:
+- un seul scan projeté par collection (users, chat_participants, profile_uploads)
+  -> set des fichiers référencés
+- profile_uploads: référence des photos sans document users / chat_participants
+  (invité "guest", profil gardé en localStorage), une par propriétaire: seul le
+  fichier remplacé par un nouvel upload devient orphelin; les références d'invités
+  expirent après GUEST_TTL_SECONDS (updated_at) et sont purgées au balayage
+- un seul listing du stockage (scandir local ou list_objects_v2 S3)
+- suppression par lots des fichiers non référencés plus vieux que la période de grâce
+  (un upload en cours n'est pas encore référencé en DB; une variante récente protège
+  toutes celles du même hash)
+- rapport: fichiers examinés, supprimés, octets récupérés
+"""
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Set
+
+from image_pipeline import variant_names
+
+logger = logging.getLogger(__name__)
+
+PHOTO_FIELDS = ("photo_url", "photoUrl", "photo_srcset")
+UPLOADS_COLLECTION = "profile_uploads"
+REFERENCE_COLLECTIONS = ("users", "chat_participants", UPLOADS_COLLECTION)
+GUEST_OWNER = "guest"
+GRACE_SECONDS = 24 * 3600
+GUEST_TTL_SECONDS = 30 * 86400
+BATCH_SIZE = 200
+SWEEP_INTERVAL_SECONDS = 6 * 3600
+INITIAL_DELAY_SECONDS = 600
+
+# Variante adressée par contenu: {hash}_{taille}.{ext} (image_pipeline)
+_VARIANT_RE = re.compile(r"^([0-9a-f]{24})_\d+\.(?:webp|jpg)$")
+
+
+def with_sibling_variants(names: Iterable[str]) -> Set[str]:
+    """Ajoute toutes les variantes (tailles / formats) des hash présents dans `names`."""
+    expanded = set(names)
+    for name in list(expanded):
+        match = _VARIANT_RE.match(name)
+        if match:
+            expanded.update(variant_names(match.group(1)))
+    return expanded
+
+
+def referenced_files(values: Iterable[str], key_of: Callable[[str], Optional[str]]) -> Set[str]:
+    """
+    Noms de fichiers référencés par des photo_url / srcset (key_of: URL -> clé du
+    stockage ou None). Une variante référencée protège toutes celles du même hash.
+    """
+    names = set()
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        for candidate in value.split(","):
+            url = candidate.strip().split(" ")[0]
+            name = key_of(url) if url else None
+            if name:
+                names.add(name)
+    return with_sibling_variants(names)
+
+
+def upload_owner(owner_id: Optional[str], digest: str) -> str:
+    """Propriétaire de la référence; les invités (sans id stable) en ont une par photo."""
+    if not owner_id or owner_id == GUEST_OWNER:
+        return f"{GUEST_OWNER}:{digest}"
+    return owner_id
+
+
+async def record_upload(database, owner_id: Optional[str], digest: str, photo_fields: dict):
+    """Photo qui n'a mis à jour aucun document: référence conservée pour le balayage."""
+    await database[UPLOADS_COLLECTION].update_one(
+        {"_id": upload_owner(owner_id, digest)},
+        {"$set": {**photo_fields, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+
+
+async def forget_uploads(database, owner_id: str):
+    """Propriétaire supprimé: ses photos redeviennent orphelines (supprimées après la grâce)."""
+    await database[UPLOADS_COLLECTION].delete_many({"_id": owner_id})
+
+
+def _expired_guest(doc: dict, guest_cutoff: Optional[str]) -> bool:
+    return (guest_cutoff is not None and str(doc.get("_id", "")).startswith(f"{GUEST_OWNER}:")
+            and (doc.get("updated_at") or "") < guest_cutoff)
+
+
+async def expire_guest_uploads(database, guest_cutoff: str) -> int:
+    """Références d'invités non rafraîchies depuis guest_cutoff (ISO UTC) supprimées."""
+    result = await database[UPLOADS_COLLECTION].delete_many(
+        {"_id": {"$regex": f"^{GUEST_OWNER}:"}, "updated_at": {"$lt": guest_cutoff}}
+    )
+    return result.deleted_count
+
+
+async def collect_references(database, key_of: Callable[[str], Optional[str]],
+                             guest_cutoff: Optional[str] = None) -> Set[str]:
+    """Fichiers référencés; les références d'invités antérieures à guest_cutoff ne comptent plus."""
+    projection = {"_id": 0, **{field: 1 for field in PHOTO_FIELDS}}
+    query = {"$or": [{field: {"$type": "string"}} for field in PHOTO_FIELDS]}
+    values: List[str] = []
+    for collection in REFERENCE_COLLECTIONS:
+        fields = projection
+        if collection == UPLOADS_COLLECTION:
+            fields = {**projection, "_id": 1, "updated_at": 1}
+        async for doc in database[collection].find(query, fields):
+            if collection == UPLOADS_COLLECTION and _expired_guest(doc, guest_cutoff):
+                continue
+            values.extend(doc.get(field) for field in PHOTO_FIELDS)
+    return referenced_files(values, key_of)
+
+
+class UploadSweeper:
+    """Balayage ponctuel (sweep) ou périodique (start/stop) d'un stockage de médias."""
+
+    def __init__(self, database, storage,
+                 grace_seconds: float = GRACE_SECONDS, batch_size: int = BATCH_SIZE,
+                 clock: Callable[[], float] = time.time, guest_ttl_seconds: float = GUEST_TTL_SECONDS):
+        self.database = database
+        self.storage = storage
+        self.grace_seconds = grace_seconds
+        self.guest_ttl_seconds = guest_ttl_seconds
+        self.batch_size = batch_size
+        self._clock = clock
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.last_report: Optional[dict] = None
+
+    async def sweep(self, dry_run: bool = False) -> dict:
+        async with self._lock:
+            started = time.monotonic()
+            guest_cutoff = datetime.fromtimestamp(
+                self._clock() - self.guest_ttl_seconds, tz=timezone.utc
+            ).isoformat()
+            guests_expired = 0 if dry_run else await expire_guest_uploads(self.database, guest_cutoff)
+            # Références lues AVANT le listing: un fichier apparu entre-temps est récent (grâce)
+            referenced = await collect_references(self.database, self.storage.key_from_url, guest_cutoff)
+            files = await self.storage.list()
+            cutoff = self._clock() - self.grace_seconds
+            protected = referenced | with_sibling_variants(f.key for f in files if f.mtime >= cutoff)
+            orphans = [f for f in files if f.key not in protected]
+            recent = sum(1 for f in files if f.key not in referenced and f.key in protected)
+
+            deleted = reclaimed = errors = 0
+            if dry_run:
+                reclaimed = sum(f.size for f in orphans)
+            else:
+                for start in range(0, len(orphans), self.batch_size):
+                    batch = orphans[start:start + self.batch_size]
+                    failed = await self.storage.delete_many(f.key for f in batch)
+                    for f in batch:
+                        if f.key in failed:
+                            errors += 1
+                        else:
+                            deleted += 1
+                            reclaimed += f.size
+
+            report = {
+                "dry_run": dry_run,
+                "scanned": len(files),
+                "referenced": len(referenced),
+                "orphans": len(orphans),
+                "kept_recent": recent,
+                "guests_expired": guests_expired,
+                "deleted": deleted,
+                "reclaimed_bytes": reclaimed,
+                "errors": errors,
+                "duration_ms": int((time.monotonic() - started) * 1000),
+            }
+            if not dry_run:
+                self.last_report = report
+            logger.info(f"[UPLOAD-GC] {report}")
+            return report
+
+    async def _run(self, interval: float, initial_delay: float):
+        await asyncio.sleep(initial_delay)
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"[UPLOAD-GC] Balayage échoué: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = SWEEP_INTERVAL_SECONDS, initial_delay: float = INITIAL_DELAY_SECONDS):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(interval, initial_delay))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,203 @@
+"""
+UPLOAD INTAKE - Réception des fichiers à mémoire bornée
+- UploadSizeLimitMiddleware: refuse (413) dès le Content-Length annoncé, ou dès
+  que le flux reçu dépasse la limite de la route (corps chunked), avant parsing
+- read_upload(): copie par blocs vers un fichier temporaire "spooled"
+  (mémoire jusqu'à SPOOL_MEMORY_BYTES, disque au-delà), arrêt au premier
+  octet de trop
+- sniff_image_type(): type réel d'après les premiers octets (magic bytes),
+  indépendant du Content-Type / de l'extension envoyés par le client
+"""
+
+import json
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MEMORY_BYTES = 256 * 1024
+MULTIPART_OVERHEAD = 16 * 1024  # en-têtes multipart + champs texte (nom, catégorie)
+
+MAX_PHOTO_BYTES = 2 * 1024 * 1024
+MAX_EMOJI_BYTES = 512 * 1024
+
+# (signature, décalage, type) - WebP: "RIFF....WEBP"
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", 0, "png"),
+    (b"\xff\xd8\xff", 0, "jpg"),
+    (b"GIF87a", 0, "gif"),
+    (b"GIF89a", 0, "gif"),
+    (b"WEBP", 8, "webp"),
+)
+MIME_TYPES = {"png": "image/png", "jpg": "image/jpeg", "gif": "image/gif", "webp": "image/webp"}
+SNIFF_BYTES = 16
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Fichier trop volumineux (max {limit // 1024} KB)")
+        self.limit = limit
+
+
+class UnsupportedImage(Exception):
+    """Contenu qui n'est pas une image PNG / JPEG / GIF / WebP."""
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    for signature, offset, kind in _SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if kind == "webp" and not head.startswith(b"RIFF"):
+                continue
+            return kind
+    return None
+
+
+def base64_limit(max_bytes: int) -> int:
+    """Taille maximale d'un corps JSON portant max_bytes encodés en base64 (data URL)."""
+    return (max_bytes + 2) // 3 * 4 + MULTIPART_OVERHEAD
+
+
+@dataclass
+class IntakeFile:
+    file: "tempfile.SpooledTemporaryFile"
+    size: int
+    kind: str
+
+    @property
+    def extension(self) -> str:
+        return self.kind
+
+    @property
+    def content_type(self) -> str:
+        return MIME_TYPES[self.kind]
+
+    def read_all(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+
+async def read_upload(upload, max_bytes: int, chunk_size: int = CHUNK_SIZE) -> IntakeFile:
+    """
+    UploadFile (ou tout objet avec `async read(n)`) -> IntakeFile.
+    UploadTooLarge dès que max_bytes est dépassé, UnsupportedImage si les
+    premiers octets ne correspondent à aucun format image accepté.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    head = b""
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            if len(head) < SNIFF_BYTES:
+                head += chunk[:SNIFF_BYTES - len(head)]
+                if len(head) >= SNIFF_BYTES and sniff_image_type(head) is None:
+                    raise UnsupportedImage("Format non reconnu")
+            spooled.write(chunk)
+        kind = sniff_image_type(head)
+        if kind is None:
+            raise UnsupportedImage("Format non reconnu")
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return IntakeFile(spooled, size, kind)
+
+
+class _MemoryReader:
+    """Adapte des octets déjà en mémoire (base64 legacy décodé) à read_upload()."""
+
+    def __init__(self, data: bytes):
+        self._data = memoryview(data)
+        self._offset = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size < 0 else self._offset + size
+        chunk = bytes(self._data[self._offset:end])
+        self._offset += len(chunk)
+        return chunk
+
+
+async def read_bytes(data: bytes, max_bytes: int) -> IntakeFile:
+    return await read_upload(_MemoryReader(data), max_bytes)
+
+
+def _too_large_body(limit: int) -> bytes:
+    return json.dumps({"detail": str(UploadTooLarge(limit))}, ensure_ascii=False).encode("utf-8")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Middleware ASGI: limite de corps par (méthode, chemin). Le corps n'est jamais
+    lu au-delà de la limite; FastAPI transforme l'interruption du parsing en 400,
+    la réponse est donc remplacée par un 413 explicite.
+    """
+
+    def __init__(self, app, limits: Dict[Tuple[str, str], int]):
+        self.app = app
+        self.limits = limits
+
+    def _limit_for(self, scope) -> Optional[int]:
+        if scope["type"] != "http":
+            return None
+        return self.limits.get((scope["method"], scope["path"].rstrip("/") or "/"))
+
+    async def _reject(self, send, limit: int):
+        body = _too_large_body(limit)
+        await send({
+            "type": "http.response.start", "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit_for(scope)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            logger.info(f"[UPLOAD] 413 {scope['path']}: Content-Length {int(declared)} > {limit}")
+            return await self._reject(send, limit)
+
+        state = {"received": 0, "exceeded": False, "replaced": False}
+
+        async def limited_receive():
+            if state["exceeded"]:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["exceeded"] = True
+                    logger.info(f"[UPLOAD] 413 {scope['path']}: flux > {limit} octets")
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not state["exceeded"]:
+                return await send(message)
+            if not state["replaced"]:
+                state["replaced"] = True
+                await self._reject(send, limit)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not state["exceeded"]:
+                raise
+            if not state["replaced"]:
+                state["replaced"] = True
+                await self._reject(send, limit)
@@ -0,0 +1,157 @@
+"""
+WHATSAPP MEMORY - Conversations WhatsApp persistées + mémoire de l'IA
+Chaque message entrant créait un LlmChat sans aucun tour précédent: le client
+devait tout réexpliquer. Ici:
+- une session chat_sessions par numéro (whatsapp_phone E.164, index unique partiel),
+  créée par upsert: visible dans le CRM comme les conversations du widget
+- messages entrants et réponses IA stockés dans chat_messages (store_message du serveur:
+  seq, cache, compteurs non-lus)
+- fenêtre d'historique bornée (HISTORY_TURNS tours, HISTORY_TOKEN_BUDGET tokens estimés)
+  injectée dans le prompt système, au format de l'historique du chat web
+- appel LLM injecté (llm): remplaçable par un stub local dans les tests
+"""
+
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TURNS = 12
+HISTORY_TOKEN_BUDGET = 1500
+TURN_CHAR_LIMIT = 800
+CHARS_PER_TOKEN = 4
+TURN_OVERHEAD_TOKENS = 4  # "Client: " + séparateurs
+DUPLICATE_KEY = 11000
+AI_SENDER_NAME = "Assistant Afroboost"
+
+# llm(system_prompt, message, llm_session_id) -> texte de la réponse
+LlmReply = Callable[[str, str, str], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière (~4 caractères par token), suffisante pour borner le prompt."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _turn_text(message: dict) -> str:
+    content = " ".join((message.get("content") or "").split())
+    if len(content) > TURN_CHAR_LIMIT:
+        content = content[:TURN_CHAR_LIMIT - 1] + "…"
+    speaker = "Client" if message.get("sender_type") == "user" else "Assistant"
+    return f"{speaker}: {content}"
+
+
+def conversation_window(messages: List[dict], max_turns: int = HISTORY_TURNS,
+                        token_budget: int = HISTORY_TOKEN_BUDGET) -> List[str]:
+    """Tours les plus récents (ordre chronologique) tenant dans max_turns et token_budget."""
+    window, used = [], 0
+    for message in reversed(messages):
+        if message.get("is_deleted") or not message.get("content"):
+            continue
+        turn = _turn_text(message)
+        cost = estimate_tokens(turn) + TURN_OVERHEAD_TOKENS
+        if len(window) >= max_turns or used + cost > token_budget:
+            break
+        window.append(turn)
+        used += cost
+    window.reverse()
+    return window
+
+
+def format_history(turns: List[str]) -> str:
+    return "\n\n📜 HISTORIQUE RÉCENT:\n" + "\n".join(turns) if turns else ""
+
+
+class WhatsAppConversations:
+    """Session persistée par numéro + réponses IA avec fenêtre d'historique."""
+
+    def __init__(self, database, store_message: Callable[[dict], Awaitable[dict]],
+                 recent_messages: Callable[[str, int], Awaitable[list]],
+                 history_turns: int = HISTORY_TURNS, token_budget: int = HISTORY_TOKEN_BUDGET):
+        self.database = database
+        self._store_message = store_message
+        self._recent_messages = recent_messages
+        self.history_turns = history_turns
+        self.token_budget = token_budget
+
+    async def ensure_indexes(self):
+        await self.database.chat_sessions.create_index(
+            "whatsapp_phone", unique=True, partialFilterExpression={"whatsapp_phone": {"$type": "string"}}
+        )
+
+    async def session_for(self, phone_e164: str, client_name: Optional[str] = None,
+                          participant_id: Optional[str] = None) -> dict:
+        """Session WhatsApp du numéro (créée au premier message, upsert sur l'index unique)."""
+        now = datetime.now(timezone.utc).isoformat()
+        on_insert = {
+            "id": str(uuid.uuid4()),
+            "mode": "ai",
+            "is_ai_active": True,
+            "is_deleted": False,
+            "source": "whatsapp",
+            "link_token": str(uuid.uuid4())[:12],
+            "title": f"WhatsApp {client_name or phone_e164}",
+            "created_at": now,
+        }
+        update = {"$setOnInsert": on_insert, "$set": {"updated_at": now}}
+        if participant_id:
+            update["$addToSet"] = {"participant_ids": participant_id}
+        else:
+            on_insert["participant_ids"] = []
+        try:
+            session = await self.database.chat_sessions.find_one_and_update(
+                {"whatsapp_phone": phone_e164}, update, upsert=True, projection={"_id": 0},
+                return_document=True
+            )
+        except Exception as e:
+            if getattr(e, "code", None) != DUPLICATE_KEY:
+                raise
+            # Deux messages simultanés du même numéro: l'autre upsert a créé la session
+            session = await self.database.chat_sessions.find_one({"whatsapp_phone": phone_e164}, {"_id": 0})
+        return session
+
+    async def _record(self, session_id: str, sender_type: str, sender_id: str, sender_name: str,
+                      content: str) -> dict:
+        return await self._store_message({
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "sender_id": sender_id,
+            "sender_name": sender_name,
+            "sender_type": sender_type,
+            "content": content,
+            "mode": "ai",
+            "channel": "whatsapp",
+            "is_deleted": False,
+            "notified": False,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+
+    async def history(self, session_id: str, exclude_id: Optional[str] = None) -> List[str]:
+        rows = await self._recent_messages(session_id, self.history_turns + 1)
+        return conversation_window(
+            [m for m in rows if m.get("id") != exclude_id], self.history_turns, self.token_budget
+        )
+
+    async def record_inbound(self, phone_e164: str, text: str, client_name: Optional[str] = None,
+                             participant_id: Optional[str] = None) -> tuple:
+        """(session, message) du message entrant, persisté avant tout appel IA."""
+        session = await self.session_for(phone_e164, client_name, participant_id)
+        inbound = await self._record(
+            session["id"], "user", participant_id or f"whatsapp:{phone_e164}", client_name or phone_e164, text
+        )
+        return session, inbound
+
+    async def reply(self, session: dict, inbound: dict, system_prompt: str, llm: LlmReply,
+                    llm_session_id: str) -> Optional[dict]:
+        """
+        Réponse IA avec la fenêtre d'historique, persistée dans la session.
+        None si le coach a repris la conversation (is_ai_active à False).
+        """
+        if not session.get("is_ai_active", True):
+            return None
+        turns = await self.history(session["id"], exclude_id=inbound["id"])
+        response = await llm(system_prompt + format_history(turns), inbound["content"], llm_session_id)
+        message = await self._record(session["id"], "ai", "ai", AI_SENDER_NAME, response)
+        return {"response": response, "message": message, "history_turns": len(turns)}
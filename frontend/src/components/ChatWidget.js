@@ -44,6 +44,17 @@ const CHAT_SESSION_KEY = 'af_chat_session';
 const AFROBOOST_IDENTITY_KEY = 'afroboost_identity'; // Clé unifiée pour l'identité
 const AFROBOOST_PROFILE_KEY = 'afroboost_profile'; // Profil abonné avec code promo validé
 const MESSAGE_CACHE_KEY = 'afroboost_last_msgs'; // Cache hybride pour chargement instantané
+const PRIVATE_PAGE_SIZE = 50; // Taille d'une page de MP (plus récent d'abord, curseur next_before)
+
+// Message privé de l'API -> format affiché par PrivateChatView
+const toPrivateViewMessage = (m, participantId) => ({
+  id: m.id,
+  text: m.content,
+  sender: m.sender_name,
+  senderId: m.sender_id,
+  isMine: m.sender_id === participantId,
+  createdAt: m.created_at
+});
 
 // Icône Plein Écran
 const FullscreenIcon = () => (
@@ -981,8 +992,10 @@ export const ChatWidget = () => {
       setActivePrivateChat(conversation);
       
       // Charger les messages existants
-      const messagesRes = await axios.get(`${API}/private/messages/${conversation.id}`);
-      setPrivateMessages(messagesRes.data || []);
+      // Dernière page seulement (plus récent d'abord) -> ordre chronologique pour l'affichage
+      const messagesRes = await axios.get(`${API}/private/messages/${conversation.id}?page_size=${PRIVATE_PAGE_SIZE}`);
+      setPrivateMessages([...(messagesRes.data.messages || [])].reverse().map(m => toPrivateViewMessage(m, participantId)));
+      setPrivateOlderCursor(messagesRes.data.has_more ? messagesRes.data.next_before : null);
       
       // Rejoindre la room Socket.IO pour les mises à jour temps réel
       if (socketRef.current) {
@@ -1013,6 +1026,7 @@ export const ChatWidget = () => {
     }
     setActivePrivateChat(null);
     setPrivateMessages([]);
+    setPrivateOlderCursor(null);
     setPrivateInput('');
     localStorage.removeItem('afroboost_active_dm');
     console.log('[DM] 📭 DM fermé');
@@ -1181,6 +1195,7 @@ export const ChatWidget = () => {
         // === MISE À JOUR DU PROFIL LOCAL (sync avec DB) ===
         const profile = getStoredProfile() || {};
         profile.photoUrl = photoUrl;
+        profile.photoSrcset = res.data.srcset || null;
         localStorage.setItem(AFROBOOST_PROFILE_KEY, JSON.stringify(profile));
         setAfroboostProfile(profile);
         
@@ -1230,6 +1245,8 @@ export const ChatWidget = () => {
   const [privateChats, setPrivateChats] = useState([]); // Liste des conversations MP actives
   const [activePrivateChat, setActivePrivateChat] = useState(null); // MP actuellement ouverte
   const [privateMessages, setPrivateMessages] = useState([]); // Messages de la MP active
+  const [privateOlderCursor, setPrivateOlderCursor] = useState(null); // Curseur "before" de la page précédente (null = début)
+  const [loadingOlderPrivate, setLoadingOlderPrivate] = useState(false);
   const [privateInput, setPrivateInput] = useState(''); // Input de la MP
   const [unreadPrivateCount, setUnreadPrivateCount] = useState(0); // Compteur MP non lus (pastille rouge)
   const [dmTypingUser, setDmTypingUser] = useState(null); // Indicateur "en train d'écrire" pour DM
@@ -1480,10 +1497,12 @@ export const ChatWidget = () => {
           console.log('[PHOTO] Photo chargée depuis DB:', res.data.photo_url);
           setProfilePhoto(res.data.photo_url);
           
-          // Synchroniser localStorage avec la DB
+          // Synchroniser localStorage avec la DB (srcset de la même photo, sinon l'ancien reste prioritaire)
           const profile = getStoredProfile() || {};
-          if (profile.photoUrl !== res.data.photo_url) {
+          const photoSrcset = res.data.photo_srcset || null;
+          if (profile.photoUrl !== res.data.photo_url || (profile.photoSrcset || null) !== photoSrcset) {
             profile.photoUrl = res.data.photo_url;
+            profile.photoSrcset = photoSrcset;
             localStorage.setItem(AFROBOOST_PROFILE_KEY, JSON.stringify(profile));
             setAfroboostProfile(profile);
           }
@@ -1889,6 +1908,11 @@ export const ChatWidget = () => {
     // Stocker la dernière date de sync dans localStorage (UTC ISO 8601)
     const LAST_SYNC_KEY = `afroboost_last_sync_${sessionData.id}`;
     let lastSyncTime = localStorage.getItem(LAST_SYNC_KEY) || null;
+    // Curseur de séquence de la session (delta exact, détection des trous côté serveur)
+    const LAST_SEQ_KEY = `afroboost_last_seq_${sessionData.id}`;
+    let lastSeq = localStorage.getItem(LAST_SEQ_KEY);
+    const LAST_BROADCAST_SEQ_KEY = 'afroboost_last_broadcast_seq';
+    let lastBroadcastSeq = localStorage.getItem(LAST_BROADCAST_SEQ_KEY);
     
     // Constantes de configuration
     const MAX_RETRIES = 3;
@@ -1913,6 +1937,12 @@ export const ChatWidget = () => {
           // S'assurer que le timestamp est en UTC
           url += `&since=${encodeURIComponent(lastSyncTime)}`;
         }
+        if (lastSeq !== null) {
+          url += `&after_seq=${encodeURIComponent(lastSeq)}`;
+        }
+        if (lastBroadcastSeq !== null) {
+          url += `&after_broadcast_seq=${encodeURIComponent(lastBroadcastSeq)}`;
+        }
         
         console.log(`[RAMASSER] Sync depuis ${source} (since=${lastSyncTime ? lastSyncTime.substring(0, 19) : 'null'})`);
         
@@ -1938,6 +1968,20 @@ export const ChatWidget = () => {
           lastSyncTime = data.synced_at;
           localStorage.setItem(LAST_SYNC_KEY, lastSyncTime);
         }
+        if (data.next_after_seq !== undefined && data.next_after_seq !== null) {
+          lastSeq = String(data.next_after_seq);
+          localStorage.setItem(LAST_SEQ_KEY, lastSeq);
+        }
+        if (data.next_after_broadcast_seq !== undefined && data.next_after_broadcast_seq !== null) {
+          lastBroadcastSeq = String(data.next_after_broadcast_seq);
+          localStorage.setItem(LAST_BROADCAST_SEQ_KEY, lastBroadcastSeq);
+        }
+        
+        // Tombstones: messages supprimés depuis le dernier curseur
+        if (data.deleted_ids && data.deleted_ids.length > 0) {
+          const deleted = new Set(data.deleted_ids);
+          setMessages(prev => prev.filter(m => !deleted.has(m.id)));
+        }
         
         if (data.messages && data.messages.length > 0) {
           console.log(`[RAMASSER] ${data.count} message(s) recupere(s)`);
@@ -1957,6 +2001,9 @@ export const ChatWidget = () => {
         }
         
         setIsSyncing(false);
+        if (data.has_more && (data.next_after_seq > data.after_seq || data.next_after_broadcast_seq > data.after_broadcast_seq)) {
+          return fetchLatestMessages(0, source);
+        }
         
       } catch (err) {
         console.warn(`[RAMASSER] Tentative ${retryCount + 1}/${MAX_RETRIES} échouée:`, err.message);
@@ -2075,8 +2122,8 @@ export const ChatWidget = () => {
       
       const conversation = response.data;
       
-      // Charger les messages existants
-      const messagesRes = await axios.get(`${API}/private/messages/${conversation.id}`);
+      // Charger les messages existants (dernière page)
+      const messagesRes = await axios.get(`${API}/private/messages/${conversation.id}?page_size=${PRIVATE_PAGE_SIZE}`);
       
       // Ouvrir la fenêtre flottante MP
       setActivePrivateChat({
@@ -2084,14 +2131,8 @@ export const ChatWidget = () => {
         recipientId: targetId,
         recipientName: targetName
       });
-      setPrivateMessages(messagesRes.data.map(m => ({
-        id: m.id,
-        text: m.content,
-        sender: m.sender_name,
-        senderId: m.sender_id,
-        isMine: m.sender_id === participantId,
-        createdAt: m.created_at
-      })));
+      setPrivateMessages([...(messagesRes.data.messages || [])].reverse().map(m => toPrivateViewMessage(m, participantId)));
+      setPrivateOlderCursor(messagesRes.data.has_more ? messagesRes.data.next_before : null);
       
       // === SOCKET.IO: Rejoindre la room de conversation privée ===
       if (socketRef.current) {
@@ -2121,9 +2162,31 @@ export const ChatWidget = () => {
     }
     setActivePrivateChat(null);
     setPrivateMessages([]);
+    setPrivateOlderCursor(null);
     setPrivateInput('');
   };
 
+  // === MP: page précédente (défilement vers le haut), insérée avant les messages affichés ===
+  const loadOlderPrivateMessages = async () => {
+    if (!activePrivateChat?.id || !privateOlderCursor || loadingOlderPrivate) return;
+    setLoadingOlderPrivate(true);
+    try {
+      const res = await axios.get(`${API}/private/messages/${activePrivateChat.id}`, {
+        params: { before: privateOlderCursor, page_size: PRIVATE_PAGE_SIZE }
+      });
+      const older = [...(res.data.messages || [])].reverse().map(m => toPrivateViewMessage(m, participantId));
+      setPrivateMessages(prev => {
+        const known = new Set(prev.map(m => m.id));
+        return [...older.filter(m => !known.has(m.id)), ...prev];
+      });
+      setPrivateOlderCursor(res.data.has_more ? res.data.next_before : null);
+    } catch (err) {
+      console.error('[DM] Erreur chargement messages précédents:', err);
+    } finally {
+      setLoadingOlderPrivate(false);
+    }
+  };
+
   // === SOCKET.IO pour les MP - Remplace le polling ===
   useEffect(() => {
     if (!socketRef.current) return;
@@ -3261,6 +3324,8 @@ export const ChatWidget = () => {
                         {profilePhoto && (
                           <img 
                             src={profilePhoto} 
+                            srcSet={afroboostProfile?.photoSrcset || undefined}
+                            sizes="20px"
                             alt="" 
                             style={{ width: '20px', height: '20px', borderRadius: '50%', marginLeft: 'auto' }}
                           />
@@ -4353,6 +4418,9 @@ export const ChatWidget = () => {
               : activePrivateChat.participant_1_name)
         } : null}
         messages={privateMessages}
+        hasOlder={!!privateOlderCursor}
+        loadingOlder={loadingOlderPrivate}
+        onLoadOlder={loadOlderPrivateMessages}
         inputValue={privateInput}
         setInputValue={setPrivateInput}
         onSend={sendPrivateMessage}
@@ -5,6 +5,7 @@
  */
 import { useState, useEffect, useRef, useMemo, useCallback } from "react";
 import axios from "axios";
+import { io } from "socket.io-client";
 import { QRCodeSVG } from "qrcode.react";
 import {
   getWhatsAppConfig,
@@ -1551,6 +1552,13 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
   };
 
   // === CUSTOM EMOJIS FUNCTIONS ===
+  // Emojis uploadés en fichier (image_url) ou anciens emojis base64 (image_data)
+  // image_url absolue si stockage S3/CDN, relative à l'API sinon
+  const emojiSrc = (emoji) => {
+    if (!emoji.image_url) return emoji.image_data;
+    return emoji.image_url.startsWith('http') ? emoji.image_url : `${BACKEND_URL}${emoji.image_url}`;
+  };
+
   const loadCustomEmojis = async () => {
     try {
       const res = await axios.get(`${API}/chat/emojis`);
@@ -1572,25 +1580,22 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
       return;
     }
     
-    // Convertir en base64
-    const reader = new FileReader();
-    reader.onload = async (e) => {
-      try {
-        const imageData = e.target.result;
-        const res = await axios.post(`${API}/chat/emojis`, {
-          name: newEmojiName.trim(),
-          image_data: imageData,
-          category: "custom"
-        });
-        setCustomEmojis(prev => [res.data, ...prev]);
-        setNewEmojiName("");
-        if (emojiInputRef.current) emojiInputRef.current.value = "";
-      } catch (err) {
-        console.error("Error uploading emoji:", err);
-        alert("Erreur lors de l'upload de l'emoji");
-      }
-    };
-    reader.readAsDataURL(file);
+    // Envoi binaire (multipart), sans conversion base64
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('name', newEmojiName.trim());
+    formData.append('category', 'custom');
+    try {
+      const res = await axios.post(`${API}/chat/emojis`, formData, {
+        headers: { 'Content-Type': 'multipart/form-data' }
+      });
+      setCustomEmojis(prev => [res.data, ...prev]);
+      setNewEmojiName("");
+      if (emojiInputRef.current) emojiInputRef.current.value = "";
+    } catch (err) {
+      console.error("Error uploading emoji:", err);
+      alert(err.response?.status === 413 ? "Image trop volumineuse (max 512 KB)" : "Erreur lors de l'upload de l'emoji");
+    }
   };
 
   const deleteCustomEmoji = async (emojiId) => {
@@ -1661,7 +1666,7 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
         for (const emoji of customEmojis) {
           const tag = `[emoji:${emoji.id}]`;
           if (messageContent.includes(tag)) {
-            messageContent = messageContent.replace(tag, `<img src="${emoji.image_data}" alt="${emoji.name}" style="width:24px;height:24px;display:inline;vertical-align:middle" />`);
+            messageContent = messageContent.replace(tag, `<img src="${emojiSrc(emoji)}" alt="${emoji.name}" style="width:24px;height:24px;display:inline;vertical-align:middle" />`);
           }
         }
       }
@@ -2108,26 +2113,44 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
     }
   }, [tab, chatSessions, addToastNotification, notifyOnAiResponse]);
   
-  // Polling des notifications toutes les 10 secondes
+  // Notifications poussées par le serveur (Socket.IO 'unread_update')
+  // Le polling ne sert plus que de filet de sécurité si le socket est déconnecté
+  const checkUnreadRef = useRef(checkUnreadNotifications);
+  useEffect(() => { checkUnreadRef.current = checkUnreadNotifications; }, [checkUnreadNotifications]);
+  
   useEffect(() => {
     if (tab !== 'conversations') return;
     
-    console.log('[NOTIFICATIONS] Polling activé (interval 10s)');
-    
     // Vérifier immédiatement
-    checkUnreadNotifications();
+    checkUnreadRef.current();
     
-    // Puis toutes les 10 secondes
+    const socket = io(BACKEND_URL, {
+      transports: ['websocket'],
+      reconnection: true,
+      reconnectionDelay: 1000
+    });
+    socket.on('connect', () => {
+      console.log('[NOTIFICATIONS] Abonnement temps réel actif');
+      socket.emit('subscribe_notifications', { target: 'coach' });
+    });
+    socket.on('unread_update', (data) => {
+      setUnreadCount(notifyOnAiResponse ? (data.count_with_ai ?? data.count) : data.count);
+      // Nouveau message: récupérer le détail (une requête par message, plus de polling)
+      if (data.message) checkUnreadRef.current();
+    });
+    
+    // Fallback: polling lent uniquement si le socket est déconnecté
     const interval = setInterval(() => {
-      checkUnreadNotifications();
-    }, 10000);
+      if (!socket.connected) checkUnreadRef.current();
+    }, 30000);
     
     // Cleanup important pour éviter les fuites mémoire
     return () => {
-      console.log('[NOTIFICATIONS] Polling désactivé');
+      console.log('[NOTIFICATIONS] Abonnement désactivé');
       clearInterval(interval);
+      socket.disconnect();
     };
-  }, [tab, checkUnreadNotifications]);
+  }, [tab, notifyOnAiResponse]);
 
   // === POLLING LEGACY pour les sessions en mode humain ===
   const lastMessageCountRef = useRef({});
@@ -6740,7 +6763,7 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
                                       title={emoji.name}
                                     >
                                       <img 
-                                        src={emoji.image_data} 
+                                        src={emojiSrc(emoji)} 
                                         alt={emoji.name}
                                         style={{ width: '32px', height: '32px', borderRadius: '4px', cursor: 'pointer' }}
                                       />
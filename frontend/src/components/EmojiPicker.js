@@ -5,6 +5,14 @@ import { useState, useEffect } from 'react';
 import axios from 'axios';
 
 const API = process.env.REACT_APP_BACKEND_URL + '/api';
+const EMOJI_SIZE = 26;
+
+// URL du manifeste: absolue (S3/CDN), "/api/..." (backend) ou relative à l'API (fallback)
+const resolveEmojiUrl = (url) => {
+  if (url.startsWith('http')) return url;
+  if (url.startsWith('/api/')) return process.env.REACT_APP_BACKEND_URL + url;
+  return `${API}${url}`;
+};
 
 /**
  * Parse les tags [emoji:filename.svg] et les convertit en balises <img>
@@ -36,14 +44,17 @@ const EmojiPicker = ({
   position = 'bottom' // 'bottom' | 'top'
 }) => {
   const [emojis, setEmojis] = useState([]);
+  const [sprite, setSprite] = useState(null);
   const [loading, setLoading] = useState(true);
 
   // Charger les emojis depuis l'API
   useEffect(() => {
     const loadEmojis = async () => {
       try {
+        // Manifeste (ETag) + une seule planche de sprites: 2 requêtes quel que soit le nombre d'emojis
         const res = await axios.get(`${API}/custom-emojis/list`);
         const emojiList = res.data.emojis || [];
+        setSprite(emojiList.length > 0 ? res.data.sprite || null : null);
         setEmojis(emojiList.length > 0 ? emojiList : getDefaultEmojis());
       } catch (err) {
         console.warn('[EMOJI] Erreur chargement, utilisation fallback:', err);
@@ -152,6 +163,8 @@ const EmojiPicker = ({
           {emojis.map((emoji, idx) => {
             const emojiName = typeof emoji === 'object' ? emoji.name : emoji.replace('.svg', '');
             const emojiUrl = typeof emoji === 'object' ? emoji.url : `/emojis/${emoji}`;
+            const frame = sprite && typeof emoji === 'object' ? emoji.sprite : null;
+            const scale = sprite ? EMOJI_SIZE / sprite.cell : 1;
             
             return (
               <button
@@ -182,20 +195,35 @@ const EmojiPicker = ({
                 title={emojiName}
                 data-testid={`emoji-${emojiName}`}
               >
-                <img 
-                  src={`${API}${emojiUrl}`} 
-                  alt={emojiName}
-                  style={{ 
-                    width: '26px', 
-                    height: '26px',
-                    filter: 'drop-shadow(0 1px 2px rgba(0,0,0,0.3))'
-                  }}
-                  onError={(e) => { 
-                    // Fallback: afficher le nom si l'image ne charge pas
-                    e.target.style.display = 'none';
-                    e.target.parentElement.textContent = emojiName.charAt(0).toUpperCase();
-                  }}
-                />
+                {frame ? (
+                  <span
+                    role="img"
+                    aria-label={emojiName}
+                    style={{
+                      width: `${EMOJI_SIZE}px`,
+                      height: `${EMOJI_SIZE}px`,
+                      backgroundImage: `url(${resolveEmojiUrl(sprite.url)})`,
+                      backgroundSize: `${sprite.width * scale}px ${sprite.height * scale}px`,
+                      backgroundPosition: `-${frame.x * scale}px -${frame.y * scale}px`,
+                      filter: 'drop-shadow(0 1px 2px rgba(0,0,0,0.3))'
+                    }}
+                  />
+                ) : (
+                  <img 
+                    src={resolveEmojiUrl(emojiUrl)} 
+                    alt={emojiName}
+                    style={{ 
+                      width: '26px', 
+                      height: '26px',
+                      filter: 'drop-shadow(0 1px 2px rgba(0,0,0,0.3))'
+                    }}
+                    onError={(e) => { 
+                      // Fallback: afficher le nom si l'image ne charge pas
+                      e.target.style.display = 'none';
+                      e.target.parentElement.textContent = emojiName.charAt(0).toUpperCase();
+                    }}
+                  />
+                )}
               </button>
             );
           })}
@@ -6,17 +6,21 @@
  * 
  * Fonctionnalités:
  * - Affichage des messages privés
+ * - Pages plus anciennes au défilement vers le haut (ou bouton "Messages précédents")
  * - Indicateur de frappe (3 points animés)
  * - Envoi de messages
  * - Fermeture de la fenêtre
  */
 
-import React, { memo } from 'react';
+import React, { memo, useRef, useLayoutEffect } from 'react';
 
 /**
  * Composant de la fenêtre de chat privé
  * @param {object} activeChat - Conversation active {id, recipientName, participant_1_id, participant_2_id}
  * @param {array} messages - Liste des messages [{text, sender, isMine, createdAt}]
+ * @param {boolean} hasOlder - Des messages plus anciens restent à charger
+ * @param {boolean} loadingOlder - Page plus ancienne en cours de chargement
+ * @param {function} onLoadOlder - Charge la page précédente (insérée en tête de liste)
  * @param {string} inputValue - Valeur actuelle de l'input
  * @param {function} setInputValue - Setter pour l'input
  * @param {function} onSend - Handler d'envoi de message
@@ -29,6 +33,9 @@ import React, { memo } from 'react';
 const PrivateChatView = ({
   activeChat,
   messages,
+  hasOlder = false,
+  loadingOlder = false,
+  onLoadOlder,
   inputValue,
   setInputValue,
   onSend,
@@ -38,6 +45,25 @@ const PrivateChatView = ({
   typingUser,
   isMainChatOpen = true
 }) => {
+  const listRef = useRef(null);
+  const prependAnchorRef = useRef(null); // Distance au bas de la liste avant l'insertion d'une page
+
+  const requestOlder = () => {
+    if (!hasOlder || loadingOlder || !onLoadOlder) return;
+    const list = listRef.current;
+    if (list) prependAnchorRef.current = list.scrollHeight - list.scrollTop;
+    onLoadOlder();
+  };
+
+  // Page plus ancienne insérée en tête: la position de lecture est conservée
+  useLayoutEffect(() => {
+    const list = listRef.current;
+    if (list && prependAnchorRef.current !== null && !loadingOlder) {
+      list.scrollTop = list.scrollHeight - prependAnchorRef.current;
+      prependAnchorRef.current = null;
+    }
+  }, [messages, loadingOlder]);
+
   if (!activeChat) return null;
 
   return (
@@ -97,14 +123,39 @@ const PrivateChatView = ({
       </div>
 
       {/* Messages */}
-      <div style={{
-        flex: 1,
-        overflowY: 'auto',
-        padding: '12px',
-        display: 'flex',
-        flexDirection: 'column',
-        gap: '8px'
-      }}>
+      <div
+        ref={listRef}
+        onScroll={(e) => {
+          if (e.currentTarget.scrollTop < 40) requestOlder();
+        }}
+        style={{
+          flex: 1,
+          overflowY: 'auto',
+          padding: '12px',
+          display: 'flex',
+          flexDirection: 'column',
+          gap: '8px'
+        }}
+      >
+        {hasOlder && (
+          <button
+            onClick={requestOlder}
+            disabled={loadingOlder}
+            style={{
+              alignSelf: 'center',
+              background: 'rgba(255,255,255,0.1)',
+              border: 'none',
+              borderRadius: '12px',
+              padding: '4px 12px',
+              color: 'rgba(255,255,255,0.7)',
+              fontSize: '11px',
+              cursor: loadingOlder ? 'default' : 'pointer'
+            }}
+            data-testid="load-older-private"
+          >
+            {loadingOlder ? 'Chargement...' : 'Messages précédents'}
+          </button>
+        )}
         {messages.length === 0 ? (
           <div style={{ color: 'rgba(255,255,255,0.5)', textAlign: 'center', marginTop: '50px' }}>
             Commencez la conversation...
@@ -112,7 +163,7 @@ const PrivateChatView = ({
         ) : (
           messages.map((msg, idx) => (
             <div
-              key={idx}
+              key={msg.id || idx}
               style={{
                 alignSelf: msg.isMine ? 'flex-end' : 'flex-start',
                 maxWidth: '80%'